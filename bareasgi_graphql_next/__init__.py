@@ -1,13 +1,108 @@
-"""bareASGI-graphql-next"""
+"""bareASGI-graphql-next
+
+The public names are imported on first use, so importing the package does not
+load graphql, bareASGI or the optional features until they are needed.
+"""
 
 import logging
+from typing import TYPE_CHECKING
+
+from .lazy import lazy_attributes
 
-from .graphql.controller import GraphQLController
-from .graphql.helpers import add_graphql_next
+if TYPE_CHECKING:
+    from .controller import DrainReport
+    from .cost import QueryCost, QueryCostAnalyser, QueryCostError
+    from .deadline import DeadlineExceededError, get_deadline, time_remaining
+    from .graphql.controller import GraphQLController
+    from .graphql.helpers import add_graphql_next
+    from .limits import InputLimitError, InputLimits
+    from .multipart import GraphQLUpload, MultipartError, Upload
+    from .offload import (
+        OffloadMiddleware,
+        ResolverPool,
+        ResolverPoolFullError,
+        blocking_resolver
+    )
+    from .operation_stats import OperationStats
+    from .options import GraphQLOptions
+    from .process_pool import ProcessPoolExecution
+    from .profiling import OperationProfiler
+    from .rate_limit import (
+        CostRateLimiter,
+        RateLimitError,
+        client_address,
+        context_identity,
+        header_identity
+    )
+    from .tracing import TracingMiddleware
+    from .warmup import WarmUp
 
 __all__ = [
     'GraphQLController',
-    'add_graphql_next'
+    'add_graphql_next',
+    'GraphQLOptions',
+    'DrainReport',
+    'QueryCost',
+    'QueryCostAnalyser',
+    'QueryCostError',
+    'DeadlineExceededError',
+    'get_deadline',
+    'time_remaining',
+    'InputLimitError',
+    'InputLimits',
+    'CostRateLimiter',
+    'RateLimitError',
+    'client_address',
+    'context_identity',
+    'header_identity',
+    'OperationProfiler',
+    'OperationStats',
+    'OffloadMiddleware',
+    'ResolverPool',
+    'ResolverPoolFullError',
+    'blocking_resolver',
+    'GraphQLUpload',
+    'MultipartError',
+    'Upload',
+    'ProcessPoolExecution',
+    'TracingMiddleware',
+    'WarmUp'
 ]
 
+__getattr__, __dir__ = lazy_attributes(
+    __name__,
+    globals(),
+    {
+        'DrainReport': '.controller',
+        'QueryCost': '.cost',
+        'QueryCostAnalyser': '.cost',
+        'QueryCostError': '.cost',
+        'DeadlineExceededError': '.deadline',
+        'get_deadline': '.deadline',
+        'time_remaining': '.deadline',
+        'GraphQLController': '.graphql.controller',
+        'add_graphql_next': '.graphql.helpers',
+        'InputLimitError': '.limits',
+        'InputLimits': '.limits',
+        'OffloadMiddleware': '.offload',
+        'ResolverPool': '.offload',
+        'ResolverPoolFullError': '.offload',
+        'blocking_resolver': '.offload',
+        'GraphQLUpload': '.multipart',
+        'MultipartError': '.multipart',
+        'Upload': '.multipart',
+        'OperationStats': '.operation_stats',
+        'GraphQLOptions': '.options',
+        'ProcessPoolExecution': '.process_pool',
+        'OperationProfiler': '.profiling',
+        'CostRateLimiter': '.rate_limit',
+        'RateLimitError': '.rate_limit',
+        'client_address': '.rate_limit',
+        'context_identity': '.rate_limit',
+        'header_identity': '.rate_limit',
+        'TracingMiddleware': '.tracing',
+        'WarmUp': '.warmup'
+    }
+)
+
 logging.getLogger("bareasgi_graphql_next").addHandler(logging.NullHandler())
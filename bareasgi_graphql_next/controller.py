@@ -2,24 +2,24 @@
 
 from abc import ABCMeta, abstractmethod
 import asyncio
-from cgi import parse_multipart
-from datetime import datetime
-from functools import partial
-import io
 import logging
+from math import isfinite
+import random
+import time
 from typing import (
     Any,
-    AsyncIterable,
+    Awaitable,
     Callable,
     Dict,
     List,
-    Mapping,
+    NamedTuple,
     Optional,
+    Set,
     Tuple,
     Union,
-    cast
+    cast,
+    TYPE_CHECKING
 )
-from urllib.parse import parse_qs, urlencode
 
 from bareasgi import (
     Application,
@@ -28,64 +28,61 @@ from bareasgi import (
     WebSocketRequest,
     HttpMiddlewareCallback
 )
-from bareutils import text_reader, text_writer, response_code, header
-import graphql
+from bareutils import bytes_writer, response_code, header
 from graphql import (
     ExecutionResult,
     GraphQLError,
+    GraphQLSchema,
     MapAsyncIterator,
     MiddlewareManager
 )
-
-from .template import make_template
+from graphql.pyutils import AwaitableOrValue
+
+from .deadline import DeadlineExceededError, run_with_deadline
+from .document_cache import CachedDocument, DocumentCache
+from .errors import OperationRejectedError, ServerDrainingError
+from .limits import InputLimitError
+from .metrics import Metrics, PhaseTimer
+from .monitoring import MonitoringEndpoints
+from .options import GraphQLOptions
+from .process_pool import EncodedExecutionResult
+from .queries import handle_query
+from .request_body import read_query_document
+from .responses import make_internal_error_response, make_rejected_response
+from .streaming import StreamingSubscriptions
+from .subscriptions import (
+    SubscriptionInfo,
+    SubscriptionRegistry,
+    source_queue_size
+)
+from .sync_execution import SyncAnalyser
+from .tracing import find_tracing_middleware
 from .utils import (
-    cancellable_aiter,
+    append_middleware,
+    etag_matches,
     get_host,
     get_scheme,
-    has_subscription,
+    is_incremental_delivery_supported,
     wrap_middleware,
     ZeroEvent
 )
 
-LOGGER = logging.getLogger(__name__)
-
-
-def _encode_sse(
-        dumps: Callable[[Any], str],
-        execution_result: Optional[ExecutionResult]
-) -> bytes:
-    if execution_result is None:
-        payload = f'event: ping\ndata: {datetime.utcnow()}\n\n'
-    else:
-        response = {
-            'data': execution_result.data,
-            'errors': [
-                error.formatted
-                for error in execution_result.errors
-            ] if execution_result.errors else None
-        }
-
-        payload = f'event: message\ndata: {dumps(response)}\n\n'
-
-    return payload.encode('utf-8')
+if TYPE_CHECKING:
+    from .graphiql_assets import GraphiQLAssets
+    from .introspection import IntrospectionCache
+    from .multipart import Upload
+    from .websocket_instance import GraphQLWebSocketHandlerInstanceBase
 
+LOGGER = logging.getLogger(__name__)
 
-def _encode_json(
-        dumps: Callable[[Any], str],
-        execution_result: Optional[ExecutionResult]
-) -> bytes:
-    if execution_result is None:
-        return b'\n'
+class DrainReport(NamedTuple):
+    """The outcome of draining the streams and connections on shutdown"""
 
-    payload = dumps({
-        'data': execution_result.data,
-        'errors': [
-            error.formatted
-            for error in execution_result.errors
-        ] if execution_result.errors else None
-    }) + '\n'
+    drained: int
+    """The number which finished before the deadline"""
 
-    return payload.encode('utf-8')
+    killed: int
+    """The number which were cancelled at the deadline"""
 
 
 class GraphQLControllerBase(metaclass=ABCMeta):
@@ -97,15 +94,349 @@ class GraphQLControllerBase(metaclass=ABCMeta):
             middleware: Optional[Union[Tuple, List, MiddlewareManager]],
             ping_interval: float,
             loads: Callable[[str], Any],
-            dumps: Callable[[Any], str]
+            dumps: Callable[[Any], str],
+            options: Optional[GraphQLOptions] = None
     ) -> None:
         self.path_prefix = path_prefix
         self.middleware = middleware
+        # Operations are traced from before they are parsed.
+        self.tracing = find_tracing_middleware(middleware)
         self.ping_interval = ping_interval
         self.loads = loads
         self.dumps = dumps
+        self.options = options = options or GraphQLOptions()
+        self.is_draining = False
+        self.metrics = Metrics()
         self.cancellation_event = asyncio.Event()
+        self._cancellation: "Optional[asyncio.Future[None]]" = None
         self.subscription_count = ZeroEvent()
+        self.stream_tasks: Set[asyncio.Task] = set()
+        self.websocket_instances: Dict[
+            "GraphQLWebSocketHandlerInstanceBase",
+            asyncio.Task
+        ] = {}
+        self.metrics.streams_active.collect = lambda: self.subscription_count.count
+        self.metrics.websocket_connections_active.collect = lambda: len(
+            self.websocket_instances
+        )
+        self.document_cache = DocumentCache()
+        self.subscriptions = SubscriptionRegistry(self.metrics)
+        self.streaming = StreamingSubscriptions(self)
+        self.monitoring = MonitoringEndpoints(
+            self.metrics,
+            self.subscriptions,
+            options.operation_stats,
+            dumps
+        )
+        if options.resolver_offload is not None:
+            options.resolver_offload.bind(self.metrics)
+            # The pools run the resolver after any other middleware.
+            self.middleware = append_middleware(
+                middleware,
+                options.resolver_offload
+            )
+        if options.process_pool is not None:
+            options.process_pool.start(dumps)
+        self.graphiql_assets: Optional["GraphiQLAssets"] = None
+        if options.graphiql_assets_path is not None:
+            # pylint: disable=import-outside-toplevel
+            from .graphiql_assets import load_graphiql_assets
+            self.graphiql_assets = load_graphiql_assets(
+                options.graphiql_assets_path
+            )
+        self.introspection_cache: Optional["IntrospectionCache"] = None
+        if options.cache_introspection:
+            # pylint: disable=import-outside-toplevel
+            from .introspection import IntrospectionCache
+            self.introspection_cache = IntrospectionCache(dumps)
+        self.sync_analyser: Optional[SyncAnalyser] = None
+        if options.sync_execution is not False:
+            self.sync_analyser = SyncAnalyser(
+                self.middleware,
+                assume_sync=options.sync_execution is True
+            )
+
+    @property
+    @abstractmethod
+    def graphql_schema(self) -> GraphQLSchema:
+        """The GraphQL schema
+
+        Returns:
+            GraphQLSchema: The schema.
+        """
+
+    def prepare_operation(
+            self,
+            request: Union[HttpRequest, WebSocketRequest],
+            query: str,
+            variables: Optional[Dict[str, Any]],
+            operation_name: Optional[str]
+    ) -> CachedDocument:
+        """Parse an operation, check it may be executed, and charge the
+        client for it.
+
+        When there is a rate limiter the cost of the operation is charged to
+        the client.
+
+        Args:
+            request (Union[HttpRequest, WebSocketRequest]): The request.
+            query (str): The query.
+            variables (Optional[Dict[str, Any]]): Optional variables.
+            operation_name (Optional[str]): An optional operation name.
+
+        Raises:
+            GraphQLError: If the query cannot be parsed.
+            OperationRejectedError: If the operation is rejected, including
+                when it exceeds the input limits or the rate limit.
+
+        Returns:
+            CachedDocument: The parsed document.
+        """
+        cached_document, cost = self._analyse_operation(
+            request,
+            query,
+            variables,
+            operation_name
+        )
+        self._charge_operation(request, cost)
+        return cached_document
+
+    def _analyse_operation(
+            self,
+            request: Union[HttpRequest, WebSocketRequest],
+            query: str,
+            variables: Optional[Dict[str, Any]],
+            operation_name: Optional[str]
+    ) -> Tuple[CachedDocument, float]:
+        """Parse an operation and check it may be executed.
+
+        The parsed document and the static cost of its operations are cached,
+        so repeated operations are not parsed or analysed again. When there is
+        tracing middleware the decision to trace is made here, so the trace
+        includes the parsing and validation of the operation.
+
+        Args:
+            request (Union[HttpRequest, WebSocketRequest]): The request.
+            query (str): The query.
+            variables (Optional[Dict[str, Any]]): Optional variables.
+            operation_name (Optional[str]): An optional operation name.
+
+        Raises:
+            GraphQLError: If the query cannot be parsed.
+            OperationRejectedError: If the operation is rejected, including
+                when it exceeds the input limits.
+
+        Returns:
+            Tuple[CachedDocument, float]: The parsed document and the cost of
+                the operation.
+        """
+        transport = 'http' if isinstance(request, HttpRequest) else 'websocket'
+        trace = self.tracing.start(request) if self.tracing is not None else None
+        start = time.perf_counter()
+        try:
+            cached_document = self.document_cache.get(
+                query,
+                self.options.input_limits
+            )
+        except InputLimitError as error:
+            self.metrics.input_rejected.inc((error.limit, transport))
+            raise
+        self.metrics.timer(
+            transport,
+            operation_name,
+            trace
+        ).observe('parse', time.perf_counter() - start)
+
+        if self.is_draining and cached_document.has_subscription:
+            raise ServerDrainingError()
+
+        cost = 1.0
+        cost_analyser = self.options.cost_analyser
+        if cost_analyser is not None:
+            query_cost = cached_document.costs.get(operation_name)
+            if query_cost is None:
+                query_cost = cost_analyser.analyse(
+                    self.graphql_schema,
+                    cached_document.document,
+                    operation_name,
+                    variables
+                )
+                if query_cost.is_static:
+                    cached_document.costs[operation_name] = query_cost
+            cost_analyser.check(query_cost)
+            cost = query_cost.cost
+
+        return cached_document, cost
+
+    def _charge_operation(
+            self,
+            request: Union[HttpRequest, WebSocketRequest],
+            cost: float
+    ) -> None:
+        """Charge the client for an operation, if there is a rate limiter."""
+        if self.options.rate_limiter is not None:
+            self.options.rate_limiter.charge(request, cost)
+
+    def get_operation_timeout(
+            self,
+            request: Union[HttpRequest, WebSocketRequest]
+    ) -> Optional[float]:
+        """Get the timeout for an operation.
+
+        The client may request a shorter timeout than the server default with
+        the timeout header, giving the number of seconds.
+
+        Args:
+            request (Union[HttpRequest, WebSocketRequest]): The request.
+
+        Returns:
+            Optional[float]: The timeout in seconds, or None for no timeout.
+        """
+        timeout = self.options.operation_timeout
+        timeout_header = self.options.timeout_header
+        if timeout_header is None:
+            return timeout
+
+        value = header.find(timeout_header, request.scope['headers'])
+        if not value:
+            return timeout
+        try:
+            client_timeout = float(value)
+        except ValueError:
+            LOGGER.debug("Ignoring invalid timeout header: %r", value)
+            return timeout
+        if not (isfinite(client_timeout) and client_timeout > 0):
+            return timeout
+
+        return client_timeout if timeout is None else min(timeout, client_timeout)
+
+    async def execute_with_deadline(
+            self,
+            transport: str,
+            timeout: Optional[float],
+            operation: Awaitable[ExecutionResult]
+    ) -> ExecutionResult:
+        """Execute an operation, cancelling it if the deadline passes.
+
+        Resolvers can find the deadline with `get_deadline` or
+        `time_remaining`.
+
+        Args:
+            transport (str): The transport label for the metrics.
+            timeout (Optional[float]): The timeout in seconds, or None for no
+                timeout.
+            operation (Awaitable[ExecutionResult]): The operation.
+
+        Raises:
+            asyncio.CancelledError: If the operation was cancelled.
+
+        Returns:
+            ExecutionResult: The result, or an error if the deadline passed.
+        """
+        self.metrics.operations_in_flight.inc((transport,))
+        try:
+            return await run_with_deadline(operation, timeout)
+        except asyncio.TimeoutError:
+            LOGGER.debug("Operation timed out after %s seconds.", timeout)
+            self.metrics.operations_timed_out.inc((transport,))
+            return ExecutionResult(
+                data=None,
+                errors=[DeadlineExceededError(cast(float, timeout))]
+            )
+        except asyncio.CancelledError:
+            LOGGER.debug("Operation cancelled.")
+            self.metrics.operations_cancelled.inc((transport,))
+            raise
+        finally:
+            self.metrics.operations_in_flight.dec((transport,))
+
+    def profile_if_requested(
+            self,
+            request: Union[HttpRequest, WebSocketRequest],
+            operation: Awaitable[ExecutionResult],
+            operation_name: Optional[str]
+    ) -> Awaitable[ExecutionResult]:
+        """Run the operation under the profiler if the client asked for it.
+
+        Args:
+            request (Union[HttpRequest, WebSocketRequest]): The request.
+            operation (Awaitable[ExecutionResult]): The operation.
+            operation_name (Optional[str]): The operation name.
+
+        Returns:
+            Awaitable[ExecutionResult]: The operation.
+        """
+        profiler = self.options.profiler
+        if profiler is None or not profiler.is_requested(request):
+            return operation
+        return profiler.profile(operation, operation_name)
+
+    def register_subscription(
+            self,
+            query: str,
+            operation_name: Optional[str],
+            transport: str,
+            source: Any
+    ) -> SubscriptionInfo:
+        """Register an active subscription.
+
+        Args:
+            query (str): The query.
+            operation_name (Optional[str]): The operation name.
+            transport (str): The transport.
+            source (Any): The async iterator of the results.
+
+        Returns:
+            SubscriptionInfo: The state of the subscription.
+        """
+        signature_id, signature = self.document_cache.get_signature(
+            query,
+            operation_name
+        ) or ('', '')
+        return self.subscriptions.add(
+            signature_id,
+            signature,
+            operation_name,
+            transport,
+            source_queue_size(source)
+        )
+
+    def record_operation(
+            self,
+            query: str,
+            variables: Optional[Dict[str, Any]],
+            operation_name: Optional[str],
+            result: ExecutionResult,
+            duration: float,
+            response_bytes: int
+    ) -> None:
+        """Record the statistics of a completed query or mutation.
+
+        Args:
+            query (str): The query.
+            variables (Optional[Dict[str, Any]]): The variables.
+            operation_name (Optional[str]): The operation name.
+            result (ExecutionResult): The result.
+            duration (float): The time taken in seconds.
+            response_bytes (int): The size of the response.
+        """
+        operation_stats = self.options.operation_stats
+        if operation_stats is None:
+            return
+
+        signature = self.document_cache.get_signature(query, operation_name)
+        if signature is None:
+            return
+
+        operation_stats.record(
+            signature[0],
+            signature[1],
+            operation_name,
+            variables,
+            duration,
+            bool(result.errors),
+            response_bytes
+        )
 
     def add_routes(
             self,
@@ -155,61 +486,159 @@ class GraphQLControllerBase(metaclass=ABCMeta):
             self.handle_websocket_subscription
         )
 
+        if self.options.metrics_path is not None:
+            app.http_router.add(
+                {'GET'},
+                path_prefix + self.options.metrics_path,
+                wrap_middleware(rest_middleware, self.monitoring.handle_metrics)
+            )
+
+        if self.options.debug_path is not None:
+            app.http_router.add(
+                {'GET'},
+                path_prefix + self.options.debug_path + '/operations',
+                wrap_middleware(
+                    rest_middleware,
+                    self.monitoring.handle_debug_operations
+                )
+            )
+            app.http_router.add(
+                {'GET'},
+                path_prefix + self.options.debug_path + '/subscriptions',
+                wrap_middleware(
+                    rest_middleware,
+                    self.monitoring.handle_debug_subscriptions
+                )
+            )
+
+        if self.introspection_cache is not None:
+            app.http_router.add(
+                {'GET'},
+                path_prefix + '/schema.graphql',
+                wrap_middleware(rest_middleware, self._view_schema)
+            )
+
         # Add Graphiql
         app.http_router.add(
             {'GET'},
             path_prefix + '/graphiql',
             wrap_middleware(view_middleware, self.view_graphiql)
         )
+        if self.graphiql_assets is not None:
+            app.http_router.add(
+                {'GET'},
+                path_prefix + '/graphiql/assets/{name:str}',
+                wrap_middleware(
+                    view_middleware,
+                    self.graphiql_assets.handle_request
+                )
+            )
 
         return app
 
-    async def shutdown(self) -> None:
-        """Shutdown the service"""
+    def get_cancellation(self) -> "asyncio.Future[None]":
+        """Get the future which is done when the controller shuts down.
+
+        Returns:
+            asyncio.Future[None]: The future.
+        """
+        # The streams share a future which is done on shutdown, rather than
+        # each starting a task to wait for the cancellation event.
+        if self._cancellation is None:
+            self._cancellation = asyncio.get_running_loop().create_future()
+            if self.cancellation_event.is_set():
+                self._cancellation.set_result(None)
+        return self._cancellation
+
+    async def shutdown(self) -> DrainReport:
+        """Shutdown the service.
+
+        New subscriptions are rejected, and the streaming subscriptions are
+        completed. The WebSocket connections are completed and closed with
+        the code 1012 (service restart) at random times over the first half
+        of the drain timeout, so the clients do not all reconnect at once.
+        Streams and connections which have not finished by the drain timeout
+        are cancelled.
+
+        Returns:
+            DrainReport: The number of streams and connections drained and
+                killed.
+        """
+        self.is_draining = True
         self.cancellation_event.set()
-        await self.subscription_count.wait()
+        if self._cancellation is not None and not self._cancellation.done():
+            self._cancellation.set_result(None)
+
+        tasks = set(self.stream_tasks)
+        tasks.update(self.websocket_instances.values())
+        drain_timeout = self.options.drain_timeout
+        close_tasks = [
+            asyncio.create_task(
+                instance.drain(random.uniform(0, drain_timeout / 2))
+            )
+            for instance in self.websocket_instances
+        ]
+
+        pending: Set[asyncio.Task] = set()
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=drain_timeout)
+            for task in pending:
+                task.cancel()
+            for task in close_tasks:
+                task.cancel()
+            await asyncio.wait(tasks | set(close_tasks))
+
+        if self.options.resolver_offload is not None:
+            self.options.resolver_offload.shutdown(wait=False)
+        if self.options.process_pool is not None:
+            self.options.process_pool.shutdown(wait=False)
+
+        report = DrainReport(len(tasks) - len(pending), len(pending))
+        LOGGER.info(
+            "Drained %d streams and connections, killed %d.",
+            report.drained,
+            report.killed
+        )
+        return report
 
     async def view_graphiql(self, request: HttpRequest) -> HttpResponse:
         """Render the Graphiql view
 
+        The page is rendered once for each scheme and host, and may be cached
+        by the client, which revalidates it with its entity tag.
+
         Args:
             request (HttpRequest): The request.
 
         Returns:
             HttpResponse: The response.
         """
+        # Imported when needed, as the page is only served to developers.
+        from .template import make_graphiql_page  # pylint: disable=import-outside-toplevel
 
         try:
-            host = get_host(request)
-            scheme = get_scheme(request)
-            query_path = f'{scheme}://{host}{self.path_prefix}/graphql'
-            ws_scheme = 'ws' if scheme == 'http' else 'wss'
-            subscription_path = f'{ws_scheme}://{host}{self.path_prefix}/subscriptions'
-            body = make_template(
-                host,
-                query_path,
-                subscription_path
+            page = make_graphiql_page(
+                get_scheme(request),
+                get_host(request),
+                self.path_prefix,
+                self.graphiql_assets
             )
             headers = [
-                (b'content-type', b'text/html'),
-                (b'content-length', str(len(body)).encode())
+                (b'etag', page.etag),
+                (b'cache-control', b'no-cache')
             ]
-            return HttpResponse(response_code.OK, headers, text_writer(body))
+            if etag_matches(request, page.etag):
+                return HttpResponse(response_code.NOT_MODIFIED, headers)
 
-        # pylint: disable=bare-except
-        except:
-            LOGGER.exception("Failed to handle grahphiql request")
-
-            text = 'Internal server error'
-            headers = [
-                (b'content-type', b'text/plain'),
-                (b'content-length', str(len(text)).encode())
+            headers += [
+                (b'content-type', b'text/html; charset=utf-8'),
+                (b'content-length', str(len(page.body)).encode())
             ]
-            return HttpResponse(
-                response_code.INTERNAL_SERVER_ERROR,
-                headers,
-                text_writer(text)
-            )
+            return HttpResponse(response_code.OK, headers, bytes_writer(page.body))
+
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("Failed to handle grahphiql request")
+            return make_internal_error_response()
 
     @abstractmethod
     async def handle_websocket_subscription(self, request: WebSocketRequest) -> None:
@@ -228,50 +657,112 @@ class GraphQLControllerBase(metaclass=ABCMeta):
         Returns:
             HttpResponse: The HTTP response to the query request
         """
-
+        uploads: List["Upload"] = []
+        response = await self._handle_graphql(request, uploads)
+        if uploads:
+            # pylint: disable=import-outside-toplevel
+            from .multipart import close_after
+
+            # The uploads are available until the response has been sent,
+            # which is when a cancellable operation runs.
+            response.body = close_after(response.body, uploads)
+        return response
+
+    async def _handle_graphql(  # pylint: disable=too-many-return-statements
+            self,
+            request: HttpRequest,
+            uploads: List["Upload"]
+    ) -> HttpResponse:
         try:
-            body = await self._get_query_document(request)
+            try:
+                body = await read_query_document(
+                    request,
+                    self.loads,
+                    self.options,
+                    uploads
+                )
+            except OperationRejectedError as error:
+                if isinstance(error, InputLimitError):
+                    self.metrics.input_rejected.inc((error.limit, 'http'))
+                return make_rejected_response(error, self.dumps)
 
             query: str = body['query']
             variables: Optional[Dict[str, Any]] = body.get('variables')
             operation_name: Optional[str] = body.get('operationName')
 
-            query_document = graphql.parse(query)
+            # The subscription method is determined by the `allow` header.
+            allow = header.find(b'allow', request.scope['headers'], b'GET')
+
+            try:
+                cached_document, cost = self._analyse_operation(
+                    request,
+                    query,
+                    variables,
+                    operation_name
+                )
+                # A redirected subscription is charged when the client
+                # follows the redirect.
+                if not (cached_document.has_subscription and allow == b'GET'):
+                    self._charge_operation(request, cost)
+            except GraphQLError as error:
+                return make_rejected_response(error, self.dumps)
+
+            if not cached_document.has_subscription:
+                if self.introspection_cache is not None:
+                    response = self.introspection_cache.get_response(
+                        request,
+                        self.graphql_schema,
+                        cached_document,
+                        query,
+                        operation_name
+                    )
+                    if response is not None:
+                        return response
 
-            if not has_subscription(query_document):
-                return await self._handle_query_or_mutation(
+                if (
+                        cached_document.has_incremental_delivery and
+                        is_incremental_delivery_supported()
+                ):
+                    # Incremental delivery requires a streaming media type,
+                    # preferring multipart over server sent events.
+                    accept = header.find(
+                        b'accept',
+                        request.scope['headers'],
+                        b''
+                    ) or b''
+                    if b'multipart/mixed' in accept or b'text/event-stream' in accept:
+                        # pylint: disable=import-outside-toplevel
+                        from .incremental import handle_incremental_query
+                        return await handle_incremental_query(
+                            self,
+                            request,
+                            query,
+                            variables,
+                            operation_name,
+                            b'multipart/mixed' not in accept
+                        )
+
+                return await handle_query(
+                    self,
                     request,
                     query,
                     variables,
                     operation_name
                 )
 
-            # The subscription method is determined by the `allow` header.
-            allow = header.find(b'allow', request.scope['headers'], b'GET')
             if allow == b'GET':
-                return self._handle_subscription_redirect(request, body)
+                return self.streaming.redirect(request, body)
 
-            return await self._handle_streaming_subscription(
+            return await self.streaming.stream(
                 request,
                 query,
                 variables,
                 operation_name
             )
 
-        # pylint: disable=bare-except
-        except:
+        except Exception:  # pylint: disable=broad-except
             LOGGER.exception("Failed to handle graphql query request")
-
-            text = 'Internal server error'
-            headers = [
-                (b'content-type', b'text/plain'),
-                (b'content-length', str(len(text)).encode())
-            ]
-            return HttpResponse(
-                response_code.INTERNAL_SERVER_ERROR,
-                headers,
-                text_writer(text)
-            )
+            return make_internal_error_response()
 
     async def handle_subscription_get(self, request: HttpRequest) -> HttpResponse:
         """Handle a streaming subscription
@@ -282,46 +773,7 @@ class GraphQLControllerBase(metaclass=ABCMeta):
         Returns:
             HttpResponse: The streaming response
         """
-
-        try:
-            LOGGER.debug(
-                "Received GET streaming subscription request: http_version='%s'.",
-                request.scope['http_version']
-            )
-
-            body = {
-                name.decode('utf-8'): self.loads(value[0].decode('utf-8'))
-                for name, value in cast(
-                    Dict[bytes, List[bytes]],
-                    parse_qs(request.scope['query_string'])
-                ).items()
-            }
-
-            query: str = body['query']
-            variables: Optional[Dict[str, Any]] = body.get('variables')
-            operation_name: Optional[str] = body.get('operationName')
-
-            return await self._handle_streaming_subscription(
-                request,
-                query,
-                variables,
-                operation_name
-            )
-
-        # pylint: disable=bare-except
-        except:
-            LOGGER.exception("Failed to handle graphql GET subscription")
-
-            text = 'Internal server error'
-            headers = [
-                (b'content-type', b'text/plain'),
-                (b'content-length', str(len(text)).encode())
-            ]
-            return HttpResponse(
-                response_code.INTERNAL_SERVER_ERROR,
-                headers,
-                text_writer(text)
-            )
+        return await self.streaming.handle_get(request)
 
     async def handle_subscription_post(self, request: HttpRequest) -> HttpResponse:
         """Handle a streaming subscription
@@ -332,250 +784,175 @@ class GraphQLControllerBase(metaclass=ABCMeta):
         Returns:
             HttpResponse: A stream response
         """
+        return await self.streaming.handle_post(request)
 
-        try:
-            LOGGER.debug(
-                "Received POST streaming subscription request: http_version='%s'.",
-                request.scope['http_version']
-            )
-
-            text = await text_reader(request.body)
-            body = self.loads(text)
-
-            query: str = body['query']
-            variables: Optional[Dict[str, Any]] = body.get('variables')
-            operation_name: Optional[str] = body.get('operationName')
-
-            return await self._handle_streaming_subscription(
-                request,
-                query,
-                variables,
-                operation_name
-            )
+    async def _view_schema(self, request: HttpRequest) -> HttpResponse:
+        assert self.introspection_cache is not None
+        return self.introspection_cache.get_sdl_response(
+            request,
+            self.graphql_schema
+        )
 
-        # pylint: disable=bare-except
-        except:
-            LOGGER.exception("Failed to handle graphql POST subscription")
+    def encode_query_result(
+            self,
+            result: ExecutionResult,
+            timer: Optional[PhaseTimer] = None
+    ) -> bytes:
+        """Encode the result of a query or mutation as JSON.
 
-            text = 'Internal server error'
-            headers = [
-                (b'content-type', b'text/plain'),
-                (b'content-length', str(len(text)).encode())
-            ]
-            return HttpResponse(
-                response_code.INTERNAL_SERVER_ERROR,
-                headers,
-                text_writer(text)
-            )
+        Args:
+            result (ExecutionResult): The result.
+            timer (Optional[PhaseTimer], optional): The timer recording the
+                serialisation. Defaults to None.
 
-    async def _get_query_document(self, request: HttpRequest) -> Mapping[str, Any]:
-        content_type = header.content_type(request.scope['headers'])
-        if content_type is None:
-            raise ValueError('Content type not specified')
-        media_type, parameters = content_type
-
-        if media_type == b'application/graphql':
-            return {'query': await text_reader(request.body)}
-        elif media_type in (b'application/json', b'text/plain'):
-            return self.loads(await text_reader(request.body))
-        elif media_type == b'application/x-www-form-urlencoded':
-            body = parse_qs(await text_reader(request.body))
-            return {name: value[0] for name, value in body.items()}
-        elif media_type == b'multipart/form-data':
-            if parameters is None:
-                raise ValueError(
-                    'Missing content type parameters for multipart/form-data'
-                )
-            param_dict = {
-                key.decode('utf-8'): val
-                for key, val in parameters.items()
-            }
-            multipart_dict = parse_multipart(
-                io.StringIO(await text_reader(request.body)),
-                param_dict
-            )
-            return {
-                name: value[0]
-                for name, value in multipart_dict.items()
-            }
+        Returns:
+            bytes: The encoded response.
+        """
+        if isinstance(result, EncodedExecutionResult) and not result.extensions:
+            # The worker process has encoded the response.
+            return result.encoded
+
+        start = time.perf_counter()
+        if isinstance(result, EncodedExecutionResult):
+            # Extensions, such as a profile, were added after the worker.
+            response: Dict[str, Any] = self.loads(result.encoded.decode('utf-8'))
         else:
-            raise RuntimeError(
-                f"Unsupported content type: {media_type.decode('ascii')}"
-            )
+            response = {'data': result.data}
+            if result.errors:
+                response['errors'] = [
+                    error.formatted for error in result.errors]
+        if result.extensions:
+            response['extensions'] = {
+                **response.get('extensions', {}),
+                **result.extensions
+            }
+
+        buf = self.dumps(response).encode('utf-8')
+        if timer is not None:
+            timer.observe('serialise', time.perf_counter() - start)
+        return buf
 
-    async def _handle_query_or_mutation(
+    @abstractmethod
+    async def subscribe(
             self,
             request: HttpRequest,
             query: str,
             variables: Optional[Dict[str, Any]],
-            operation_name: Optional[str]
-    ) -> HttpResponse:
-        LOGGER.debug("Processing a query or mutation.")
-
-        result = await self.query(request, query, variables, operation_name)
-
-        response: Dict[str, Any] = {'data': result.data}
-        if result.errors:
-            response['errors'] = [
-                error.formatted for error in result.errors]
-
-        text = self.dumps(response)
-        headers = [
-            (b'content-type', b'application/json'),
-            (b'content-length', str(len(text)).encode())
-        ]
+            operation_name: Optional[str],
+    ) -> MapAsyncIterator:
+        """Execute a subscription.
 
-        return HttpResponse(response_code.OK, headers, text_writer(text))
+        Args:
+            request (HttpRequest): The http request.
+            query (str): The subscription query.
+            variables (Optional[Dict[str, Any]]): Optional variables.
+            operation_name (Optional[str]): An optional operation name.
 
-    def _handle_subscription_redirect(
-            self,
-            request: HttpRequest,
-            body: Mapping[str, Any]
-    ) -> HttpResponse:
-        # Handle a subscription by returning 201 (Created) with
-        # the url location of the subscription.
-        LOGGER.debug("Redirecting subscription request.")
-        # TODO: handle 'forwarded' header.
-        forwarded_proto = header.find(
-            b'x-forwarded-proto',
-            request.scope['headers']
-        )
-        scheme = (
-            forwarded_proto.decode()
-            if forwarded_proto is not None
-            else request.scope['scheme']
-        )
-        host = cast(
-            bytes,
-            header.find(  # type: ignore
-                b'host',
-                request.scope['headers'],
-                b'localhost'
-            )
-        ).decode()
-        path = self.path_prefix + '/subscriptions'
-        query_string = urlencode(
-            {
-                name.encode('utf-8'): self.dumps(value).encode('utf-8')
-                for name, value in body.items()
-            }
-        )
-        location = f'{scheme}://{host}{path}?{query_string}'.encode('ascii')
-        headers = [
-            (b'access-control-expose-headers', b'location'),
-            (b'location', location)
-        ]
-        return HttpResponse(response_code.CREATED, headers)
+        Returns:
+            MapAsyncIterator: An asynchronous iterator of the results.
+        """
 
-    async def _handle_streaming_subscription(
+    async def query(
             self,
             request: HttpRequest,
             query: str,
             variables: Optional[Dict[str, Any]],
-            operation_name: Optional[str]
-    ) -> HttpResponse:
-        # If unspecified default to server sent events as they have better support.
-        accept = cast(
-            bytes,
-            header.find(
-                b'accept', request.scope['headers'], b'text/event-stream')
-        )
-        content_type = (
-            b'application/stream+json'
-            if accept == b'application/json'
-            else accept
-        )
-
-        result = await self.subscribe(request, query, variables, operation_name)
-
-        is_sse = content_type == b'text/event-stream'
-        encode = partial(_encode_sse if is_sse else _encode_json, self.dumps)
-        nudge = b':\n\n' if is_sse else b'\n'
-
-        # Make an async iterator for the subscription results.
-        async def send_events(zero_event: ZeroEvent) -> AsyncIterable[bytes]:
-            LOGGER.debug('Streaming subscription started.')
+            operation_name: Optional[str],
+    ) -> ExecutionResult:
+        """Execute a query or mutation.
 
-            try:
-                zero_event.increment()
+        If there is a process pool which selects the operation it runs in a
+        worker process, and the result holds the encoded response.
 
-                async for val in cancellable_aiter(
-                        result,
-                        self.cancellation_event,
-                        timeout=self.ping_interval
-                ):
-                    yield encode(val)
-                    yield nudge  # Give the ASGI server a nudge.
-
-            except asyncio.CancelledError:
-                LOGGER.debug("Streaming subscription cancelled.")
-            except Exception as error:  # pylint: disable=broad-except
-                LOGGER.exception("Streaming subscription failed.")
-                # If the error is not caught the client fetch will fail, however
-                # the status code and headers have already been sent. So rather
-                # than let the fetch fail we send a GraphQL response with no
-                # data and the error and close gracefully.
-                if not isinstance(error, GraphQLError):
-                    error = GraphQLError(
-                        'Execution error',
-                        original_error=error
-                    )
-                val = ExecutionResult(None, [error])
-                yield encode(val)
-                yield nudge  # Give the ASGI server a nudge.
-            finally:
-                zero_event.decrement()
-
-            LOGGER.debug("Streaming subscription stopped.")
-
-        headers = [
-            (b'cache-control', b'no-cache'),
-            (b'content-type', content_type),
-            (b'connection', b'keep-alive')
-        ]
+        Args:
+            request (HttpRequest): The http request.
+            query (str): The query.
+            variables (Optional[Dict[str, Any]]): Optional variables.
+            operation_name (Optional[str]): An optional operation name.
 
-        return HttpResponse(
-            response_code.OK,
-            headers,
-            send_events(self.subscription_count)
+        Returns:
+            ExecutionResult: The query results.
+        """
+        process_pool = self.options.process_pool
+        if process_pool is not None and process_pool.selects(
+                self.document_cache.get(query),
+                operation_name
+        ):
+            return await process_pool.execute(
+                request,
+                query,
+                variables,
+                operation_name
+            )
+        return await self._execute_query(
+            request,
+            query,
+            variables,
+            operation_name
         )
 
     @abstractmethod
-    async def subscribe(
+    def execute_query_sync(
             self,
             request: HttpRequest,
-            query: str,
+            cached_document: CachedDocument,
             variables: Optional[Dict[str, Any]],
             operation_name: Optional[str],
-    ) -> MapAsyncIterator:
-        """Execute a subscription.
+    ) -> AwaitableOrValue[ExecutionResult]:
+        """Execute a query, completing synchronously if the resolvers are
+        synchronous.
 
         Args:
             request (HttpRequest): The http request.
-            query (str): The subscription query.
+            cached_document (CachedDocument): The parsed query.
             variables (Optional[Dict[str, Any]]): Optional variables.
             operation_name (Optional[str]): An optional operation name.
 
         Returns:
-            MapAsyncIterator: An asynchronous iterator of the results.
+            AwaitableOrValue[ExecutionResult]: The query results.
         """
 
     @abstractmethod
-    async def query(
+    async def _execute_query(
             self,
             request: HttpRequest,
             query: str,
             variables: Optional[Dict[str, Any]],
             operation_name: Optional[str],
     ) -> ExecutionResult:
-        """Execute a query
+        """Execute a query in the event loop process.
 
         Args:
             request (HttpRequest): The http request.
-            query (str): The subscription query.
+            query (str): The query.
             variables (Optional[Dict[str, Any]]): Optional variables.
             operation_name (Optional[str]): An optional operation name.
 
         Returns:
             ExecutionResult: The query results.
         """
+
+    async def query_incremental(
+            self,
+            request: HttpRequest,
+            query: str,
+            variables: Optional[Dict[str, Any]],
+            operation_name: Optional[str],
+    ) -> Any:
+        """Execute a query which uses the `@defer` or `@stream` directives.
+
+        The default implementation executes the query without incremental
+        delivery.
+
+        Args:
+            request (HttpRequest): The http request.
+            query (str): The query.
+            variables (Optional[Dict[str, Any]]): Optional variables.
+            operation_name (Optional[str]): An optional operation name.
+
+        Returns:
+            Any: Either an `ExecutionResult`, or an
+                `ExperimentalIncrementalExecutionResults` with the initial
+                result and an async iterator of the subsequent results.
+        """
+        return await self.query(request, query, variables, operation_name)
@@ -0,0 +1,397 @@
+"""Static query cost analysis"""
+
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple
+)
+
+from graphql import (
+    DocumentNode,
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLField,
+    GraphQLInterfaceType,
+    GraphQLNamedType,
+    GraphQLObjectType,
+    GraphQLSchema,
+    InlineFragmentNode,
+    IntValueNode,
+    OperationDefinitionNode,
+    OperationType,
+    SelectionSetNode,
+    VariableNode,
+    get_named_type,
+    get_nullable_type,
+    is_list_type,
+    value_from_ast_untyped
+)
+
+from .errors import OperationRejectedError
+
+QUERY_TOO_COMPLEX = 'QUERY_TOO_COMPLEX'
+
+
+class QueryCost(NamedTuple):
+    """The cost of an operation"""
+
+    cost: float
+    """The total cost"""
+
+    depth: int
+    """The maximum depth of the selections"""
+
+    is_static: bool
+    """True if the cost does not depend on the variables"""
+
+
+class QueryCostError(OperationRejectedError):
+    """An error raised when an operation is over budget"""
+
+    def __init__(
+            self,
+            message: str,
+            query_cost: QueryCost,
+            max_cost: Optional[float],
+            max_depth: Optional[int]
+    ) -> None:
+        super().__init__(
+            message,
+            QUERY_TOO_COMPLEX,
+            {
+                'cost': query_cost.cost,
+                'depth': query_cost.depth,
+                'maxCost': max_cost,
+                'maxDepth': max_depth
+            }
+        )
+        self.query_cost = query_cost
+
+
+def _get_root_type(
+        schema: GraphQLSchema,
+        operation: OperationDefinitionNode
+) -> Optional[GraphQLObjectType]:
+    if operation.operation == OperationType.QUERY:
+        return schema.query_type
+    if operation.operation == OperationType.MUTATION:
+        return schema.mutation_type
+    return schema.subscription_type
+
+
+def _get_operation_variables(
+        operation: OperationDefinitionNode,
+        variables: Mapping[str, Any]
+) -> Dict[str, Any]:
+    # The supplied variables take precedence over the defaults of the
+    # operation, so a size cannot be hidden in a default.
+    operation_variables = {
+        definition.variable.name.value: value_from_ast_untyped(
+            definition.default_value
+        )
+        for definition in operation.variable_definitions or []
+        if definition.default_value is not None
+    }
+    operation_variables.update(variables)
+    return operation_variables
+
+
+class _CostContext:
+
+    __slots__ = (
+        'schema',
+        'fragments',
+        'variables',
+        'is_static',
+        'fragment_costs'
+    )
+
+    def __init__(
+            self,
+            schema: GraphQLSchema,
+            fragments: Mapping[str, FragmentDefinitionNode],
+            variables: Dict[str, Any]
+    ) -> None:
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables
+        self.is_static = True
+        # The cost and depth below the spread of each fragment, so a fragment
+        # spread many times is only walked once.
+        self.fragment_costs: Dict[str, Tuple[float, int]] = {}
+
+
+class QueryCostAnalyser:
+    """A static cost and depth analyser for operations"""
+
+    def __init__(
+            self,
+            *,
+            max_cost: Optional[float] = None,
+            max_depth: Optional[int] = None,
+            default_field_cost: float = 1,
+            field_costs: Optional[Mapping[str, float]] = None,
+            list_size_arguments: Iterable[str] = ('first', 'last', 'limit'),
+            default_list_size: int = 10
+    ) -> None:
+        """A static cost and depth analyser for operations.
+
+        The cost of a field is its own cost, plus the cost of its selections.
+        When the field is a list the cost of the selections is multiplied by
+        the value of the first list size argument found (e.g. `first: 5`), or
+        the default list size if there is none. Introspection fields are free.
+
+        Args:
+            max_cost (Optional[float], optional): The maximum cost of an
+                operation, or None for no limit. Defaults to None.
+            max_depth (Optional[int], optional): The maximum depth of an
+                operation, or None for no limit. Defaults to None.
+            default_field_cost (float, optional): The cost of a field with no
+                configured cost. Defaults to 1.
+            field_costs (Optional[Mapping[str, float]], optional): The costs of
+                fields keyed by `"Type.field"`. Defaults to None.
+            list_size_arguments (Iterable[str], optional): The names of the
+                arguments which limit the size of a list. Defaults to
+                ('first', 'last', 'limit').
+            default_list_size (int, optional): The size assumed for lists
+                without a size argument. Defaults to 10.
+        """
+        self.max_cost = max_cost
+        self.max_depth = max_depth
+        self.default_field_cost = default_field_cost
+        self.field_costs: Mapping[str, float] = field_costs or {}
+        self.list_size_arguments = tuple(list_size_arguments)
+        self.default_list_size = default_list_size
+
+    def analyse(
+            self,
+            schema: GraphQLSchema,
+            document: DocumentNode,
+            operation_name: Optional[str],
+            variables: Optional[Mapping[str, Any]]
+    ) -> QueryCost:
+        """Calculate the cost of an operation.
+
+        If there is no operation name the most expensive operation is used.
+
+        Args:
+            schema (GraphQLSchema): The schema.
+            document (DocumentNode): The parsed document.
+            operation_name (Optional[str]): The operation name.
+            variables (Optional[Mapping[str, Any]]): The variables.
+
+        Returns:
+            QueryCost: The cost.
+        """
+        fragments: Dict[str, FragmentDefinitionNode] = {}
+        operations = []
+        for definition in document.definitions:
+            if isinstance(definition, FragmentDefinitionNode):
+                fragments[definition.name.value] = definition
+            elif isinstance(definition, OperationDefinitionNode):
+                if operation_name is None or (
+                        definition.name is not None and
+                        definition.name.value == operation_name
+                ):
+                    operations.append(definition)
+
+        context = _CostContext(schema, fragments, {})
+
+        cost, depth = 0.0, 0
+        for operation in operations:
+            root_type = _get_root_type(schema, operation)
+            if root_type is None:
+                continue
+            context.variables = _get_operation_variables(
+                operation,
+                variables or {}
+            )
+            # The cost of a fragment depends on the variables of the
+            # operation spreading it.
+            context.fragment_costs.clear()
+            operation_cost, operation_depth = self._selection_set_cost(
+                context,
+                root_type,
+                operation.selection_set,
+                1,
+                set()
+            )
+            cost = max(cost, operation_cost)
+            depth = max(depth, operation_depth)
+
+        return QueryCost(cost, depth, context.is_static)
+
+    def check(self, query_cost: QueryCost) -> None:
+        """Check the cost of an operation is within budget.
+
+        Args:
+            query_cost (QueryCost): The cost of the operation.
+
+        Raises:
+            QueryCostError: If the operation is over budget.
+        """
+        if self.max_depth is not None and query_cost.depth > self.max_depth:
+            raise QueryCostError(
+                f'Query depth {query_cost.depth} exceeds the maximum depth {self.max_depth}.',
+                query_cost,
+                self.max_cost,
+                self.max_depth
+            )
+        if self.max_cost is not None and query_cost.cost > self.max_cost:
+            raise QueryCostError(
+                f'Query cost {query_cost.cost:g} exceeds the maximum cost {self.max_cost:g}.',
+                query_cost,
+                self.max_cost,
+                self.max_depth
+            )
+
+    def _selection_set_cost(
+            self,
+            context: _CostContext,
+            parent_type: GraphQLNamedType,
+            selection_set: SelectionSetNode,
+            depth: int,
+            visited_fragments: Set[str]
+    ) -> Tuple[float, int]:
+        cost, max_depth = 0.0, depth
+
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                if selection.name.value.startswith('__'):
+                    continue
+                field_cost, field_depth = self._field_cost(
+                    context,
+                    parent_type,
+                    selection,
+                    depth,
+                    visited_fragments
+                )
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = (
+                    context.schema.get_type(selection.type_condition.name.value)
+                    if selection.type_condition is not None
+                    else parent_type
+                )
+                if fragment_type is None:
+                    continue
+                field_cost, field_depth = self._selection_set_cost(
+                    context,
+                    fragment_type,
+                    selection.selection_set,
+                    depth,
+                    visited_fragments
+                )
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment_cost = self._fragment_cost(
+                    context,
+                    selection.name.value,
+                    visited_fragments
+                )
+                if fragment_cost is None:
+                    continue
+                field_cost, field_depth = fragment_cost
+                field_depth += depth
+            else:
+                continue
+
+            cost += field_cost
+            max_depth = max(max_depth, field_depth)
+
+        return cost, max_depth
+
+    def _fragment_cost(
+            self,
+            context: _CostContext,
+            name: str,
+            visited_fragments: Set[str]
+    ) -> Optional[Tuple[float, int]]:
+        fragment_cost = context.fragment_costs.get(name)
+        if fragment_cost is not None:
+            return fragment_cost
+
+        fragment = context.fragments.get(name)
+        # Fragment cycles are invalid, but validation has not run yet.
+        if fragment is None or name in visited_fragments:
+            return None
+        fragment_type = context.schema.get_type(
+            fragment.type_condition.name.value
+        )
+        if fragment_type is None:
+            return None
+        fragment_cost = self._selection_set_cost(
+            context,
+            fragment_type,
+            fragment.selection_set,
+            0,
+            visited_fragments | {name}
+        )
+        context.fragment_costs[name] = fragment_cost
+        return fragment_cost
+
+    def _field_cost(
+            self,
+            context: _CostContext,
+            parent_type: GraphQLNamedType,
+            field_node: FieldNode,
+            depth: int,
+            visited_fragments: Set[str]
+    ) -> Tuple[float, int]:
+        name = field_node.name.value
+        cost = self.field_costs.get(
+            f'{parent_type.name}.{name}',
+            self.default_field_cost
+        )
+
+        if not isinstance(parent_type, (GraphQLObjectType, GraphQLInterfaceType)):
+            return cost, depth
+        field = parent_type.fields.get(name)
+        if field is None or field_node.selection_set is None:
+            return cost, depth
+
+        selection_cost, selection_depth = self._selection_set_cost(
+            context,
+            get_named_type(field.type),
+            field_node.selection_set,
+            depth + 1,
+            visited_fragments
+        )
+        if is_list_type(get_nullable_type(field.type)):
+            selection_cost *= self._list_size(context, field, field_node)
+
+        return cost + selection_cost, selection_depth
+
+    def _list_size(
+            self,
+            context: _CostContext,
+            field: GraphQLField,
+            field_node: FieldNode
+    ) -> int:
+        arguments = {
+            argument.name.value: argument.value
+            for argument in field_node.arguments or []
+        }
+        for name in self.list_size_arguments:
+            if name not in field.args:
+                continue
+
+            value_node = arguments.get(name)
+            # A negative size is an error for the resolver, and must not
+            # cancel the cost of other fields.
+            if isinstance(value_node, IntValueNode):
+                return max(0, int(value_node.value))
+            if isinstance(value_node, VariableNode):
+                context.is_static = False
+                value = value_from_ast_untyped(value_node, context.variables)
+                if isinstance(value, int):
+                    return max(0, value)
+            default_value = field.args[name].default_value
+            if isinstance(default_value, int):
+                return max(0, default_value)
+
+        return self.default_list_size
@@ -0,0 +1,110 @@
+"""Operation deadlines"""
+
+import asyncio
+from contextvars import ContextVar
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from graphql import GraphQLError
+
+DEADLINE_EXCEEDED = 'DEADLINE_EXCEEDED'
+
+T = TypeVar('T')
+
+# The deadline of the current operation in event loop time.
+_DEADLINE: ContextVar[Optional[float]] = ContextVar(
+    'bareasgi_graphql_next.deadline',
+    default=None
+)
+
+
+class DeadlineExceededError(GraphQLError):
+    """An error reported when an operation does not complete before its deadline"""
+
+    def __init__(self, timeout: float) -> None:
+        super().__init__(
+            f'The operation did not complete within {timeout:g} seconds.',
+            extensions={'code': DEADLINE_EXCEEDED, 'timeout': timeout}
+        )
+
+
+def get_deadline() -> Optional[float]:
+    """Get the deadline of the operation being executed.
+
+    Resolvers can use this to bound calls to other services.
+
+    Returns:
+        Optional[float]: The deadline in event loop time, or None if there is
+            no deadline.
+    """
+    return _DEADLINE.get()
+
+
+def time_remaining() -> Optional[float]:
+    """Get the time remaining before the deadline of the operation being
+    executed.
+
+    Returns:
+        Optional[float]: The number of seconds remaining, or None if there is
+            no deadline.
+    """
+    deadline = _DEADLINE.get()
+    if deadline is None:
+        return None
+    try:
+        now = asyncio.get_running_loop().time()
+    except RuntimeError:
+        # A resolver on a thread pool has no loop, but the loop uses the
+        # monotonic clock.
+        now = time.monotonic()
+    return max(deadline - now, 0.0)
+
+
+async def run_with_deadline(operation: Awaitable[T], timeout: Optional[float]) -> T:
+    """Run an operation which will be cancelled if the timeout expires.
+
+    Args:
+        operation (Awaitable[T]): The operation.
+        timeout (Optional[float]): The timeout in seconds, or None for no
+            timeout.
+
+    Raises:
+        asyncio.TimeoutError: If the timeout expired.
+
+    Returns:
+        T: The result of the operation.
+    """
+    if timeout is None:
+        return await operation
+
+    # The deadline is set before the operation is scheduled, so the tasks
+    # running the resolvers inherit it.
+    token = _DEADLINE.set(asyncio.get_running_loop().time() + timeout)
+    try:
+        return await asyncio.wait_for(operation, timeout)
+    finally:
+        _DEADLINE.reset(token)
+
+
+def call_with_deadline(func: Callable[[], T], timeout: Optional[float]) -> T:
+    """Call a function which starts an operation, with its deadline set.
+
+    The resolvers which run before the operation first awaits can find the
+    deadline, although it cannot interrupt them.
+
+    Args:
+        func (Callable[[], T]): The function.
+        timeout (Optional[float]): The timeout in seconds, or None for no
+            timeout.
+
+    Returns:
+        T: The result of the function.
+    """
+    if timeout is None:
+        return func()
+
+    token = _DEADLINE.set(asyncio.get_running_loop().time() + timeout)
+    try:
+        return func()
+    finally:
+        _DEADLINE.reset(token)
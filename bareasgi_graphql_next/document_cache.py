@@ -0,0 +1,355 @@
+"""A cache of parsed documents"""
+
+from collections import OrderedDict
+from inspect import isawaitable
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast
+)
+
+import graphql
+from graphql import (
+    DocumentNode,
+    ExecutionResult,
+    GraphQLError,
+    GraphQLSchema,
+    MiddlewareManager
+)
+from graphql.pyutils import AwaitableOrValue
+
+from .cost import QueryCost
+from .metrics import PhaseTimer
+from .signature import operation_signature, signature_hash
+from .utils import (
+    has_incremental_delivery,
+    has_subscription,
+    is_incremental_delivery_supported
+)
+
+if TYPE_CHECKING:
+    from .limits import InputLimits
+
+
+class CachedDocument:
+    """A parsed document with the information derived from it"""
+
+    __slots__ = (
+        'document',
+        'has_subscription',
+        'has_incremental_delivery',
+        'costs',
+        'signatures',
+        'sync_operations',
+        'validation_errors'
+    )
+
+    def __init__(self, document: DocumentNode) -> None:
+        """A parsed document with the information derived from it.
+
+        Args:
+            document (DocumentNode): The parsed document.
+        """
+        self.document = document
+        self.has_subscription = has_subscription(document)
+        self.has_incremental_delivery = has_incremental_delivery(document)
+        # The static query costs keyed by operation name.
+        self.costs: Dict[Optional[str], QueryCost] = {}
+        # The signature hashes and signatures keyed by operation name.
+        self.signatures: Dict[Optional[str], Tuple[str, str]] = {}
+        # Whether the operations can be run synchronously, keyed by operation
+        # name.
+        self.sync_operations: Dict[Optional[str], bool] = {}
+        # The errors from validating against the schema, or None if the
+        # document has not been validated.
+        self.validation_errors: Optional[List[GraphQLError]] = None
+
+    def validate(self, schema: GraphQLSchema) -> List[GraphQLError]:
+        """Validate the document, caching the errors.
+
+        A cache is used with a single schema, so the errors are kept.
+
+        Args:
+            schema (GraphQLSchema): The schema.
+
+        Returns:
+            List[GraphQLError]: The validation errors.
+        """
+        if self.validation_errors is None:
+            self.validation_errors = graphql.validate(schema, self.document)
+        return self.validation_errors
+
+
+class DocumentCache:
+    """A least recently used cache of parsed documents keyed by query"""
+
+    def __init__(self, max_size: int = 1000) -> None:
+        """A least recently used cache of parsed documents keyed by query.
+
+        Args:
+            max_size (int, optional): The maximum number of documents to hold.
+                Defaults to 1000.
+        """
+        self.max_size = max_size
+        self._documents: "OrderedDict[str, CachedDocument]" = OrderedDict()
+
+    def get(
+            self,
+            query: str,
+            limits: Optional["InputLimits"] = None
+    ) -> CachedDocument:
+        """Get the parsed document for a query, parsing it if necessary.
+
+        The limits are checked when the query is parsed, so a cached document
+        has passed them.
+
+        Args:
+            query (str): The query.
+            limits (Optional[InputLimits], optional): Limits on the size and
+                shape of the query. Defaults to None.
+
+        Raises:
+            GraphQLError: If the query cannot be parsed.
+            InputLimitError: If the query exceeds a limit.
+
+        Returns:
+            CachedDocument: The cached document.
+        """
+        cached_document = self._documents.get(query)
+        if cached_document is not None:
+            self._documents.move_to_end(query)
+            return cached_document
+
+        cached_document = CachedDocument(
+            graphql.parse(query) if limits is None else limits.parse(query)
+        )
+        self._documents[query] = cached_document
+        if len(self._documents) > self.max_size:
+            self._documents.popitem(last=False)
+
+        return cached_document
+
+    def get_signature(
+            self,
+            query: str,
+            operation_name: Optional[str]
+    ) -> Optional[Tuple[str, str]]:
+        """Get the normalised signature of an operation.
+
+        The signature is cached with the parsed document.
+
+        Args:
+            query (str): The query.
+            operation_name (Optional[str]): The operation name.
+
+        Returns:
+            Optional[Tuple[str, str]]: The hash of the signature and the
+                signature, or None if the query is invalid.
+        """
+        try:
+            cached_document = self.get(query)
+        except GraphQLError:
+            return None
+
+        signature = cached_document.signatures.get(operation_name)
+        if signature is None:
+            text = operation_signature(cached_document.document, operation_name)
+            signature = (signature_hash(text), text)
+            # Only cache the signatures of operations in the document, as
+            # the operation name comes from the client.
+            if text:
+                cached_document.signatures[operation_name] = signature
+
+        return signature
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+
+def execute_document(
+        schema: GraphQLSchema,
+        cached_document: CachedDocument,
+        variables: Optional[Dict[str, Any]],
+        operation_name: Optional[str],
+        context_value: Any,
+        middleware: Optional[Union[Tuple, List, MiddlewareManager]],
+        timer: Optional[PhaseTimer] = None
+) -> AwaitableOrValue[ExecutionResult]:
+    """Execute a cached document.
+
+    The result is returned directly when the resolvers are synchronous, and
+    is otherwise awaitable.
+
+    Args:
+        schema (GraphQLSchema): The schema.
+        cached_document (CachedDocument): The parsed document.
+        variables (Optional[Dict[str, Any]]): Optional variables.
+        operation_name (Optional[str]): An optional operation name.
+        context_value (Any): The context value.
+        middleware (Optional[Union[Tuple, List, MiddlewareManager]]): The
+            graphql middleware.
+        timer (Optional[PhaseTimer], optional): An optional timer for the
+            validate and execute phases. Defaults to None.
+
+    Returns:
+        AwaitableOrValue[ExecutionResult]: The result of the execution.
+    """
+    start = time.perf_counter()
+    validation_errors = cached_document.validate(schema)
+    if timer is not None:
+        timer.observe('validate', time.perf_counter() - start)
+    if validation_errors:
+        return ExecutionResult(data=None, errors=validation_errors)
+
+    start = time.perf_counter()
+    result = graphql.execute(
+        schema,
+        cached_document.document,
+        variable_values=variables,
+        operation_name=operation_name,
+        context_value=context_value,
+        middleware=middleware
+    )
+    if isawaitable(result):
+        return _complete_execution(
+            cast(Awaitable[ExecutionResult], result),
+            start,
+            timer
+        )
+    if timer is not None:
+        timer.observe('execute', time.perf_counter() - start)
+    return cast(ExecutionResult, result)
+
+
+async def _complete_execution(
+        result: Awaitable[ExecutionResult],
+        start: float,
+        timer: Optional[PhaseTimer]
+) -> ExecutionResult:
+    try:
+        return await result
+    finally:
+        if timer is not None:
+            timer.observe('execute', time.perf_counter() - start)
+
+
+async def execute_document_incrementally(
+        schema: GraphQLSchema,
+        cached_document: CachedDocument,
+        variables: Optional[Dict[str, Any]],
+        operation_name: Optional[str],
+        context_value: Any,
+        middleware: Optional[Union[Tuple, List, MiddlewareManager]],
+        timer: Optional[PhaseTimer] = None
+) -> Any:
+    """Execute a cached document which uses the `@defer` or `@stream`
+    directives.
+
+    This uses the experimental incremental execution of graphql-core when it
+    is available, and falls back to a normal execution when it is not.
+
+    Args:
+        schema (GraphQLSchema): The schema.
+        cached_document (CachedDocument): The parsed document.
+        variables (Optional[Dict[str, Any]]): Optional variables.
+        operation_name (Optional[str]): An optional operation name.
+        context_value (Any): The context value.
+        middleware (Optional[Union[Tuple, List, MiddlewareManager]]): The
+            graphql middleware.
+        timer (Optional[PhaseTimer], optional): An optional timer for the
+            validate phase, and the execution of the initial result.
+            Defaults to None.
+
+    Returns:
+        Any: Either an `ExecutionResult` or an
+            `ExperimentalIncrementalExecutionResults`.
+    """
+    if not is_incremental_delivery_supported():
+        result = execute_document(
+            schema,
+            cached_document,
+            variables,
+            operation_name,
+            context_value,
+            middleware,
+            timer
+        )
+        if isawaitable(result):
+            return await cast(Awaitable[ExecutionResult], result)
+        return result
+
+    start = time.perf_counter()
+    validation_errors = cached_document.validate(schema)
+    if timer is not None:
+        timer.observe('validate', time.perf_counter() - start)
+    if validation_errors:
+        return ExecutionResult(data=None, errors=validation_errors)
+
+    start = time.perf_counter()
+    # pylint: disable=no-member
+    result = graphql.execution.experimental_execute_incrementally(  # type: ignore
+        schema=schema,
+        document=cached_document.document,
+        variable_values=variables,
+        operation_name=operation_name,
+        context_value=context_value,
+        middleware=middleware
+    )
+    if isawaitable(result):
+        result = await result
+    if timer is not None:
+        timer.observe('execute', time.perf_counter() - start)
+    return result
+
+
+async def execute_cached(
+        schema: GraphQLSchema,
+        document_cache: DocumentCache,
+        query: str,
+        variables: Optional[Dict[str, Any]],
+        operation_name: Optional[str],
+        context_value: Any,
+        middleware: Optional[Union[Tuple, List, MiddlewareManager]],
+        timer: Optional[PhaseTimer] = None
+) -> ExecutionResult:
+    """Execute a query using the cached document.
+
+    Args:
+        schema (GraphQLSchema): The schema.
+        document_cache (DocumentCache): The document cache.
+        query (str): The query.
+        variables (Optional[Dict[str, Any]]): Optional variables.
+        operation_name (Optional[str]): An optional operation name.
+        context_value (Any): The context value.
+        middleware (Optional[Union[Tuple, List, MiddlewareManager]]): The
+            graphql middleware.
+        timer (Optional[PhaseTimer], optional): An optional timer for the
+            validate and execute phases. Defaults to None.
+
+    Returns:
+        ExecutionResult: The result of the execution.
+    """
+    try:
+        cached_document = document_cache.get(query)
+    except GraphQLError as error:
+        return ExecutionResult(data=None, errors=[error])
+
+    result = execute_document(
+        schema,
+        cached_document,
+        variables,
+        operation_name,
+        context_value,
+        middleware,
+        timer
+    )
+    if isawaitable(result):
+        return await cast(Awaitable[ExecutionResult], result)
+    return cast(ExecutionResult, result)
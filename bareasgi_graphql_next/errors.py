@@ -0,0 +1,52 @@
+"""Errors"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from bareutils import response_code
+from graphql import GraphQLError
+
+
+class OperationRejectedError(GraphQLError):
+    """An error raised when an operation is rejected before execution"""
+
+    def __init__(
+            self,
+            message: str,
+            code: str,
+            extensions: Optional[Dict[str, Any]] = None,
+            *,
+            status: int = response_code.BAD_REQUEST,
+            headers: Optional[List[Tuple[bytes, bytes]]] = None
+    ) -> None:
+        """An error raised when an operation is rejected before execution.
+
+        Args:
+            message (str): The error message.
+            code (str): The error code reported in the extensions.
+            extensions (Optional[Dict[str, Any]], optional): Additional
+                extensions. Defaults to None.
+            status (int, optional): The HTTP status code. Defaults to
+                response_code.BAD_REQUEST.
+            headers (Optional[List[Tuple[bytes, bytes]]], optional): Additional
+                HTTP headers. Defaults to None.
+        """
+        super().__init__(
+            message,
+            extensions={'code': code, **(extensions or {})}
+        )
+        self.status = status
+        self.headers = headers or []
+
+
+SERVER_DRAINING = 'SERVER_DRAINING'
+
+
+class ServerDrainingError(OperationRejectedError):
+    """An error raised for a new subscription while the server is draining"""
+
+    def __init__(self) -> None:
+        super().__init__(
+            'The server is shutting down.',
+            SERVER_DRAINING,
+            status=response_code.SERVICE_UNAVAILABLE
+        )
@@ -1,9 +1,23 @@
 """bareASGI graphene support"""
 
-from .controller import GrapheneController
-from .helpers import add_graphene
+from typing import TYPE_CHECKING
+
+from ..lazy import lazy_attributes
+
+if TYPE_CHECKING:
+    from .controller import GrapheneController
+    from .helpers import add_graphene
 
 __all__ = [
     'GrapheneController',
     'add_graphene'
 ]
+
+__getattr__, __dir__ = lazy_attributes(
+    __name__,
+    globals(),
+    {
+        'GrapheneController': '.controller',
+        'add_graphene': '.helpers'
+    }
+)
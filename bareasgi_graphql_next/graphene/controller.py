@@ -1,5 +1,6 @@
 """Graphene support"""
 
+import time
 from typing import (
     Any,
     Callable,
@@ -12,9 +13,22 @@ from typing import (
 
 from bareasgi import WebSocketRequest, HttpRequest
 from graphene import Schema
-from graphql import ExecutionResult, MiddlewareManager, MapAsyncIterator
+from graphql import (
+    ExecutionResult,
+    GraphQLSchema,
+    MiddlewareManager,
+    MapAsyncIterator
+)
+from graphql.pyutils import AwaitableOrValue
 
 from ..controller import GraphQLControllerBase
+from ..document_cache import (
+    CachedDocument,
+    execute_document,
+    execute_document_incrementally
+)
+from ..options import GraphQLOptions
+from ..tracing import get_trace
 
 from .websocket_handler import GrapheneWebSocketHandler
 
@@ -29,7 +43,8 @@ class GrapheneController(GraphQLControllerBase):
             middleware: Optional[Union[Tuple, List, MiddlewareManager]],
             ping_interval: float,
             loads: Callable[[str], Any],
-            dumps: Callable[[Any], str]
+            dumps: Callable[[Any], str],
+            options: Optional[GraphQLOptions] = None
     ) -> None:
         """Create a Graphene controller
 
@@ -43,10 +58,23 @@ class GrapheneController(GraphQLControllerBase):
                 to an object.
             dumps (Callable[[Any], str]): The function to convert an object to a
                 JSON string. Defaults to json.dumps.
+            options (Optional[GraphQLOptions], optional): The optional
+                features of the controller. Defaults to None.
         """
-        super().__init__(path_prefix, middleware, ping_interval, loads, dumps)
+        super().__init__(
+            path_prefix,
+            middleware,
+            ping_interval,
+            loads,
+            dumps,
+            options
+        )
         self.schema = schema
-        self.ws_subscription_handler = GrapheneWebSocketHandler(schema)
+        self.ws_subscription_handler = GrapheneWebSocketHandler(schema, self)
+
+    @property
+    def graphql_schema(self) -> GraphQLSchema:
+        return self.schema.graphql_schema
 
     async def subscribe(
             self,
@@ -62,18 +90,71 @@ class GrapheneController(GraphQLControllerBase):
             context_value=request
         )
 
-    async def query(
+    def execute_query_sync(
+            self,
+            request: HttpRequest,
+            cached_document: CachedDocument,
+            variables: Optional[Dict[str, Any]],
+            operation_name: Optional[str]
+    ) -> AwaitableOrValue[ExecutionResult]:
+        # The same as the execution by Graphene, but with the document parsed
+        # by the controller.
+        return execute_document(
+            self.schema.graphql_schema,
+            cached_document,
+            variables,
+            operation_name,
+            request,
+            self.middleware,
+            self.metrics.timer(
+                'http',
+                operation_name,
+                get_trace(request)
+            )
+        )
+
+    async def _execute_query(
             self,
             request: HttpRequest,
             query: str,
             variables: Optional[Dict[str, Any]],
             operation_name: Optional[str]
     ) -> ExecutionResult:
-        return await self.schema.execute_async(
-            source=query,
-            variable_values=variables,
-            operation_name=operation_name,
-            context_value=request
+        # Graphene parses and validates as part of the execution.
+        start = time.perf_counter()
+        try:
+            return await self.schema.execute_async(
+                source=query,
+                variable_values=variables,
+                operation_name=operation_name,
+                context_value=request,
+                middleware=self.middleware
+            )
+        finally:
+            self.metrics.timer('http', operation_name).observe(
+                'execute',
+                time.perf_counter() - start
+            )
+
+    async def query_incremental(
+            self,
+            request: HttpRequest,
+            query: str,
+            variables: Optional[Dict[str, Any]],
+            operation_name: Optional[str]
+    ) -> Any:
+        return await execute_document_incrementally(
+            self.schema.graphql_schema,
+            self.document_cache.get(query),
+            variables,
+            operation_name,
+            request,
+            self.middleware,
+            self.metrics.timer(
+                'http',
+                operation_name,
+                get_trace(request)
+            )
         )
 
     async def handle_websocket_subscription(self, request: WebSocketRequest) -> None:
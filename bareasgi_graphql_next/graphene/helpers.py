@@ -11,6 +11,9 @@ from bareasgi import (
 )
 from graphene import Schema
 
+from ..options import GraphQLOptions
+from ..warmup import WarmUp
+
 from .controller import GrapheneController
 
 LOGGER = logging.getLogger(__name__)
@@ -27,7 +30,9 @@ def add_graphene(
         graphql_middleware=None,
         ping_interval: float = 10,
         loads: Callable[[str], Any] = json.loads,
-        dumps: Callable[[Any], str] = json.dumps
+        dumps: Callable[[Any], str] = json.dumps,
+        options: Optional[GraphQLOptions] = None,
+        warm_up: Optional[WarmUp] = None
 ) -> None:
     """Add graphql support to an bareASGI application.
 
@@ -48,8 +53,22 @@ def add_graphene(
             JSON string to an object. Defaults to json.loads.
         dumps (Callable[[Any], str], optional): The function to convert an
             object to a JSON string. Defaults to json.dumps.
+        options (Optional[GraphQLOptions], optional): The optional features
+            of the controller. Defaults to None.
+        warm_up (Optional[WarmUp], optional): If given, hot operations are
+            parsed and validated, and the GraphiQL page and introspection
+            result are built, before the first request. Defaults to None.
     """
 
+    options = options or GraphQLOptions()
+    if warm_up is not None and warm_up.prefork:
+        warm_up.prepare(
+            schema.graphql_schema,
+            options.cost_analyser,
+            path_prefix,
+            options.graphiql_assets_path
+        )
+
     async def start_graphql(request: LifespanRequest) -> None:
         """Start the GraphQL controller"""
 
@@ -61,8 +80,11 @@ def add_graphene(
             graphql_middleware,
             ping_interval,
             loads,
-            dumps
+            dumps,
+            options
         )
+        if warm_up is not None:
+            warm_up.apply(controller)
         controller.add_routes(
             app,
             path_prefix,
@@ -5,19 +5,28 @@ from typing import Any, Callable
 from bareasgi import WebSocketRequest
 from graphene import Schema
 
+from ..controller import GraphQLControllerBase
+
 from .websocket_instance import GrapheneWebSocketHandlerInstance
 
 
 class GrapheneWebSocketHandler:
     """Graphene WebSocket handler"""
 
-    def __init__(self, schema: Schema):
+    def __init__(
+            self,
+            schema: Schema,
+            controller: GraphQLControllerBase
+    ) -> None:
         """Graphene WebSocket handler
 
         Args:
             schema (Schema): The schema
+            controller (GraphQLControllerBase): The controller which checks
+                operations before they are executed.
         """
         self.schema = schema
+        self.controller = controller
 
     async def __call__(
             self,
@@ -27,6 +36,7 @@ class GrapheneWebSocketHandler:
         instance = GrapheneWebSocketHandlerInstance(
             self.schema,
             request,
-            dumps
+            dumps,
+            self.controller
         )
         await instance.start(request.scope['subprotocols'])
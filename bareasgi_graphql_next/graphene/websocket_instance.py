@@ -1,26 +1,30 @@
 """Graphene WebSocket instance"""
 
+import time
 from typing import Any, Callable, Dict, Optional
 
 from bareasgi import WebSocketRequest
 from graphene import Schema
 from graphql import ExecutionResult, MapAsyncIterator
 
+from ..controller import GraphQLControllerBase
 from ..websocket_instance import GraphQLWebSocketHandlerInstanceBase
 
 
 class GrapheneWebSocketHandlerInstance(GraphQLWebSocketHandlerInstanceBase):
     """A GraphQL WebSocket handler instance"""
 
+    __slots__ = ('schema',)
+
     def __init__(
             self,
             schema: Schema,
             request: WebSocketRequest,
-            dumps: Callable[[Any], str]
+            dumps: Callable[[Any], str],
+            controller: GraphQLControllerBase
     ) -> None:
-        super().__init__(request.web_socket, dumps)
+        super().__init__(request, dumps, controller)
         self.schema = schema
-        self.request = request
 
     async def subscribe(
             self,
@@ -37,13 +41,23 @@ class GrapheneWebSocketHandlerInstance(GraphQLWebSocketHandlerInstanceBase):
 
     async def query(
             self,
+            request: WebSocketRequest,
             query: str,
             variables: Optional[Dict[str, Any]],
             operation_name: Optional[str]
     ) -> ExecutionResult:
-        return await self.schema.execute_async(
-            source=query,
-            variable_values=variables,
-            operation_name=operation_name,
-            context_value=self.request
-        )
+        # Graphene parses and validates as part of the execution.
+        start = time.perf_counter()
+        try:
+            return await self.schema.execute_async(
+                source=query,
+                variable_values=variables,
+                operation_name=operation_name,
+                context_value=request,
+                middleware=self.controller.middleware
+            )
+        finally:
+            self.controller.metrics.timer('websocket', operation_name).observe(
+                'execute',
+                time.perf_counter() - start
+            )
@@ -0,0 +1,184 @@
+"""Serving the GraphiQL scripts and styles locally
+
+usage: python -m bareasgi_graphql_next.graphiql_assets DIRECTORY
+
+The command downloads the assets from the CDN into the directory, so they can
+be shipped with an application which cannot reach the CDN.
+"""
+
+import argparse
+from functools import lru_cache
+import hashlib
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+from bareasgi import HttpRequest, HttpResponse
+from bareutils import bytes_writer, response_code
+
+from .template import (
+    CDN_URL,
+    GRAPHIQL_ASSETS,
+    GRAPHIQL_VERSION,
+    SUBSCRIPTIONS_TRANSPORT_VERSION
+)
+from .utils import etag_matches
+
+# The URLs of the assets change with their content, so they may be cached for
+# a year, the longest time HTTP/1.1 allows.
+IMMUTABLE_CACHE_CONTROL = b'public, max-age=31536000, immutable'
+
+CONTENT_TYPES = {
+    '.css': b'text/css; charset=utf-8',
+    '.js': b'application/javascript; charset=utf-8'
+}
+
+
+class Asset(NamedTuple):
+    """A file served to GraphiQL"""
+    body: bytes
+    etag: bytes
+    content_type: bytes
+
+
+class GraphiQLAssets:
+    """The GraphiQL scripts and styles, served from memory"""
+
+    def __init__(self, directory: str) -> None:
+        """The GraphiQL scripts and styles, served from memory.
+
+        Args:
+            directory (str): The directory holding the assets.
+
+        Raises:
+            FileNotFoundError: If an asset is missing.
+        """
+        self.directory = directory
+        self.assets: Dict[str, Asset] = {}
+        self.digests: Dict[str, str] = {}
+        missing: List[str] = []
+        for _, filename, _ in GRAPHIQL_ASSETS:
+            path = os.path.join(directory, filename)
+            if not os.path.isfile(path):
+                missing.append(filename)
+                continue
+            with open(path, 'rb') as file:
+                body = file.read()
+            digest = hashlib.sha256(body).hexdigest()[:16]
+            self.digests[filename] = digest
+            self.assets[filename] = Asset(
+                body,
+                f'"{digest}"'.encode('ascii'),
+                CONTENT_TYPES[os.path.splitext(filename)[1]]
+            )
+        if missing:
+            raise FileNotFoundError(
+                f'Missing GraphiQL assets in "{directory}": '
+                f'{", ".join(missing)}. Download them with '
+                f'"python -m bareasgi_graphql_next.graphiql_assets {directory}".'
+            )
+
+    def urls(self, base: str) -> Dict[str, str]:
+        """Make the URLs of the assets, which change with their content.
+
+        Args:
+            base (str): The path of the asset route.
+
+        Returns:
+            Dict[str, str]: The URLs keyed by template variable.
+        """
+        return {
+            variable: f'{base}{filename}?v={self.digests[filename]}'
+            for variable, filename, _ in GRAPHIQL_ASSETS
+        }
+
+    async def handle_request(self, request: HttpRequest) -> HttpResponse:
+        """Serve an asset.
+
+        Args:
+            request (HttpRequest): The request.
+
+        Returns:
+            HttpResponse: The response.
+        """
+        asset = self.assets.get(request.matches.get('name', ''))
+        if asset is None:
+            return HttpResponse(response_code.NOT_FOUND)
+
+        headers = [
+            (b'etag', asset.etag),
+            (b'cache-control', IMMUTABLE_CACHE_CONTROL)
+        ]
+        if etag_matches(request, asset.etag):
+            return HttpResponse(response_code.NOT_MODIFIED, headers)
+
+        headers += [
+            (b'content-type', asset.content_type),
+            (b'content-length', str(len(asset.body)).encode('ascii'))
+        ]
+        return HttpResponse(response_code.OK, headers, bytes_writer(asset.body))
+
+
+@lru_cache(maxsize=None)
+def load_graphiql_assets(directory: str) -> GraphiQLAssets:
+    """Load the assets in a directory once.
+
+    Args:
+        directory (str): The directory.
+
+    Returns:
+        GraphiQLAssets: The assets.
+    """
+    return GraphiQLAssets(directory)
+
+
+def download(directory: str) -> List[str]:
+    """Download the assets from the CDN.
+
+    Args:
+        directory (str): The directory to write the assets to.
+
+    Returns:
+        List[str]: The paths of the files written.
+    """
+    # pylint: disable=import-outside-toplevel
+    from urllib.request import urlopen
+
+    os.makedirs(directory, exist_ok=True)
+    paths: List[str] = []
+    for _, filename, cdn_path in GRAPHIQL_ASSETS:
+        url = CDN_URL + cdn_path.format(
+            graphiql=GRAPHIQL_VERSION,
+            subscriptions_transport=SUBSCRIPTIONS_TRANSPORT_VERSION
+        )
+        with urlopen(url) as response:  # nosec - the URL is a constant
+            body = response.read()
+        path = os.path.join(directory, filename)
+        with open(path, 'wb') as file:
+            file.write(body)
+        paths.append(path)
+    return paths
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Download the GraphiQL assets.
+
+    Args:
+        argv (Optional[List[str]], optional): The arguments. Defaults to
+            None.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(
+        description='Download the GraphiQL assets to serve them locally'
+    )
+    parser.add_argument('directory', help='The directory for the assets')
+    args = parser.parse_args(argv)
+
+    for path in download(args.directory):
+        print(path)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,9 +1,23 @@
 """bareASGI graphql support"""
 
-from .controller import GraphQLController
-from .helpers import add_graphql_next
+from typing import TYPE_CHECKING
+
+from ..lazy import lazy_attributes
+
+if TYPE_CHECKING:
+    from .controller import GraphQLController
+    from .helpers import add_graphql_next
 
 __all__ = [
     'GraphQLController',
     'add_graphql_next'
 ]
+
+__getattr__, __dir__ = lazy_attributes(
+    __name__,
+    globals(),
+    {
+        'GraphQLController': '.controller',
+        'add_graphql_next': '.helpers'
+    }
+)
@@ -22,8 +22,17 @@ from graphql import (
     MapAsyncIterator,
     MiddlewareManager
 )
+from graphql.pyutils import AwaitableOrValue
 
 from ..controller import GraphQLControllerBase
+from ..document_cache import (
+    CachedDocument,
+    execute_cached,
+    execute_document,
+    execute_document_incrementally
+)
+from ..options import GraphQLOptions
+from ..tracing import get_trace
 
 from .websocket_handler import GraphQLWebSocketHandler
 
@@ -38,7 +47,8 @@ class GraphQLController(GraphQLControllerBase):
             middleware: Optional[Union[Tuple, List, MiddlewareManager]],
             ping_interval: float,
             loads: Callable[[str], Any],
-            dumps: Callable[[Any], str]
+            dumps: Callable[[Any], str],
+            options: Optional[GraphQLOptions] = None
     ) -> None:
         """Create a GraphQL controller
 
@@ -52,10 +62,23 @@ class GraphQLController(GraphQLControllerBase):
                 to an object.
             dumps (Callable[[Any], str]): The function to convert an object to a
                 JSON string.
+            options (Optional[GraphQLOptions], optional): The optional
+                features of the controller. Defaults to None.
         """
-        super().__init__(path_prefix, middleware, ping_interval, loads, dumps)
+        super().__init__(
+            path_prefix,
+            middleware,
+            ping_interval,
+            loads,
+            dumps,
+            options
+        )
         self.schema = schema
-        self.ws_subscription_handler = GraphQLWebSocketHandler(schema)
+        self.ws_subscription_handler = GraphQLWebSocketHandler(schema, self)
+
+    @property
+    def graphql_schema(self) -> GraphQLSchema:
+        return self.schema
 
     async def subscribe(
             self,
@@ -66,27 +89,75 @@ class GraphQLController(GraphQLControllerBase):
     ) -> MapAsyncIterator:
         result = await graphql.subscribe(
             schema=self.schema,
-            document=graphql.parse(query),
+            document=self.document_cache.get(query).document,
             variable_values=variables,
             operation_name=operation_name,
             context_value=request
         )
         return cast(MapAsyncIterator, result)
 
-    async def query(
+    def execute_query_sync(
+            self,
+            request: HttpRequest,
+            cached_document: CachedDocument,
+            variables: Optional[Dict[str, Any]],
+            operation_name: Optional[str]
+    ) -> AwaitableOrValue[ExecutionResult]:
+        return execute_document(
+            self.schema,
+            cached_document,
+            variables,
+            operation_name,
+            request,
+            self.middleware,
+            self.metrics.timer(
+                'http',
+                operation_name,
+                get_trace(request)
+            )
+        )
+
+    async def _execute_query(
             self,
             request: HttpRequest,
             query: str,
             variables: Optional[Dict[str, Any]],
             operation_name: Optional[str]
     ) -> ExecutionResult:
-        return await graphql.graphql(
-            schema=self.schema,
-            source=graphql.Source(query),  # source=query,
-            variable_values=variables,
-            operation_name=operation_name,
-            context_value=request,
-            middleware=self.middleware
+        return await execute_cached(
+            self.schema,
+            self.document_cache,
+            query,
+            variables,
+            operation_name,
+            request,
+            self.middleware,
+            self.metrics.timer(
+                'http',
+                operation_name,
+                get_trace(request)
+            )
+        )
+
+    async def query_incremental(
+            self,
+            request: HttpRequest,
+            query: str,
+            variables: Optional[Dict[str, Any]],
+            operation_name: Optional[str]
+    ) -> Any:
+        return await execute_document_incrementally(
+            self.schema,
+            self.document_cache.get(query),
+            variables,
+            operation_name,
+            request,
+            self.middleware,
+            self.metrics.timer(
+                'http',
+                operation_name,
+                get_trace(request)
+            )
         )
 
     async def handle_websocket_subscription(self, request: WebSocketRequest) -> None:
@@ -7,6 +7,9 @@ from typing import Any, Callable, Optional
 from bareasgi import Application, LifespanRequest, HttpMiddlewareCallback
 from graphql import GraphQLSchema
 
+from ..options import GraphQLOptions
+from ..warmup import WarmUp
+
 from .controller import GraphQLController
 
 logger = logging.getLogger(__name__)
@@ -23,7 +26,9 @@ def add_graphql_next(
         graphql_middleware=None,
         ping_interval: float = 10,
         loads: Callable[[str], Any] = json.loads,
-        dumps: Callable[[Any], str] = json.dumps
+        dumps: Callable[[Any], str] = json.dumps,
+        options: Optional[GraphQLOptions] = None,
+        warm_up: Optional[WarmUp] = None
 ) -> None:
     """Add graphql support to an bareASGI application.
 
@@ -44,8 +49,22 @@ def add_graphql_next(
             JSON string to an object. Defaults to json.loads.
         dumps (Callable[[Any], str], optional): The function to convert an
             object to a JSON string. Defaults to json.dumps.
+        options (Optional[GraphQLOptions], optional): The optional features
+            of the controller. Defaults to None.
+        warm_up (Optional[WarmUp], optional): If given, hot operations are
+            parsed and validated, and the GraphiQL page and introspection
+            result are built, before the first request. Defaults to None.
     """
 
+    options = options or GraphQLOptions()
+    if warm_up is not None and warm_up.prefork:
+        warm_up.prepare(
+            schema,
+            options.cost_analyser,
+            path_prefix,
+            options.graphiql_assets_path
+        )
+
     async def start_graphql(request: LifespanRequest) -> None:
         """Start the GraphQL controller"""
 
@@ -57,8 +76,11 @@ def add_graphql_next(
             graphql_middleware,
             ping_interval,
             loads,
-            dumps
+            dumps,
+            options
         )
+        if warm_up is not None:
+            warm_up.apply(controller)
         controller.add_routes(
             app,
             path_prefix,
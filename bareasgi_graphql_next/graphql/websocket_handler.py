@@ -4,19 +4,28 @@ from typing import Any, Callable
 from bareasgi import WebSocketRequest
 import graphql
 
+from ..controller import GraphQLControllerBase
+
 from .websocket_instance import GraphQLWebSocketHandlerInstance
 
 
 class GraphQLWebSocketHandler:
     """GraphQL WebSocket handler"""
 
-    def __init__(self, schema: graphql.GraphQLSchema):
+    def __init__(
+            self,
+            schema: graphql.GraphQLSchema,
+            controller: GraphQLControllerBase
+    ) -> None:
         """GraphQL WebSocket handler
 
         Args:
             schema (graphql.GraphQLSchema): The schema
+            controller (GraphQLControllerBase): The controller which checks
+                operations before they are executed.
         """
         self.schema = schema
+        self.controller = controller
 
     async def __call__(
             self,
@@ -26,6 +35,7 @@ class GraphQLWebSocketHandler:
         instance = GraphQLWebSocketHandlerInstance(
             self.schema,
             request,
-            dumps
+            dumps,
+            self.controller
         )
         await instance.start(request.scope['subprotocols'])
@@ -12,21 +12,26 @@ from bareasgi import WebSocketRequest
 import graphql
 from graphql import ExecutionResult, GraphQLSchema, MapAsyncIterator
 
+from ..controller import GraphQLControllerBase
+from ..document_cache import execute_cached
+from ..tracing import get_trace
 from ..websocket_instance import GraphQLWebSocketHandlerInstanceBase
 
 
 class GraphQLWebSocketHandlerInstance(GraphQLWebSocketHandlerInstanceBase):
     """A GraphQL WebSocket handler instance"""
 
+    __slots__ = ('schema',)
+
     def __init__(
             self,
             schema: GraphQLSchema,
             request: WebSocketRequest,
-            dumps: Callable[[Any], str]
+            dumps: Callable[[Any], str],
+            controller: GraphQLControllerBase
     ) -> None:
-        super().__init__(request.web_socket, dumps)
+        super().__init__(request, dumps, controller)
         self.schema = schema
-        self.request = request
 
     async def subscribe(
             self,
@@ -36,7 +41,7 @@ class GraphQLWebSocketHandlerInstance(GraphQLWebSocketHandlerInstanceBase):
     ) -> MapAsyncIterator:
         result = await graphql.subscribe(
             schema=self.schema,
-            document=graphql.parse(query),
+            document=self.controller.document_cache.get(query).document,
             variable_values=variables,
             operation_name=operation_name,
             context_value=self.request
@@ -45,14 +50,22 @@ class GraphQLWebSocketHandlerInstance(GraphQLWebSocketHandlerInstanceBase):
 
     async def query(
             self,
+            request: WebSocketRequest,
             query: str,
             variables: Optional[Dict[str, Any]],
             operation_name: Optional[str]
     ) -> ExecutionResult:
-        return await graphql.graphql(
-            schema=self.schema,
-            source=graphql.Source(query),
-            variable_values=variables,
-            operation_name=operation_name,
-            context_value=self.request
+        return await execute_cached(
+            self.schema,
+            self.controller.document_cache,
+            query,
+            variables,
+            operation_name,
+            request,
+            self.controller.middleware,
+            self.controller.metrics.timer(
+                'websocket',
+                operation_name,
+                get_trace(request)
+            )
         )
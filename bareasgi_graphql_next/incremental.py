@@ -0,0 +1,213 @@
+"""Queries using the @defer and @stream directives
+
+The initial result is sent as soon as it is ready, followed by the deferred
+and streamed fields as they are resolved, as multipart/mixed parts or server
+sent events.
+"""
+
+import asyncio
+from functools import partial
+import logging
+import time
+from typing import (
+    Any,
+    AsyncIterable,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    cast,
+    TYPE_CHECKING
+)
+
+from bareasgi import HttpRequest, HttpResponse
+from bareutils import response_code
+from graphql import ExecutionResult, GraphQLError
+
+from .deadline import DeadlineExceededError, run_with_deadline
+from .metrics import timed_body
+from .streaming import (
+    encode_multipart_end,
+    encode_multipart_payload,
+    encode_sse_end,
+    encode_sse_payload
+)
+from .tracing import add_trace, get_trace
+
+if TYPE_CHECKING:
+    from .controller import GraphQLControllerBase
+
+LOGGER = logging.getLogger(__name__)
+
+INCREMENTAL_BOUNDARY = b'-'
+INCREMENTAL_CONTENT_TYPE = (
+    b'multipart/mixed; boundary="' + INCREMENTAL_BOUNDARY + b'"; deferSpec=20220824'
+)
+
+
+async def handle_incremental_query(
+        controller: "GraphQLControllerBase",
+        request: HttpRequest,
+        query: str,
+        variables: Optional[Dict[str, Any]],
+        operation_name: Optional[str],
+        is_sse: bool
+) -> HttpResponse:
+    """Execute a query with deferred or streamed fields.
+
+    The deferred and streamed fields share the deadline of the initial
+    result. If nothing was deferred or streamed the result is sent as JSON.
+
+    Args:
+        controller (GraphQLControllerBase): The controller.
+        request (HttpRequest): The request.
+        query (str): The query.
+        variables (Optional[Dict[str, Any]]): Optional variables.
+        operation_name (Optional[str]): An optional operation name.
+        is_sse (bool): If True the payloads are sent as server sent events,
+            otherwise as multipart/mixed parts.
+
+    Returns:
+        HttpResponse: The response.
+    """
+    LOGGER.debug("Processing an incremental query.")
+
+    start = time.perf_counter()
+    timeout = controller.get_operation_timeout(request)
+    timer = controller.metrics.timer('http', operation_name)
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+
+    result = await controller.execute_with_deadline(
+        'http',
+        timeout,
+        controller.profile_if_requested(
+            request,
+            controller.query_incremental(request, query, variables, operation_name),
+            operation_name
+        )
+    )
+
+    if isinstance(result, ExecutionResult):
+        # Nothing was deferred or streamed.
+        add_trace(result, request.context)
+        buf = controller.encode_query_result(result, timer)
+        controller.record_operation(
+            query,
+            variables,
+            operation_name,
+            result,
+            time.perf_counter() - start,
+            len(buf)
+        )
+        headers = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(buf)).encode())
+        ]
+        return HttpResponse(response_code.OK, headers, timed_body(buf, timer))
+
+    if is_sse:
+        encode_payload: Callable[[Mapping[str, Any]], bytes] = partial(
+            encode_sse_payload,
+            controller.dumps
+        )
+        end = encode_sse_end()
+        content_type = b'text/event-stream'
+    else:
+        encode_payload = partial(
+            encode_multipart_payload,
+            controller.dumps,
+            INCREMENTAL_BOUNDARY
+        )
+        end = encode_multipart_end(INCREMENTAL_BOUNDARY)
+        content_type = INCREMENTAL_CONTENT_TYPE
+
+    trace = get_trace(request)
+    response_bytes = 0
+    errors: List[GraphQLError] = []
+
+    def encode(payload: Mapping[str, Any]) -> bytes:
+        nonlocal response_bytes
+        if trace is not None and not payload.get('hasNext', True):
+            # The trace is complete when the last payload is sent.
+            payload = {
+                **payload,
+                'extensions': {
+                    **payload.get('extensions', {}),
+                    'tracing': trace.to_dict()
+                }
+            }
+        encode_start = time.perf_counter()
+        buf = encode_payload(payload)
+        timer.observe('serialise', time.perf_counter() - encode_start)
+        response_bytes += len(buf)
+        return buf
+
+    async def send_payloads() -> AsyncIterable[bytes]:
+        subsequent_results = result.subsequent_results
+        try:
+            # The initial payload goes out before the deferred fields have
+            # been resolved.
+            errors.extend(result.initial_result.errors or [])
+            yield encode(result.initial_result.formatted)
+
+            while True:
+                remaining = (
+                    None
+                    if deadline is None
+                    else max(deadline - loop.time(), 0)
+                )
+                try:
+                    subsequent_result = await run_with_deadline(
+                        subsequent_results.__anext__(),
+                        remaining
+                    )
+                except StopAsyncIteration:
+                    break
+                errors.extend(
+                    error
+                    for incremental in subsequent_result.incremental or []
+                    for error in incremental.errors or []
+                )
+                yield encode(subsequent_result.formatted)
+
+        except asyncio.TimeoutError:
+            LOGGER.debug("Incremental query timed out.")
+            controller.metrics.operations_timed_out.inc(('http',))
+            error = DeadlineExceededError(cast(float, timeout))
+            errors.append(error)
+            yield encode({'errors': [error.formatted], 'hasNext': False})
+        except asyncio.CancelledError:
+            LOGGER.debug("Incremental query cancelled.")
+            controller.metrics.operations_cancelled.inc(('http',))
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.exception("Incremental query failed.")
+            # The headers have been sent, so report the error as a final
+            # payload.
+            if not isinstance(error, GraphQLError):
+                error = GraphQLError(
+                    'Execution error',
+                    original_error=error
+                )
+            errors.append(error)
+            yield encode({'errors': [error.formatted], 'hasNext': False})
+        finally:
+            await subsequent_results.aclose()
+            controller.record_operation(
+                query,
+                variables,
+                operation_name,
+                ExecutionResult(data=None, errors=errors or None),
+                time.perf_counter() - start,
+                response_bytes
+            )
+
+        yield end
+
+    headers = [
+        (b'cache-control', b'no-cache'),
+        (b'content-type', content_type)
+    ]
+
+    return HttpResponse(response_code.OK, headers, send_payloads())
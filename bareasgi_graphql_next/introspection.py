@@ -0,0 +1,297 @@
+"""Cached introspection responses and the schema SDL
+
+Tools such as GraphiQL and code generators send the same introspection query
+again and again. As the result depends only on the schema, it is executed
+once and the encoded response is kept, with an entity tag so a client may
+revalidate it.
+"""
+
+from collections import OrderedDict
+import hashlib
+from inspect import isawaitable
+import logging
+from typing import (
+    Any,
+    Callable,
+    NamedTuple,
+    Optional,
+    Tuple
+)
+
+from bareasgi import HttpRequest, HttpResponse
+from bareutils import bytes_writer, response_code
+import graphql
+from graphql import (
+    DocumentNode,
+    FieldNode,
+    GraphQLSchema,
+    OperationDefinitionNode,
+    OperationType,
+    get_introspection_query,
+    print_schema
+)
+
+from .document_cache import CachedDocument
+from .utils import etag_matches
+
+LOGGER = logging.getLogger(__name__)
+
+INTROSPECTION_FIELDS = frozenset(('__schema', '__type', '__typename'))
+
+# The query executed by `graphql.introspection_from_schema`.
+STANDARD_INTROSPECTION_QUERY = get_introspection_query(
+    descriptions=True,
+    specified_by_url=True,
+    directive_is_repeatable=True,
+    schema_description=True,
+    input_value_deprecation=True
+)
+
+
+class CachedResponse(NamedTuple):
+    """An encoded response with its entity tag"""
+    body: bytes
+    etag: bytes
+
+
+def _with_etag(body: bytes) -> CachedResponse:
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    return CachedResponse(body, f'"{etag}"'.encode('ascii'))
+
+
+def is_introspection_operation(
+        document: DocumentNode,
+        operation_name: Optional[str]
+) -> bool:
+    """Check if an operation only selects introspection fields.
+
+    The result of such an operation depends only on the schema, provided it
+    has no variables.
+
+    Args:
+        document (DocumentNode): The document.
+        operation_name (Optional[str]): The name of the operation.
+
+    Returns:
+        bool: True if the operation is a query without variables, selecting
+            only `__schema`, `__type` and `__typename` at the root.
+    """
+    operations = [
+        definition
+        for definition in document.definitions
+        if isinstance(definition, OperationDefinitionNode)
+    ]
+    if operation_name is not None:
+        operations = [
+            operation
+            for operation in operations
+            if operation.name is not None and operation.name.value == operation_name
+        ]
+    if len(operations) != 1:
+        return False
+    operation = operations[0]
+    return (
+        operation.operation == OperationType.QUERY and
+        not operation.variable_definitions and
+        all(
+            isinstance(selection, FieldNode) and
+            selection.name.value in INTROSPECTION_FIELDS
+            for selection in operation.selection_set.selections
+        )
+    )
+
+
+class IntrospectionCache:
+    """A cache of encoded introspection responses and the schema SDL"""
+
+    def __init__(
+            self,
+            dumps: Callable[[Any], str],
+            max_size: int = 16
+    ) -> None:
+        """A cache of encoded introspection responses and the schema SDL.
+
+        A cache is used with a single schema. The responses are keyed by the
+        query and the operation name, so the number kept is limited.
+
+        Args:
+            dumps (Callable[[Any], str]): The function to convert an object to
+                a JSON string.
+            max_size (int, optional): The maximum number of responses to
+                hold. Defaults to 16.
+        """
+        self.dumps = dumps
+        self.max_size = max_size
+        self._responses: "OrderedDict[Tuple[str, Optional[str]], CachedResponse]" = OrderedDict()
+        self._sdl: Optional[CachedResponse] = None
+
+    def get(
+            self,
+            schema: GraphQLSchema,
+            cached_document: CachedDocument,
+            query: str,
+            operation_name: Optional[str]
+    ) -> Optional[CachedResponse]:
+        """Get the response to an introspection operation, executing it the
+        first time it is seen.
+
+        Args:
+            schema (GraphQLSchema): The schema.
+            cached_document (CachedDocument): The parsed query.
+            query (str): The query.
+            operation_name (Optional[str]): The name of the operation.
+
+        Returns:
+            Optional[CachedResponse]: The response, or None if the operation
+                is not an introspection operation, or fails.
+        """
+        key = (query, operation_name)
+        response = self._responses.get(key)
+        if response is not None:
+            self._responses.move_to_end(key)
+            return response
+
+        if (
+                not is_introspection_operation(
+                    cached_document.document,
+                    operation_name
+                ) or
+                cached_document.validate(schema)
+        ):
+            return None
+
+        result = graphql.execute(
+            schema,
+            cached_document.document,
+            operation_name=operation_name
+        )
+        if isawaitable(result):
+            # Introspection is synchronous, unless a resolver of the schema
+            # has been replaced.
+            result.close()  # type: ignore
+            return None
+        if result.errors:
+            return None
+
+        return self.seed(query, operation_name, result.data)
+
+    def seed(
+            self,
+            query: str,
+            operation_name: Optional[str],
+            data: Any
+    ) -> CachedResponse:
+        """Add the result of an introspection operation which has already
+        been executed.
+
+        Args:
+            query (str): The query.
+            operation_name (Optional[str]): The name of the operation.
+            data (Any): The data of the result.
+
+        Returns:
+            CachedResponse: The response.
+        """
+        key = (query, operation_name)
+        response = _with_etag(
+            self.dumps({'data': data}).encode('utf-8')
+        )
+        self._responses[key] = response
+        if len(self._responses) > self.max_size:
+            self._responses.popitem(last=False)
+        return response
+
+    def sdl(self, schema: GraphQLSchema) -> CachedResponse:
+        """Get the schema in the schema definition language.
+
+        Args:
+            schema (GraphQLSchema): The schema.
+
+        Returns:
+            CachedResponse: The schema definition.
+        """
+        if self._sdl is None:
+            self._sdl = _with_etag(
+                print_schema(schema).encode('utf-8')
+            )
+        return self._sdl
+
+    def get_response(
+            self,
+            request: HttpRequest,
+            schema: GraphQLSchema,
+            cached_document: CachedDocument,
+            query: str,
+            operation_name: Optional[str]
+    ) -> Optional[HttpResponse]:
+        """Get the HTTP response to an introspection operation.
+
+        Args:
+            request (HttpRequest): The request.
+            schema (GraphQLSchema): The schema.
+            cached_document (CachedDocument): The parsed query.
+            query (str): The query.
+            operation_name (Optional[str]): The name of the operation.
+
+        Returns:
+            Optional[HttpResponse]: The response, or None if the operation
+                must be executed.
+        """
+        response = self.get(schema, cached_document, query, operation_name)
+        if response is None:
+            return None
+
+        LOGGER.debug("Sending the cached introspection response.")
+        return make_cached_response(request, response, b'application/json')
+
+    def get_sdl_response(
+            self,
+            request: HttpRequest,
+            schema: GraphQLSchema
+    ) -> HttpResponse:
+        """Get the HTTP response serving the schema definition.
+
+        Args:
+            request (HttpRequest): The request.
+            schema (GraphQLSchema): The schema.
+
+        Returns:
+            HttpResponse: The response.
+        """
+        return make_cached_response(
+            request,
+            self.sdl(schema),
+            b'text/plain; charset=utf-8'
+        )
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+
+def make_cached_response(
+        request: HttpRequest,
+        response: CachedResponse,
+        content_type: bytes
+) -> HttpResponse:
+    """Make a response which the client revalidates with its entity tag.
+
+    Args:
+        request (HttpRequest): The request.
+        response (CachedResponse): The encoded response.
+        content_type (bytes): The content type.
+
+    Returns:
+        HttpResponse: The HTTP response, with no body if the client has it.
+    """
+    headers = [
+        (b'etag', response.etag),
+        (b'cache-control', b'no-cache')
+    ]
+    if etag_matches(request, response.etag):
+        return HttpResponse(response_code.NOT_MODIFIED, headers)
+
+    headers += [
+        (b'content-type', content_type),
+        (b'content-length', str(len(response.body)).encode('ascii'))
+    ]
+    return HttpResponse(response_code.OK, headers, bytes_writer(response.body))
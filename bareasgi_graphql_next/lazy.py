@@ -0,0 +1,39 @@
+"""Importing the names of a package on first use"""
+
+from importlib import import_module
+from typing import Any, Callable, Dict, List, Mapping, Tuple
+
+
+def lazy_attributes(
+        package: str,
+        namespace: Dict[str, Any],
+        modules: Mapping[str, str]
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """Make the module `__getattr__` and `__dir__` functions of a package
+    whose names are imported on first use.
+
+    Args:
+        package (str): The name of the package.
+        namespace (Dict[str, Any]): The globals of the package, which cache
+            the names once imported.
+        modules (Mapping[str, str]): The relative module names keyed by the
+            names they provide.
+
+    Returns:
+        Tuple[Callable[[str], Any], Callable[[], List[str]]]: The
+            `__getattr__` and `__dir__` functions.
+    """
+    def __getattr__(name: str) -> Any:
+        module_name = modules.get(name)
+        if module_name is None:
+            raise AttributeError(
+                f'module {package!r} has no attribute {name!r}'
+            )
+        value = getattr(import_module(module_name, package), name)
+        namespace[name] = value
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(namespace) | set(modules))
+
+    return __getattr__, __dir__
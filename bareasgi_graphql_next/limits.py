@@ -0,0 +1,350 @@
+"""Limits on the size and shape of the input from clients
+
+The limits are checked as early as possible, so a hostile request is
+rejected before it is costly: the content length before the body is read,
+the body size as it is read, the token count as the query is parsed, and the
+depth, aliases and directives of the parsed document before it is validated.
+"""
+
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Tuple
+)
+
+from bareutils import response_code
+from graphql import (
+    DocumentNode,
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    InlineFragmentNode,
+    OperationDefinitionNode,
+    SelectionSetNode,
+    Source,
+    TokenKind
+)
+from graphql.language import Lexer, Token
+from graphql.language.parser import Parser
+
+from .errors import OperationRejectedError
+
+INPUT_LIMIT_EXCEEDED = 'INPUT_LIMIT_EXCEEDED'
+
+# The parser is recursive, so the nesting of braces and brackets is limited
+# to keep it well within the recursion limit.
+MAX_NESTING = 100
+
+_OPENING = (TokenKind.BRACE_L, TokenKind.BRACKET_L)
+_CLOSING = (TokenKind.BRACE_R, TokenKind.BRACKET_R)
+
+
+class InputLimitError(OperationRejectedError):
+    """An error raised when a request exceeds an input limit"""
+
+    def __init__(
+            self,
+            message: str,
+            limit: str,
+            maximum: int,
+            status: int = response_code.BAD_REQUEST
+    ) -> None:
+        super().__init__(
+            message,
+            INPUT_LIMIT_EXCEEDED,
+            {'limit': limit, 'maximum': maximum},
+            status=status
+        )
+        self.limit = limit
+
+
+class _LimitedLexer(Lexer):
+
+    def __init__(self, source: Source, max_tokens: Optional[int]) -> None:
+        super().__init__(source)
+        self.max_tokens = max_tokens
+        self.token_count = 0
+        self.nesting = 0
+
+    def advance(self) -> Token:
+        token = super().advance()
+        if token.kind == TokenKind.EOF:
+            return token
+        self.token_count += 1
+        if self.max_tokens is not None and self.token_count > self.max_tokens:
+            raise InputLimitError(
+                f'The document has more than {self.max_tokens} tokens.',
+                'tokens',
+                self.max_tokens
+            )
+        if token.kind in _OPENING:
+            self.nesting += 1
+            if self.nesting > MAX_NESTING:
+                raise InputLimitError(
+                    f'The document is nested more than {MAX_NESTING} levels.',
+                    'nesting',
+                    MAX_NESTING
+                )
+        elif token.kind in _CLOSING:
+            self.nesting -= 1
+        return token
+
+
+class _LimitedParser(Parser):
+
+    def __init__(self, source: Source, max_tokens: Optional[int]) -> None:
+        super().__init__(source)
+        self._lexer = _LimitedLexer(source, max_tokens)
+
+
+# The depth, alias count and directive count of a selection set.
+_Shape = Tuple[int, int, int]
+
+
+class _DocumentShape:
+
+    __slots__ = ('fragments', 'shapes', 'visiting')
+
+    def __init__(self, document: DocumentNode) -> None:
+        self.fragments: Dict[str, FragmentDefinitionNode] = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        # The shapes of the fragments, which are counted once however many
+        # times they are spread.
+        self.shapes: Dict[str, _Shape] = {}
+        self.visiting: List[str] = []
+
+    def fragment(self, name: str) -> _Shape:
+        """The shape of a fragment"""
+        shape = self.shapes.get(name)
+        if shape is not None:
+            return shape
+        fragment = self.fragments.get(name)
+        if fragment is None or name in self.visiting:
+            # Unknown and cyclic fragments are reported by validation.
+            return 0, 0, 0
+        self.visiting.append(name)
+        depth, aliases, directives = self.selection_set(fragment.selection_set)
+        self.visiting.pop()
+        shape = (depth, aliases, directives + len(fragment.directives or ()))
+        self.shapes[name] = shape
+        return shape
+
+    def selection_set(self, selection_set: SelectionSetNode) -> _Shape:
+        """The shape of a selection set, following fragment spreads"""
+        depth, aliases, directives = 0, 0, 0
+        for selection in selection_set.selections:
+            directives += len(selection.directives or ())
+            if isinstance(selection, FieldNode):
+                child_depth, child_aliases, child_directives = (
+                    self.selection_set(selection.selection_set)
+                    if selection.selection_set is not None
+                    else (0, 0, 0)
+                )
+                depth = max(depth, child_depth + 1)
+                aliases += child_aliases + (1 if selection.alias else 0)
+                directives += child_directives
+            else:
+                if isinstance(selection, InlineFragmentNode):
+                    shape = self.selection_set(selection.selection_set)
+                elif isinstance(selection, FragmentSpreadNode):
+                    shape = self.fragment(selection.name.value)
+                else:
+                    continue
+                depth = max(depth, shape[0])
+                aliases += shape[1]
+                directives += shape[2]
+        return depth, aliases, directives
+
+
+class InputLimits:
+    """Limits on the size and shape of the input from clients"""
+
+    def __init__(
+            self,
+            *,
+            max_body_size: Optional[int] = 1024 * 1024,
+            max_upload_size: Optional[int] = None,
+            max_tokens: Optional[int] = 10000,
+            max_depth: Optional[int] = 20,
+            max_aliases: Optional[int] = 50,
+            max_directives: Optional[int] = 50
+    ) -> None:
+        """Limits on the size and shape of the input from clients.
+
+        Each limit may be None for no limit. The depth, aliases and
+        directives are counted through fragment spreads, so a fragment
+        spread many times counts many times.
+
+        Args:
+            max_body_size (Optional[int], optional): The maximum size in
+                bytes of a request body, other than a multipart request, and of
+                the fields of a multipart request. Defaults to 1024 * 1024.
+            max_upload_size (Optional[int], optional): The maximum size in
+                bytes of a multipart request, including the files. Defaults to
+                None.
+            max_tokens (Optional[int], optional): The maximum number of tokens
+                in a document. Defaults to 10000.
+            max_depth (Optional[int], optional): The maximum depth of the
+                selections of an operation. Defaults to 20.
+            max_aliases (Optional[int], optional): The maximum number of
+                aliases in a document. Defaults to 50.
+            max_directives (Optional[int], optional): The maximum number of
+                directives in a document. Defaults to 50.
+        """
+        self.max_body_size = max_body_size
+        self.max_upload_size = max_upload_size
+        self.max_tokens = max_tokens
+        self.max_depth = max_depth
+        self.max_aliases = max_aliases
+        self.max_directives = max_directives
+
+    @classmethod
+    def check_content_length(
+            cls,
+            content_length: Optional[bytes],
+            max_size: Optional[int]
+    ) -> None:
+        """Check the content length of a request before the body is read.
+
+        Args:
+            content_length (Optional[bytes]): The content length header, if
+                any.
+            max_size (Optional[int]): The maximum size, if any.
+
+        Raises:
+            InputLimitError: If the body is too large.
+        """
+        if max_size is None or content_length is None:
+            return
+        try:
+            size = int(content_length)
+        except ValueError:
+            return
+        if size > max_size:
+            raise _body_too_large(max_size)
+
+    async def read_body(self, body: AsyncIterable[bytes]) -> bytes:
+        """Read a request body, stopping once it is too large.
+
+        Args:
+            body (AsyncIterable[bytes]): The body.
+
+        Raises:
+            InputLimitError: If the body is too large.
+
+        Returns:
+            bytes: The body.
+        """
+        chunks: List[bytes] = []
+        async for chunk in self.limit_body(body, self.max_body_size):
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    @classmethod
+    async def limit_body(
+            cls,
+            body: AsyncIterable[bytes],
+            max_size: Optional[int]
+    ) -> AsyncIterator[bytes]:
+        """Stream a request body, stopping once it is too large.
+
+        Args:
+            body (AsyncIterable[bytes]): The body.
+            max_size (Optional[int]): The maximum size, if any.
+
+        Raises:
+            InputLimitError: If the body is too large.
+
+        Yields:
+            bytes: The body.
+        """
+        size = 0
+        async for chunk in body:
+            size += len(chunk)
+            if max_size is not None and size > max_size:
+                raise _body_too_large(max_size)
+            yield chunk
+
+    def parse(self, query: str) -> DocumentNode:
+        """Parse a query, checking the limits on its size and shape.
+
+        The nesting of the document is limited to MAX_NESTING, whatever the
+        limits, as the parser is recursive.
+
+        Args:
+            query (str): The query.
+
+        Raises:
+            GraphQLError: If the query cannot be parsed.
+            InputLimitError: If the query exceeds a limit.
+
+        Returns:
+            DocumentNode: The parsed document.
+        """
+        document = _LimitedParser(Source(query), self.max_tokens).parse_document()
+        self.check_document(document)
+        return document
+
+    def check_document(self, document: DocumentNode) -> None:
+        """Check the depth, aliases and directives of a document.
+
+        Args:
+            document (DocumentNode): The document.
+
+        Raises:
+            InputLimitError: If the document exceeds a limit.
+        """
+        if (
+                self.max_depth is None and
+                self.max_aliases is None and
+                self.max_directives is None
+        ):
+            return
+
+        shape = _DocumentShape(document)
+        aliases, directives = 0, 0
+        for definition in document.definitions:
+            if not isinstance(definition, OperationDefinitionNode):
+                continue
+            depth, operation_aliases, operation_directives = shape.selection_set(
+                definition.selection_set
+            )
+            aliases += operation_aliases
+            directives += operation_directives + len(definition.directives or ())
+            if self.max_depth is not None and depth > self.max_depth:
+                raise InputLimitError(
+                    f'The operation depth {depth} exceeds the maximum depth '
+                    f'{self.max_depth}.',
+                    'depth',
+                    self.max_depth
+                )
+
+        if self.max_aliases is not None and aliases > self.max_aliases:
+            raise InputLimitError(
+                f'The document has {aliases} aliases, more than the maximum '
+                f'of {self.max_aliases}.',
+                'aliases',
+                self.max_aliases
+            )
+        if self.max_directives is not None and directives > self.max_directives:
+            raise InputLimitError(
+                f'The document has {directives} directives, more than the '
+                f'maximum of {self.max_directives}.',
+                'directives',
+                self.max_directives
+            )
+
+
+def _body_too_large(max_size: int) -> InputLimitError:
+    return InputLimitError(
+        f'The request body is larger than {max_size} bytes.',
+        'bodySize',
+        max_size,
+        response_code.PAYLOAD_TOO_LARGE
+    )
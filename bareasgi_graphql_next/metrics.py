@@ -0,0 +1,508 @@
+"""Metrics"""
+
+from bisect import bisect_left
+import time
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Union
+)
+
+if TYPE_CHECKING:
+    from .tracing import Trace
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0
+)
+OTHER_OPERATIONS = '__other__'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(label_names: Sequence[str], label_values: Sequence[str]) -> str:
+    if not label_names:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"'
+        for name, value in zip(label_names, label_values)
+    ) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """A monotonically increasing counter with optional labels"""
+
+    __slots__ = ('name', 'documentation', 'label_names', 'values')
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            label_names: Sequence[str] = ()
+    ) -> None:
+        """A monotonically increasing counter with optional labels.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): A description of the metric.
+            label_names (Sequence[str], optional): The label names. Defaults
+                to ().
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, label_values: LabelValues = (), amount: float = 1) -> None:
+        """Increment the counter.
+
+        Args:
+            label_values (LabelValues, optional): The label values in the
+                order of the label names. Defaults to ().
+            amount (float, optional): The amount. Defaults to 1.
+        """
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get(self, label_values: LabelValues = ()) -> float:
+        """Get the value of the counter.
+
+        Args:
+            label_values (LabelValues, optional): The label values. Defaults
+                to ().
+
+        Returns:
+            float: The value.
+        """
+        return self.values.get(label_values, 0)
+
+    def render(self) -> List[str]:
+        """Render the counter in the Prometheus text format.
+
+        Returns:
+            List[str]: The lines.
+        """
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} counter'
+        ]
+        for label_values, value in self.values.items():
+            lines.append(
+                f'{self.name}{_format_labels(self.label_names, label_values)} '
+                f'{_format_value(value)}'
+            )
+        return lines
+
+
+class Gauge(Counter):
+    """A value which can go up and down"""
+
+    __slots__ = ('collect',)
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            label_names: Sequence[str] = (),
+            collect: Optional[Callable[[], float]] = None
+    ) -> None:
+        """A value which can go up and down.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): A description of the metric.
+            label_names (Sequence[str], optional): The label names. Defaults
+                to ().
+            collect (Optional[Callable[[], float]], optional): An optional
+                function to read the value of a gauge without labels when it
+                is rendered. Defaults to None.
+        """
+        super().__init__(name, documentation, label_names)
+        self.collect = collect
+
+    def dec(self, label_values: LabelValues = (), amount: float = 1) -> None:
+        """Decrement the gauge.
+
+        Args:
+            label_values (LabelValues, optional): The label values in the
+                order of the label names. Defaults to ().
+            amount (float, optional): The amount. Defaults to 1.
+        """
+        self.values[label_values] = self.values.get(label_values, 0) - amount
+
+    def set(self, label_values: LabelValues, value: float) -> None:
+        """Set the gauge.
+
+        Args:
+            label_values (LabelValues): The label values in the order of the
+                label names.
+            value (float): The value.
+        """
+        self.values[label_values] = value
+
+    def render(self) -> List[str]:
+        if self.collect is not None:
+            self.values[()] = self.collect()
+        lines = super().render()
+        lines[1] = f'# TYPE {self.name} gauge'
+        return lines
+
+
+class _HistogramValue:
+
+    __slots__ = ('buckets', 'sum', 'count')
+
+    def __init__(self, size: int) -> None:
+        self.buckets = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """A histogram of observations with optional labels"""
+
+    __slots__ = ('name', 'documentation', 'label_names', 'bounds', 'values')
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            label_names: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        """A histogram of observations with optional labels.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): A description of the metric.
+            label_names (Sequence[str], optional): The label names. Defaults
+                to ().
+            buckets (Sequence[float], optional): The upper bounds of the
+                buckets. Defaults to DEFAULT_BUCKETS.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.bounds = tuple(sorted(buckets))
+        self.values: Dict[LabelValues, _HistogramValue] = {}
+
+    def observe(self, label_values: LabelValues, value: float) -> None:
+        """Record an observation.
+
+        Args:
+            label_values (LabelValues): The label values in the order of the
+                label names.
+            value (float): The observed value.
+        """
+        histogram_value = self.values.get(label_values)
+        if histogram_value is None:
+            histogram_value = _HistogramValue(len(self.bounds) + 1)
+            self.values[label_values] = histogram_value
+        # Observations are counted in their own bucket, and accumulated when
+        # rendered.
+        histogram_value.buckets[bisect_left(self.bounds, value)] += 1
+        histogram_value.sum += value
+        histogram_value.count += 1
+
+    def render(self) -> List[str]:
+        """Render the histogram in the Prometheus text format.
+
+        Returns:
+            List[str]: The lines.
+        """
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} histogram'
+        ]
+        bucket_label_names = self.label_names + ('le',)
+        for label_values, histogram_value in self.values.items():
+            cumulative = 0
+            for bound, count in zip(
+                    self.bounds + (float('inf'),),
+                    histogram_value.buckets
+            ):
+                cumulative += count
+                labels = _format_labels(
+                    bucket_label_names,
+                    label_values + (_format_value(bound),)
+                )
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(
+                f'{self.name}_sum{labels} {_format_value(histogram_value.sum)}'
+            )
+            lines.append(f'{self.name}_count{labels} {histogram_value.count}')
+        return lines
+
+
+MetricT = TypeVar('MetricT', bound=Union[Counter, Histogram])
+
+
+class PhaseTimer:
+    """Records the duration of the phases of an operation"""
+
+    __slots__ = ('histogram', 'operation', 'transport', 'trace')
+
+    def __init__(
+            self,
+            histogram: Histogram,
+            operation: str,
+            transport: str,
+            trace: Optional["Trace"] = None
+    ) -> None:
+        self.histogram = histogram
+        self.operation = operation
+        self.transport = transport
+        self.trace = trace
+
+    def observe(self, phase: str, seconds: float) -> None:
+        """Record the duration of a phase.
+
+        Args:
+            phase (str): The phase (e.g. "parse", "validate", "execute",
+                "serialise" or "send").
+            seconds (float): The duration in seconds.
+        """
+        self.histogram.observe(
+            (phase, self.operation, self.transport),
+            seconds
+        )
+        if self.trace is not None:
+            self.trace.add_phase(phase, seconds)
+
+
+async def timed_body(buf: bytes, timer: PhaseTimer) -> AsyncIterable[bytes]:
+    """Send a response body, recording the time taken to send it.
+
+    Args:
+        buf (bytes): The body.
+        timer (PhaseTimer): The timer of the operation.
+
+    Returns:
+        AsyncIterable[bytes]: The body.
+    """
+    yield buf
+    # The server fetches the next chunk before sending the previous one, so
+    # the body has been sent when this resumes.
+    start = time.perf_counter()
+    yield b''
+    timer.observe('send', time.perf_counter() - start)
+
+
+class Metrics:
+    """The metrics collected by a controller"""
+
+    def __init__(self, max_operation_names: int = 100) -> None:
+        """The metrics collected by a controller.
+
+        Args:
+            max_operation_names (int, optional): The maximum number of
+                operation names used as labels. Any further operations are
+                recorded as "__other__". Defaults to 100.
+        """
+        self.max_operation_names = max_operation_names
+        self._operation_names: Set[str] = set()
+        # Functions which update the metrics before they are rendered.
+        self.collectors: List[Callable[[], None]] = []
+        # The metrics in the order they are rendered.
+        self.registry: List[Union[Counter, Histogram]] = []
+
+        self.operations_timed_out = self.register(
+            Counter(
+                'graphql_operations_timed_out_total',
+                'Operations cancelled because their deadline passed.',
+                ('transport',)
+            )
+        )
+        self.operations_cancelled = self.register(
+            Counter(
+                'graphql_operations_cancelled_total',
+                'Operations cancelled before they completed.',
+                ('transport',)
+            )
+        )
+        self.input_rejected = self.register(
+            Counter(
+                'graphql_input_rejected_total',
+                'Requests rejected because they exceeded an input limit.',
+                ('limit', 'transport')
+            )
+        )
+        self.sync_executions = self.register(
+            Counter(
+                'graphql_sync_executions_total',
+                'Queries and mutations started without an event loop task, by '
+                'whether they completed synchronously or fell back to awaiting.',
+                ('outcome',)
+            )
+        )
+        self.phase_seconds = self.register(
+            Histogram(
+                'graphql_operation_phase_seconds',
+                'The time spent in each phase of an operation.',
+                ('phase', 'operation', 'transport')
+            )
+        )
+        self.operations_in_flight = self.register(
+            Gauge(
+                'graphql_operations_in_flight',
+                'Queries and mutations being executed.',
+                ('transport',)
+            )
+        )
+        self.streams_active = self.register(
+            Gauge(
+                'graphql_streams_active',
+                'Streaming subscriptions over HTTP.'
+            )
+        )
+        self.websocket_connections_active = self.register(
+            Gauge(
+                'graphql_websocket_connections_active',
+                'Open WebSocket connections.'
+            )
+        )
+        self.subscriptions_active = self.register(
+            Gauge(
+                'graphql_subscriptions_active',
+                'Active subscriptions.',
+                ('transport',)
+            )
+        )
+        self.subscription_events_sent = self.register(
+            Counter(
+                'graphql_subscription_events_sent_total',
+                'Subscription events sent to clients.',
+                ('transport',)
+            )
+        )
+        self.subscription_bytes_sent = self.register(
+            Counter(
+                'graphql_subscription_bytes_sent_total',
+                'The size of the subscription events sent to clients.',
+                ('transport',)
+            )
+        )
+        self.subscription_oldest_seconds = self.register(
+            Gauge(
+                'graphql_subscription_oldest_seconds',
+                'The age of the oldest active subscription.'
+            )
+        )
+        self.resolver_pool_active = self.register(
+            Gauge(
+                'graphql_resolver_pool_active',
+                'Blocking resolvers running on a thread pool.',
+                ('pool',)
+            )
+        )
+        self.resolver_pool_queued = self.register(
+            Gauge(
+                'graphql_resolver_pool_queued',
+                'Blocking resolvers waiting for a thread.',
+                ('pool',)
+            )
+        )
+        self.resolver_pool_rejected = self.register(
+            Counter(
+                'graphql_resolver_pool_rejected_total',
+                'Blocking resolvers rejected because the queue was full.',
+                ('pool',)
+            )
+        )
+        self.resolver_pool_wait_seconds = self.register(
+            Histogram(
+                'graphql_resolver_pool_wait_seconds',
+                'The time blocking resolvers waited for a thread.',
+                ('pool',)
+            )
+        )
+        self.resolver_pool_run_seconds = self.register(
+            Histogram(
+                'graphql_resolver_pool_run_seconds',
+                'The time blocking resolvers ran on a thread.',
+                ('pool',)
+            )
+        )
+
+    def register(self, metric: MetricT) -> MetricT:
+        """Register a metric, so it is rendered.
+
+        Args:
+            metric (MetricT): The metric.
+
+        Returns:
+            MetricT: The metric.
+        """
+        self.registry.append(metric)
+        return metric
+
+    def operation_label(self, operation_name: Optional[str]) -> str:
+        """Get the label for an operation.
+
+        Args:
+            operation_name (Optional[str]): The operation name.
+
+        Returns:
+            str: The label.
+        """
+        name = operation_name or ''
+        if name not in self._operation_names:
+            if len(self._operation_names) >= self.max_operation_names:
+                return OTHER_OPERATIONS
+            self._operation_names.add(name)
+        return name
+
+    def timer(
+            self,
+            transport: str,
+            operation_name: Optional[str],
+            trace: Optional["Trace"] = None
+    ) -> PhaseTimer:
+        """Make a timer for the phases of an operation.
+
+        Args:
+            transport (str): The transport ("http" or "websocket").
+            operation_name (Optional[str]): The operation name.
+            trace (Optional[Trace], optional): The trace of the operation, to
+                which the phases are also added. Defaults to None.
+
+        Returns:
+            PhaseTimer: The timer.
+        """
+        return PhaseTimer(
+            self.phase_seconds,
+            self.operation_label(operation_name),
+            transport,
+            trace
+        )
+
+    def render(self) -> str:
+        """Render the metrics in the Prometheus text format.
+
+        Returns:
+            str: The metrics.
+        """
+        for collect in self.collectors:
+            collect()
+        lines: List[str] = []
+        for metric in self.registry:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,103 @@
+"""The metrics and debug routes"""
+
+from typing import Any, Callable, Optional
+from urllib.parse import parse_qs
+
+from bareasgi import HttpRequest, HttpResponse
+from bareutils import bytes_writer, response_code
+
+from .metrics import Metrics
+from .operation_stats import OperationStats
+from .subscriptions import SubscriptionRegistry
+
+PROMETHEUS_CONTENT_TYPE = b'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _make_response(body: bytes, content_type: bytes) -> HttpResponse:
+    headers = [
+        (b'content-type', content_type),
+        (b'content-length', str(len(body)).encode())
+    ]
+    return HttpResponse(response_code.OK, headers, bytes_writer(body))
+
+
+class MonitoringEndpoints:
+    """The routes serving the metrics and the debug information"""
+
+    def __init__(
+            self,
+            metrics: Metrics,
+            subscriptions: SubscriptionRegistry,
+            operation_stats: Optional[OperationStats],
+            dumps: Callable[[Any], str]
+    ) -> None:
+        """The routes serving the metrics and the debug information.
+
+        Args:
+            metrics (Metrics): The metrics of the controller.
+            subscriptions (SubscriptionRegistry): The active subscriptions.
+            operation_stats (Optional[OperationStats]): The operation
+                statistics, if they are collected.
+            dumps (Callable[[Any], str]): The function to convert an object to
+                a JSON string.
+        """
+        self.metrics = metrics
+        self.subscriptions = subscriptions
+        self.operation_stats = operation_stats
+        self.dumps = dumps
+
+    async def handle_metrics(self, _request: HttpRequest) -> HttpResponse:
+        """Render the metrics in the Prometheus text format
+
+        Args:
+            _request (HttpRequest): The request.
+
+        Returns:
+            HttpResponse: The response.
+        """
+        return _make_response(
+            self.metrics.render().encode('utf-8'),
+            PROMETHEUS_CONTENT_TYPE
+        )
+
+    async def handle_debug_operations(self, request: HttpRequest) -> HttpResponse:
+        """Render the operation signatures with the greatest total time as
+        JSON
+
+        The number of signatures is given by the `top` query parameter.
+
+        Args:
+            request (HttpRequest): The request.
+
+        Returns:
+            HttpResponse: The response.
+        """
+        query_string = parse_qs(request.scope['query_string'])
+        try:
+            top = int(query_string.get(b'top', [b'20'])[0])
+        except ValueError:
+            top = 20
+
+        body = self.dumps({
+            'operations': (
+                self.operation_stats.top(top)
+                if self.operation_stats is not None
+                else []
+            )
+        })
+        return _make_response(body.encode('utf-8'), b'application/json')
+
+    async def handle_debug_subscriptions(
+            self,
+            _request: HttpRequest
+    ) -> HttpResponse:
+        """Render the active subscriptions as JSON
+
+        Args:
+            _request (HttpRequest): The request.
+
+        Returns:
+            HttpResponse: The response.
+        """
+        body = self.dumps({'subscriptions': self.subscriptions.snapshot()})
+        return _make_response(body.encode('utf-8'), b'application/json')
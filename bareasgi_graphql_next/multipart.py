@@ -0,0 +1,540 @@
+"""Streaming multipart/form-data requests and GraphQL file uploads
+
+The body is parsed as it arrives. Fields are kept in memory, up to a limit
+on their total size, and files are written to spooled temporary files, which move to disk when
+they grow beyond the spool size, so the memory used does not depend on the
+size of the upload.
+
+A request following the GraphQL multipart request specification
+(https://github.com/jaydenseric/graphql-multipart-request-spec) has an
+`operations` field with the JSON operation, a `map` field with the JSON
+mapping of file fields to variable paths, and the files. The files are put
+into the variables as `Upload` objects.
+"""
+
+import re
+from tempfile import SpooledTemporaryFile
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union
+)
+
+from bareutils import response_code
+from graphql import GraphQLError, GraphQLScalarType, ValueNode
+
+from .errors import OperationRejectedError
+from .limits import InputLimitError
+
+BAD_MULTIPART_REQUEST = 'BAD_MULTIPART_REQUEST'
+
+DEFAULT_SPOOL_SIZE = 1024 * 1024
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MAX_FIELD_SIZE = 16 * 1024 * 1024
+MAX_HEADER_SIZE = 16 * 1024
+MAX_PARTS = 1000
+
+_PARAMETER = re.compile(r';\s*([^\s=;]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^;]*)')
+_QUOTED_PAIR = re.compile(r'\\(.)')
+
+# The parser states.
+_PREAMBLE, _BOUNDARY, _HEADERS, _BODY, _EPILOGUE = range(5)
+
+
+class MultipartError(OperationRejectedError):
+    """An error raised for a malformed multipart request"""
+
+    def __init__(self, message: str) -> None:
+        super().__init__(message, BAD_MULTIPART_REQUEST)
+
+
+class Upload:
+    """A file uploaded with an operation"""
+
+    __slots__ = ('name', 'filename', 'content_type', 'headers', 'file', 'size')
+
+    def __init__(
+            self,
+            name: str,
+            filename: str,
+            content_type: Optional[str],
+            headers: Dict[str, str],
+            spool_size: int = DEFAULT_SPOOL_SIZE
+    ) -> None:
+        """A file uploaded with an operation.
+
+        The content is held in memory until it grows beyond the spool size,
+        after which it is held in a temporary file. The file is deleted when
+        the upload is closed, which the controller does once the response
+        has been sent.
+
+        Args:
+            name (str): The name of the form field.
+            filename (str): The name of the file given by the client.
+            content_type (Optional[str]): The content type given by the
+                client.
+            headers (Dict[str, str]): The headers of the part, with lower case
+                names.
+            spool_size (int, optional): The size in bytes above which the
+                content is written to disk. Defaults to DEFAULT_SPOOL_SIZE.
+        """
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.headers = headers
+        # The file lives as long as the operation.
+        # pylint: disable=consider-using-with
+        self.file = SpooledTemporaryFile(max_size=spool_size)
+        self.size = 0
+
+    def write(self, data: Union[bytes, bytearray]) -> None:
+        """Append data to the upload.
+
+        Args:
+            data (Union[bytes, bytearray]): The data.
+        """
+        self.file.write(data)
+        self.size += len(data)
+
+    def read(self, size: int = -1) -> bytes:
+        """Read from the upload.
+
+        Args:
+            size (int, optional): The maximum number of bytes to read, or -1
+                for the rest of the file. Defaults to -1.
+
+        Returns:
+            bytes: The bytes read.
+        """
+        return self.file.read(size)
+
+    def seek(self, offset: int) -> int:
+        """Move to a position in the upload.
+
+        Args:
+            offset (int): The position from the start.
+
+        Returns:
+            int: The new position.
+        """
+        return self.file.seek(offset)
+
+    async def stream(
+            self,
+            chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        """Stream the content from the start.
+
+        Args:
+            chunk_size (int, optional): The size of the chunks. Defaults to
+                DEFAULT_CHUNK_SIZE.
+
+        Yields:
+            bytes: The content.
+        """
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    @property
+    def closed(self) -> bool:
+        """True if the upload has been closed"""
+        return self.file.closed
+
+    def close(self) -> None:
+        """Close the upload, deleting any temporary file"""
+        self.file.close()
+
+    def __repr__(self) -> str:
+        return (
+            f'Upload(name={self.name!r}, filename={self.filename!r}, '
+            f'content_type={self.content_type!r}, size={self.size})'
+        )
+
+
+def _parse_upload_literal(value_node: ValueNode, _variables: Any = None) -> Any:
+    raise GraphQLError(
+        'An upload must be sent as a variable.',
+        value_node
+    )
+
+
+def _serialize_upload(value: Any) -> Any:
+    raise GraphQLError('An upload cannot be returned.')
+
+
+GraphQLUpload = GraphQLScalarType(  # pylint: disable=invalid-name
+    'Upload',
+    description='A file sent with a multipart request.',
+    serialize=_serialize_upload,
+    parse_value=lambda value: value,
+    parse_literal=_parse_upload_literal
+)
+
+
+def _parse_header_value(value: str) -> Tuple[str, Dict[str, str]]:
+    main, _, rest = value.partition(';')
+    parameters: Dict[str, str] = {}
+    for match in _PARAMETER.finditer(';' + rest):
+        name, parameter = match.group(1).lower(), match.group(2).strip()
+        if len(parameter) >= 2 and parameter[0] == parameter[-1] == '"':
+            parameter = _QUOTED_PAIR.sub(r'\1', parameter[1:-1])
+        parameters[name] = parameter
+    return main.strip().lower(), parameters
+
+
+class MultipartParser:
+    """An incremental parser of a multipart/form-data body"""
+
+    def __init__(
+            self,
+            boundary: bytes,
+            spool_size: int = DEFAULT_SPOOL_SIZE,
+            max_field_size: int = MAX_FIELD_SIZE,
+            max_parts: int = MAX_PARTS
+    ) -> None:
+        """An incremental parser of a multipart/form-data body.
+
+        Args:
+            boundary (bytes): The boundary from the content type.
+            spool_size (int, optional): The size in bytes above which files
+                are written to disk. Defaults to DEFAULT_SPOOL_SIZE.
+            max_field_size (int, optional): The maximum size in bytes of the
+                fields which are not files, in total. Defaults to
+                MAX_FIELD_SIZE.
+            max_parts (int, optional): The maximum number of fields and files.
+                Defaults to MAX_PARTS.
+
+        Raises:
+            MultipartError: If the boundary is invalid.
+        """
+        if boundary[:1] == b'"' and boundary[-1:] == b'"':
+            boundary = boundary[1:-1]
+        if not 0 < len(boundary) <= 70:
+            raise MultipartError('Invalid multipart boundary')
+        self.spool_size = spool_size
+        self.max_field_size = max_field_size
+        self.max_parts = max_parts
+        self.fields: Dict[str, str] = {}
+        self.files: Dict[str, Upload] = {}
+        self._delimiter = b'\r\n--' + boundary
+        # The first boundary need not follow a line break.
+        self._buffer = bytearray(b'\r\n')
+        self._state = _PREAMBLE
+        self._name = ''
+        self._field: Optional[bytearray] = None
+        self._upload: Optional[Upload] = None
+        self._parts = 0
+        self._field_size = 0
+
+    @property
+    def is_complete(self) -> bool:
+        """True if the final boundary has been read"""
+        return self._state == _EPILOGUE
+
+    def feed(self, data: bytes) -> None:
+        """Parse the next data of the body.
+
+        Args:
+            data (bytes): The data.
+
+        Raises:
+            MultipartError: If the body is malformed.
+            InputLimitError: If the fields are too large, or there are too
+                many parts.
+        """
+        if self._state == _EPILOGUE:
+            return
+        self._buffer += data
+        while self._state == _PREAMBLE and self._parse_preamble():
+            pass
+        while self._state not in (_EPILOGUE, _PREAMBLE):
+            if self._state == _BOUNDARY:
+                progressed = self._parse_boundary()
+            elif self._state == _HEADERS:
+                progressed = self._parse_headers()
+            else:
+                progressed = self._parse_body()
+            if not progressed:
+                break
+
+    def close(self) -> None:
+        """Close the files"""
+        for upload in self.files.values():
+            upload.close()
+        if self._upload is not None:
+            self._upload.close()
+
+    def _parse_preamble(self) -> bool:
+        index = self._buffer.find(self._delimiter)
+        if index == -1:
+            # Keep what may be the start of the delimiter.
+            del self._buffer[:-len(self._delimiter)]
+            return False
+        del self._buffer[:index + len(self._delimiter)]
+        self._state = _BOUNDARY
+        return True
+
+    def _parse_boundary(self) -> bool:
+        if self._buffer[:2] == b'--':
+            self._state = _EPILOGUE
+            self._buffer.clear()
+            return False
+        index = self._buffer.find(b'\r\n')
+        if index == -1:
+            if len(self._buffer) > MAX_HEADER_SIZE:
+                raise MultipartError('Invalid multipart boundary line')
+            return False
+        if self._buffer[:index].strip(b' \t'):
+            raise MultipartError('Invalid multipart boundary line')
+        del self._buffer[:index + 2]
+        self._state = _HEADERS
+        return True
+
+    def _parse_headers(self) -> bool:
+        if self._buffer[:2] == b'\r\n':
+            index = 0
+        else:
+            index = self._buffer.find(b'\r\n\r\n')
+            if index == -1:
+                if len(self._buffer) > MAX_HEADER_SIZE:
+                    raise MultipartError('The part headers are too large')
+                return False
+        if index > MAX_HEADER_SIZE:
+            raise MultipartError('The part headers are too large')
+
+        headers: Dict[str, str] = {}
+        for line in bytes(self._buffer[:index]).decode('utf-8', 'replace').split('\r\n'):
+            name, separator, value = line.partition(':')
+            if not separator:
+                raise MultipartError('Invalid part header')
+            headers[name.strip().lower()] = value.strip()
+        del self._buffer[:index + (2 if index == 0 else 4)]
+
+        disposition, parameters = _parse_header_value(
+            headers.get('content-disposition', '')
+        )
+        field_name = parameters.get('name')
+        if disposition != 'form-data' or field_name is None:
+            raise MultipartError('A part has no form-data content disposition')
+        self._parts += 1
+        if self._parts > self.max_parts:
+            raise InputLimitError(
+                f'The body has more than {self.max_parts} parts.',
+                'parts',
+                self.max_parts,
+                response_code.PAYLOAD_TOO_LARGE
+            )
+        self._name = field_name
+        if 'filename' in parameters:
+            content_type = headers.get('content-type')
+            self._upload = Upload(
+                field_name,
+                parameters['filename'],
+                None if content_type is None else _parse_header_value(content_type)[0],
+                headers,
+                self.spool_size
+            )
+        else:
+            self._field = bytearray()
+        self._state = _BODY
+        return True
+
+    def _parse_body(self) -> bool:
+        index = self._buffer.find(self._delimiter)
+        if index == -1:
+            # Keep what may be the start of the delimiter.
+            size = len(self._buffer) - len(self._delimiter) + 1
+            if size > 0:
+                self._write(self._buffer[:size])
+                del self._buffer[:size]
+            return False
+
+        self._write(self._buffer[:index])
+        del self._buffer[:index + len(self._delimiter)]
+        if self._upload is not None:
+            self._upload.seek(0)
+            self.files[self._name] = self._upload
+            self._upload = None
+        elif self._field is not None:
+            self.fields[self._name] = self._field.decode('utf-8')
+            self._field = None
+        self._state = _BOUNDARY
+        return True
+
+    def _write(self, data: bytearray) -> None:
+        if self._upload is not None:
+            self._upload.write(data)
+        elif self._field is not None:
+            # The fields are limited together, as each is held in memory.
+            self._field_size += len(data)
+            if self._field_size > self.max_field_size:
+                raise InputLimitError(
+                    f'The fields are larger than {self.max_field_size} bytes.',
+                    'fieldSize',
+                    self.max_field_size,
+                    response_code.PAYLOAD_TOO_LARGE
+                )
+            self._field += data
+
+
+async def parse_multipart(
+        body: AsyncIterable[bytes],
+        boundary: bytes,
+        spool_size: int = DEFAULT_SPOOL_SIZE,
+        max_field_size: int = MAX_FIELD_SIZE
+) -> Tuple[Dict[str, str], Dict[str, Upload]]:
+    """Parse a multipart/form-data body as it arrives.
+
+    Args:
+        body (AsyncIterable[bytes]): The body.
+        boundary (bytes): The boundary from the content type.
+        spool_size (int, optional): The size in bytes above which files are
+            written to disk. Defaults to DEFAULT_SPOOL_SIZE.
+        max_field_size (int, optional): The maximum size in bytes of the
+            fields which are not files, in total. Defaults to MAX_FIELD_SIZE.
+
+    Raises:
+        MultipartError: If the body is malformed.
+        InputLimitError: If the fields are too large, or there are too many
+            parts.
+
+    Returns:
+        Tuple[Dict[str, str], Dict[str, Upload]]: The fields and the files,
+            keyed by field name.
+    """
+    parser = MultipartParser(boundary, spool_size, max_field_size)
+    try:
+        async for data in body:
+            parser.feed(data)
+        if not parser.is_complete:
+            raise MultipartError('The multipart body is incomplete')
+    # pylint: disable=bare-except
+    except:
+        parser.close()
+        raise
+    return parser.fields, parser.files
+
+
+def _set_variable(operation: Dict[str, Any], path: str, upload: Upload) -> None:
+    keys = path.split('.')
+    if keys[0] != 'variables' or len(keys) < 2:
+        raise MultipartError(f'Invalid file path "{path}"')
+    container: Any = operation
+    try:
+        for index, key in enumerate(keys):
+            if isinstance(container, list):
+                if index == len(keys) - 1:
+                    container[int(key)] = upload
+                else:
+                    container = container[int(key)]
+            elif isinstance(container, dict):
+                if index == len(keys) - 1:
+                    container[key] = upload
+                else:
+                    container = container[key]
+            else:
+                raise TypeError(key)
+    except (KeyError, IndexError, TypeError, ValueError) as error:
+        raise MultipartError(f'Invalid file path "{path}"') from error
+
+
+async def parse_graphql_multipart(
+        body: AsyncIterable[bytes],
+        boundary: bytes,
+        loads: Callable[[str], Any],
+        uploads: List[Upload],
+        spool_size: int = DEFAULT_SPOOL_SIZE,
+        max_field_size: int = MAX_FIELD_SIZE
+) -> Dict[str, Any]:
+    """Parse a multipart/form-data operation.
+
+    A request with an `operations` field follows the GraphQL multipart
+    request specification, and the files are put into the variables. Batched
+    operations are not supported. Otherwise the fields are the members of the
+    operation (e.g. `query` and `variables`) as in a form post.
+
+    Args:
+        body (AsyncIterable[bytes]): The body.
+        boundary (bytes): The boundary from the content type.
+        loads (Callable[[str], Any]): The function to convert a JSON string
+            to an object.
+        uploads (List[Upload]): A list to which the files are added, so they
+            can be closed once the operation has completed.
+        spool_size (int, optional): The size in bytes above which files are
+            written to disk. Defaults to DEFAULT_SPOOL_SIZE.
+        max_field_size (int, optional): The maximum size in bytes of the
+            fields which are not files, in total. Defaults to MAX_FIELD_SIZE.
+
+    Raises:
+        MultipartError: If the request is malformed.
+        InputLimitError: If the fields are too large, or there are too many
+            parts.
+
+    Returns:
+        Dict[str, Any]: The operation.
+    """
+    fields, files = await parse_multipart(
+        body,
+        boundary,
+        spool_size,
+        max_field_size
+    )
+    uploads.extend(files.values())
+
+    if 'operations' not in fields:
+        return dict(fields)
+
+    try:
+        operation = loads(fields['operations'])
+        file_map = loads(fields.get('map', '{}'))
+    except ValueError as error:
+        raise MultipartError(
+            'The operations and map fields must be JSON'
+        ) from error
+    if isinstance(operation, list):
+        raise MultipartError('Batched operations are not supported')
+    if not isinstance(operation, dict) or not isinstance(file_map, dict):
+        raise MultipartError('The operations and map fields must be objects')
+
+    for name, paths in file_map.items():
+        upload = files.get(name)
+        if upload is None:
+            raise MultipartError(f'The file "{name}" is missing')
+        if not isinstance(paths, list):
+            raise MultipartError(f'The paths of the file "{name}" must be a list')
+        for path in paths:
+            _set_variable(operation, str(path), upload)
+
+    return operation
+
+
+async def close_after(
+        body: Optional[AsyncIterable[bytes]],
+        uploads: List[Upload]
+) -> AsyncIterator[bytes]:
+    """Send a response body, closing the uploads when it has been sent.
+
+    Args:
+        body (Optional[AsyncIterable[bytes]]): The response body.
+        uploads (List[Upload]): The uploads.
+
+    Yields:
+        bytes: The response body.
+    """
+    try:
+        if body is not None:
+            async for buf in body:
+                yield buf
+    finally:
+        for upload in uploads:
+            upload.close()
@@ -0,0 +1,312 @@
+"""Running blocking resolvers on thread pools"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from functools import partial
+from inspect import isawaitable
+import os
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar
+)
+
+from graphql import GraphQLError, GraphQLResolveInfo
+
+from .metrics import Metrics
+
+RESOLVER_POOL_FULL = 'RESOLVER_POOL_FULL'
+DEFAULT_POOL = 'default'
+
+# The attribute of a resolver holding the name of its pool.
+POOL_ATTRIBUTE = '__bareasgi_graphql_next_pool__'
+
+T = TypeVar('T', bound=Callable)
+
+
+class ResolverPoolFullError(GraphQLError):
+    """An error reported when a resolver pool has no room in its queue"""
+
+    def __init__(self, pool: str) -> None:
+        super().__init__(
+            f'The resolver pool "{pool}" is full.',
+            extensions={'code': RESOLVER_POOL_FULL, 'pool': pool}
+        )
+
+
+def blocking_resolver(pool: str = DEFAULT_POOL) -> Callable[[T], T]:
+    """Mark a resolver as blocking, so the `OffloadMiddleware` runs it on a
+    thread pool.
+
+    Args:
+        pool (str, optional): The name of the pool. Defaults to "default".
+
+    Returns:
+        Callable[[T], T]: The decorator.
+    """
+    def decorate(resolver: T) -> T:
+        setattr(resolver, POOL_ATTRIBUTE, pool)
+        return resolver
+    return decorate
+
+
+def _marked_pool(resolver: Optional[Callable]) -> Optional[str]:
+    # Look through bound methods, partials and decorators for the mark.
+    while resolver is not None:
+        pool = getattr(resolver, POOL_ATTRIBUTE, None)
+        if pool is not None:
+            return pool
+        resolver = getattr(resolver, 'func', None) or getattr(
+            resolver,
+            '__wrapped__',
+            None
+        )
+    return None
+
+
+class ResolverPool:
+    """A thread pool for blocking resolvers with a bounded queue"""
+
+    def __init__(
+            self,
+            name: str = DEFAULT_POOL,
+            max_workers: Optional[int] = None,
+            max_queue_size: int = 100
+    ) -> None:
+        """A thread pool for blocking resolvers with a bounded queue.
+
+        When every thread is busy and `max_queue_size` resolvers are waiting,
+        further resolvers fail with a `ResolverPoolFullError` rather than
+        waiting.
+
+        Args:
+            name (str, optional): The name of the pool, used as the metrics
+                label. Defaults to "default".
+            max_workers (Optional[int], optional): The number of threads.
+                Defaults to None, which uses the `ThreadPoolExecutor` default.
+            max_queue_size (int, optional): The number of resolvers which may
+                wait for a thread. Defaults to 100.
+        """
+        self.name = name
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.max_queue_size = max_queue_size
+        self.executor = ThreadPoolExecutor(
+            self.max_workers,
+            thread_name_prefix=f'graphql-{name}'
+        )
+        self.metrics: Optional[Metrics] = None
+        self.pending = 0
+        self.active = 0
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        """The number of resolvers waiting for a thread"""
+        return self.pending - self.active
+
+    def bind(self, metrics: Metrics) -> None:
+        """Record the metrics of the pool.
+
+        Args:
+            metrics (Metrics): The metrics.
+        """
+        self.metrics = metrics
+        metrics.collectors.append(self._collect)
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a function on the pool.
+
+        The context variables of the caller are available to the function.
+
+        Args:
+            func (Callable[..., Any]): The function.
+            *args (Any): The positional arguments.
+            **kwargs (Any): The keyword arguments.
+
+        Raises:
+            ResolverPoolFullError: If the queue is full.
+
+        Returns:
+            Any: The result of the function.
+        """
+        with self._lock:
+            is_full = self.pending >= self.max_workers + self.max_queue_size
+            if not is_full:
+                self.pending += 1
+        if is_full:
+            if self.metrics is not None:
+                self.metrics.resolver_pool_rejected.inc((self.name,))
+            raise ResolverPoolFullError(self.name)
+
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        result = await loop.run_in_executor(
+            self.executor,
+            partial(
+                context.run,
+                self._call,
+                loop,
+                time.perf_counter(),
+                func,
+                args,
+                kwargs
+            )
+        )
+        # An async resolver returns an awaitable, which runs on the loop.
+        return await result if isawaitable(result) else result
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shut down the threads.
+
+        Args:
+            wait (bool, optional): If True wait for the running resolvers to
+                finish. Defaults to True.
+        """
+        self.executor.shutdown(wait=wait)
+
+    def _call(
+            self,
+            loop: asyncio.AbstractEventLoop,
+            submitted: float,
+            func: Callable[..., Any],
+            args: Tuple[Any, ...],
+            kwargs: Dict[str, Any]
+    ) -> Any:
+        started = time.perf_counter()
+        with self._lock:
+            self.active += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self.active -= 1
+                self.pending -= 1
+            if self.metrics is not None and not loop.is_closed():
+                # The metrics are only changed on the event loop thread.
+                loop.call_soon_threadsafe(
+                    self._observe,
+                    started - submitted,
+                    finished - started
+                )
+
+    def _observe(self, wait_seconds: float, run_seconds: float) -> None:
+        if self.metrics is not None:
+            self.metrics.resolver_pool_wait_seconds.observe(
+                (self.name,),
+                wait_seconds
+            )
+            self.metrics.resolver_pool_run_seconds.observe(
+                (self.name,),
+                run_seconds
+            )
+
+    def _collect(self) -> None:
+        if self.metrics is not None:
+            with self._lock:
+                active, queued = self.active, self.queued
+            self.metrics.resolver_pool_active.set((self.name,), active)
+            self.metrics.resolver_pool_queued.set((self.name,), queued)
+
+
+class OffloadMiddleware:
+    """A graphql middleware running blocking resolvers on thread pools"""
+
+    def __init__(
+            self,
+            pools: Sequence[ResolverPool] = (),
+            fields: Optional[Mapping[str, str]] = None
+    ) -> None:
+        """A graphql middleware running blocking resolvers on thread pools.
+
+        A resolver is run on a pool if it is marked with `blocking_resolver`,
+        or its field is given in `fields`. The keys of `fields` are either a
+        type name, for all the fields of the type, or "Type.field".
+
+        Args:
+            pools (Sequence[ResolverPool], optional): The pools. A pool named
+                "default" is created if none is given. Defaults to ().
+            fields (Optional[Mapping[str, str]], optional): The pool names of
+                types and fields. Defaults to None.
+
+        Raises:
+            ValueError: If a field names an unknown pool.
+        """
+        self.pools = {pool.name: pool for pool in pools}
+        if DEFAULT_POOL not in self.pools:
+            self.pools[DEFAULT_POOL] = ResolverPool()
+        self.fields = dict(fields or {})
+        for coordinate, pool in self.fields.items():
+            if pool not in self.pools:
+                raise ValueError(f'Unknown pool "{pool}" for "{coordinate}".')
+        self._field_pools: Dict[Tuple[str, str], Optional[ResolverPool]] = {}
+
+    def bind(self, metrics: Metrics) -> None:
+        """Record the metrics of the pools.
+
+        Args:
+            metrics (Metrics): The metrics.
+        """
+        for pool in self.pools.values():
+            pool.bind(metrics)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shut down the pools.
+
+        Args:
+            wait (bool, optional): If True wait for the running resolvers to
+                finish. Defaults to True.
+        """
+        for pool in self.pools.values():
+            pool.shutdown(wait)
+
+    def resolve(
+            self,
+            next_: Callable,
+            root: Any,
+            info: GraphQLResolveInfo,
+            **args: Any
+    ) -> Any:
+        """Resolve a field, on a thread pool if it is blocking.
+
+        Args:
+            next_ (Callable): The next resolver.
+            root (Any): The parent value.
+            info (GraphQLResolveInfo): The resolver info.
+
+        Returns:
+            Any: The resolved value, or an awaitable if it runs on a pool.
+        """
+        key = (info.parent_type.name, info.field_name)
+        try:
+            pool = self._field_pools[key]
+        except KeyError:
+            pool = self._find_pool(info)
+            self._field_pools[key] = pool
+
+        if pool is None:
+            return next_(root, info, **args)
+        return pool.run(next_, root, info, **args)
+
+    def _find_pool(self, info: GraphQLResolveInfo) -> Optional[ResolverPool]:
+        type_name = info.parent_type.name
+        name = self.fields.get(f'{type_name}.{info.field_name}')
+        if name is None:
+            name = self.fields.get(type_name)
+        if name is None:
+            field = info.parent_type.fields.get(info.field_name)
+            name = _marked_pool(field.resolve if field is not None else None)
+        if name is None:
+            return None
+        pool = self.pools.get(name)
+        if pool is None:
+            raise ValueError(f'Unknown pool "{name}" for "{type_name}".')
+        return pool
@@ -0,0 +1,170 @@
+"""Aggregated operation statistics and the slow operation log"""
+
+from collections import OrderedDict, deque
+import logging
+from typing import Any, Deque, Dict, List, Mapping, Optional
+
+SLOW_LOGGER = logging.getLogger('bareasgi_graphql_next.slow')
+
+REDACTED = '[REDACTED]'
+
+
+def redact(value: Any) -> Any:
+    """Replace the values in a structure, keeping its shape.
+
+    Args:
+        value (Any): The value (e.g. the variables of an operation).
+
+    Returns:
+        Any: The redacted value.
+    """
+    if isinstance(value, Mapping):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    if value is None:
+        return None
+    return REDACTED
+
+
+def _quantile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class _SignatureStats:
+
+    __slots__ = (
+        'signature',
+        'count',
+        'error_count',
+        'total_time',
+        'response_bytes',
+        'latencies'
+    )
+
+    def __init__(self, signature: str, sample_size: int) -> None:
+        self.signature = signature
+        self.count = 0
+        self.error_count = 0
+        self.total_time = 0.0
+        self.response_bytes = 0
+        # The most recent latencies, from which the quantiles are taken.
+        self.latencies: Deque[float] = deque(maxlen=sample_size)
+
+
+class OperationStats:
+    """Aggregated statistics of operations keyed by their signature"""
+
+    def __init__(
+            self,
+            *,
+            slow_threshold: Optional[float] = 1.0,
+            max_signatures: int = 1000,
+            sample_size: int = 256
+    ) -> None:
+        """Aggregated statistics of operations keyed by their signature.
+
+        The signature of an operation is the hash of its normalised text, so
+        operations differing only by literals, aliases or the order of their
+        fields are counted together. When the table is full the least
+        recently seen signature is discarded.
+
+        Operations taking longer than the slow threshold are written to the
+        `bareasgi_graphql_next.slow` logger with their variables redacted.
+
+        Args:
+            slow_threshold (Optional[float], optional): The duration in
+                seconds above which an operation is logged as slow, or None to
+                not log slow operations. Defaults to 1.0.
+            max_signatures (int, optional): The maximum number of signatures
+                to hold. Defaults to 1000.
+            sample_size (int, optional): The number of recent latencies used
+                to calculate the quantiles. Defaults to 256.
+        """
+        self.slow_threshold = slow_threshold
+        self.max_signatures = max_signatures
+        self.sample_size = sample_size
+        self._stats: "OrderedDict[str, _SignatureStats]" = OrderedDict()
+
+    def record(
+            self,
+            signature_id: str,
+            signature: str,
+            operation_name: Optional[str],
+            variables: Optional[Mapping[str, Any]],
+            duration: float,
+            has_errors: bool,
+            response_bytes: int
+    ) -> None:
+        """Record an operation.
+
+        Args:
+            signature_id (str): The hash of the signature.
+            signature (str): The signature.
+            operation_name (Optional[str]): The operation name.
+            variables (Optional[Mapping[str, Any]]): The variables.
+            duration (float): The duration in seconds.
+            has_errors (bool): True if the result had errors.
+            response_bytes (int): The size of the response.
+        """
+        stats = self._stats.get(signature_id)
+        if stats is None:
+            stats = _SignatureStats(signature, self.sample_size)
+            self._stats[signature_id] = stats
+            if len(self._stats) > self.max_signatures:
+                self._stats.popitem(last=False)
+        else:
+            self._stats.move_to_end(signature_id)
+
+        stats.count += 1
+        if has_errors:
+            stats.error_count += 1
+        stats.total_time += duration
+        stats.response_bytes += response_bytes
+        stats.latencies.append(duration)
+
+        if self.slow_threshold is not None and duration > self.slow_threshold:
+            SLOW_LOGGER.warning(
+                "Slow operation: duration=%.3fs signature=%s operationName=%s"
+                " variables=%s query=%s",
+                duration,
+                signature_id,
+                operation_name,
+                redact(variables),
+                signature
+            )
+
+    def top(self, count: int = 20) -> List[Dict[str, Any]]:
+        """Get the signatures with the greatest total time.
+
+        Args:
+            count (int, optional): The number of signatures. Defaults to 20.
+
+        Returns:
+            List[Dict[str, Any]]: The statistics of the signatures.
+        """
+        ranked = sorted(
+            self._stats.items(),
+            key=lambda item: item[1].total_time,
+            reverse=True
+        )
+        result: List[Dict[str, Any]] = []
+        for signature_id, stats in ranked[:count]:
+            latencies = sorted(stats.latencies)
+            result.append({
+                'id': signature_id,
+                'signature': stats.signature,
+                'count': stats.count,
+                'errorCount': stats.error_count,
+                'totalTime': stats.total_time,
+                'p50': _quantile(latencies, 0.5),
+                'p95': _quantile(latencies, 0.95),
+                'p99': _quantile(latencies, 0.99),
+                'responseBytes': stats.response_bytes
+            })
+        return result
+
+    def __len__(self) -> int:
+        return len(self._stats)
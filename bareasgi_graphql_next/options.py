@@ -0,0 +1,117 @@
+"""The options of a GraphQL controller"""
+
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from .cost import QueryCostAnalyser
+    from .limits import InputLimits
+    from .offload import OffloadMiddleware
+    from .operation_stats import OperationStats
+    from .process_pool import ProcessPoolExecution
+    from .profiling import OperationProfiler
+    from .rate_limit import CostRateLimiter
+
+
+class GraphQLOptions:
+    """The optional features of a GraphQL controller"""
+
+    def __init__(
+            self,
+            *,
+            cost_analyser: Optional["QueryCostAnalyser"] = None,
+            rate_limiter: Optional["CostRateLimiter"] = None,
+            operation_timeout: Optional[float] = None,
+            timeout_header: Optional[bytes] = None,
+            cancel_on_disconnect: bool = False,
+            drain_timeout: float = 30,
+            metrics_path: Optional[str] = None,
+            profiler: Optional["OperationProfiler"] = None,
+            operation_stats: Optional["OperationStats"] = None,
+            debug_path: Optional[str] = None,
+            resolver_offload: Optional["OffloadMiddleware"] = None,
+            process_pool: Optional["ProcessPoolExecution"] = None,
+            graphiql_assets_path: Optional[str] = None,
+            upload_spool_size: int = 1024 * 1024,
+            input_limits: Optional["InputLimits"] = None,
+            cache_introspection: bool = False,
+            sync_execution: Optional[bool] = None
+    ) -> None:
+        """The optional features of a GraphQL controller.
+
+        Args:
+            cost_analyser (Optional[QueryCostAnalyser], optional): An optional
+                analyser to reject expensive operations before they are
+                executed. Defaults to None.
+            rate_limiter (Optional[CostRateLimiter], optional): An optional
+                rate limiter charging the cost of each operation to the
+                client. Defaults to None.
+            operation_timeout (Optional[float], optional): The default timeout
+                for queries and mutations in seconds, or None for no timeout.
+                Defaults to None.
+            timeout_header (Optional[bytes], optional): The header a client
+                may use to request a shorter timeout in seconds (e.g.
+                `b'x-request-timeout'`). Defaults to None.
+            cancel_on_disconnect (bool, optional): If True queries and
+                mutations are cancelled when the client disconnects. The
+                response is sent without a content length. Defaults to False.
+            drain_timeout (float, optional): The maximum time in seconds to
+                wait for streams and connections to finish on shutdown.
+                Defaults to 30.
+            metrics_path (Optional[str], optional): The path of an optional
+                route serving the metrics in the Prometheus text format (e.g.
+                `"/metrics"`). Defaults to None.
+            profiler (Optional[OperationProfiler], optional): An optional
+                profiler for operations requested by authorised clients.
+                Defaults to None.
+            operation_stats (Optional[OperationStats], optional): If given,
+                the statistics of queries and mutations are aggregated by their
+                normalised signature, and slow operations are logged. Defaults
+                to None.
+            debug_path (Optional[str], optional): If given, the operation
+                statistics and the active subscriptions are served as JSON from
+                `{debug_path}/operations` and `{debug_path}/subscriptions`.
+                Defaults to None.
+            resolver_offload (Optional[OffloadMiddleware], optional): If
+                given, blocking resolvers are run on its thread pools, and the
+                pools are shut down with the controller. Defaults to None.
+            process_pool (Optional[ProcessPoolExecution], optional): If given,
+                the operations it selects are run in its worker processes.
+                Defaults to None.
+            graphiql_assets_path (Optional[str], optional): If given, the
+                GraphiQL scripts and styles are served from the files in this
+                directory rather than a CDN. Defaults to None.
+            upload_spool_size (int, optional): The size in bytes above which
+                uploaded files are written to a temporary file rather than held
+                in memory. Defaults to 1024 * 1024.
+            input_limits (Optional[InputLimits], optional): If given, requests
+                exceeding the limits on the body size and the tokens, depth,
+                aliases and directives of the query are rejected before they
+                are validated. Defaults to None.
+            cache_introspection (bool, optional): If True the responses to
+                introspection queries are cached, and the schema is served from
+                `/schema.graphql`. Defaults to False.
+            sync_execution (Optional[bool], optional): Whether queries and
+                mutations are executed without an event loop task when their
+                resolvers are synchronous. If None the resolvers are checked
+                for coroutine functions, if True they are assumed to be
+                synchronous, and if False the operations are always executed
+                asynchronously. An operation which turns out to be asynchronous
+                is completed asynchronously. Defaults to None.
+        """
+        self.cost_analyser = cost_analyser
+        self.rate_limiter = rate_limiter
+        self.operation_timeout = operation_timeout
+        self.timeout_header = timeout_header
+        self.cancel_on_disconnect = cancel_on_disconnect
+        self.drain_timeout = drain_timeout
+        self.metrics_path = metrics_path
+        self.profiler = profiler
+        self.operation_stats = operation_stats
+        self.debug_path = debug_path
+        self.resolver_offload = resolver_offload
+        self.process_pool = process_pool
+        self.graphiql_assets_path = graphiql_assets_path
+        self.upload_spool_size = upload_spool_size
+        self.input_limits = input_limits
+        self.cache_introspection = cache_introspection
+        self.sync_execution = sync_execution
@@ -0,0 +1,350 @@
+"""Running CPU bound operations in worker processes"""
+
+import asyncio
+from collections import OrderedDict
+import hashlib
+from importlib import import_module
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple
+)
+
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    GraphQLSchema,
+    get_operation_ast
+)
+
+from .document_cache import CachedDocument, DocumentCache, execute_cached
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+# The result of an operation in a worker: the encoded response and the error
+# messages, or None if the worker does not have the document.
+WorkerResult = Optional[Tuple[bytes, List[str]]]
+
+
+class EncodedExecutionResult(ExecutionResult):
+    """The result of an operation run in a worker process.
+
+    The worker encodes the response, so the event loop does not serialise it.
+    The errors are kept so they can be counted, but only hold the messages.
+    """
+
+    __slots__ = ('encoded',)
+
+    def __init__(self, encoded: bytes, errors: List[str]) -> None:
+        super().__init__(
+            None,
+            [GraphQLError(message) for message in errors] or None
+        )
+        self.encoded = encoded
+
+
+def document_id(query: str) -> str:
+    """Make the id of a document which is sent to the workers.
+
+    Args:
+        query (str): The query.
+
+    Returns:
+        str: The SHA-256 hash of the query.
+    """
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+def load_schema(path: str) -> GraphQLSchema:
+    """Load a schema from its import path.
+
+    Args:
+        path (str): The path as "module:attribute". The attribute is a graphql
+            schema, a graphene schema, or a function returning either.
+
+    Returns:
+        GraphQLSchema: The graphql schema.
+    """
+    module_name, _, attribute = path.partition(':')
+    schema = getattr(import_module(module_name), attribute)
+    if callable(schema) and not hasattr(schema, 'graphql_schema'):
+        schema = schema()
+    return getattr(schema, 'graphql_schema', schema)
+
+
+class _Worker:
+    """The state of a worker process"""
+
+    __slots__ = ('schema', 'dumps', 'document_cache', 'queries', 'loop')
+
+    def __init__(
+            self,
+            schema: GraphQLSchema,
+            dumps: Callable[[Any], str],
+            max_documents: int
+    ) -> None:
+        self.schema = schema
+        self.dumps = dumps
+        self.document_cache = DocumentCache(max_documents)
+        # The queries keyed by document id.
+        self.queries: "OrderedDict[str, str]" = OrderedDict()
+        self.loop = asyncio.new_event_loop()
+
+    def execute(
+            self,
+            id_: str,
+            query: Optional[str],
+            variables: Optional[Dict[str, Any]],
+            operation_name: Optional[str],
+            context: Any
+    ) -> WorkerResult:
+        """Execute an operation, returning None if the query is needed"""
+        if query is None:
+            query = self.queries.get(id_)
+            if query is None:
+                return None
+            self.queries.move_to_end(id_)
+        else:
+            self.queries[id_] = query
+            if len(self.queries) > self.document_cache.max_size:
+                self.queries.popitem(last=False)
+
+        result = self.loop.run_until_complete(
+            execute_cached(
+                self.schema,
+                self.document_cache,
+                query,
+                variables,
+                operation_name,
+                context,
+                None
+            )
+        )
+        response: Dict[str, Any] = {'data': result.data}
+        if result.errors:
+            response['errors'] = [error.formatted for error in result.errors]
+        if result.extensions:
+            response['extensions'] = result.extensions
+        return (
+            self.dumps(response).encode('utf-8'),
+            [error.message for error in result.errors or []]
+        )
+
+
+_WORKER: Optional[_Worker] = None
+
+
+def _initialise_worker(
+        schema_path: str,
+        dumps: Callable[[Any], str],
+        max_documents: int
+) -> None:
+    # pylint: disable=global-statement
+    global _WORKER
+    _WORKER = _Worker(load_schema(schema_path), dumps, max_documents)
+
+
+def _execute_in_worker(
+        id_: str,
+        query: Optional[str],
+        variables: Optional[Dict[str, Any]],
+        operation_name: Optional[str],
+        context: Any
+) -> WorkerResult:
+    if _WORKER is None:
+        raise RuntimeError('The worker has not been initialised.')
+    return _WORKER.execute(id_, query, variables, operation_name, context)
+
+
+class ProcessPoolExecution:
+    """Runs selected operations in a pool of worker processes"""
+
+    def __init__(
+            self,
+            schema_path: str,
+            *,
+            operation_names: Collection[str] = (),
+            min_cost: Optional[float] = None,
+            context: Optional[Callable[[Any], Any]] = None,
+            max_workers: Optional[int] = None,
+            max_documents: int = 1000,
+            start_method: str = 'spawn'
+    ) -> None:
+        """Runs selected operations in a pool of worker processes.
+
+        Resolvers which compute for a long time hold the GIL, so threads do
+        not help. Operations selected by name or by cost are run in worker
+        processes instead. Each worker loads the schema once when it starts.
+        Only the document id, the variables and the context are sent for an
+        operation, and the worker returns the encoded response.
+
+        Args:
+            schema_path (str): The import path of the schema as
+                "module:attribute". The attribute is a graphql schema, a
+                graphene schema, or a function returning either.
+            operation_names (Collection[str], optional): The names of the
+                operations to run in the workers. Defaults to ().
+            min_cost (Optional[float], optional): If given, operations with a
+                static cost of at least this are run in the workers. This
+                needs a cost analyser. Defaults to None.
+            context (Optional[Callable[[Any], Any]], optional): A function
+                taking the request and returning the context value for the
+                worker, which must be picklable. Defaults to None, which
+                gives an empty dictionary.
+            max_workers (Optional[int], optional): The number of worker
+                processes. Defaults to None, which uses the number of CPUs.
+            max_documents (int, optional): The number of documents each worker
+                keeps parsed. Defaults to 1000.
+            start_method (str, optional): The multiprocessing start method.
+                Defaults to 'spawn'.
+        """
+        self.schema_path = schema_path
+        self.operation_names = frozenset(operation_names)
+        self.min_cost = min_cost
+        self.context = context
+        self.max_workers = max_workers
+        self.max_documents = max_documents
+        self.start_method = start_method
+        self._executor: Optional["ProcessPoolExecutor"] = None
+        self._futures: Set["Future[WorkerResult]"] = set()
+
+    def start(self, dumps: Callable[[Any], str]) -> None:
+        """Start the worker processes.
+
+        Args:
+            dumps (Callable[[Any], str]): The function to encode the responses,
+                which must be picklable.
+        """
+        if self._executor is not None:
+            return
+        # pylint: disable=import-outside-toplevel
+        from concurrent.futures import ProcessPoolExecutor
+        import multiprocessing
+
+        self._executor = ProcessPoolExecutor(
+            self.max_workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_initialise_worker,
+            initargs=(self.schema_path, dumps, self.max_documents)
+        )
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker processes.
+
+        Args:
+            wait (bool, optional): If True wait for the running operations to
+                finish. Defaults to True.
+        """
+        if self._executor is not None:
+            # The pending operations are cancelled here, as the
+            # `cancel_futures` argument of shutdown needs Python 3.9.
+            for future in list(self._futures):
+                future.cancel()
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def selects(
+            self,
+            cached_document: CachedDocument,
+            operation_name: Optional[str]
+    ) -> bool:
+        """Check if an operation should run in the workers.
+
+        Args:
+            cached_document (CachedDocument): The parsed document.
+            operation_name (Optional[str]): The operation name.
+
+        Returns:
+            bool: True if the operation is selected.
+        """
+        if cached_document.has_subscription:
+            return False
+        if self.min_cost is not None:
+            cost = cached_document.costs.get(operation_name)
+            if cost is not None and cost.cost >= self.min_cost:
+                return True
+        if not self.operation_names:
+            return False
+        if operation_name is None:
+            operation = get_operation_ast(cached_document.document)
+            if operation is None or operation.name is None:
+                return False
+            operation_name = operation.name.value
+        return operation_name in self.operation_names
+
+    async def execute(
+            self,
+            request: Any,
+            query: str,
+            variables: Optional[Dict[str, Any]],
+            operation_name: Optional[str]
+    ) -> EncodedExecutionResult:
+        """Execute an operation in a worker.
+
+        The operation continues in the worker if it is cancelled.
+
+        Args:
+            request (Any): The request.
+            query (str): The query.
+            variables (Optional[Dict[str, Any]]): Optional variables.
+            operation_name (Optional[str]): An optional operation name.
+
+        Raises:
+            RuntimeError: If the workers have not been started.
+
+        Returns:
+            EncodedExecutionResult: The encoded result.
+        """
+        if self._executor is None:
+            raise RuntimeError('The worker processes have not been started.')
+
+        id_ = document_id(query)
+        context = {} if self.context is None else self.context(request)
+        result = await self._submit(
+            id_,
+            None,
+            variables,
+            operation_name,
+            context
+        )
+        if result is None:
+            # The worker has not seen the document, so send the query.
+            result = await self._submit(
+                id_,
+                query,
+                variables,
+                operation_name,
+                context
+            )
+        encoded, errors = result or (b'', [])
+        return EncodedExecutionResult(encoded, errors)
+
+    def _submit(
+            self,
+            id_: str,
+            query: Optional[str],
+            variables: Optional[Dict[str, Any]],
+            operation_name: Optional[str],
+            context: Any
+    ) -> "asyncio.Future[WorkerResult]":
+        """Submit an operation to the workers, keeping the future until it is
+        done so it can be cancelled on shutdown."""
+        assert self._executor is not None
+        future = self._executor.submit(
+            _execute_in_worker,
+            id_,
+            query,
+            variables,
+            operation_name,
+            context
+        )
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        return asyncio.wrap_future(future)
@@ -0,0 +1,152 @@
+"""On demand profiling of operations"""
+
+import asyncio
+from datetime import datetime
+import logging
+import os
+import re
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from bareasgi import HttpRequest, WebSocketRequest
+from bareutils import header
+from graphql import ExecutionResult
+
+if TYPE_CHECKING:
+    import cProfile
+
+LOGGER = logging.getLogger(__name__)
+
+Request = Union[HttpRequest, WebSocketRequest]
+
+
+class OperationProfiler:
+    """Profiles operations when requested by an authorised client"""
+
+    def __init__(
+            self,
+            authorise: Callable[[Request], bool],
+            *,
+            header_name: bytes = b'x-graphql-profile',
+            top: int = 20,
+            output_dir: Optional[str] = None
+    ) -> None:
+        """Profiles operations when requested by an authorised client.
+
+        An operation is profiled when the request has the profile header and
+        the authoriser allows it. The functions with the greatest cumulative
+        time are returned in `extensions.profile`. If an output directory is
+        given the profile is also written there as a `.prof` file, and the
+        file name is returned.
+
+        Args:
+            authorise (Callable[[Request], bool]): A function returning True
+                if the client may profile operations.
+            header_name (bytes, optional): The request header which asks for
+                the operation to be profiled. Defaults to b'x-graphql-profile'.
+            top (int, optional): The number of functions to return. Defaults
+                to 20.
+            output_dir (Optional[str], optional): An optional directory in
+                which to write the profiles. Defaults to None.
+        """
+        self.authorise = authorise
+        self.header_name = header_name
+        self.top = top
+        self.output_dir = output_dir
+        # The profiler hooks the interpreter, so only one operation can be
+        # profiled at a time. The lock is made on first use, as before Python
+        # 3.10 it binds to the event loop current when it is created.
+        self._lock: Optional[asyncio.Lock] = None
+
+    def is_requested(self, request: Request) -> bool:
+        """Check if the client has asked for profiling and is allowed to.
+
+        Args:
+            request (Request): The request.
+
+        Returns:
+            bool: True if the operation should be profiled.
+        """
+        if not header.find(self.header_name, request.scope['headers']):
+            return False
+        if not self.authorise(request):
+            LOGGER.warning("Profiling refused for an unauthorised request.")
+            return False
+        return True
+
+    async def profile(
+            self,
+            operation: Awaitable[ExecutionResult],
+            operation_name: Optional[str]
+    ) -> ExecutionResult:
+        """Run an operation under the profiler.
+
+        As the profiler records everything the event loop runs, other tasks
+        running at the same time will appear in the profile.
+
+        Args:
+            operation (Awaitable[ExecutionResult]): The operation.
+            operation_name (Optional[str]): The operation name.
+
+        Returns:
+            ExecutionResult: The result with the profile in the extensions.
+        """
+        # Imported when needed, as few operations are profiled.
+        import cProfile  # pylint: disable=import-outside-toplevel
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                result = await operation
+            finally:
+                profiler.disable()
+
+        report: Dict[str, Any] = {'functions': self._top_functions(profiler)}
+        if self.output_dir is not None:
+            report['file'] = self._write(
+                profiler,
+                self.output_dir,
+                operation_name
+            )
+
+        result.extensions = {**(result.extensions or {}), 'profile': report}
+        return result
+
+    def _top_functions(self, profiler: "cProfile.Profile") -> List[Dict[str, Any]]:
+        import pstats  # pylint: disable=import-outside-toplevel
+
+        stats = pstats.Stats(profiler)
+        rows = sorted(
+            stats.stats.items(),  # type: ignore
+            key=lambda item: item[1][3],
+            reverse=True
+        )
+        return [
+            {
+                'function': f'{filename}:{line}({name})',
+                'calls': calls,
+                'totalTime': total_time,
+                'cumulativeTime': cumulative_time
+            }
+            for (filename, line, name), (_, calls, total_time, cumulative_time, _)
+            in rows[:self.top]
+        ]
+
+    @classmethod
+    def _write(
+            cls,
+            profiler: "cProfile.Profile",
+            output_dir: str,
+            operation_name: Optional[str]
+    ) -> str:
+        # The operation name comes from the client.
+        name = re.sub(r'[^_0-9A-Za-z]', '_', operation_name or 'anonymous')
+        filename = os.path.join(
+            output_dir,
+            f'{datetime.utcnow():%Y%m%dT%H%M%S%f}-{name[:64]}.prof'
+        )
+        profiler.dump_stats(filename)
+        LOGGER.info("Wrote profile to %s.", filename)
+        return os.path.basename(filename)
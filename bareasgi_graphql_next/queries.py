@@ -0,0 +1,184 @@
+"""Queries and mutations over HTTP
+
+An operation whose resolvers are synchronous is executed without an event
+loop task. Otherwise it runs under the deadline of the request, and, if the
+controller cancels operations when the client disconnects, while the
+response body is sent.
+"""
+
+from functools import partial
+from inspect import isawaitable
+import logging
+import time
+from typing import (
+    Any,
+    AsyncIterable,
+    Awaitable,
+    Dict,
+    Optional,
+    cast,
+    TYPE_CHECKING
+)
+
+from bareasgi import HttpRequest, HttpResponse
+from bareutils import response_code
+from graphql import ExecutionResult, GraphQLError
+from graphql.pyutils import AwaitableOrValue
+
+from .deadline import call_with_deadline
+from .metrics import timed_body
+from .tracing import add_trace
+
+if TYPE_CHECKING:
+    from .controller import GraphQLControllerBase
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _start_sync_query(
+        controller: "GraphQLControllerBase",
+        request: HttpRequest,
+        query: str,
+        variables: Optional[Dict[str, Any]],
+        operation_name: Optional[str],
+        timeout: Optional[float]
+) -> Optional[AwaitableOrValue[ExecutionResult]]:
+    """Execute a query or mutation synchronously, if its resolvers are.
+
+    Args:
+        controller (GraphQLControllerBase): The controller.
+        request (HttpRequest): The http request.
+        query (str): The query.
+        variables (Optional[Dict[str, Any]]): Optional variables.
+        operation_name (Optional[str]): An optional operation name.
+        timeout (Optional[float]): The timeout in seconds, or None for no
+            timeout.
+
+    Returns:
+        Optional[AwaitableOrValue[ExecutionResult]]: None if the operation
+            must be executed asynchronously, otherwise the result, or an
+            awaitable result if a resolver was asynchronous.
+    """
+    options = controller.options
+    if controller.sync_analyser is None or (
+            options.profiler is not None and
+            options.profiler.is_requested(request)
+    ):
+        return None
+    try:
+        cached_document = controller.document_cache.get(query)
+    except GraphQLError:
+        return None
+    if options.process_pool is not None and options.process_pool.selects(
+            cached_document,
+            operation_name
+    ):
+        return None
+    if not controller.sync_analyser.is_sync(
+            controller.graphql_schema,
+            cached_document,
+            operation_name
+    ):
+        return None
+
+    operation = call_with_deadline(
+        partial(
+            controller.execute_query_sync,
+            request,
+            cached_document,
+            variables,
+            operation_name
+        ),
+        timeout
+    )
+    controller.metrics.sync_executions.inc(
+        ('fallback' if isawaitable(operation) else 'completed',)
+    )
+    return operation
+
+
+async def handle_query(
+        controller: "GraphQLControllerBase",
+        request: HttpRequest,
+        query: str,
+        variables: Optional[Dict[str, Any]],
+        operation_name: Optional[str]
+) -> HttpResponse:
+    """Execute a query or mutation, responding with the result as JSON.
+
+    Args:
+        controller (GraphQLControllerBase): The controller.
+        request (HttpRequest): The request.
+        query (str): The query.
+        variables (Optional[Dict[str, Any]]): Optional variables.
+        operation_name (Optional[str]): An optional operation name.
+
+    Returns:
+        HttpResponse: The response.
+    """
+    LOGGER.debug("Processing a query or mutation.")
+
+    start = time.perf_counter()
+    timeout = controller.get_operation_timeout(request)
+    timer = controller.metrics.timer('http', operation_name)
+
+    async def execute() -> bytes:
+        operation = _start_sync_query(
+            controller,
+            request,
+            query,
+            variables,
+            operation_name,
+            timeout
+        )
+        remaining = timeout
+        if operation is None:
+            operation = controller.profile_if_requested(
+                request,
+                controller.query(request, query, variables, operation_name),
+                operation_name
+            )
+        elif isawaitable(operation) and timeout is not None:
+            # The operation was not synchronous after all, and is
+            # completed within what remains of the deadline.
+            remaining = max(timeout - (time.perf_counter() - start), 0)
+        if isawaitable(operation):
+            result = await controller.execute_with_deadline(
+                'http',
+                remaining,
+                cast(Awaitable[ExecutionResult], operation)
+            )
+        else:
+            result = cast(ExecutionResult, operation)
+        add_trace(result, request.context)
+        buf = controller.encode_query_result(result, timer)
+        controller.record_operation(
+            query,
+            variables,
+            operation_name,
+            result,
+            time.perf_counter() - start,
+            len(buf)
+        )
+        return buf
+
+    if not controller.options.cancel_on_disconnect:
+        buf = await execute()
+        headers = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(buf)).encode())
+        ]
+        return HttpResponse(response_code.OK, headers, timed_body(buf, timer))
+
+    # The operation runs while the body is sent, when the server is watching
+    # for the client to disconnect. If it does the body, and with it the
+    # operation, is cancelled.
+    async def send_result() -> AsyncIterable[bytes]:
+        async for buf in timed_body(await execute(), timer):
+            yield buf
+
+    headers = [
+        (b'content-type', b'application/json')
+    ]
+
+    return HttpResponse(response_code.OK, headers, send_result())
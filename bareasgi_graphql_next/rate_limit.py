@@ -0,0 +1,171 @@
+"""Cost based rate limiting"""
+
+from collections import OrderedDict
+from math import ceil
+import time
+from typing import Callable, Optional, Union
+
+from bareasgi import HttpRequest, WebSocketRequest
+from bareutils import header, response_code
+
+from .errors import OperationRejectedError
+
+RATE_LIMITED = 'RATE_LIMITED'
+
+Request = Union[HttpRequest, WebSocketRequest]
+ClientIdentity = Callable[[Request], Optional[str]]
+
+
+def client_address(request: Request) -> Optional[str]:
+    """Identify the client by the address of the connection.
+
+    Args:
+        request (Request): The request.
+
+    Returns:
+        Optional[str]: The client host, or None if it is unknown.
+    """
+    client = request.scope.get('client')
+    return client[0] if client else None
+
+
+def header_identity(name: bytes) -> ClientIdentity:
+    """Make a function to identify a client by a request header.
+
+    Args:
+        name (bytes): The header name (e.g. `b'x-api-key'`).
+
+    Returns:
+        ClientIdentity: A function returning the header value.
+    """
+    def identify(request: Request) -> Optional[str]:
+        value = header.find(name, request.scope['headers'])
+        return value.decode() if value else None
+    return identify
+
+
+def context_identity(key: str) -> ClientIdentity:
+    """Make a function to identify a client by a value in the request context.
+
+    This is typically the authenticated principal set by middleware.
+
+    Args:
+        key (str): The context key.
+
+    Returns:
+        ClientIdentity: A function returning the context value.
+    """
+    def identify(request: Request) -> Optional[str]:
+        value = request.context.get(key)
+        return str(value) if value is not None else None
+    return identify
+
+
+class RateLimitError(OperationRejectedError):
+    """An error raised when a client has exceeded its rate limit"""
+
+    def __init__(self, cost: float, retry_after: float) -> None:
+        super().__init__(
+            'Rate limit exceeded.',
+            RATE_LIMITED,
+            {'cost': cost, 'retryAfter': retry_after},
+            status=response_code.TOO_MANY_REQUESTS,
+            headers=[(b'retry-after', str(ceil(retry_after)).encode())]
+        )
+        self.retry_after = retry_after
+
+
+class _TokenBucket:
+
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens: float, updated: float) -> None:
+        self.tokens = tokens
+        self.updated = updated
+
+
+class CostRateLimiter:
+    """A per client token bucket charged with the cost of each operation"""
+
+    def __init__(
+            self,
+            rate: float,
+            capacity: float,
+            *,
+            identify: ClientIdentity = client_address,
+            clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        """A per client token bucket charged with the cost of each operation.
+
+        Each client has a bucket of `capacity` tokens which refills at `rate`
+        tokens per second. Operations are charged their cost as calculated by
+        the query cost analyser, or 1 if there is no analyser. A bucket which
+        has had time to refill is indistinguishable from a new bucket, so it
+        is discarded.
+
+        Args:
+            rate (float): The number of tokens added per second.
+            capacity (float): The maximum number of tokens in a bucket.
+            identify (ClientIdentity, optional): A function to identify the
+                client from the request. Clients which cannot be identified
+                are not limited. Defaults to client_address.
+            clock (Callable[[], float], optional): The clock. Defaults to
+                time.monotonic.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.identify = identify
+        self.clock = clock
+        # Buckets are ordered by the time they were last updated.
+        self._buckets: "OrderedDict[str, _TokenBucket]" = OrderedDict()
+
+    def charge(self, request: Request, cost: float) -> None:
+        """Charge the cost of an operation to the client.
+
+        Args:
+            request (Request): The request.
+            cost (float): The cost of the operation.
+
+        Raises:
+            RateLimitError: If the client has insufficient tokens.
+        """
+        client = self.identify(request)
+        if client is None:
+            return
+
+        now = self.clock()
+        self._expire(now)
+
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = _TokenBucket(self.capacity, now)
+            self._buckets[client] = bucket
+        else:
+            bucket.tokens = min(
+                self.capacity,
+                bucket.tokens + (now - bucket.updated) * self.rate
+            )
+            bucket.updated = now
+            self._buckets.move_to_end(client)
+
+        # An operation costing more than the capacity is allowed when the
+        # bucket is full, leaving the client in debt.
+        required = min(cost, self.capacity)
+        if bucket.tokens < required:
+            raise RateLimitError(
+                cost,
+                (required - bucket.tokens) / self.rate
+            )
+
+        bucket.tokens -= cost
+
+    def _expire(self, now: float) -> None:
+        while self._buckets:
+            bucket = next(iter(self._buckets.values()))
+            time_to_fill = (self.capacity - bucket.tokens) / self.rate
+            if now - bucket.updated < time_to_fill:
+                break
+            self._buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
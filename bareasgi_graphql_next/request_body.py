@@ -0,0 +1,115 @@
+"""Reading an operation from the body of a request"""
+
+from typing import Any, Callable, List, Mapping, Optional, TYPE_CHECKING
+from urllib.parse import parse_qs
+
+from bareasgi import HttpRequest
+from bareutils import header, text_reader
+
+from .limits import InputLimits
+from .options import GraphQLOptions
+
+if TYPE_CHECKING:
+    from .multipart import Upload
+
+
+async def read_body(request: HttpRequest, limits: Optional[InputLimits]) -> str:
+    """Read the body of a request as text.
+
+    Args:
+        request (HttpRequest): The request.
+        limits (Optional[InputLimits]): The input limits, if any.
+
+    Raises:
+        InputLimitError: If the body is too large.
+
+    Returns:
+        str: The body.
+    """
+    if limits is None:
+        return await text_reader(request.body)
+
+    # Reject a large body before reading it, when the size is known.
+    limits.check_content_length(
+        header.find(b'content-length', request.scope['headers']),
+        limits.max_body_size
+    )
+    return (await limits.read_body(request.body)).decode('utf-8')
+
+
+async def read_query_document(
+        request: HttpRequest,
+        loads: Callable[[str], Any],
+        options: GraphQLOptions,
+        uploads: List["Upload"]
+) -> Mapping[str, Any]:
+    """Read the query, variables and operation name from the body of a
+    request.
+
+    The body may be a GraphQL document, JSON, a form, or a multipart form
+    with uploaded files.
+
+    Args:
+        request (HttpRequest): The request.
+        loads (Callable[[str], Any]): The function to convert a JSON string to
+            an object.
+        options (GraphQLOptions): The options of the controller.
+        uploads (List[Upload]): The list to which uploaded files are added.
+
+    Raises:
+        ValueError: If there is no content type.
+        RuntimeError: If the content type is not supported.
+        OperationRejectedError: If the body exceeds the input limits, or is an
+            invalid multipart form.
+
+    Returns:
+        Mapping[str, Any]: The request.
+    """
+    content_type = header.content_type(request.scope['headers'])
+    if content_type is None:
+        raise ValueError('Content type not specified')
+    media_type, parameters = content_type
+    limits = options.input_limits
+
+    if media_type == b'application/graphql':
+        return {'query': await read_body(request, limits)}
+    elif media_type in (b'application/json', b'text/plain'):
+        return loads(await read_body(request, limits))
+    elif media_type == b'application/x-www-form-urlencoded':
+        body = parse_qs(await read_body(request, limits))
+        return {name: value[0] for name, value in body.items()}
+    elif media_type == b'multipart/form-data':
+        # Imported when needed, as few clients post forms.
+        # pylint: disable=import-outside-toplevel
+        from .multipart import (
+            MAX_FIELD_SIZE,
+            MultipartError,
+            parse_graphql_multipart
+        )
+        if parameters is None or b'boundary' not in parameters:
+            raise MultipartError(
+                'Missing boundary for multipart/form-data'
+            )
+        content = request.body
+        max_field_size = MAX_FIELD_SIZE
+        if limits is not None:
+            # Files may be larger than other bodies.
+            limits.check_content_length(
+                header.find(b'content-length', request.scope['headers']),
+                limits.max_upload_size
+            )
+            content = limits.limit_body(content, limits.max_upload_size)
+            if limits.max_body_size is not None:
+                max_field_size = limits.max_body_size
+        return await parse_graphql_multipart(
+            content,
+            parameters[b'boundary'],
+            loads,
+            uploads,
+            options.upload_spool_size,
+            max_field_size
+        )
+    else:
+        raise RuntimeError(
+            f"Unsupported content type: {media_type.decode('ascii')}"
+        )
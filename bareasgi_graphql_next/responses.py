@@ -0,0 +1,63 @@
+"""Responses to requests which fail before an operation is executed"""
+
+import logging
+from typing import Any, Callable
+
+from bareasgi import HttpResponse
+from bareutils import bytes_writer, response_code, text_writer
+from graphql import GraphQLError
+
+from .errors import OperationRejectedError
+
+LOGGER = logging.getLogger(__name__)
+
+
+def make_internal_error_response() -> HttpResponse:
+    """Make the response to a request which failed unexpectedly.
+
+    Returns:
+        HttpResponse: The response.
+    """
+    text = 'Internal server error'
+    headers = [
+        (b'content-type', b'text/plain'),
+        (b'content-length', str(len(text)).encode())
+    ]
+    return HttpResponse(
+        response_code.INTERNAL_SERVER_ERROR,
+        headers,
+        text_writer(text)
+    )
+
+
+def make_rejected_response(
+        error: GraphQLError,
+        dumps: Callable[[Any], str]
+) -> HttpResponse:
+    """Make the response to an operation rejected before execution.
+
+    Args:
+        error (GraphQLError): The error.
+        dumps (Callable[[Any], str]): The function to convert an object to a
+            JSON string.
+
+    Returns:
+        HttpResponse: The response.
+    """
+    LOGGER.debug("Operation rejected: %s", error.message)
+
+    if isinstance(error, OperationRejectedError):
+        status, error_headers = error.status, error.headers
+        text = dumps({'data': None, 'errors': [error.formatted]})
+    else:
+        # The document could not be parsed, so there is no data.
+        status, error_headers = response_code.BAD_REQUEST, []
+        text = dumps({'errors': [error.formatted]})
+    body = text.encode('utf-8')
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode()),
+        *error_headers
+    ]
+
+    return HttpResponse(status, headers, bytes_writer(body))
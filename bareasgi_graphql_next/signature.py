@@ -0,0 +1,195 @@
+"""Normalised operation signatures"""
+
+import hashlib
+from typing import Dict, Iterable, List, Optional, Set
+
+from graphql import (
+    ArgumentNode,
+    BooleanValueNode,
+    DirectiveNode,
+    DocumentNode,
+    EnumValueNode,
+    FieldNode,
+    FloatValueNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    InlineFragmentNode,
+    IntValueNode,
+    ListValueNode,
+    NullValueNode,
+    ObjectValueNode,
+    OperationDefinitionNode,
+    SelectionSetNode,
+    StringValueNode,
+    ValueNode,
+    VariableNode,
+    print_ast
+)
+
+
+_PLACEHOLDERS = {
+    IntValueNode: '0',
+    FloatValueNode: '0',
+    StringValueNode: '""',
+    ListValueNode: '[]',
+    ObjectValueNode: '{}'
+}
+
+
+def _print_value(value: ValueNode) -> str:
+    # Literals are replaced so operations differing only by their inline
+    # values share a signature.
+    if isinstance(value, VariableNode):
+        return '$' + value.name.value
+    placeholder = _PLACEHOLDERS.get(type(value))
+    if placeholder is not None:
+        return placeholder
+    if isinstance(value, (BooleanValueNode, EnumValueNode, NullValueNode)):
+        return print_ast(value)
+    return ''
+
+
+def _print_arguments(arguments: Optional[Iterable[ArgumentNode]]) -> str:
+    if not arguments:
+        return ''
+    return '(' + ','.join(sorted(
+        f'{argument.name.value}:{_print_value(argument.value)}'
+        for argument in arguments
+    )) + ')'
+
+
+def _print_directives(directives: Optional[Iterable[DirectiveNode]]) -> str:
+    if not directives:
+        return ''
+    return ''.join(sorted(
+        f'@{directive.name.value}{_print_arguments(directive.arguments)}'
+        for directive in directives
+    ))
+
+
+def _print_selection_set(
+        selection_set: Optional[SelectionSetNode],
+        fragments: Dict[str, FragmentDefinitionNode],
+        used_fragments: Set[str]
+) -> str:
+    if selection_set is None:
+        return ''
+
+    selections: List[str] = []
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            # Aliases are dropped.
+            selections.append(
+                selection.name.value +
+                _print_arguments(selection.arguments) +
+                _print_directives(selection.directives) +
+                _print_selection_set(
+                    selection.selection_set,
+                    fragments,
+                    used_fragments
+                )
+            )
+        elif isinstance(selection, FragmentSpreadNode):
+            name = selection.name.value
+            if name not in used_fragments and name in fragments:
+                used_fragments.add(name)
+                fragment = fragments[name]
+                # Record the fragments used by the fragment.
+                _print_selection_set(
+                    fragment.selection_set,
+                    fragments,
+                    used_fragments
+                )
+            selections.append(
+                '...' + name + _print_directives(selection.directives)
+            )
+        elif isinstance(selection, InlineFragmentNode):
+            type_condition = (
+                ' on ' + selection.type_condition.name.value
+                if selection.type_condition is not None
+                else ''
+            )
+            selections.append(
+                '...' + type_condition +
+                _print_directives(selection.directives) +
+                _print_selection_set(
+                    selection.selection_set,
+                    fragments,
+                    used_fragments
+                )
+            )
+
+    return '{' + ' '.join(sorted(selections)) + '}'
+
+
+def operation_signature(
+        document: DocumentNode,
+        operation_name: Optional[str]
+) -> str:
+    """Make the normalised signature of an operation.
+
+    Literals are replaced by placeholders, aliases are removed, and the
+    fields, arguments and fragments are sorted, so operations which differ
+    only in these ways have the same signature. Only the fragments used by
+    the operation are included.
+
+    Args:
+        document (DocumentNode): The parsed document.
+        operation_name (Optional[str]): The operation name, or None for the
+            first operation.
+
+    Returns:
+        str: The signature.
+    """
+    fragments: Dict[str, FragmentDefinitionNode] = {}
+    operation: Optional[OperationDefinitionNode] = None
+    for definition in document.definitions:
+        if isinstance(definition, FragmentDefinitionNode):
+            fragments[definition.name.value] = definition
+        elif isinstance(definition, OperationDefinitionNode) and operation is None:
+            if operation_name is None or (
+                    definition.name is not None and
+                    definition.name.value == operation_name
+            ):
+                operation = definition
+
+    if operation is None:
+        return ''
+
+    used_fragments: Set[str] = set()
+    variables = ','.join(sorted(
+        f'${variable.variable.name.value}:{print_ast(variable.type)}'
+        for variable in operation.variable_definitions or []
+    ))
+    parts = [
+        operation.operation.value +
+        (' ' + operation.name.value if operation.name is not None else '') +
+        (f'({variables})' if variables else '') +
+        _print_directives(operation.directives) +
+        _print_selection_set(
+            operation.selection_set,
+            fragments,
+            used_fragments
+        )
+    ]
+    for name in sorted(used_fragments):
+        fragment = fragments[name]
+        parts.append(
+            f'fragment {name} on {fragment.type_condition.name.value}' +
+            _print_directives(fragment.directives) +
+            _print_selection_set(fragment.selection_set, fragments, set())
+        )
+
+    return ' '.join(parts)
+
+
+def signature_hash(signature: str) -> str:
+    """Hash a signature.
+
+    Args:
+        signature (str): The signature.
+
+    Returns:
+        str: The first 16 hex digits of the SHA-256 hash.
+    """
+    return hashlib.sha256(signature.encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,501 @@
+"""Streaming subscriptions over HTTP
+
+A subscription is streamed as server sent events, multipart/mixed parts or
+newline delimited JSON, chosen by the `accept` header of the request.
+"""
+
+import asyncio
+from datetime import datetime
+import logging
+import time
+from typing import (
+    Any,
+    AsyncIterable,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Union,
+    cast,
+    TYPE_CHECKING
+)
+from urllib.parse import parse_qs, urlencode
+
+from bareasgi import HttpRequest, HttpResponse
+from bareutils import header, response_code
+from graphql import ExecutionResult, GraphQLError, MapAsyncIterator
+
+from .limits import InputLimitError
+from .request_body import read_body
+from .responses import make_internal_error_response, make_rejected_response
+from .utils import (
+    SubscriptionIterator,
+    ZeroEvent,
+    cancellable_aiter,
+    compact_subscription,
+    get_host,
+    get_scheme
+)
+
+if TYPE_CHECKING:
+    from .controller import GraphQLControllerBase
+
+LOGGER = logging.getLogger(__name__)
+
+SUBSCRIPTION_BOUNDARY = b'graphql'
+SUBSCRIPTION_MULTIPART_CONTENT_TYPE = (
+    b'multipart/mixed; boundary="' + SUBSCRIPTION_BOUNDARY + b'"; subscriptionSpec="1.0"'
+)
+
+
+def _encode_sse(
+        dumps: Callable[[Any], str],
+        execution_result: Optional[ExecutionResult]
+) -> bytes:
+    if execution_result is None:
+        payload = f'event: ping\ndata: {datetime.utcnow()}\n\n'
+    else:
+        response = {
+            'data': execution_result.data,
+            'errors': [
+                error.formatted
+                for error in execution_result.errors
+            ] if execution_result.errors else None
+        }
+
+        payload = f'event: message\ndata: {dumps(response)}\n\n'
+
+    return payload.encode('utf-8')
+
+
+def _encode_json(
+        dumps: Callable[[Any], str],
+        execution_result: Optional[ExecutionResult]
+) -> bytes:
+    if execution_result is None:
+        return b'\n'
+
+    payload = dumps({
+        'data': execution_result.data,
+        'errors': [
+            error.formatted
+            for error in execution_result.errors
+        ] if execution_result.errors else None
+    }) + '\n'
+
+    return payload.encode('utf-8')
+
+
+def encode_sse_payload(
+        dumps: Callable[[Any], str],
+        payload: Mapping[str, Any]
+) -> bytes:
+    """Encode a payload as a server sent event.
+
+    Args:
+        dumps (Callable[[Any], str]): The function to convert an object to a
+            JSON string.
+        payload (Mapping[str, Any]): The payload.
+
+    Returns:
+        bytes: The event.
+    """
+    return f'event: message\ndata: {dumps(payload)}\n\n'.encode('utf-8')
+
+
+def encode_sse_end() -> bytes:
+    """Encode the event which ends a server sent event stream.
+
+    Returns:
+        bytes: The complete event.
+    """
+    return b'event: complete\ndata:\n\n'
+
+
+def encode_multipart_payload(
+        dumps: Callable[[Any], str],
+        boundary: bytes,
+        payload: Mapping[str, Any]
+) -> bytes:
+    """Encode a payload as a part of a multipart/mixed response.
+
+    Args:
+        dumps (Callable[[Any], str]): The function to convert an object to a
+            JSON string.
+        boundary (bytes): The boundary between the parts.
+        payload (Mapping[str, Any]): The payload.
+
+    Returns:
+        bytes: The part.
+    """
+    return (
+        b'\r\n--' + boundary +
+        b'\r\ncontent-type: application/json; charset=utf-8\r\n\r\n' +
+        dumps(payload).encode('utf-8')
+    )
+
+
+def encode_multipart_end(boundary: bytes) -> bytes:
+    """Encode the end of a multipart/mixed response.
+
+    Args:
+        boundary (bytes): The boundary between the parts.
+
+    Returns:
+        bytes: The closing boundary.
+    """
+    return b'\r\n--' + boundary + b'--\r\n'
+
+
+def _encode_multipart(
+        dumps: Callable[[Any], str],
+        execution_result: Optional[ExecutionResult]
+) -> bytes:
+    if execution_result is None:
+        # An empty object is a heartbeat.
+        return encode_multipart_payload(dumps, SUBSCRIPTION_BOUNDARY, {})
+
+    response: Dict[str, Any] = {'data': execution_result.data}
+    if execution_result.errors:
+        response['errors'] = [
+            error.formatted
+            for error in execution_result.errors
+        ]
+
+    return encode_multipart_payload(
+        dumps,
+        SUBSCRIPTION_BOUNDARY,
+        {'payload': response}
+    )
+
+
+class _SubscriptionStream:
+    """The state of a streaming subscription.
+
+    A stream is held for the life of the subscription, so the state is kept
+    in slots rather than in the cells of a closure.
+    """
+
+    __slots__ = (
+        'controller',
+        'result',
+        'cancellation',
+        'query',
+        'operation_name',
+        'transport',
+        'encode',
+        'nudge',
+        'end'
+    )
+
+    def __init__(
+            self,
+            controller: "GraphQLControllerBase",
+            result: Union[MapAsyncIterator, SubscriptionIterator],
+            cancellation: "asyncio.Future[None]",
+            query: str,
+            operation_name: Optional[str],
+            transport: str,
+            encode: Callable[[Callable[[Any], str], Any], bytes],
+            nudge: bytes,
+            end: bytes
+    ) -> None:
+        self.controller = controller
+        self.result = result
+        self.cancellation = cancellation
+        self.query = query
+        self.operation_name = operation_name
+        self.transport = transport
+        self.encode = encode
+        self.nudge = nudge
+        self.end = end
+
+    async def send_events(self, zero_event: ZeroEvent) -> AsyncIterable[bytes]:
+        """Stream the results of the subscription.
+
+        Args:
+            zero_event (ZeroEvent): The count of the active streams.
+
+        Returns:
+            AsyncIterable[bytes]: The encoded results.
+        """
+        LOGGER.debug('Streaming subscription started.')
+
+        controller, encode, dumps = self.controller, self.encode, self.controller.dumps
+        task = cast(asyncio.Task, asyncio.current_task())
+        info = controller.register_subscription(
+            self.query,
+            self.operation_name,
+            self.transport,
+            self.result
+        )
+        timer = controller.metrics.timer('http', self.operation_name)
+        try:
+            zero_event.increment()
+            controller.stream_tasks.add(task)
+
+            async for val in cancellable_aiter(
+                    self.result,
+                    self.cancellation,
+                    timeout=controller.ping_interval
+            ):
+                if val is None:
+                    yield encode(dumps, val)
+                    yield self.nudge  # Give the ASGI server a nudge.
+                    continue
+
+                controller.subscriptions.received(info)
+                start = time.perf_counter()
+                buf = encode(dumps, val)
+                timer.observe('serialise', time.perf_counter() - start)
+                yield buf
+                # The event is sent when the server asks for the nudge.
+                start = time.perf_counter()
+                yield self.nudge  # Give the ASGI server a nudge.
+                timer.observe('send', time.perf_counter() - start)
+                controller.subscriptions.sent(info, len(buf))
+
+            if self.end:
+                yield self.end
+
+        except asyncio.CancelledError:
+            LOGGER.debug("Streaming subscription cancelled.")
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.exception("Streaming subscription failed.")
+            # If the error is not caught the client fetch will fail, however
+            # the status code and headers have already been sent. So rather
+            # than let the fetch fail we send a GraphQL response with no
+            # data and the error and close gracefully.
+            if not isinstance(error, GraphQLError):
+                error = GraphQLError(
+                    'Execution error',
+                    original_error=error
+                )
+            yield encode(dumps, ExecutionResult(None, [error]))
+            yield self.nudge  # Give the ASGI server a nudge.
+            if self.end:
+                yield self.end
+        finally:
+            # Release the resources held by the source, rather than
+            # waiting for the iterator to be garbage collected.
+            await self.result.aclose()
+            zero_event.decrement()
+            controller.stream_tasks.discard(task)
+            controller.subscriptions.remove(info)
+
+        LOGGER.debug("Streaming subscription stopped.")
+
+
+class StreamingSubscriptions:
+    """The routes streaming subscriptions over HTTP"""
+
+    def __init__(self, controller: "GraphQLControllerBase") -> None:
+        """The routes streaming subscriptions over HTTP.
+
+        Args:
+            controller (GraphQLControllerBase): The controller executing the
+                subscriptions.
+        """
+        self.controller = controller
+
+    async def handle_get(self, request: HttpRequest) -> HttpResponse:
+        """Handle a streaming subscription
+
+        The query, variables and operation name are JSON encoded values of
+        the query string.
+
+        Args:
+            request (HttpRequest): The request
+
+        Returns:
+            HttpResponse: The streaming response
+        """
+        controller = self.controller
+        try:
+            LOGGER.debug(
+                "Received GET streaming subscription request: http_version='%s'.",
+                request.scope['http_version']
+            )
+
+            body = {
+                name.decode('utf-8'): controller.loads(value[0].decode('utf-8'))
+                for name, value in cast(
+                    Dict[bytes, List[bytes]],
+                    parse_qs(request.scope['query_string'])
+                ).items()
+            }
+            return await self._start(request, body)
+
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("Failed to handle graphql GET subscription")
+            return make_internal_error_response()
+
+    async def handle_post(self, request: HttpRequest) -> HttpResponse:
+        """Handle a streaming subscription
+
+        Args:
+            request (HttpRequest): The request
+
+        Returns:
+            HttpResponse: A stream response
+        """
+        controller = self.controller
+        try:
+            LOGGER.debug(
+                "Received POST streaming subscription request: http_version='%s'.",
+                request.scope['http_version']
+            )
+
+            try:
+                text = await read_body(
+                    request,
+                    controller.options.input_limits
+                )
+            except InputLimitError as error:
+                controller.metrics.input_rejected.inc((error.limit, 'http'))
+                return make_rejected_response(error, controller.dumps)
+
+            return await self._start(request, controller.loads(text))
+
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("Failed to handle graphql POST subscription")
+            return make_internal_error_response()
+
+    async def _start(
+            self,
+            request: HttpRequest,
+            body: Mapping[str, Any]
+    ) -> HttpResponse:
+        query: str = body['query']
+        variables: Optional[Dict[str, Any]] = body.get('variables')
+        operation_name: Optional[str] = body.get('operationName')
+
+        try:
+            self.controller.prepare_operation(
+                request,
+                query,
+                variables,
+                operation_name
+            )
+        except GraphQLError as error:
+            return make_rejected_response(
+                error,
+                self.controller.dumps
+            )
+
+        return await self.stream(request, query, variables, operation_name)
+
+    async def stream(
+            self,
+            request: HttpRequest,
+            query: str,
+            variables: Optional[Dict[str, Any]],
+            operation_name: Optional[str]
+    ) -> HttpResponse:
+        """Execute a subscription and stream the results.
+
+        The transport is chosen by the `accept` header, defaulting to server
+        sent events.
+
+        Args:
+            request (HttpRequest): The request.
+            query (str): The query.
+            variables (Optional[Dict[str, Any]]): Optional variables.
+            operation_name (Optional[str]): An optional operation name.
+
+        Returns:
+            HttpResponse: The streaming response.
+        """
+        controller = self.controller
+        # If unspecified default to server sent events as they have better support.
+        accept = cast(
+            bytes,
+            header.find(
+                b'accept', request.scope['headers'], b'text/event-stream')
+        )
+        if accept.startswith(b'multipart/mixed'):
+            content_type = SUBSCRIPTION_MULTIPART_CONTENT_TYPE
+        elif accept == b'application/json':
+            content_type = b'application/stream+json'
+        else:
+            content_type = accept
+
+        result = compact_subscription(
+            await controller.subscribe(request, query, variables, operation_name)
+        )
+
+        if content_type == b'text/event-stream':
+            encode: Callable[[Callable[[Any], str], Any], bytes] = _encode_sse
+            nudge, end = b':\n\n', encode_sse_end()
+            transport = 'sse'
+        elif content_type == SUBSCRIPTION_MULTIPART_CONTENT_TYPE:
+            # Multipart has no comment syntax so the nudge is empty.
+            encode = _encode_multipart
+            nudge, end = b'', encode_multipart_end(SUBSCRIPTION_BOUNDARY)
+            transport = 'multipart'
+        else:
+            encode = _encode_json
+            nudge, end = b'\n', b''
+            transport = 'ndjson'
+
+        stream = _SubscriptionStream(
+            controller,
+            result,
+            controller.get_cancellation(),
+            query,
+            operation_name,
+            transport,
+            encode,
+            nudge,
+            end
+        )
+
+        headers = [
+            (b'cache-control', b'no-cache'),
+            (b'content-type', content_type),
+            (b'connection', b'keep-alive')
+        ]
+
+        return HttpResponse(
+            response_code.OK,
+            headers,
+            stream.send_events(controller.subscription_count)
+        )
+
+    def redirect(
+            self,
+            request: HttpRequest,
+            body: Mapping[str, Any]
+    ) -> HttpResponse:
+        """Redirect a subscription to the GET route.
+
+        The response is 201 (Created) with the url location of the
+        subscription.
+
+        Args:
+            request (HttpRequest): The request.
+            body (Mapping[str, Any]): The query, variables and operation name.
+
+        Returns:
+            HttpResponse: The response.
+        """
+        LOGGER.debug("Redirecting subscription request.")
+        scheme = get_scheme(request)
+        try:
+            host = get_host(request)
+        except KeyError:
+            host = 'localhost'
+        path = self.controller.path_prefix + '/subscriptions'
+        query_string = urlencode(
+            {
+                name.encode('utf-8'): self.controller.dumps(value).encode('utf-8')
+                for name, value in body.items()
+            }
+        )
+        location = f'{scheme}://{host}{path}?{query_string}'.encode('ascii')
+        headers = [
+            (b'access-control-expose-headers', b'location'),
+            (b'location', location)
+        ]
+        return HttpResponse(response_code.CREATED, headers)
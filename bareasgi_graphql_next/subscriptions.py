@@ -0,0 +1,217 @@
+"""A registry of the active subscriptions"""
+
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .metrics import Metrics
+
+
+class SubscriptionInfo:
+    """The state of an active subscription"""
+
+    __slots__ = (
+        'signature_id',
+        'signature',
+        'operation_name',
+        'transport',
+        'start_time',
+        'started',
+        'events_sent',
+        'bytes_sent',
+        'last_event',
+        'pending',
+        'queue_size'
+    )
+
+    def __init__(
+            self,
+            signature_id: str,
+            signature: str,
+            operation_name: Optional[str],
+            transport: str,
+            queue_size: Optional[Callable[[], int]]
+    ) -> None:
+        self.signature_id = signature_id
+        self.signature = signature
+        self.operation_name = operation_name
+        self.transport = transport
+        self.start_time = time.time()
+        self.started = time.monotonic()
+        self.events_sent = 0
+        self.bytes_sent = 0
+        self.last_event: Optional[float] = None
+        # The number of events taken from the source which are not yet sent.
+        self.pending = 0
+        self.queue_size = queue_size
+
+    @property
+    def buffer_depth(self) -> int:
+        """The number of events waiting to be sent.
+
+        Returns:
+            int: The events taken from the source but not sent, and the size
+                of the source queue if it has one.
+        """
+        depth = self.pending
+        if self.queue_size is not None:
+            try:
+                depth += self.queue_size()
+            except Exception:  # pylint: disable=broad-except
+                pass
+        return depth
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        """Describe the subscription.
+
+        Args:
+            now (float): The time from `time.monotonic`.
+
+        Returns:
+            Dict[str, Any]: The description.
+        """
+        return {
+            'signatureId': self.signature_id,
+            'signature': self.signature,
+            'operationName': self.operation_name,
+            'transport': self.transport,
+            'startTime': self.start_time,
+            'ageSeconds': now - self.started,
+            'eventsSent': self.events_sent,
+            'bytesSent': self.bytes_sent,
+            'idleSeconds': now - (
+                self.last_event
+                if self.last_event is not None
+                else self.started
+            ),
+            'bufferDepth': self.buffer_depth
+        }
+
+
+def source_queue_size(source: Any) -> Optional[Callable[[], int]]:
+    """Find the queue size of a subscription source.
+
+    A source which buffers events, for example one reading from an
+    `asyncio.Queue`, can report its depth with a `qsize` method.
+
+    Args:
+        source (Any): The async iterator returned by subscribe.
+
+    Returns:
+        Optional[Callable[[], int]]: The `qsize` method of the source, or of
+            the iterator it maps, if there is one.
+    """
+    for candidate in (source, getattr(source, 'iterator', None)):
+        qsize = getattr(candidate, 'qsize', None)
+        if callable(qsize):
+            return qsize
+    return None
+
+
+class SubscriptionRegistry:
+    """The active subscriptions of a controller"""
+
+    def __init__(self, metrics: Metrics) -> None:
+        """The active subscriptions of a controller.
+
+        Every subscription streamed over HTTP or a WebSocket is registered
+        while it runs. The counts, events and bytes sent by transport are
+        published as metrics.
+
+        Args:
+            metrics (Metrics): The metrics of the controller.
+        """
+        self.metrics = metrics
+        self._subscriptions: Dict[int, SubscriptionInfo] = {}
+        metrics.subscription_oldest_seconds.collect = self.oldest_age
+
+    def add(
+            self,
+            signature_id: str,
+            signature: str,
+            operation_name: Optional[str],
+            transport: str,
+            queue_size: Optional[Callable[[], int]] = None
+    ) -> SubscriptionInfo:
+        """Register a subscription.
+
+        Args:
+            signature_id (str): The hash of the operation signature.
+            signature (str): The operation signature.
+            operation_name (Optional[str]): The operation name.
+            transport (str): The transport (e.g. "sse", "ndjson", "multipart"
+                or "websocket").
+            queue_size (Optional[Callable[[], int]], optional): A function
+                returning the number of events buffered by the source.
+                Defaults to None.
+
+        Returns:
+            SubscriptionInfo: The state of the subscription.
+        """
+        info = SubscriptionInfo(
+            signature_id,
+            signature,
+            operation_name,
+            transport,
+            queue_size
+        )
+        self._subscriptions[id(info)] = info
+        self.metrics.subscriptions_active.inc((transport,))
+        return info
+
+    def remove(self, info: SubscriptionInfo) -> None:
+        """Unregister a subscription.
+
+        Args:
+            info (SubscriptionInfo): The state of the subscription.
+        """
+        if self._subscriptions.pop(id(info), None) is not None:
+            self.metrics.subscriptions_active.dec((info.transport,))
+
+    def received(self, info: SubscriptionInfo) -> None:
+        """Record an event taken from the source of a subscription.
+
+        Args:
+            info (SubscriptionInfo): The state of the subscription.
+        """
+        info.pending += 1
+
+    def sent(self, info: SubscriptionInfo, length: int) -> None:
+        """Record an event sent to the client.
+
+        Args:
+            info (SubscriptionInfo): The state of the subscription.
+            length (int): The length of the encoded event.
+        """
+        info.pending = max(0, info.pending - 1)
+        info.events_sent += 1
+        info.bytes_sent += length
+        info.last_event = time.monotonic()
+        self.metrics.subscription_events_sent.inc((info.transport,))
+        self.metrics.subscription_bytes_sent.inc((info.transport,), length)
+
+    def oldest_age(self) -> float:
+        """The age of the oldest subscription.
+
+        Returns:
+            float: The age in seconds, or 0 if there are no subscriptions.
+        """
+        if not self._subscriptions:
+            return 0.0
+        # Subscriptions are held in the order they started.
+        oldest = next(iter(self._subscriptions.values()))
+        return time.monotonic() - oldest.started
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Describe the active subscriptions, oldest first.
+
+        Returns:
+            List[Dict[str, Any]]: The subscriptions.
+        """
+        now = time.monotonic()
+        return [
+            info.to_dict(now)
+            for info in list(self._subscriptions.values())
+        ]
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
@@ -0,0 +1,280 @@
+"""Synchronous execution of operations without asynchronous resolvers
+
+graphql-core only makes coroutines when a resolver returns an awaitable, so
+an operation whose resolvers are all synchronous completes within the call to
+`graphql.execute`. Such an operation can be run by the handler directly,
+rather than in the coroutines and the deadline task of an asynchronous
+operation.
+
+The analysis looks for coroutine functions, so a synchronous function
+returning an awaitable is not found. That is safe, as graphql-core then
+completes the operation asynchronously, and the caller awaits the result.
+"""
+
+from functools import partial
+from inspect import isasyncgenfunction, iscoroutinefunction
+from typing import (
+    Any,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Union
+)
+
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLInterfaceType,
+    GraphQLNamedType,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLUnionType,
+    InlineFragmentNode,
+    MiddlewareManager,
+    OperationDefinitionNode,
+    OperationType,
+    SelectionSetNode,
+    get_named_type,
+    get_operation_ast
+)
+
+from .document_cache import CachedDocument
+
+
+def is_async_callable(func: Any) -> bool:
+    """Check if a resolver is a coroutine or async generator function.
+
+    Args:
+        func (Any): The resolver, which may be None.
+
+    Returns:
+        bool: True if calling the resolver returns an awaitable.
+    """
+    while isinstance(func, partial):
+        func = func.func
+    if func is None:
+        return False
+    if iscoroutinefunction(func) or isasyncgenfunction(func):
+        return True
+    # A callable object.
+    call = getattr(type(func), '__call__', None)
+    return call is not None and iscoroutinefunction(call)
+
+
+def has_async_middleware(
+        middleware: Optional[Union[Tuple, List, MiddlewareManager]]
+) -> bool:
+    """Check if any graphql middleware is asynchronous.
+
+    Args:
+        middleware (Optional[Union[Tuple, List, MiddlewareManager]]): The
+            middleware.
+
+    Returns:
+        bool: True if a middleware function, or the `resolve` method of a
+            middleware object, is a coroutine function.
+    """
+    if middleware is None:
+        return False
+    if isinstance(middleware, MiddlewareManager):
+        middleware = middleware.middlewares
+    return any(
+        is_async_callable(getattr(item, 'resolve', item))
+        for item in middleware or ()
+    )
+
+
+def _get_root_type(
+        schema: GraphQLSchema,
+        operation: OperationDefinitionNode
+) -> Optional[GraphQLObjectType]:
+    if operation.operation == OperationType.QUERY:
+        return schema.query_type
+    if operation.operation == OperationType.MUTATION:
+        return schema.mutation_type
+    return None
+
+
+class SyncAnalyser:
+    """Finds the operations whose resolvers are all synchronous"""
+
+    __slots__ = ('has_async_middleware', 'assume_sync')
+
+    def __init__(
+            self,
+            middleware: Optional[Union[Tuple, List, MiddlewareManager]],
+            assume_sync: bool = False
+    ) -> None:
+        """Finds the operations whose resolvers are all synchronous.
+
+        Args:
+            middleware (Optional[Union[Tuple, List, MiddlewareManager]]): The
+                graphql middleware, which wraps every resolver.
+            assume_sync (bool, optional): If True every query and mutation is
+                taken to be synchronous without looking at the resolvers.
+                Defaults to False.
+        """
+        self.has_async_middleware = has_async_middleware(middleware)
+        self.assume_sync = assume_sync
+
+    def is_sync(
+            self,
+            schema: GraphQLSchema,
+            cached_document: CachedDocument,
+            operation_name: Optional[str]
+    ) -> bool:
+        """Check if an operation can be run synchronously.
+
+        The result is cached with the document.
+
+        Args:
+            schema (GraphQLSchema): The schema.
+            cached_document (CachedDocument): The parsed document.
+            operation_name (Optional[str]): The operation name.
+
+        Returns:
+            bool: True if the operation is a query or mutation, and none of
+                the resolvers it may call are coroutine functions.
+        """
+        is_sync = cached_document.sync_operations.get(operation_name)
+        if is_sync is None:
+            is_sync = self._analyse(schema, cached_document, operation_name)
+            cached_document.sync_operations[operation_name] = is_sync
+        return is_sync
+
+    def _analyse(
+            self,
+            schema: GraphQLSchema,
+            cached_document: CachedDocument,
+            operation_name: Optional[str]
+    ) -> bool:
+        if self.has_async_middleware or cached_document.has_subscription:
+            return False
+        document = cached_document.document
+        operation = get_operation_ast(document, operation_name)
+        if operation is None:
+            return False
+        root_type = _get_root_type(schema, operation)
+        if root_type is None:
+            return False
+        if self.assume_sync:
+            return True
+
+        fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        return _SelectionAnalyser(schema, fragments).is_sync(
+            root_type,
+            operation.selection_set
+        )
+
+
+class _SelectionAnalyser:
+
+    __slots__ = ('schema', 'fragments', 'visited_fragments', 'checked_types')
+
+    def __init__(
+            self,
+            schema: GraphQLSchema,
+            fragments: Mapping[str, FragmentDefinitionNode]
+    ) -> None:
+        self.schema = schema
+        self.fragments = fragments
+        self.visited_fragments: Set[str] = set()
+        # The abstract and object types with synchronous type resolution.
+        self.checked_types: Dict[str, bool] = {}
+
+    def is_sync(
+            self,
+            parent_type: GraphQLNamedType,
+            selection_set: SelectionSetNode
+    ) -> bool:
+        """Check the selections of a type, following fragments"""
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                if not self._is_field_sync(parent_type, selection):
+                    return False
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = (
+                    self.schema.get_type(selection.type_condition.name.value)
+                    if selection.type_condition is not None
+                    else parent_type
+                )
+                if fragment_type is not None and not self.is_sync(
+                        fragment_type,
+                        selection.selection_set
+                ):
+                    return False
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                # Fragment cycles are invalid, but validation may not have run.
+                if fragment is None or name in self.visited_fragments:
+                    continue
+                self.visited_fragments.add(name)
+                fragment_type = self.schema.get_type(
+                    fragment.type_condition.name.value
+                )
+                if fragment_type is not None and not self.is_sync(
+                        fragment_type,
+                        fragment.selection_set
+                ):
+                    return False
+        return True
+
+    def _is_field_sync(
+            self,
+            parent_type: GraphQLNamedType,
+            selection: FieldNode
+    ) -> bool:
+        name = selection.name.value
+        if name.startswith('__'):
+            # Introspection is synchronous.
+            return True
+        if not isinstance(parent_type, (GraphQLObjectType, GraphQLInterfaceType)):
+            return True
+
+        # A field of an interface is resolved by the implementing type.
+        object_types = (
+            self.schema.get_possible_types(parent_type)
+            if isinstance(parent_type, GraphQLInterfaceType)
+            else [parent_type]
+        )
+        for object_type in object_types:
+            field = object_type.fields.get(name)
+            if field is None:
+                continue
+            if is_async_callable(field.resolve):
+                return False
+            field_type = get_named_type(field.type)
+            if not self._is_type_sync(field_type):
+                return False
+            if selection.selection_set is not None and not self.is_sync(
+                    field_type,
+                    selection.selection_set
+            ):
+                return False
+        return True
+
+    def _is_type_sync(self, named_type: GraphQLNamedType) -> bool:
+        is_sync = self.checked_types.get(named_type.name)
+        if is_sync is not None:
+            return is_sync
+
+        if isinstance(named_type, (GraphQLInterfaceType, GraphQLUnionType)):
+            is_sync = not is_async_callable(named_type.resolve_type) and all(
+                not is_async_callable(object_type.is_type_of)
+                for object_type in self.schema.get_possible_types(named_type)
+            )
+        elif isinstance(named_type, GraphQLObjectType):
+            is_sync = not is_async_callable(named_type.is_type_of)
+        else:
+            is_sync = True
+        self.checked_types[named_type.name] = is_sync
+        return is_sync
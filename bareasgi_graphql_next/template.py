@@ -2,13 +2,53 @@
 Graphiql template
 """
 
+from functools import lru_cache
+import hashlib
 import json
 import string
-from typing import Any, Mapping, Optional
+from typing import TYPE_CHECKING, Any, Mapping, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .graphiql_assets import GraphiQLAssets
 
 GRAPHIQL_VERSION = '1.0.3'
 SUBSCRIPTIONS_TRANSPORT_VERSION = '0.7.3'
 
+CDN_URL = 'https://cdn.jsdelivr.net/npm/'
+
+# The scripts and styles of the page: the template variable, the file name
+# when served locally, and the path on the CDN.
+GRAPHIQL_ASSETS: Tuple[Tuple[str, str, str], ...] = (
+    ('graphiql_css', 'graphiql.css', 'graphiql@{graphiql}/graphiql.css'),
+    (
+        'polyfill_js',
+        'polyfill.min.js',
+        'promise-polyfill@8.1.3/dist/polyfill.min.js'
+    ),
+    ('unfetch_js', 'unfetch.umd.js', 'unfetch@4.1.0/dist/unfetch.umd.js'),
+    (
+        'react_js',
+        'react.production.min.js',
+        'react@16.13.1/umd/react.production.min.js'
+    ),
+    (
+        'react_dom_js',
+        'react-dom.production.min.js',
+        'react-dom@16.13.1/umd/react-dom.production.min.js'
+    ),
+    ('graphiql_js', 'graphiql.min.js', 'graphiql@{graphiql}/graphiql.min.js'),
+    (
+        'subscriptions_transport_js',
+        'subscriptions-transport-ws.js',
+        'subscriptions-transport-ws@{subscriptions_transport}/browser/client.js'
+    ),
+    (
+        'subscriptions_fetcher_js',
+        'graphiql-subscriptions-fetcher.js',
+        'graphiql-subscriptions-fetcher@0.0.2/browser/client.js'
+    )
+)
+
 GRAPHIQL_TEMPLATE = string.Template(
     """
 <!DOCTYPE html>
@@ -27,14 +67,14 @@ GRAPHIQL_TEMPLATE = string.Template(
         height: 100vh;
       }
     </style>
-    <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/graphiql@${graphiql_version}/graphiql.css" />
-    <script src="//cdn.jsdelivr.net/npm/promise-polyfill@8.1.3/dist/polyfill.min.js"></script>
-    <script src="//cdn.jsdelivr.net/npm/unfetch@4.1.0/dist/unfetch.umd.js"></script>
-    <script src="//cdn.jsdelivr.net/npm/react@16.13.1/umd/react.production.min.js"></script>
-    <script src="//cdn.jsdelivr.net/npm/react-dom@16.13.1/umd/react-dom.production.min.js"></script>
-    <script src="//cdn.jsdelivr.net/npm/graphiql@${graphiql_version}/graphiql.min.js"></script>
-    <script src="//cdn.jsdelivr.net/npm/subscriptions-transport-ws@${subscriptions_transport_version}/browser/client.js"></script>
-    <script src="//cdn.jsdelivr.net/npm/graphiql-subscriptions-fetcher@0.0.2/browser/client.js"></script>
+    <link rel="stylesheet" href="${graphiql_css}" />
+    <script src="${polyfill_js}"></script>
+    <script src="${unfetch_js}"></script>
+    <script src="${react_js}"></script>
+    <script src="${react_dom_js}"></script>
+    <script src="${graphiql_js}"></script>
+    <script src="${subscriptions_transport_js}"></script>
+    <script src="${subscriptions_fetcher_js}"></script>
   </head>
   <body>
     <div id="graphiql">Loading...</div>
@@ -154,14 +194,83 @@ def make_template(
         graphiql_version: str = GRAPHIQL_VERSION,
         subscriptions_transport_version: str = SUBSCRIPTIONS_TRANSPORT_VERSION,
         title: str = 'GraphiQL',
-        headers: Optional[Mapping[str, Any]] = None
+        headers: Optional[Mapping[str, Any]] = None,
+        asset_urls: Optional[Mapping[str, str]] = None
 ) -> str:
+    """Render the GraphiQL page.
+
+    Args:
+        host (str): The host.
+        query_url (str): The URL of the query endpoint.
+        subscription_url (str): The URL of the WebSocket endpoint.
+        graphiql_version (str, optional): The version of GraphiQL on the CDN.
+            Defaults to GRAPHIQL_VERSION.
+        subscriptions_transport_version (str, optional): The version of the
+            subscriptions transport on the CDN. Defaults to
+            SUBSCRIPTIONS_TRANSPORT_VERSION.
+        title (str, optional): The page title. Defaults to 'GraphiQL'.
+        headers (Optional[Mapping[str, Any]], optional): The initial request
+            headers. Defaults to None.
+        asset_urls (Optional[Mapping[str, str]], optional): The URLs of the
+            scripts and styles keyed by template variable. Defaults to None,
+            which uses the CDN.
+
+    Returns:
+        str: The page.
+    """
+    if asset_urls is None:
+        asset_urls = {
+            variable: CDN_URL + path.format(
+                graphiql=graphiql_version,
+                subscriptions_transport=subscriptions_transport_version
+            )
+            for variable, _, path in GRAPHIQL_ASSETS
+        }
     return GRAPHIQL_TEMPLATE.substitute(
+        asset_urls,
         host=host,
         query_url=query_url,
         subscription_url=subscription_url,
-        graphiql_version=graphiql_version,
-        subscriptions_transport_version=subscriptions_transport_version,
         graphiql_html_title=title,
         headers=json.dumps(headers or {})
     )
+
+
+class GraphiQLPage(NamedTuple):
+    """A rendered GraphiQL page"""
+    body: bytes
+    etag: bytes
+
+
+@lru_cache(maxsize=32)
+def make_graphiql_page(
+        scheme: str,
+        host: str,
+        path_prefix: str,
+        assets: Optional["GraphiQLAssets"] = None
+) -> GraphiQLPage:
+    """Make the GraphiQL page for a host, caching the most recent pages.
+
+    Args:
+        scheme (str): The scheme of the request ("http" or "https").
+        host (str): The host of the request.
+        path_prefix (str): The path prefix of the endpoints.
+        assets (Optional[GraphiQLAssets], optional): The locally served
+            assets, or None to use the CDN. Defaults to None.
+
+    Returns:
+        GraphiQLPage: The page and its entity tag.
+    """
+    ws_scheme = 'ws' if scheme == 'http' else 'wss'
+    body = make_template(
+        host,
+        f'{scheme}://{host}{path_prefix}/graphql',
+        f'{ws_scheme}://{host}{path_prefix}/subscriptions',
+        asset_urls=(
+            None
+            if assets is None
+            else assets.urls(f'{path_prefix}/graphiql/assets/')
+        )
+    ).encode('utf-8')
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    return GraphiQLPage(body, f'"{etag}"'.encode('ascii'))
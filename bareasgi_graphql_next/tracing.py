@@ -0,0 +1,247 @@
+"""Resolver tracing in the Apollo tracing format"""
+
+from datetime import datetime, timezone
+from inspect import isawaitable
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from bareutils import header
+from graphql import ExecutionResult, GraphQLResolveInfo, MiddlewareManager
+
+TRACE_KEY = 'bareasgi_graphql_next.trace'
+
+# The phases reported in the trace, keyed by the name of the phase timer.
+TRACED_PHASES = {
+    'parse': 'parsing',
+    'validate': 'validation'
+}
+
+
+def _format_time(value: datetime) -> str:
+    return value.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+class Trace:
+    """The resolver timings of an operation"""
+
+    __slots__ = ('start_time', 'start', 'phases', 'resolvers')
+
+    def __init__(self) -> None:
+        self.start_time = datetime.now(timezone.utc)
+        self.start = time.perf_counter_ns()
+        self.phases: Dict[str, Dict[str, int]] = {}
+        self.resolvers: List[Dict[str, Any]] = []
+
+    def add_phase(self, phase: str, seconds: float) -> None:
+        """Add the timing of a phase which has just finished.
+
+        Args:
+            phase (str): The phase (e.g. "parse" or "validate"). Phases which
+                are not part of the Apollo tracing format are ignored.
+            seconds (float): The duration in seconds.
+        """
+        name = TRACED_PHASES.get(phase)
+        if name is None:
+            return
+        duration = int(seconds * 1e9)
+        self.phases[name] = {
+            'startOffset': max(time.perf_counter_ns() - duration - self.start, 0),
+            'duration': duration
+        }
+
+    def add(self, info: GraphQLResolveInfo, start: int, end: int) -> None:
+        """Add the timing of a resolver.
+
+        Args:
+            info (GraphQLResolveInfo): The resolver info.
+            start (int): The start time from `time.perf_counter_ns`.
+            end (int): The end time from `time.perf_counter_ns`.
+        """
+        self.resolvers.append({
+            'path': info.path.as_list(),
+            'parentType': info.parent_type.name,
+            'fieldName': info.field_name,
+            'returnType': str(info.return_type),
+            'startOffset': start - self.start,
+            'duration': end - start
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Format the trace in the Apollo tracing format.
+
+        Returns:
+            Dict[str, Any]: The trace.
+        """
+        duration = time.perf_counter_ns() - self.start
+        end_time = datetime.now(timezone.utc)
+        return {
+            'version': 1,
+            'startTime': _format_time(self.start_time),
+            'endTime': _format_time(end_time),
+            'duration': duration,
+            **self.phases,
+            'execution': {
+                'resolvers': self.resolvers
+            }
+        }
+
+
+class TracingMiddleware:
+    """A graphql middleware recording the timings of the resolvers"""
+
+    def __init__(
+            self,
+            sample_rate: float = 0.0,
+            header_name: Optional[bytes] = b'x-graphql-tracing',
+            sample: Callable[[], float] = random.random
+    ) -> None:
+        """A graphql middleware recording the timings of the resolvers.
+
+        An operation is traced if the request has the tracing header, or it
+        is chosen by the sample rate. The trace is returned in
+        `extensions.tracing` in the Apollo tracing format. When the
+        controller starts the trace before the operation is parsed, the trace
+        includes the parsing and validation phases.
+
+        Args:
+            sample_rate (float, optional): The fraction of operations to
+                trace. Defaults to 0.0.
+            header_name (Optional[bytes], optional): The request header which
+                turns tracing on, or None to only use the sample rate.
+                Defaults to b'x-graphql-tracing'.
+            sample (Callable[[], float], optional): A function returning a
+                random number between 0 and 1. Defaults to random.random.
+        """
+        self.sample_rate = sample_rate
+        self.header_name = header_name
+        self.sample = sample
+
+    def start(self, request: Any) -> Optional[Trace]:
+        """Decide whether an operation is traced, before it is parsed.
+
+        The decision is kept in the request context, which must belong to the
+        one operation.
+
+        Args:
+            request (Any): The bareASGI request.
+
+        Returns:
+            Optional[Trace]: The trace, or None if the operation is not
+                traced.
+        """
+        trace = self._start_trace(request)
+        request.context[TRACE_KEY] = trace
+        return trace or None
+
+    def resolve(
+            self,
+            next_: Callable,
+            root: Any,
+            info: GraphQLResolveInfo,
+            **args: Any
+    ) -> Any:
+        """Resolve a field, recording the timing when the operation is traced.
+
+        Args:
+            next_ (Callable): The next resolver.
+            root (Any): The parent value.
+            info (GraphQLResolveInfo): The resolver info.
+
+        Returns:
+            Any: The resolved value.
+        """
+        # The context value is the bareASGI request.
+        context = getattr(info.context, 'context', None)
+        if context is None:
+            return next_(root, info, **args)
+
+        trace = context.get(TRACE_KEY)
+        if trace is None:
+            # The first field decides whether the operation is traced.
+            trace = self._start_trace(info.context)
+            context[TRACE_KEY] = trace
+        if trace is False:
+            return next_(root, info, **args)
+
+        start = time.perf_counter_ns()
+        result = next_(root, info, **args)
+        if isawaitable(result):
+            return self._trace_async(trace, info, start, result)
+        trace.add(info, start, time.perf_counter_ns())
+        return result
+
+    @classmethod
+    async def _trace_async(
+            cls,
+            trace: Trace,
+            info: GraphQLResolveInfo,
+            start: int,
+            result: Any
+    ) -> Any:
+        try:
+            return await result
+        finally:
+            trace.add(info, start, time.perf_counter_ns())
+
+    def _start_trace(self, request: Any) -> Any:
+        if self.header_name is not None and header.find(
+                self.header_name,
+                request.scope['headers']
+        ):
+            return Trace()
+        if self.sample_rate > 0 and self.sample() < self.sample_rate:
+            return Trace()
+        return False
+
+
+def find_tracing_middleware(
+        middleware: Optional[Union[Tuple, List, MiddlewareManager]]
+) -> Optional[TracingMiddleware]:
+    """Find the tracing middleware.
+
+    Args:
+        middleware (Optional[Union[Tuple, List, MiddlewareManager]]): The
+            graphql middleware.
+
+    Returns:
+        Optional[TracingMiddleware]: The tracing middleware, or None if there
+            is none.
+    """
+    if isinstance(middleware, MiddlewareManager):
+        middleware = middleware.middlewares
+    for item in middleware or ():
+        if isinstance(item, TracingMiddleware):
+            return item
+    return None
+
+
+def get_trace(request: Any) -> Optional[Trace]:
+    """Get the trace of an operation.
+
+    Args:
+        request (Any): The bareASGI request, or another context value.
+
+    Returns:
+        Optional[Trace]: The trace, or None if the operation is not traced.
+    """
+    context = getattr(request, 'context', None)
+    if context is None:
+        return None
+    return context.get(TRACE_KEY) or None
+
+
+def add_trace(result: ExecutionResult, context: Dict[str, Any]) -> None:
+    """Add the trace of an operation to the result extensions.
+
+    Args:
+        result (ExecutionResult): The result of the operation.
+        context (Dict[str, Any]): The request context.
+    """
+    trace = context.get(TRACE_KEY)
+    if not trace:
+        return
+    result.extensions = {
+        **(result.extensions or {}),
+        'tracing': trace.to_dict()
+    }
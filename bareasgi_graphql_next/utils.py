@@ -4,92 +4,225 @@ Utilities
 
 import asyncio
 from asyncio import Event
-from typing import AsyncIterator, Iterable, Optional, Set, Tuple, TYPE_CHECKING
-
-from bareasgi import (
-    make_middleware_chain,
-    HttpRequest,
-    HttpRequestCallback,
-    HttpMiddlewareCallback
+from inspect import isawaitable
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+    TYPE_CHECKING
 )
+
+import graphql
 from graphql import (
+    BREAK,
     DefinitionNode,
+    DirectiveNode,
     DocumentNode,
     MapAsyncIterator,
+    MiddlewareManager,
     OperationDefinitionNode,
-    OperationType
+    OperationType,
+    Visitor
 )
 
 if TYPE_CHECKING:
     # pylint: disable=ungrouped-imports
     from asyncio import Future
-    from typing import Any
+
+    # The worker processes use this module, but not bareASGI.
+    from bareasgi import (
+        HttpRequest,
+        HttpRequestCallback,
+        HttpMiddlewareCallback
+    )
+
+INCREMENTAL_DIRECTIVES = ('defer', 'stream')
+
+
+class SubscriptionIterator:
+    """A compact replacement for the graphql `MapAsyncIterator`.
+
+    The `MapAsyncIterator` starts two tasks and an event for every value it
+    waits for, so it can be closed while a value is pending. The streams in
+    this package are stopped by cancelling the task waiting for the value, so
+    the source can be awaited directly.
+    """
+
+    __slots__ = ('iterator', 'callback', 'reject_callback', 'is_closed')
+
+    def __init__(
+            self,
+            iterator: AsyncIterator,
+            callback: Callable[[Any], Any],
+            reject_callback: Optional[Callable[[Exception], Any]] = None
+    ) -> None:
+        """A compact replacement for the graphql `MapAsyncIterator`.
+
+        Args:
+            iterator (AsyncIterator): The source of the events.
+            callback (Callable[[Any], Any]): The function mapping an event to
+                a result.
+            reject_callback (Optional[Callable[[Exception], Any]], optional):
+                The function mapping an error to a result. Defaults to None.
+        """
+        self.iterator = iterator
+        self.callback = callback
+        self.reject_callback = reject_callback
+        self.is_closed = False
+
+    def __aiter__(self) -> 'SubscriptionIterator':
+        return self
+
+    async def __anext__(self) -> Any:
+        if self.is_closed:
+            raise StopAsyncIteration
+        try:
+            value = await self.iterator.__anext__()
+        except StopAsyncIteration:
+            raise
+        except Exception as error:  # pylint: disable=broad-except
+            if self.reject_callback is None:
+                raise
+            result = self.reject_callback(error)
+        else:
+            result = self.callback(value)
+        return await result if isawaitable(result) else result
+
+    async def aclose(self) -> None:
+        """Close the iterator and its source."""
+        if self.is_closed:
+            return
+        self.is_closed = True
+        aclose = getattr(self.iterator, 'aclose', None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except RuntimeError:
+                pass
+
+
+def compact_subscription(result: Any) -> Any:
+    """Replace a `MapAsyncIterator` with a `SubscriptionIterator`.
+
+    Args:
+        result (Any): The result of a subscription.
+
+    Returns:
+        Any: The result, with a `MapAsyncIterator` replaced.
+    """
+    if isinstance(result, MapAsyncIterator) and not result.is_closed:
+        return SubscriptionIterator(
+            result.iterator,
+            result.callback,
+            result.reject_callback
+        )
+    return result
 
 
 async def cancellable_aiter(
-        async_iterator: MapAsyncIterator,
-        cancellation_event: Event,
+        async_iterator: AsyncIterator,
+        cancellation: "Union[Event, Future[Any]]",
         *,
         cancel_pending: bool = True,
         timeout: Optional[float] = None
 ) -> AsyncIterator:
-    """[summary]
+    """Iterate until cancelled.
+
+    When the cancellation is a future it can be shared by many iterators, so
+    only the task fetching the next value is live for each iterator.
 
     Args:
-        async_iterator (MapAsyncIterator): The iterator to use
-        cancellation_event (Event): A cancellable event
+        async_iterator (AsyncIterator): The iterator to use
+        cancellation (Union[Event, Future[Any]]): An event which is set, or
+            a future which is done, to cancel the iteration.
         cancel_pending (bool, optional): If True cancel pendings. Defaults to
             True.
-        timeout (Optional[float], optional): A timeout. Defaults to None.
+        timeout (Optional[float], optional): If given None is yielded when
+            no value has arrived for this many seconds. Defaults to None.
 
     Returns:
         AsyncIterator: The async iterator
     """
-    result_iter = async_iterator.__aiter__()
-    cancellation_task = asyncio.create_task(cancellation_event.wait())
-    pending: Set["Future[Any]"] = {
-        cancellation_task,
-        asyncio.create_task(result_iter.__anext__())
-    }
-
-    if timeout is None:
-        sleep_task: "Optional[Future[Any]]" = None
+    if isinstance(cancellation, Event):
+        is_cancelled: Callable[[], bool] = cancellation.is_set
+        cancellation_task: "Future[Any]" = asyncio.create_task(
+            cancellation.wait()
+        )
     else:
-        sleep_task = asyncio.create_task(asyncio.sleep(timeout))
-        pending.add(sleep_task)
+        is_cancelled = cancellation.done
+        cancellation_task = cancellation
 
-    while not cancellation_event.is_set():
-        try:
-            done, pending = await asyncio.wait(
-                pending,
+    result_iter = async_iterator.__aiter__()
+    loop = asyncio.get_running_loop()
+    anext_task: "Future[Any]" = asyncio.ensure_future(result_iter.__anext__())
+    deadline = None if timeout is None else loop.time() + timeout
+
+    try:
+        while not is_cancelled():
+            await asyncio.wait(
+                (cancellation_task, anext_task),
+                timeout=None if deadline is None else deadline - loop.time(),
                 return_when=asyncio.FIRST_COMPLETED
             )
-        except asyncio.CancelledError:
-            for pending_task in pending:
-                pending_task.cancel()
-            raise
 
-        for done_task in done:
-            if done_task == cancellation_task:
-                for pending_task in pending:
-                    if cancel_pending:
-                        pending_task.cancel()
-                    else:
-                        await pending_task
-                        yield pending_task.result()
-                break
-            elif done_task == sleep_task:
+            if anext_task.done():
+                try:
+                    result = anext_task.result()
+                except StopAsyncIteration:
+                    # The source has finished.
+                    return
+                yield result
+                anext_task = asyncio.ensure_future(result_iter.__anext__())
+            elif not is_cancelled():
+                # The timeout has passed with no value.
                 yield None
-            else:
-                yield done_task.result()
-                pending.add(asyncio.create_task(result_iter.__anext__()))
-        else:
-            if timeout is not None:
-                if sleep_task in pending:
-                    sleep_task.cancel()
-                    pending.discard(sleep_task)
-                sleep_task = asyncio.create_task(asyncio.sleep(timeout))
-                pending.add(sleep_task)
+
+            if deadline is not None:
+                deadline = loop.time() + cast(float, timeout)
+
+        if not cancel_pending:
+            await asyncio.wait((anext_task,))
+            if not isinstance(anext_task.exception(), StopAsyncIteration):
+                yield anext_task.result()
+    finally:
+        # Wait for the outstanding tasks to finish cancelling, so the iterator
+        # can be closed as soon as this returns.
+        pending = {
+            task
+            for task in (anext_task, cancellation_task)
+            if not (task.done() or task is cancellation)
+        }
+        for pending_task in pending:
+            pending_task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+
+def append_middleware(
+        middleware: Optional[Union[Tuple, List, MiddlewareManager]],
+        item: Any
+) -> Union[List, MiddlewareManager]:
+    """Add graphql middleware after the existing middleware.
+
+    Args:
+        middleware (Optional[Union[Tuple, List, MiddlewareManager]]): The
+            existing middleware.
+        item (Any): The middleware to add.
+
+    Returns:
+        Union[List, MiddlewareManager]: The middleware.
+    """
+    if middleware is None:
+        return [item]
+    if isinstance(middleware, MiddlewareManager):
+        return MiddlewareManager(*middleware.middlewares, item)
+    return [*middleware, item]
 
 
 def _is_subscription(definition: DefinitionNode) -> bool:
@@ -111,14 +244,53 @@ def has_subscription(document: DocumentNode) -> bool:
     return any(_is_subscription(definition) for definition in document.definitions)
 
 
+class _IncrementalDeliveryVisitor(Visitor):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.found = False
+
+    def enter_directive(self, node: DirectiveNode, *_args: Any) -> Any:
+        """Stop at the first incremental delivery directive"""
+        if node.name.value in INCREMENTAL_DIRECTIVES:
+            self.found = True
+            return BREAK
+        return None
+
+
+def has_incremental_delivery(document: DocumentNode) -> bool:
+    """Check if a document uses the `@defer` or `@stream` directives
+
+    Args:
+        document (DocumentNode): The document
+
+    Returns:
+        bool: True if the document requests incremental delivery
+    """
+    visitor = _IncrementalDeliveryVisitor()
+    graphql.visit(document, visitor)
+    return visitor.found
+
+
+def is_incremental_delivery_supported() -> bool:
+    """Check if the installed graphql-core supports incremental delivery
+
+    Returns:
+        bool: True if `@defer` and `@stream` can be executed incrementally.
+    """
+    return hasattr(graphql.execution, 'experimental_execute_incrementally')
+
+
 def wrap_middleware(
-        middleware: Optional[HttpMiddlewareCallback],
-        handler: HttpRequestCallback
-) -> HttpRequestCallback:
+        middleware: Optional["HttpMiddlewareCallback"],
+        handler: "HttpRequestCallback"
+) -> "HttpRequestCallback":
     """Optionally wrap a handler with middleware"""
     if middleware is None:
         return handler
     else:
+        # pylint: disable=import-outside-toplevel
+        from bareasgi import make_middleware_chain
         return make_middleware_chain(middleware, handler=handler)
 
 
@@ -184,9 +356,28 @@ def _first_valid_header(
     )
 
 
-def get_host(request: HttpRequest) -> str:
+def _forwarded_parameter(
+        name: bytes,
+        headers: Iterable[Tuple[bytes, bytes]]
+) -> Optional[bytes]:
+    # The first element of the RFC 7239 forwarded header was added by the
+    # proxy nearest the client.
+    forwarded = _first_valid_header(b'forwarded', headers, None)
+    if not forwarded:
+        return None
+    for pair in forwarded.split(b',', 1)[0].split(b';'):
+        key, separator, value = pair.partition(b'=')
+        if separator and key.strip().lower() == name:
+            return value.strip().strip(b'"') or None
+    return None
+
+
+def get_host(request: "HttpRequest") -> str:
     """Get the host from the header of an http request.
 
+    The `forwarded` header is preferred to the `x-forwarded-host` header,
+    which is preferred to the `host` header.
+
     Args:
         request (HttpRequest): The request.
 
@@ -197,7 +388,9 @@ def get_host(request: HttpRequest) -> str:
         str: The host.
     """
     headers = request.scope['headers']
-    host = _first_valid_header(b'x-forwarded-host', headers, None)
+    host = _forwarded_parameter(b'host', headers)
+    if not host:
+        host = _first_valid_header(b'x-forwarded-host', headers, None)
     if not host:
         host = _first_valid_header(b'host', headers, None)
     if not host:
@@ -205,18 +398,43 @@ def get_host(request: HttpRequest) -> str:
     return host.decode()
 
 
-def get_scheme(request: HttpRequest) -> str:
+def get_scheme(request: "HttpRequest") -> str:
     """Get the scheme from the http request.
 
+    The `forwarded` header is preferred to the `x-forwarded-proto` header,
+    which is preferred to the scheme of the connection.
+
     Args:
         request (HttpRequest): The request.
 
     Returns:
         str: The scheme.
     """
-    scheme = _first_valid_header(
-        b'x-forwarded-proto',
-        request.scope['headers'],
-        None
-    )
+    headers = request.scope['headers']
+    scheme = _forwarded_parameter(b'proto', headers)
+    if not scheme:
+        scheme = _first_valid_header(b'x-forwarded-proto', headers, None)
     return scheme.decode() if scheme else request.scope['scheme']
+
+
+def etag_matches(request: "HttpRequest", etag: bytes) -> bool:
+    """Check if the `if-none-match` header of a request matches an entity
+    tag, so the response is not modified.
+
+    Args:
+        request (HttpRequest): The request.
+        etag (bytes): The quoted entity tag.
+
+    Returns:
+        bool: True if the tag matches.
+    """
+    for name, value in request.scope['headers']:
+        if name.lower() != b'if-none-match':
+            continue
+        for candidate in value.split(b','):
+            candidate = candidate.strip()
+            if candidate.startswith(b'W/'):
+                candidate = candidate[2:]
+            if candidate in (etag, b'*'):
+                return True
+    return False
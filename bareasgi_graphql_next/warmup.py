@@ -0,0 +1,213 @@
+"""Warming up a controller before it serves requests"""
+
+import gc
+import logging
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence
+)
+
+from graphql import (
+    GraphQLError,
+    GraphQLSchema,
+    OperationDefinitionNode,
+    introspection_from_schema
+)
+
+from .cost import QueryCostAnalyser
+from .document_cache import DocumentCache
+
+if TYPE_CHECKING:
+    from .controller import GraphQLControllerBase
+
+LOGGER = logging.getLogger(__name__)
+
+
+class WarmUp:
+    """Work done before the first request is served"""
+
+    def __init__(
+            self,
+            operations: Iterable[str] = (),
+            *,
+            graphiql_hosts: Sequence[str] = (),
+            introspection: bool = True,
+            prefork: bool = False
+    ) -> None:
+        """Work done before the first request is served.
+
+        The operations are parsed, validated and have their static costs
+        calculated, so the first requests find them in the document cache.
+        The GraphiQL page is rendered for each of the hosts, and the
+        introspection result is built to seed the introspection cache of the
+        controller.
+
+        By default this happens in the startup handler. With `prefork` it
+        happens when the helper is called, which for a server with
+        `--preload` is in the master process before the workers are forked.
+        The objects are then moved to the permanent generation with
+        `gc.freeze()`, so the collector in the workers does not touch them
+        and their pages stay shared.
+
+        Args:
+            operations (Iterable[str], optional): The queries of the hot
+                operations. Defaults to ().
+            graphiql_hosts (Sequence[str], optional): The hosts, as sent in
+                the `host` header (e.g. `"api.example.com"`), to render the
+                GraphiQL page for. Defaults to ().
+            introspection (bool, optional): If True build the introspection
+                result, which is used when the controller caches
+                introspection. Defaults to True.
+            prefork (bool, optional): If True warm up when the helper is
+                called and freeze the objects. Defaults to False.
+        """
+        self.operations = list(operations)
+        self.graphiql_hosts = graphiql_hosts
+        self.introspection = introspection
+        self.prefork = prefork
+        self.document_cache: Optional[DocumentCache] = None
+        self.introspection_result: Optional[Dict[str, Any]] = None
+
+    @property
+    def is_prepared(self) -> bool:
+        """True if the warm up has been done"""
+        return self.document_cache is not None
+
+    def prepare(
+            self,
+            schema: GraphQLSchema,
+            cost_analyser: Optional[QueryCostAnalyser] = None,
+            path_prefix: str = '',
+            graphiql_assets_path: Optional[str] = None
+    ) -> None:
+        """Do the warm up.
+
+        Operations which fail to parse or validate are logged and skipped.
+
+        Args:
+            schema (GraphQLSchema): The schema.
+            cost_analyser (Optional[QueryCostAnalyser], optional): The cost
+                analyser of the controller. Defaults to None.
+            path_prefix (str, optional): The path prefix of the controller.
+                Defaults to ''.
+            graphiql_assets_path (Optional[str], optional): The directory of
+                the GraphiQL assets of the controller. Defaults to None.
+        """
+        start = time.perf_counter()
+        document_cache = DocumentCache()
+        failed = 0
+        for query in self.operations:
+            errors = self._prepare_operation(
+                document_cache,
+                schema,
+                cost_analyser,
+                query
+            )
+            if errors:
+                failed += 1
+                LOGGER.warning(
+                    'Failed to warm up operation %r: %s',
+                    query[:80],
+                    '; '.join(error.message for error in errors)
+                )
+
+        if self.graphiql_hosts:
+            # pylint: disable=import-outside-toplevel
+            from .graphiql_assets import load_graphiql_assets
+            from .template import make_graphiql_page
+            assets = (
+                None
+                if graphiql_assets_path is None
+                else load_graphiql_assets(graphiql_assets_path)
+            )
+            for host in self.graphiql_hosts:
+                for scheme in ('http', 'https'):
+                    make_graphiql_page(scheme, host, path_prefix, assets)
+
+        if self.introspection:
+            self.introspection_result = introspection_from_schema(schema)
+
+        self.document_cache = document_cache
+
+        if self.prefork:
+            gc.collect()
+            gc.freeze()
+
+        LOGGER.info(
+            'Warmed up %d operations (%d failed) in %.3fs',
+            len(self.operations) - failed,
+            failed,
+            time.perf_counter() - start
+        )
+
+    def apply(self, controller: "GraphQLControllerBase") -> None:
+        """Give the warmed up state to a controller, warming up first if
+        necessary.
+
+        Args:
+            controller (GraphQLControllerBase): The controller.
+        """
+        if not self.is_prepared:
+            self.prepare(
+                controller.graphql_schema,
+                controller.options.cost_analyser,
+                controller.path_prefix,
+                (
+                    None
+                    if controller.graphiql_assets is None
+                    else controller.graphiql_assets.directory
+                )
+            )
+        if self.document_cache is not None:
+            controller.document_cache = self.document_cache
+        if (
+                self.introspection_result is not None and
+                controller.introspection_cache is not None
+        ):
+            # pylint: disable=import-outside-toplevel
+            from .introspection import STANDARD_INTROSPECTION_QUERY
+            for operation_name in (None, 'IntrospectionQuery'):
+                controller.introspection_cache.seed(
+                    STANDARD_INTROSPECTION_QUERY,
+                    operation_name,
+                    self.introspection_result
+                )
+            controller.introspection_cache.sdl(controller.graphql_schema)
+
+    @classmethod
+    def _prepare_operation(
+            cls,
+            document_cache: DocumentCache,
+            schema: GraphQLSchema,
+            cost_analyser: Optional[QueryCostAnalyser],
+            query: str
+    ) -> List[GraphQLError]:
+        try:
+            cached_document = document_cache.get(query)
+        except GraphQLError as error:
+            return [error]
+
+        errors = cached_document.validate(schema)
+        if errors or cost_analyser is None:
+            return errors
+
+        operation_names: List[Optional[str]] = [None]
+        for definition in cached_document.document.definitions:
+            if isinstance(definition, OperationDefinitionNode) and definition.name:
+                operation_names.append(definition.name.value)
+        for operation_name in operation_names:
+            query_cost = cost_analyser.analyse(
+                schema,
+                cached_document.document,
+                operation_name,
+                None
+            )
+            if query_cost.is_static:
+                cached_document.costs[operation_name] = query_cost
+        return []
@@ -4,6 +4,7 @@ from abc import ABCMeta, abstractmethod
 import asyncio
 import json
 import logging
+import time
 from typing import (
     Any,
     AsyncIterator,
@@ -17,17 +18,26 @@ from typing import (
     Set,
     Tuple,
     Union,
+    cast,
+    TYPE_CHECKING
 )
 
-from bareasgi import WebSocket
-import graphql
+from bareasgi import WebSocketRequest
 from graphql import ExecutionResult, GraphQLError, MapAsyncIterator
 
-from .utils import has_subscription
+from .metrics import PhaseTimer
+from .process_pool import EncodedExecutionResult
+from .subscriptions import SubscriptionInfo
+from .tracing import add_trace
+from .utils import compact_subscription
+
+if TYPE_CHECKING:
+    from .controller import GraphQLControllerBase
 
 logger = logging.getLogger(__name__)
 
 WS_INTERNAL_ERROR = 1011
+WS_SERVICE_RESTART = 1012
 WS_PROTOCOL = "graphql-ws"
 
 GQL_CONNECTION_INIT = "connection_init"  # Client -> Server
@@ -52,11 +62,27 @@ Id = Union[str, int]
 class GraphQLWebSocketHandlerInstanceBase(metaclass=ABCMeta):
     """A GraphQL WebSocket handler instance"""
 
-    def __init__(self, web_socket: WebSocket, dumps: Callable[[Any], str]) -> None:
-        self.web_socket = web_socket
+    __slots__ = (
+        'request',
+        'web_socket',
+        '_subscriptions',
+        '_is_closed',
+        'dumps',
+        'controller'
+    )
+
+    def __init__(
+            self,
+            request: WebSocketRequest,
+            dumps: Callable[[Any], str],
+            controller: "GraphQLControllerBase"
+    ) -> None:
+        self.request = request
+        self.web_socket = request.web_socket
         self._subscriptions: MutableMapping[Id, asyncio.Future] = {}
         self._is_closed = False
         self.dumps = dumps
+        self.controller = controller
 
     async def start(self, subprotocols: Iterable[str]):
         """Start the WebSocket connection
@@ -71,6 +97,41 @@ class GraphQLWebSocketHandlerInstanceBase(metaclass=ABCMeta):
             raise ProtocolError(f"Expected subprotocol '{WS_PROTOCOL}")
         await self.web_socket.accept(WS_PROTOCOL)
 
+        if self.controller.is_draining:
+            # Send the client to another server.
+            await self.web_socket.close(WS_SERVICE_RESTART)
+            return
+
+        self.controller.websocket_instances[self] = cast(
+            asyncio.Task,
+            asyncio.current_task()
+        )
+        try:
+            await self._run()
+        finally:
+            del self.controller.websocket_instances[self]
+
+    async def drain(self, delay: float) -> None:
+        """Complete the subscriptions and close the connection.
+
+        Args:
+            delay (float): The time to wait before closing the connection.
+        """
+        await asyncio.sleep(delay)
+        if self._is_closed:
+            return
+
+        try:
+            for id_, future in list(self._subscriptions.items()):
+                await self._stop_subscription(future)
+                await self.web_socket.send(self._to_message(GQL_COMPLETE, id_))
+            self._is_closed = True
+            await self.web_socket.close(WS_SERVICE_RESTART)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to drain the connection.")
+
+    async def _run(self) -> None:
+
         _type = GQL_CONNECTION_KEEP_ALIVE
 
         read_task: Optional[asyncio.Task] = None
@@ -103,6 +164,10 @@ class GraphQLWebSocketHandlerInstanceBase(metaclass=ABCMeta):
                     # Subscription tasks are done when they complete or are cancelled.
                     self._remove_subscription(task)
 
+        # The connection may have been closed while a read was pending.
+        if read_task is not None and not read_task.done():
+            read_task.cancel()
+
         await self._unsubscribe_all()
         if not self._is_closed:
             await self.web_socket.close()
@@ -182,6 +247,7 @@ class GraphQLWebSocketHandlerInstanceBase(metaclass=ABCMeta):
     @abstractmethod
     async def query(
             self,
+            request: WebSocketRequest,
             query: str,
             variables: Optional[Dict[str, Any]],
             operation_name: Optional[str]
@@ -189,6 +255,8 @@ class GraphQLWebSocketHandlerInstanceBase(metaclass=ABCMeta):
         """Execute a query
 
         Args:
+            request (WebSocketRequest): The request of the operation, which
+                has its own context.
             query (str): The subscription query.
             variables (Optional[Dict[str, Any]]): Optional variables.
             operation_name (Optional[str]): An optional operation name.
@@ -210,43 +278,95 @@ class GraphQLWebSocketHandlerInstanceBase(metaclass=ABCMeta):
             query, variable_values, operation_name = self._parse_start_payload(
                 payload)
 
-            document = graphql.parse(query)
-            # noinspection PyUnresolvedReferences
-            if has_subscription(document):
-                result: Union[MapAsyncIterator, ExecutionResult] = await self.subscribe(
-                    query,
-                    variable_values,
-                    operation_name
+            # Each operation has its own context, as the connection is shared.
+            request = WebSocketRequest(
+                self.request.scope,
+                self.request.info,
+                dict(self.request.context),
+                self.request.matches,
+                self.web_socket
+            )
+            cached_document = self.controller.prepare_operation(
+                request,
+                query,
+                variable_values,
+                operation_name
+            )
+            if not cached_document.has_subscription:
+                # Queries run as tasks, so they are cancelled when the client
+                # stops them or disconnects.
+                self._subscriptions[id_] = asyncio.create_task(
+                    self._process_query(
+                        request,
+                        id_,
+                        query,
+                        variable_values,
+                        operation_name
+                    )
                 )
-            else:
-                result = await self.query(
+                return True
+
+            result = compact_subscription(
+                await self.subscribe(
                     query,
                     variable_values,
                     operation_name
                 )
+            )
 
             if isinstance(result, ExecutionResult):
                 await self._send_execution_result(id_, result)
                 return True
 
-            self._add_subscription(id_, result)
+            self._add_subscription(
+                id_,
+                result,
+                self.controller.metrics.timer('websocket', operation_name),
+                self.controller.register_subscription(
+                    query,
+                    operation_name,
+                    'websocket',
+                    result
+                )
+            )
 
         except Exception as error:  # pylint: disable=broad-except
             await self._send_error(GQL_ERROR, id_, error)
 
-    def _add_subscription(self, id_: Id, result: AsyncIterator) -> None:
-        self._subscriptions[id_] = asyncio.create_task(
-            self._process_subscription(id_, result)
+    def _add_subscription(
+            self,
+            id_: Id,
+            result: AsyncIterator,
+            timer: PhaseTimer,
+            info: SubscriptionInfo
+    ) -> None:
+        task = asyncio.create_task(
+            self._process_subscription(id_, result, timer, info)
         )
+        # The task may be cancelled before it starts, so the subscription is
+        # unregistered when it is done rather than when the loop exits.
+        task.add_done_callback(
+            lambda _: self.controller.subscriptions.remove(info)
+        )
+        self._subscriptions[id_] = task
 
     def _remove_subscription(self, future: asyncio.Future) -> None:
         id_ = next(k for k, v in self._subscriptions.items() if v == future)
         del self._subscriptions[id_]
 
-    async def _process_subscription(self, id_: Id, result: AsyncIterator) -> AsyncIterator:
+    async def _process_subscription(
+            self,
+            id_: Id,
+            result: AsyncIterator,
+            timer: PhaseTimer,
+            info: SubscriptionInfo
+    ) -> AsyncIterator:
+        registry = self.controller.subscriptions
         try:
             async for val in result:
-                await self._send_execution_result(id_, val)
+                registry.received(info)
+                length = await self._send_execution_result(id_, val, timer)
+                registry.sent(info, length)
             await self.web_socket.send(self._to_message(GQL_COMPLETE, id_))
         except asyncio.CancelledError:
             pass
@@ -261,15 +381,82 @@ class GraphQLWebSocketHandlerInstanceBase(metaclass=ABCMeta):
 
         return result
 
+    async def _process_query(
+            self,
+            request: WebSocketRequest,
+            id_: Id,
+            query: str,
+            variables: Optional[Dict[str, Any]],
+            operation_name: Optional[str]
+    ) -> None:
+        start = time.perf_counter()
+        try:
+            result = await self.controller.execute_with_deadline(
+                'websocket',
+                self.controller.get_operation_timeout(request),
+                self.controller.profile_if_requested(
+                    request,
+                    self._query_or_dispatch(
+                        request,
+                        query,
+                        variables,
+                        operation_name
+                    ),
+                    operation_name
+                )
+            )
+            add_trace(result, request.context)
+            response_bytes = await self._send_execution_result(
+                id_,
+                result,
+                self.controller.metrics.timer('websocket', operation_name)
+            )
+            self.controller.record_operation(
+                query,
+                variables,
+                operation_name,
+                result,
+                time.perf_counter() - start,
+                response_bytes
+            )
+        except asyncio.CancelledError:
+            pass
+        except Exception as error:  # pylint: disable=broad-except
+            await self._send_error(GQL_ERROR, id_, error)
+
+    async def _query_or_dispatch(
+            self,
+            request: WebSocketRequest,
+            query: str,
+            variables: Optional[Dict[str, Any]],
+            operation_name: Optional[str]
+    ) -> ExecutionResult:
+        process_pool = self.controller.options.process_pool
+        if process_pool is not None and process_pool.selects(
+                self.controller.document_cache.get(query),
+                operation_name
+        ):
+            return await process_pool.execute(
+                request,
+                query,
+                variables,
+                operation_name
+            )
+        return await self.query(request, query, variables, operation_name)
+
     async def _on_stop(self, id_: Id) -> None:
         await self._unsubscribe(id_)
 
     @classmethod
     async def _stop_subscription(cls, future: asyncio.Future) -> None:
         future.cancel()
-        await future
-        result = future.result()
-        await result.aclose()
+        try:
+            result = await future
+        except asyncio.CancelledError:
+            # The task was cancelled before it started.
+            return
+        if result is not None:
+            await result.aclose()
 
     async def _unsubscribe(self, id_: Id) -> None:
         await self._stop_subscription(self._subscriptions[id_])
@@ -280,25 +467,67 @@ class GraphQLWebSocketHandlerInstanceBase(metaclass=ABCMeta):
             await self._unsubscribe(id_)
 
     async def _send_error(self, type_: str, id_: Optional[Id], error: Exception) -> None:
-        await self.web_socket.send(self._to_message(type_, id_, {'message': str(error)}))
+        payload = (
+            error.formatted
+            if isinstance(error, GraphQLError)
+            else {'message': str(error)}
+        )
+        await self.web_socket.send(self._to_message(type_, id_, payload))
 
     async def _send_execution_result(
             self,
             id_: Id,
-            execution_result: ExecutionResult
-    ) -> None:
-        result: Dict[str, Union[Dict[str, Any], List[Any]]] = dict()
+            execution_result: ExecutionResult,
+            timer: Optional[PhaseTimer] = None
+    ) -> int:
+        start = time.perf_counter()
+        if isinstance(execution_result, EncodedExecutionResult):
+            message = self._to_encoded_message(id_, execution_result)
+        else:
+            result: Dict[str, Union[Dict[str, Any], List[Any]]] = dict()
 
-        if execution_result.data:
-            result["data"] = execution_result.data
+            if execution_result.data:
+                result["data"] = execution_result.data
 
-        if execution_result.errors:
-            result["errors"] = [
-                error.formatted
-                for error in execution_result.errors
-            ]
+            if execution_result.errors:
+                result["errors"] = [
+                    error.formatted
+                    for error in execution_result.errors
+                ]
 
-        await self.web_socket.send(self._to_message(GQL_DATA, id_, result))
+            if execution_result.extensions:
+                result["extensions"] = execution_result.extensions
+
+            message = self._to_message(GQL_DATA, id_, result)
+
+        if timer is None:
+            await self.web_socket.send(message)
+            return len(message)
+
+        timer.observe('serialise', time.perf_counter() - start)
+        start = time.perf_counter()
+        await self.web_socket.send(message)
+        timer.observe('send', time.perf_counter() - start)
+        return len(message)
+
+    def _to_encoded_message(
+            self,
+            id_: Id,
+            execution_result: EncodedExecutionResult
+    ) -> str:
+        payload = execution_result.encoded.decode('utf-8')
+        if execution_result.extensions:
+            # Extensions, such as a profile, were added after the worker.
+            return self._to_message(
+                GQL_DATA,
+                id_,
+                {
+                    **self.controller.loads(payload),
+                    'extensions': execution_result.extensions
+                }
+            )
+        # The worker process has encoded the payload.
+        return f'{{"type": "{GQL_DATA}", "id": {self.dumps(id_)}, "payload": {payload}}}'
 
     def _to_message(
             self,
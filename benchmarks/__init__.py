@@ -0,0 +1 @@
+"""Benchmarks for bareASGI-graphql-next"""
@@ -0,0 +1,127 @@
+"""Compare two benchmark runs
+
+usage: python -m benchmarks.compare BASELINE CURRENT [--tolerance 0.1]
+
+The exit code is 1 if any benchmark regressed by more than the tolerance.
+"""
+
+import argparse
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from .results import load_results
+
+
+class Comparison(NamedTuple):
+    """The comparison of a benchmark between two runs"""
+
+    name: str
+    baseline: float
+    current: float
+    unit: str
+    change: float
+    """The fractional improvement, negative for a regression"""
+
+    def is_regression(self, tolerance: float) -> bool:
+        """Check if the benchmark regressed beyond the tolerance.
+
+        Args:
+            tolerance (float): The fractional tolerance.
+
+        Returns:
+            bool: True if it regressed.
+        """
+        return self.change < -tolerance
+
+
+def compare(
+        baseline: Dict[str, Any],
+        current: Dict[str, Any]
+) -> List[Comparison]:
+    """Compare the benchmarks in both runs.
+
+    Args:
+        baseline (Dict[str, Any]): The baseline results.
+        current (Dict[str, Any]): The current results.
+
+    Returns:
+        List[Comparison]: The comparisons.
+    """
+    comparisons: List[Comparison] = []
+    for name, result in current['benchmarks'].items():
+        base = baseline['benchmarks'].get(name)
+        if base is None or not base['value'] or not result['value']:
+            continue
+        if result['higher_is_better']:
+            change = result['value'] / base['value'] - 1
+        else:
+            change = base['value'] / result['value'] - 1
+        comparisons.append(
+            Comparison(
+                name,
+                base['value'],
+                result['value'],
+                result['unit'],
+                change
+            )
+        )
+    return comparisons
+
+
+def format_comparisons(
+        comparisons: List[Comparison],
+        tolerance: float
+) -> str:
+    """Format the comparisons as a table.
+
+    Args:
+        comparisons (List[Comparison]): The comparisons.
+        tolerance (float): The fractional tolerance.
+
+    Returns:
+        str: The table.
+    """
+    width = max((len(item.name) for item in comparisons), default=0)
+    lines = []
+    for item in comparisons:
+        flag = '  REGRESSION' if item.is_regression(tolerance) else ''
+        lines.append(
+            f'{item.name:<{width}}  {item.baseline:>14,.1f} -> '
+            f'{item.current:>14,.1f} {item.unit:<8} {item.change:>+8.1%}{flag}'
+        )
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Compare two benchmark runs.
+
+    Args:
+        argv (Optional[List[str]], optional): The arguments. Defaults to
+            None.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(description='Compare benchmark runs')
+    parser.add_argument('baseline', help='The baseline results')
+    parser.add_argument('current', help='The current results')
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.1,
+        help='The fractional slowdown allowed (default 0.1)'
+    )
+    args = parser.parse_args(argv)
+
+    comparisons = compare(
+        load_results(args.baseline),
+        load_results(args.current)
+    )
+    print(format_comparisons(comparisons, args.tolerance))
+    return 1 if any(
+        item.is_regression(args.tolerance)
+        for item in comparisons
+    ) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
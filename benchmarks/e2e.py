@@ -0,0 +1,429 @@
+"""End-to-end benchmarks
+
+The application is driven in process through the ASGI interface, so the
+benchmarks measure the controllers, bareASGI and graphql without a network
+or server.
+
+usage: python -m benchmarks.e2e [--repeat 5] [--scale 1.0] [--output FILE]
+"""
+
+import argparse
+import asyncio
+from datetime import datetime
+import json
+import os
+import sys
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLNonNull,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+
+from bareasgi_graphql_next import GraphQLController, GraphQLOptions
+from bareasgi_graphql_next.graphene import GrapheneController
+
+from tests.asgi import WebSocketClient, graphql_post, http_request
+from .results import BenchmarkResults
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'demos')
+)
+
+# pylint: disable=wrong-import-position,wrong-import-order
+from star_wars.star_wars_schema import star_wars_schema  # noqa: E402
+from time_subscriber.time_schema import query_time  # noqa: E402
+from time_subscriber_graphene.time_schema import SCHEMA  # noqa: E402
+
+Run = Callable[[], Awaitable[int]]
+
+HERO_QUERY = """
+query HeroNameAndFriends($episode: Episode) {
+  hero(episode: $episode) {
+    id
+    name
+    friends {
+      id
+      name
+      appearsIn
+    }
+  }
+}
+"""
+
+
+def make_time_schema(events: int) -> GraphQLSchema:
+    """Make the time subscriber demo schema, publishing a fixed number of
+    events as fast as they can be sent.
+
+    Args:
+        events (int): The number of events for each subscription.
+
+    Returns:
+        GraphQLSchema: The schema.
+    """
+    async def subscribe_time(_root: Any, _info: Any) -> AsyncIterator[Any]:
+        for _ in range(events):
+            yield {"time": datetime.now().isoformat()}
+
+    return GraphQLSchema(
+        query=GraphQLObjectType(
+            "RootQueryType",
+            {
+                "time": GraphQLField(
+                    GraphQLNonNull(GraphQLString), resolve=query_time
+                )
+            },
+        ),
+        subscription=GraphQLObjectType(
+            "RootSubscriptionType",
+            {
+                "time": GraphQLField(
+                    GraphQLNonNull(GraphQLString), subscribe=subscribe_time
+                )
+            },
+        ),
+    )
+
+
+def make_app(controller: Any) -> Application:
+    """Make an application with the routes of a controller.
+
+    Args:
+        controller (Any): The controller.
+
+    Returns:
+        Application: The application.
+    """
+    app = Application()
+    controller.add_routes(app)
+    return app
+
+
+def _check(status: int, body: bytes) -> None:
+    if status != 200 or b'"errors": [' in body:
+        raise RuntimeError(f'Request failed: {status} {body[:200]!r}')
+
+
+def query_benchmark(
+        app: Application,
+        query: str,
+        count: int,
+        concurrency: int = 1
+) -> Run:
+    """Make a benchmark posting a query.
+
+    Args:
+        app (Application): The application.
+        query (str): The query.
+        count (int): The number of queries per run.
+        concurrency (int, optional): The number of queries in flight.
+            Defaults to 1.
+
+    Returns:
+        Run: The benchmark, returning the number of queries.
+    """
+    async def send_query() -> None:
+        status, _, body = await graphql_post(
+            app,
+            query,
+            {'episode': 'JEDI'},
+            timeout=None
+        )
+        _check(status, body)
+
+    async def run() -> int:
+        for _ in range(count // concurrency):
+            await asyncio.gather(*(send_query() for _ in range(concurrency)))
+        return count // concurrency * concurrency
+
+    return run
+
+
+def stream_benchmark(app: Application, accept: bytes, events: int) -> Run:
+    """Make a benchmark streaming a subscription over HTTP.
+
+    Args:
+        app (Application): The application with the time schema.
+        accept (bytes): The media type of the stream.
+        events (int): The number of events published by the schema.
+
+    Returns:
+        Run: The benchmark, returning the number of events.
+    """
+    body = json.dumps({'query': 'subscription { time }'}).encode()
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'allow', b'POST'),
+        (b'accept', accept)
+    ]
+
+    async def run() -> int:
+        status, _, response = await http_request(
+            app,
+            'POST',
+            '/graphql',
+            body,
+            headers,
+            timeout=None
+        )
+        _check(status, response)
+        received = response.count(b'"time"')
+        if received != events:
+            raise RuntimeError(f'Stream failed: {status} {received} events')
+        return received
+
+    return run
+
+
+def websocket_benchmark(
+        app: Application,
+        subscriptions: int,
+        events: int
+) -> Run:
+    """Make a benchmark running many subscriptions on a WebSocket.
+
+    Args:
+        app (Application): The application with the time schema.
+        subscriptions (int): The number of subscriptions.
+        events (int): The number of events published by the schema.
+
+    Returns:
+        Run: The benchmark, returning the number of events.
+    """
+    async def run() -> int:
+        client = WebSocketClient(app)
+        await client.connect()
+        for id_ in range(subscriptions):
+            await client.start(id_, 'subscription { time }')
+
+        received, completed = 0, 0
+        while completed < subscriptions:
+            message = await client.receive()
+            if message.get('type') == 'data':
+                received += 1
+            elif message.get('type') == 'complete':
+                completed += 1
+            else:
+                raise RuntimeError(f'Unexpected message: {message}')
+        await client.close()
+
+        if received != subscriptions * events:
+            raise RuntimeError(f'Subscriptions failed: {received} events')
+        return received
+
+    return run
+
+
+async def measure(run: Run, repeat: int) -> List[float]:
+    """Measure the throughput of a benchmark.
+
+    The benchmark is run once to warm up before it is measured.
+
+    Args:
+        run (Run): The benchmark.
+        repeat (int): The number of measurements.
+
+    Returns:
+        List[float]: The operations per second of each measurement.
+    """
+    await run()
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = await run()
+        samples.append(count / (time.perf_counter() - start))
+    return samples
+
+
+async def run_benchmarks(
+        repeat: int,
+        scale: float,
+        name_filter: Optional[str]
+) -> BenchmarkResults:
+    """Run the end-to-end benchmarks.
+
+    Args:
+        repeat (int): The number of measurements of each benchmark.
+        scale (float): A factor applied to the size of each benchmark.
+        name_filter (Optional[str]): If given only benchmarks with names
+            containing this are run.
+
+    Returns:
+        BenchmarkResults: The results.
+    """
+    def size(value: int) -> int:
+        return max(1, int(value * scale))
+
+    # The ping interval is longer than the benchmarks, so the streams only
+    # carry events.
+    star_wars_app = make_app(
+        GraphQLController(star_wars_schema, '', None, 60, json.loads, json.dumps)
+    )
+    # The star wars resolvers are synchronous, so the operations are
+    # compared with the asynchronous execution.
+    star_wars_async_app = make_app(
+        GraphQLController(
+            star_wars_schema,
+            '',
+            None,
+            60,
+            json.loads,
+            json.dumps,
+            GraphQLOptions(sync_execution=False)
+        )
+    )
+    star_wars_deadline_apps = [
+        make_app(
+            GraphQLController(
+                star_wars_schema,
+                '',
+                None,
+                60,
+                json.loads,
+                json.dumps,
+                GraphQLOptions(
+                    operation_timeout=10,
+                    sync_execution=sync_execution
+                )
+            )
+        )
+        for sync_execution in (None, False)
+    ]
+    events = size(2000)
+    time_app = make_app(
+        GraphQLController(
+            make_time_schema(events),
+            '',
+            None,
+            60,
+            json.loads,
+            json.dumps
+        )
+    )
+    ws_subscriptions, ws_events = size(20), size(200)
+    ws_app = make_app(
+        GraphQLController(
+            make_time_schema(ws_events),
+            '',
+            None,
+            60,
+            json.loads,
+            json.dumps
+        )
+    )
+    graphene_app = make_app(
+        GrapheneController(SCHEMA, '', None, 60, json.loads, json.dumps)
+    )
+
+    benchmarks = [
+        (
+            'query.star_wars.sequential',
+            query_benchmark(star_wars_app, HERO_QUERY, size(500)),
+            'ops/s'
+        ),
+        (
+            'query.star_wars.concurrent',
+            query_benchmark(star_wars_app, HERO_QUERY, size(1000), 50),
+            'ops/s'
+        ),
+        (
+            'query.star_wars.sequential_async',
+            query_benchmark(star_wars_async_app, HERO_QUERY, size(500)),
+            'ops/s'
+        ),
+        (
+            'query.star_wars.concurrent_async',
+            query_benchmark(star_wars_async_app, HERO_QUERY, size(1000), 50),
+            'ops/s'
+        ),
+        (
+            'query.star_wars.deadline',
+            query_benchmark(star_wars_deadline_apps[0], HERO_QUERY, size(500)),
+            'ops/s'
+        ),
+        (
+            'query.star_wars.deadline_async',
+            query_benchmark(star_wars_deadline_apps[1], HERO_QUERY, size(500)),
+            'ops/s'
+        ),
+        (
+            'stream.sse',
+            stream_benchmark(time_app, b'text/event-stream', events),
+            'events/s'
+        ),
+        (
+            'stream.ndjson',
+            stream_benchmark(time_app, b'application/json', events),
+            'events/s'
+        ),
+        (
+            'websocket.subscriptions',
+            websocket_benchmark(ws_app, ws_subscriptions, ws_events),
+            'events/s'
+        ),
+        (
+            'controller.graphql',
+            query_benchmark(time_app, '{ time }', size(1000)),
+            'ops/s'
+        ),
+        (
+            'controller.graphene',
+            query_benchmark(graphene_app, '{ hello }', size(1000)),
+            'ops/s'
+        )
+    ]
+
+    results = BenchmarkResults('e2e')
+    for name, run, unit in benchmarks:
+        if name_filter and name_filter not in name:
+            continue
+        results.add(name, await measure(run, repeat), unit, True)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the end-to-end benchmarks.
+
+    Args:
+        argv (Optional[List[str]], optional): The arguments. Defaults to
+            None.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(description='End-to-end benchmarks')
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='The number of measurements of each benchmark (default 5)'
+    )
+    parser.add_argument(
+        '--scale',
+        type=float,
+        default=1.0,
+        help='A factor applied to the size of each benchmark (default 1.0)'
+    )
+    parser.add_argument(
+        '--filter',
+        help='Only run the benchmarks with names containing this'
+    )
+    parser.add_argument('--output', help='Write the results as JSON')
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_benchmarks(args.repeat, args.scale, args.filter))
+    print(results.format())
+    if args.output:
+        results.write(args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
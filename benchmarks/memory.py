@@ -0,0 +1,262 @@
+"""The memory held by idle subscriptions
+
+usage: python -m benchmarks.memory [--subscriptions 10000] [--output FILE]
+
+The subscriptions are opened in process and the memory is measured with
+tracemalloc, so the numbers are the memory allocated by Python rather than
+the resident size of the process.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import tracemalloc
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+
+from bareasgi_graphql_next import GraphQLController
+
+from tests.asgi import (
+    http_scope,
+    subscription_query_string,
+    websocket_scope
+)
+
+from .results import BenchmarkResults
+
+SUBSCRIPTIONS_PER_CONNECTION = 20
+
+
+class IdleSource:
+    """An event source which never publishes"""
+
+    def __init__(self) -> None:
+        self.listening = 0
+        self.changed = asyncio.Event()
+
+    async def listen(self, _root: Any, _info: Any) -> AsyncIterator[str]:
+        """Subscribe to the source"""
+        self.listening += 1
+        self.changed.set()
+        try:
+            await asyncio.Future()
+            yield ''
+        finally:
+            self.listening -= 1
+            self.changed.set()
+
+    async def wait_for(self, listening: int) -> None:
+        """Wait until the number of listeners is reached.
+
+        Args:
+            listening (int): The number of listeners.
+        """
+        while self.listening != listening:
+            self.changed.clear()
+            await self.changed.wait()
+
+
+def make_app(source: IdleSource) -> Application:
+    """Make an application with a subscription to the source.
+
+    Args:
+        source (IdleSource): The source.
+
+    Returns:
+        Application: The application.
+    """
+    schema = GraphQLSchema(
+        query=GraphQLObjectType(
+            'Query',
+            {'ping': GraphQLField(GraphQLString, resolve=lambda *_: 'pong')}
+        ),
+        subscription=GraphQLObjectType(
+            'Subscription',
+            {
+                'event': GraphQLField(
+                    GraphQLString,
+                    subscribe=source.listen,
+                    resolve=lambda event, _info: event
+                )
+            }
+        )
+    )
+    app = Application()
+    GraphQLController(
+        schema,
+        '',
+        None,
+        60,
+        json.loads,
+        json.dumps
+    ).add_routes(app)
+    return app
+
+
+async def _discard(_message: Dict[str, Any]) -> None:
+    pass
+
+
+def open_sse(app: Application) -> 'asyncio.Queue[Dict[str, Any]]':
+    """Open a streaming subscription.
+
+    Args:
+        app (Application): The application.
+
+    Returns:
+        asyncio.Queue[Dict[str, Any]]: The queue of messages to the server.
+    """
+    queue: 'asyncio.Queue[Dict[str, Any]]' = asyncio.Queue()
+    queue.put_nowait({'type': 'http.request', 'body': b''})
+    scope = http_scope(
+        'GET',
+        '/subscriptions',
+        [(b'accept', b'text/event-stream')],
+        subscription_query_string('subscription { event }')
+    )
+    asyncio.create_task(app(scope, queue.get, _discard))  # type: ignore
+    return queue
+
+
+def open_websocket(
+        app: Application,
+        subscriptions: int
+) -> 'asyncio.Queue[Dict[str, Any]]':
+    """Open a WebSocket with subscriptions.
+
+    Args:
+        app (Application): The application.
+        subscriptions (int): The number of subscriptions.
+
+    Returns:
+        asyncio.Queue[Dict[str, Any]]: The queue of messages to the server.
+    """
+    queue: 'asyncio.Queue[Dict[str, Any]]' = asyncio.Queue()
+    messages: List[Dict[str, Any]] = [{'type': 'connection_init'}] + [
+        {'type': 'start', 'id': id_, 'payload': {'query': 'subscription { event }'}}
+        for id_ in range(subscriptions)
+    ]
+    queue.put_nowait({'type': 'websocket.connect'})
+    for message in messages:
+        queue.put_nowait(
+            {'type': 'websocket.receive', 'text': json.dumps(message)}
+        )
+    asyncio.create_task(
+        app(websocket_scope(), queue.get, _discard)  # type: ignore
+    )  # type: ignore
+    return queue
+
+
+async def measure(transport: str, subscriptions: int) -> float:
+    """Measure the memory per idle subscription.
+
+    Args:
+        transport (str): The transport ("sse" or "websocket").
+        subscriptions (int): The number of subscriptions.
+
+    Returns:
+        float: The bytes per subscription.
+    """
+    source = IdleSource()
+    app = make_app(source)
+
+    async def open_subscriptions() -> List['asyncio.Queue[Dict[str, Any]]']:
+        listening = source.listening + subscriptions
+        if transport == 'sse':
+            queues = [open_sse(app) for _ in range(subscriptions)]
+        else:
+            queues = [
+                open_websocket(app, SUBSCRIPTIONS_PER_CONNECTION)
+                for _ in range(subscriptions // SUBSCRIPTIONS_PER_CONNECTION)
+            ]
+        await source.wait_for(listening)
+        return queues
+
+    async def close_subscriptions(
+            queues: List['asyncio.Queue[Dict[str, Any]]']
+    ) -> None:
+        for queue in queues:
+            queue.put_nowait(
+                {'type': 'http.disconnect'}
+                if transport == 'sse'
+                else {'type': 'websocket.disconnect', 'code': 1000}
+            )
+        await source.wait_for(0)
+        for _ in range(10):
+            await asyncio.sleep(0)
+        gc.collect()
+
+    tracemalloc.start()
+    try:
+        # Warm up, so the caches and tables are not counted.
+        await close_subscriptions(await open_subscriptions())
+        before = tracemalloc.get_traced_memory()[0]
+        queues = await open_subscriptions()
+        gc.collect()
+        opened = tracemalloc.get_traced_memory()[0]
+        await close_subscriptions(queues)
+    finally:
+        tracemalloc.stop()
+
+    return (opened - before) / subscriptions
+
+
+async def run_benchmarks(subscriptions: int) -> BenchmarkResults:
+    """Measure the memory of idle subscriptions.
+
+    Args:
+        subscriptions (int): The number of subscriptions.
+
+    Returns:
+        BenchmarkResults: The results.
+    """
+    results = BenchmarkResults('memory')
+    for transport in ('sse', 'websocket'):
+        results.add(
+            f'idle.{transport}',
+            [await measure(transport, subscriptions)],
+            'bytes',
+            False
+        )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Measure the memory of idle subscriptions.
+
+    Args:
+        argv (Optional[List[str]], optional): The arguments. Defaults to
+            None.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(
+        description='The memory per idle subscription'
+    )
+    parser.add_argument(
+        '--subscriptions',
+        type=int,
+        default=10000,
+        help='The number of subscriptions (default 10000)'
+    )
+    parser.add_argument('--output', help='Write the results as JSON')
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_benchmarks(args.subscriptions))
+    print(results.format())
+    if args.output:
+        results.write(args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,322 @@
+"""Microbenchmarks of the functions on the per-event path
+
+usage: python -m benchmarks.micro [--output FILE] [--check] [--save-baseline]
+
+With --check the results are compared with the committed baseline, and the
+exit code is 1 if any benchmark is slower by more than the tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import timeit
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString,
+    parse
+)
+
+from bareasgi_graphql_next import GraphQLController
+from bareasgi_graphql_next.streaming import _encode_json, _encode_sse
+from bareasgi_graphql_next.graphql.websocket_instance import (
+    GraphQLWebSocketHandlerInstance
+)
+from bareasgi_graphql_next.utils import (
+    cancellable_aiter,
+    get_host,
+    get_scheme,
+    has_subscription
+)
+
+from .compare import compare, format_comparisons
+from .results import BenchmarkResults, load_results
+
+# pylint: disable=protected-access
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'micro.json')
+
+# The minimum time of a measurement, as used by timeit.
+MIN_SAMPLE_TIME = 0.2
+
+HERO_DATA = {
+    'hero': {
+        'id': '2001',
+        'name': 'R2-D2',
+        'friends': [
+            {'id': '1000', 'name': 'Luke Skywalker', 'appearsIn': ['NEWHOPE', 'EMPIRE', 'JEDI']},
+            {'id': '1002', 'name': 'Han Solo', 'appearsIn': ['NEWHOPE', 'EMPIRE', 'JEDI']},
+            {'id': '1003', 'name': 'Leia Organa', 'appearsIn': ['NEWHOPE', 'EMPIRE', 'JEDI']}
+        ]
+    }
+}
+
+QUERY_DOCUMENT = parse("""
+fragment Friend on Character { id name appearsIn }
+query HeroNameAndFriends($episode: Episode) {
+  hero(episode: $episode) { id name friends { ...Friend } }
+}
+""")
+
+SUBSCRIPTION_DOCUMENT = parse("""
+fragment Friend on Character { id name appearsIn }
+query Hero { hero { id } }
+subscription OnReview { reviewAdded { stars commentary } }
+""")
+
+START_MESSAGE = json.dumps({
+    'type': 'start',
+    'id': 1,
+    'payload': {
+        'query': 'subscription OnReview { reviewAdded { stars commentary } }',
+        'variables': {'episode': 'JEDI'},
+        'operationName': 'OnReview'
+    }
+})
+
+HEADERS = [
+    (b'host', b'localhost:9009'),
+    (b'user-agent', b'Mozilla/5.0 (X11; Linux x86_64)'),
+    (b'accept', b'text/event-stream'),
+    (b'accept-encoding', b'gzip, deflate, br'),
+    (b'x-forwarded-proto', b'https'),
+    (b'x-forwarded-host', b'api.example.com')
+]
+
+
+class _WebSocket:
+    """A WebSocket which replays a message and discards what is sent"""
+
+    def __init__(self, message: str) -> None:
+        self.message = message
+
+    async def receive(self) -> str:
+        """Receive the message"""
+        return self.message
+
+    async def send(self, _message: str) -> None:
+        """Discard the message"""
+
+
+def _sync_samples(func: Callable[[], Any], repeat: int) -> List[float]:
+    timer = timeit.Timer(func)
+    # Autorange finds the number of calls taking at least 0.2 seconds.
+    number, _ = timer.autorange()
+    return [
+        seconds / number * 1e9
+        for seconds in timer.repeat(repeat, number)
+    ]
+
+
+def _async_samples(
+        make_run: Callable[[int], Awaitable[Any]],
+        repeat: int
+) -> List[float]:
+    loop = asyncio.new_event_loop()
+    try:
+        # Double the number of operations until a run takes long enough.
+        number = 1
+        while True:
+            start = time.perf_counter()
+            loop.run_until_complete(make_run(number))
+            if time.perf_counter() - start >= MIN_SAMPLE_TIME:
+                break
+            number *= 2
+
+        samples: List[float] = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            loop.run_until_complete(make_run(number))
+            samples.append((time.perf_counter() - start) / number * 1e9)
+        return samples
+    finally:
+        loop.close()
+
+
+def _make_instance(message: str) -> GraphQLWebSocketHandlerInstance:
+    schema = GraphQLSchema(
+        GraphQLObjectType('Query', {'ping': GraphQLField(GraphQLString)})
+    )
+    controller = GraphQLController(
+        schema,
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps
+    )
+    request = SimpleNamespace(web_socket=_WebSocket(message))
+    return GraphQLWebSocketHandlerInstance(
+        schema,
+        request,  # type: ignore
+        json.dumps,
+        controller
+    )
+
+
+def run_benchmarks(repeat: int, name_filter: Optional[str]) -> BenchmarkResults:
+    """Run the microbenchmarks.
+
+    Args:
+        repeat (int): The number of measurements of each benchmark.
+        name_filter (Optional[str]): If given only benchmarks with names
+            containing this are run.
+
+    Returns:
+        BenchmarkResults: The results in nanoseconds per operation.
+    """
+    result = ExecutionResult(HERO_DATA)
+    error_result = ExecutionResult(
+        None,
+        [GraphQLError('Execution error', path=['hero', 'friends', 0])]
+    )
+    instance = _make_instance(START_MESSAGE)
+    request = SimpleNamespace(scope={'headers': HEADERS, 'scheme': 'http'})
+
+    async def iterate(count: int) -> None:
+        async def source():
+            for value in range(count):
+                yield value
+        async for _ in cancellable_aiter(source(), asyncio.Event()):
+            pass
+
+    async def iterate_with_timeout(count: int) -> None:
+        async def source():
+            for value in range(count):
+                yield value
+        async for _ in cancellable_aiter(
+                source(),
+                asyncio.Event(),
+                timeout=60
+        ):
+            pass
+
+    async def read_message(count: int) -> None:
+        for _ in range(count):
+            await instance._read_message()
+
+    async def send_execution_result(count: int) -> None:
+        for id_ in range(count):
+            await instance._send_execution_result(id_, result)
+
+    sync_benchmarks: Dict[str, Callable[[], Any]] = {
+        'encode_sse.data': lambda: _encode_sse(json.dumps, result),
+        'encode_sse.errors': lambda: _encode_sse(json.dumps, error_result),
+        'encode_sse.ping': lambda: _encode_sse(json.dumps, None),
+        'encode_json.data': lambda: _encode_json(json.dumps, result),
+        'has_subscription.query': lambda: has_subscription(QUERY_DOCUMENT),
+        'has_subscription.subscription': lambda: has_subscription(
+            SUBSCRIPTION_DOCUMENT
+        ),
+        'to_message.data': lambda: instance._to_message(
+            'data',
+            1,
+            {'data': HERO_DATA}
+        ),
+        'get_host': lambda: get_host(request),  # type: ignore
+        'get_scheme': lambda: get_scheme(request)  # type: ignore
+    }
+    async_benchmarks: Dict[str, Callable[[int], Awaitable[Any]]] = {
+        'cancellable_aiter.item': iterate,
+        'cancellable_aiter.item_with_timeout': iterate_with_timeout,
+        'read_message.start': read_message,
+        'send_execution_result.data': send_execution_result
+    }
+
+    # As with timeit the fastest measurement is used, as slower ones are
+    # caused by other processes rather than the code.
+    results = BenchmarkResults('micro')
+    for name, func in sync_benchmarks.items():
+        if not name_filter or name_filter in name:
+            results.add(
+                name,
+                _sync_samples(func, repeat),
+                'ns/op',
+                False,
+                min
+            )
+    for name, make_run in async_benchmarks.items():
+        if not name_filter or name_filter in name:
+            results.add(
+                name,
+                _async_samples(make_run, repeat),
+                'ns/op',
+                False,
+                min
+            )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the microbenchmarks.
+
+    Args:
+        argv (Optional[List[str]], optional): The arguments. Defaults to
+            None.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(description='Microbenchmarks')
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=7,
+        help='The number of measurements of each benchmark (default 7)'
+    )
+    parser.add_argument(
+        '--filter',
+        help='Only run the benchmarks with names containing this'
+    )
+    parser.add_argument('--output', help='Write the results as JSON')
+    parser.add_argument(
+        '--check',
+        action='store_true',
+        help='Compare the results with the baseline'
+    )
+    parser.add_argument(
+        '--baseline',
+        default=BASELINE,
+        help='The baseline results (default benchmarks/baselines/micro.json)'
+    )
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.15,
+        help='The fractional slowdown allowed by --check (default 0.15)'
+    )
+    parser.add_argument(
+        '--save-baseline',
+        action='store_true',
+        help='Write the results to the baseline'
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.repeat, args.filter)
+    if args.output:
+        results.write(args.output)
+    if args.save_baseline:
+        results.write(args.baseline)
+
+    if not args.check:
+        print(results.format())
+        return 0
+
+    comparisons = compare(load_results(args.baseline), results.to_dict())
+    print(format_comparisons(comparisons, args.tolerance))
+    return 1 if any(
+        item.is_regression(args.tolerance)
+        for item in comparisons
+    ) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
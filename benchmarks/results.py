@@ -0,0 +1,134 @@
+"""Benchmark results"""
+
+from importlib.metadata import PackageNotFoundError, version
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from typing import Any, Callable, Dict, List, Optional
+
+
+def _package_version(name: str) -> Optional[str]:
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            check=True,
+            text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    """Describe the environment the benchmarks ran in.
+
+    Returns:
+        Dict[str, Any]: The versions of python, the dependencies and the
+            commit.
+    """
+    return {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'bareasgi': _package_version('bareasgi'),
+        'graphql-core': _package_version('graphql-core'),
+        'graphene': _package_version('graphene'),
+        'commit': _git_commit()
+    }
+
+
+class BenchmarkResults:
+    """The results of a benchmark suite"""
+
+    def __init__(self, suite: str) -> None:
+        """The results of a benchmark suite.
+
+        Args:
+            suite (str): The name of the suite.
+        """
+        self.suite = suite
+        self.benchmarks: Dict[str, Dict[str, Any]] = {}
+
+    def add(
+            self,
+            name: str,
+            samples: List[float],
+            unit: str,
+            higher_is_better: bool,
+            aggregate: Callable[[List[float]], float] = statistics.median
+    ) -> None:
+        """Add the samples of a benchmark.
+
+        Args:
+            name (str): The name of the benchmark.
+            samples (List[float]): The samples.
+            unit (str): The unit (e.g. "ops/s" or "ns/op").
+            higher_is_better (bool): True if a larger value is an
+                improvement.
+            aggregate (Callable[[List[float]], float], optional): The
+                function which gives the value from the samples. Defaults to
+                statistics.median.
+        """
+        self.benchmarks[name] = {
+            'value': aggregate(samples),
+            'unit': unit,
+            'higher_is_better': higher_is_better,
+            'samples': samples
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The results as a dictionary.
+
+        Returns:
+            Dict[str, Any]: The suite, environment and benchmarks.
+        """
+        return {
+            'suite': self.suite,
+            'environment': environment(),
+            'benchmarks': self.benchmarks
+        }
+
+    def format(self) -> str:
+        """Format the results as a table.
+
+        Returns:
+            str: The table.
+        """
+        width = max((len(name) for name in self.benchmarks), default=0)
+        return '\n'.join(
+            f'{name:<{width}}  {result["value"]:>14,.1f} {result["unit"]}'
+            for name, result in self.benchmarks.items()
+        )
+
+    def write(self, filename: str) -> None:
+        """Write the results as JSON.
+
+        Args:
+            filename (str): The file name.
+        """
+        with open(filename, 'w', encoding='utf-8') as file_ptr:
+            json.dump(self.to_dict(), file_ptr, indent=2)
+            file_ptr.write('\n')
+
+
+def load_results(filename: str) -> Dict[str, Any]:
+    """Load results written by `BenchmarkResults.write`.
+
+    Args:
+        filename (str): The file name.
+
+    Returns:
+        Dict[str, Any]: The results.
+    """
+    with open(filename, 'r', encoding='utf-8') as file_ptr:
+        return json.load(file_ptr)
@@ -0,0 +1,437 @@
+"""An in-process ASGI client for the tests and benchmarks"""
+
+import asyncio
+import json
+from typing import (
+    Any,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union
+)
+from urllib.parse import urlencode
+
+from asgi_typing import (
+    ASGIReceiveEvent,
+    ASGISendEvent,
+    HTTPScope,
+    WebSocketScope
+)
+from bareasgi import Application
+
+Header = Tuple[bytes, bytes]
+
+# The longest a request may take before the test fails.
+REQUEST_TIMEOUT = 5
+
+
+class Response(NamedTuple):
+    """An HTTP response"""
+
+    status: int
+    """The status code"""
+
+    headers: Dict[bytes, bytes]
+    """The headers, keyed by the lower case name"""
+
+    body: bytes
+    """The body"""
+
+    def json(self) -> Any:
+        """Decode the body as JSON.
+
+        Returns:
+            Any: The decoded body.
+        """
+        return json.loads(self.body)
+
+
+def http_scope(
+        method: str,
+        path: str,
+        headers: Sequence[Header] = (),
+        query_string: bytes = b''
+) -> HTTPScope:
+    """Make the scope of an HTTP request.
+
+    Args:
+        method (str): The method.
+        path (str): The path.
+        headers (Sequence[Header], optional): The headers. A host header is
+            added if there is none. Defaults to ().
+        query_string (bytes, optional): The query string. Defaults to b''.
+
+    Returns:
+        HTTPScope: The scope.
+    """
+    if not any(name == b'host' for name, _ in headers):
+        headers = [(b'host', b'localhost'), *headers]
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query_string,
+        'root_path': '',
+        'headers': list(headers),
+        'client': None,
+        'server': None,
+        'extensions': None
+    }
+
+
+def websocket_scope(
+        path: str = '/subscriptions',
+        headers: Sequence[Header] = ()
+) -> WebSocketScope:
+    """Make the scope of a graphql-ws WebSocket connection.
+
+    Args:
+        path (str, optional): The path. Defaults to '/subscriptions'.
+        headers (Sequence[Header], optional): The headers. Defaults to ().
+
+    Returns:
+        WebSocketScope: The scope.
+    """
+    return {
+        'type': 'websocket',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'scheme': 'ws',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', b'localhost'), *headers],
+        'client': None,
+        'server': None,
+        'subprotocols': ['graphql-ws'],
+        'extensions': None
+    }
+
+
+async def http_request(
+        app: Application,
+        method: str,
+        path: str,
+        body: Union[bytes, Sequence[bytes]] = b'',
+        headers: Sequence[Header] = (),
+        query_string: bytes = b'',
+        timeout: Optional[float] = REQUEST_TIMEOUT
+) -> Response:
+    """Send an HTTP request to the application, and read the response.
+
+    Args:
+        app (Application): The application.
+        method (str): The method.
+        path (str): The path.
+        body (Union[bytes, Sequence[bytes]], optional): The body, or the
+            chunks of the body. Defaults to b''.
+        headers (Sequence[Header], optional): The headers. Defaults to ().
+        query_string (bytes, optional): The query string. Defaults to b''.
+        timeout (Optional[float], optional): The time allowed for the
+            response, or None to wait without a task for the timeout.
+            Defaults to REQUEST_TIMEOUT.
+
+    Returns:
+        Response: The response.
+    """
+    chunks = [body] if isinstance(body, bytes) else list(body)
+    response_done = asyncio.Event()
+    status = 0
+    response_headers: Dict[bytes, bytes] = {}
+    content: List[bytes] = []
+
+    async def receive() -> ASGIReceiveEvent:
+        if chunks:
+            return {
+                'type': 'http.request',
+                'body': chunks.pop(0),
+                'more_body': bool(chunks)
+            }
+        # The client stays connected until the response is complete.
+        await response_done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message: ASGISendEvent) -> None:
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+            response_headers.update(message['headers'])
+        elif message['type'] == 'http.response.body':
+            content.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                response_done.set()
+
+    handled = app(http_scope(method, path, headers, query_string), receive, send)
+    if timeout is None:
+        await handled
+    else:
+        await asyncio.wait_for(handled, timeout)
+    return Response(status, response_headers, b''.join(content))
+
+
+async def graphql_post(
+        app: Application,
+        query: str,
+        variables: Optional[Dict[str, Any]] = None,
+        headers: Sequence[Header] = (),
+        path: str = '/graphql',
+        timeout: Optional[float] = REQUEST_TIMEOUT,
+        operation_name: Optional[str] = None
+) -> Response:
+    """Post a GraphQL operation to the application.
+
+    Args:
+        app (Application): The application.
+        query (str): The query.
+        variables (Optional[Dict[str, Any]], optional): The variables.
+            Defaults to None.
+        headers (Sequence[Header], optional): Extra headers. Defaults to ().
+        path (str, optional): The path. Defaults to '/graphql'.
+        timeout (Optional[float], optional): The time allowed for the
+            response. Defaults to REQUEST_TIMEOUT.
+        operation_name (Optional[str], optional): The operation name.
+            Defaults to None.
+
+    Returns:
+        Response: The response.
+    """
+    body = json.dumps({
+        'query': query,
+        'variables': variables,
+        'operationName': operation_name
+    }).encode()
+    return await http_request(
+        app,
+        'POST',
+        path,
+        body,
+        [(b'content-type', b'application/json'), *headers],
+        timeout=timeout
+    )
+
+
+def subscription_query_string(
+        query: str,
+        variables: Optional[Dict[str, Any]] = None,
+        operation_name: Optional[str] = None
+) -> bytes:
+    """Make the query string of a GET subscription.
+
+    Args:
+        query (str): The query.
+        variables (Optional[Dict[str, Any]], optional): The variables.
+            Defaults to None.
+        operation_name (Optional[str], optional): The operation name.
+            Defaults to None.
+
+    Returns:
+        bytes: The query string, with JSON encoded values.
+    """
+    values = {'query': json.dumps(query)}
+    if variables is not None:
+        values['variables'] = json.dumps(variables)
+    if operation_name is not None:
+        values['operationName'] = json.dumps(operation_name)
+    return urlencode(values).encode()
+
+
+class HttpStream:
+    """A streaming HTTP response, read as it is sent"""
+
+    def __init__(
+            self,
+            app: Application,
+            method: str,
+            path: str,
+            body: bytes = b'',
+            headers: Sequence[Header] = (),
+            query_string: bytes = b''
+    ) -> None:
+        """A streaming HTTP response, read as it is sent.
+
+        Args:
+            app (Application): The application.
+            method (str): The method.
+            path (str): The path.
+            body (bytes, optional): The body. Defaults to b''.
+            headers (Sequence[Header], optional): The headers. Defaults to ().
+            query_string (bytes, optional): The query string. Defaults to
+                b''.
+        """
+        self.app = app
+        self.scope = http_scope(method, path, headers, query_string)
+        self.body = body
+        self.status = 0
+        self.headers: Dict[bytes, bytes] = {}
+        self.started = asyncio.Event()
+        self.done = asyncio.Event()
+        self._incoming: "asyncio.Queue[ASGIReceiveEvent]" = asyncio.Queue()
+        self._chunks: "asyncio.Queue[bytes]" = asyncio.Queue()
+        self.task: Optional["asyncio.Task[None]"] = None
+
+    def open(self) -> None:
+        """Send the request."""
+        self._incoming.put_nowait(
+            {'type': 'http.request', 'body': self.body, 'more_body': False}
+        )
+        self.task = asyncio.create_task(
+            self.app(self.scope, self._incoming.get, self.on_send)
+        )
+
+    async def on_send(self, message: ASGISendEvent) -> None:
+        """Receive a message from the application.
+
+        Args:
+            message (ASGISendEvent): The ASGI message.
+        """
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            self.headers.update(message['headers'])
+            self.started.set()
+        elif message['type'] == 'http.response.body':
+            body = message.get('body', b'')
+            if body:
+                await self._chunks.put(body)
+            if not message.get('more_body', False):
+                self.done.set()
+
+    async def start(self) -> int:
+        """Wait for the response to start.
+
+        Returns:
+            int: The status code.
+        """
+        await asyncio.wait_for(self.started.wait(), REQUEST_TIMEOUT)
+        return self.status
+
+    async def read(self) -> bytes:
+        """Read the next chunk of the body.
+
+        Returns:
+            bytes: The chunk.
+        """
+        return await asyncio.wait_for(self._chunks.get(), REQUEST_TIMEOUT)
+
+    async def disconnect(self) -> None:
+        """Disconnect and wait for the application to finish."""
+        await self._incoming.put({'type': 'http.disconnect'})
+        if self.task is not None:
+            await asyncio.wait_for(self.task, REQUEST_TIMEOUT)
+
+
+class WebSocketClient:
+    """A graphql-ws client connected to the application in process"""
+
+    def __init__(
+            self,
+            app: Application,
+            path: str = '/subscriptions',
+            headers: Sequence[Header] = ()
+    ) -> None:
+        """A graphql-ws client connected to the application in process.
+
+        Args:
+            app (Application): The application.
+            path (str, optional): The path. Defaults to '/subscriptions'.
+            headers (Sequence[Header], optional): The headers. Defaults to
+                ().
+        """
+        self.app = app
+        self.scope = websocket_scope(path, headers)
+        self._incoming: "asyncio.Queue[ASGIReceiveEvent]" = asyncio.Queue()
+        self._outgoing: "asyncio.Queue[ASGISendEvent]" = asyncio.Queue()
+        self.task: Optional["asyncio.Task[None]"] = None
+
+    async def connect(self) -> None:
+        """Open the connection and initialise the protocol."""
+        await self._incoming.put({'type': 'websocket.connect'})
+        self.task = asyncio.create_task(
+            self.app(self.scope, self._incoming.get, self.on_send)
+        )
+        message = await asyncio.wait_for(self._outgoing.get(), REQUEST_TIMEOUT)
+        if message['type'] != 'websocket.accept':
+            raise ConnectionError(f'Connection refused: {message}')
+        await self.send({'type': 'connection_init'})
+        ack = await asyncio.wait_for(self.receive(), REQUEST_TIMEOUT)
+        if ack.get('type') != 'connection_ack':
+            raise ConnectionError(f'Connection not acknowledged: {ack}')
+
+    async def on_send(self, message: ASGISendEvent) -> None:
+        """Receive a message from the application.
+
+        Args:
+            message (ASGISendEvent): The ASGI message.
+        """
+        await self._outgoing.put(message)
+        if message['type'] == 'websocket.close':
+            # The server tells the application the connection has closed.
+            await self._incoming.put({
+                'type': 'websocket.disconnect',
+                'code': message.get('code', 1000)
+            })
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        """Send a protocol message.
+
+        Args:
+            message (Dict[str, Any]): The message.
+        """
+        await self._incoming.put({
+            'type': 'websocket.receive',
+            'bytes': None,
+            'text': json.dumps(message)
+        })
+
+    async def receive(self) -> Dict[str, Any]:
+        """Receive a protocol message.
+
+        Returns:
+            Dict[str, Any]: The message, or the ASGI message if the server
+                closed the connection.
+        """
+        message = await asyncio.wait_for(self._outgoing.get(), REQUEST_TIMEOUT)
+        if message['type'] != 'websocket.send':
+            return dict(message)
+        return json.loads(message.get('text') or '')
+
+    async def start(
+            self,
+            id_: Union[int, str],
+            query: str,
+            variables: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Start an operation.
+
+        Args:
+            id_ (Union[int, str]): The operation id.
+            query (str): The query.
+            variables (Optional[Dict[str, Any]], optional): The variables.
+                Defaults to None.
+        """
+        await self.send({
+            'type': 'start',
+            'id': id_,
+            'payload': {'query': query, 'variables': variables}
+        })
+
+    async def stop(self, id_: Union[int, str]) -> None:
+        """Stop an operation.
+
+        Args:
+            id_ (Union[int, str]): The operation id.
+        """
+        await self.send({'type': 'stop', 'id': id_})
+
+    async def close(self) -> None:
+        """Close the connection and wait for the server to finish."""
+        await self._incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+        if self.task is not None:
+            await asyncio.wait_for(self.task, REQUEST_TIMEOUT)
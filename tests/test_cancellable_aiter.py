@@ -0,0 +1,74 @@
+"""Tests for cancellable_aiter"""
+
+import asyncio
+from typing import AsyncIterator
+
+import pytest
+
+from bareasgi_graphql_next.utils import cancellable_aiter
+
+
+async def count_to(limit: int) -> AsyncIterator[int]:
+    """A finite source"""
+    for value in range(limit):
+        yield value
+
+
+@pytest.mark.asyncio
+async def test_source_finishes() -> None:
+    """Test the iterator stops when the source finishes"""
+    values = [
+        value
+        async for value in cancellable_aiter(count_to(3), asyncio.Event())
+    ]
+    assert values == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_cancelled() -> None:
+    """Test the iterator stops when the cancellation event is set"""
+    cancellation_event = asyncio.Event()
+    values = []
+    async for value in cancellable_aiter(count_to(100), cancellation_event):
+        values.append(value)
+        if value == 1:
+            cancellation_event.set()
+    assert values == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_by_shared_future() -> None:
+    """Test a future cancels the iterators sharing it, and is left alone"""
+    cancellation: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    async def collect() -> list:
+        values = []
+        async for value in cancellable_aiter(count_to(100), cancellation):
+            values.append(value)
+            await asyncio.sleep(0.01)
+        return values
+
+    tasks = [asyncio.create_task(collect()) for _ in range(2)]
+    await asyncio.sleep(0.035)
+    cancellation.set_result(None)
+    for values in await asyncio.gather(*tasks):
+        assert 0 < len(values) < 100
+    assert not cancellation.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_timeout() -> None:
+    """Test None is yielded when no value arrives within the timeout"""
+    async def slow() -> AsyncIterator[int]:
+        await asyncio.sleep(0.25)
+        yield 1
+
+    values = [
+        value
+        async for value in cancellable_aiter(
+            slow(),
+            asyncio.Event(),
+            timeout=0.1
+        )
+    ]
+    assert values == [None, None, 1]
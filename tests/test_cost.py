@@ -0,0 +1,232 @@
+"""Tests for the static query cost analysis"""
+
+import json
+import time
+from typing import Any, Dict, Optional
+
+from bareasgi import Application
+from graphql import (
+    GraphQLArgument,
+    GraphQLField,
+    GraphQLInt,
+    GraphQLList,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString,
+    parse
+)
+import pytest
+
+from bareasgi_graphql_next import (
+    GraphQLController,
+    GraphQLOptions,
+    QueryCost,
+    QueryCostAnalyser,
+    QueryCostError
+)
+
+from .asgi import graphql_post
+
+ITEM = GraphQLObjectType(
+    'Item',
+    {
+        'id': GraphQLField(GraphQLString, resolve=lambda *_: '1'),
+        'name': GraphQLField(GraphQLString, resolve=lambda *_: 'item')
+    }
+)
+
+SCHEMA = GraphQLSchema(
+    GraphQLObjectType(
+        'Query',
+        {
+            'hello': GraphQLField(GraphQLString, resolve=lambda *_: 'world'),
+            'item': GraphQLField(ITEM, resolve=lambda *_: {}),
+            'items': GraphQLField(
+                GraphQLList(ITEM),
+                args={'first': GraphQLArgument(GraphQLInt)},
+                resolve=lambda *_, **__: [{}]
+            ),
+            'pages': GraphQLField(
+                GraphQLList(ITEM),
+                args={'limit': GraphQLArgument(GraphQLInt, default_value=3)},
+                resolve=lambda *_, **__: [{}]
+            )
+        }
+    )
+)
+
+# The fragment chain spreads each fragment twice, so the operation selects
+# 2 ** FRAGMENT_LEVELS fields when the fragments are expanded.
+FRAGMENT_LEVELS = 27
+
+
+def analyse(
+        query: str,
+        variables: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+) -> QueryCost:
+    """Analyse an operation"""
+    return QueryCostAnalyser(**kwargs).analyse(
+        SCHEMA,
+        parse(query),
+        None,
+        variables
+    )
+
+
+@pytest.mark.parametrize('query,cost,depth', [
+    ('{ hello }', 1, 1),
+    ('{ hello __typename __schema { types { name } } }', 1, 1),
+    ('{ item { id name } }', 3, 2),
+    ('{ items { id } }', 11, 2),
+    ('{ items(first: 5) { id name } }', 11, 2),
+    ('{ pages { id } }', 4, 2),
+    ('{ pages(limit: 2) { id } }', 3, 2),
+    ('{ ... on Query { item { id } } }', 2, 2),
+    ('{ ...F } fragment F on Query { items(first: 2) { id } }', 3, 2),
+    ('query A { hello } query B { item { id } }', 2, 2)
+])
+def test_cost(query: str, cost: float, depth: int) -> None:
+    """Test the cost and depth of operations"""
+    query_cost = analyse(query)
+    assert query_cost == QueryCost(cost, depth, True)
+
+
+def test_field_costs() -> None:
+    """Test configured field costs are used"""
+    query_cost = analyse(
+        '{ items(first: 3) { id name } }',
+        field_costs={'Query.items': 5, 'Item.name': 2},
+        default_field_cost=0.5
+    )
+    assert query_cost.cost == 5 + 3 * (0.5 + 2)
+
+
+def test_variables() -> None:
+    """Test a list size from a variable makes the cost dynamic"""
+    query_cost = analyse(
+        'query ($n: Int) { items(first: $n) { id } }',
+        {'n': 20}
+    )
+    assert query_cost == QueryCost(21, 2, False)
+
+
+@pytest.mark.parametrize('variables,cost', [
+    (None, 101),
+    ({}, 101),
+    ({'n': 20}, 21),
+    ({'n': None}, 11)
+])
+def test_variable_defaults(
+        variables: Optional[Dict[str, Any]],
+        cost: float
+) -> None:
+    """Test a list size from a variable uses the default of the operation
+    when the variable is not supplied"""
+    query_cost = analyse(
+        'query ($n: Int = 100) { items(first: $n) { id } }',
+        variables
+    )
+    assert query_cost == QueryCost(cost, 2, False)
+
+
+def test_variable_defaults_by_operation() -> None:
+    """Test a fragment is costed with the defaults of each operation"""
+    query_cost = analyse(
+        """
+        query A($n: Int = 2) { ...F }
+        query B($n: Int = 100) { ...F }
+        fragment F on Query { items(first: $n) { id } }
+        """
+    )
+    assert query_cost.cost == 101
+
+
+@pytest.mark.parametrize('query,variables', [
+    ('{ a: items(first: 100) { id } b: items(first: -100) { id } }', None),
+    (
+        'query ($n: Int) { a: items(first: 100) { id } b: items(first: $n) { id } }',
+        {'n': -100}
+    )
+])
+def test_negative_list_sizes(
+        query: str,
+        variables: Optional[Dict[str, Any]]
+) -> None:
+    """Test a negative list size does not cancel the cost of other fields"""
+    query_cost = analyse(query, variables)
+    assert query_cost.cost == 102
+    with pytest.raises(QueryCostError):
+        QueryCostAnalyser(max_cost=50).check(query_cost)
+
+
+def test_fragment_fan_out() -> None:
+    """Test fragments spread many times are only walked once"""
+    fragments = ['fragment F0 on Query { hello item { id } }'] + [
+        f'fragment F{level} on Query {{ ...F{level - 1} ...F{level - 1} }}'
+        for level in range(1, FRAGMENT_LEVELS + 1)
+    ]
+    query = f'{{ ...F{FRAGMENT_LEVELS} }} ' + ' '.join(fragments)
+
+    start = time.perf_counter()
+    query_cost = analyse(query)
+    elapsed = time.perf_counter() - start
+
+    assert query_cost == QueryCost(3 * 2 ** FRAGMENT_LEVELS, 2, True)
+    assert elapsed < 1
+
+
+def test_fragment_cycles() -> None:
+    """Test fragment cycles are not followed"""
+    query_cost = analyse(
+        '{ ...A } fragment A on Query { hello ...B } '
+        'fragment B on Query { item { id } ...A }'
+    )
+    assert query_cost == QueryCost(3, 2, True)
+
+
+def make_app(analyser: QueryCostAnalyser) -> Application:
+    """Make an application with a cost analyser"""
+    app = Application()
+    GraphQLController(
+        SCHEMA,
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            cost_analyser=analyser
+        )
+    ).add_routes(app)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_rejected() -> None:
+    """Test an operation over budget is rejected before it is executed"""
+    app = make_app(QueryCostAnalyser(max_cost=20, max_depth=3))
+
+    response = await graphql_post(app, '{ items(first: 5) { id } }')
+    assert response.status == 200
+    assert response.json() == {'data': {'items': [{'id': '1'}]}}
+
+    response = await graphql_post(app, '{ items(first: 50) { id } }')
+    assert response.status == 400
+    assert response.json() == {
+        'data': None,
+        'errors': [
+            {
+                'message': 'Query cost 51 exceeds the maximum cost 20.',
+                'locations': None,
+                'path': None,
+                'extensions': {
+                    'code': 'QUERY_TOO_COMPLEX',
+                    'cost': 51,
+                    'depth': 2,
+                    'maxCost': 20,
+                    'maxDepth': 3
+                }
+            }
+        ]
+    }
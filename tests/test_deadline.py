@@ -0,0 +1,162 @@
+"""Tests for operation deadlines and cancellation"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Any, Optional, Sequence, Tuple
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLFloat,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+import pytest
+
+from bareasgi_graphql_next import GraphQLController, GraphQLOptions, time_remaining
+
+from .asgi import (
+    Header,
+    HttpStream,
+    WebSocketClient,
+    graphql_post,
+    http_scope
+)
+
+TIMEOUT_HEADER = b'x-request-timeout'
+
+
+class Waiter:
+    """A resolver which waits until it is cancelled"""
+
+    def __init__(self) -> None:
+        self.started = asyncio.Event()
+        self.cancelled = asyncio.Event()
+
+    async def __call__(self, *_: Any) -> str:
+        self.started.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+        return 'done'
+
+
+def make_controller(
+        waiter: Waiter,
+        **kwargs: Any
+) -> Tuple[Application, GraphQLController]:
+    """Make an application with a resolver which waits"""
+    schema = GraphQLSchema(
+        GraphQLObjectType(
+            'Query',
+            {
+                'wait': GraphQLField(GraphQLString, resolve=waiter),
+                'remaining': GraphQLField(
+                    GraphQLFloat,
+                    resolve=lambda *_: time_remaining()
+                )
+            }
+        )
+    )
+    app = Application()
+    controller = GraphQLController(
+        schema,
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            timeout_header=TIMEOUT_HEADER,
+            **kwargs
+        )
+    )
+    controller.add_routes(app)
+    return app, controller
+
+
+@pytest.mark.parametrize('operation_timeout,headers,expected', [
+    (10, [], 10),
+    (10, [(TIMEOUT_HEADER, b'2')], 2),
+    (10, [(TIMEOUT_HEADER, b'20')], 10),
+    (10, [(TIMEOUT_HEADER, b'soon')], 10),
+    (10, [(TIMEOUT_HEADER, b'inf')], 10),
+    (10, [(TIMEOUT_HEADER, b'-1')], 10),
+    (None, [(TIMEOUT_HEADER, b'2')], 2),
+    (None, [], None)
+])
+def test_operation_timeout(
+        operation_timeout: Optional[float],
+        headers: Sequence[Header],
+        expected: Optional[float]
+) -> None:
+    """Test a client may only shorten the server timeout"""
+    _, controller = make_controller(Waiter(), operation_timeout=operation_timeout)
+    request: Any = SimpleNamespace(scope=http_scope('POST', '/', headers))
+    assert controller.get_operation_timeout(request) == expected
+
+
+@pytest.mark.asyncio
+async def test_deadline_exceeded() -> None:
+    """Test an operation is cancelled when its deadline passes"""
+    waiter = Waiter()
+    app, controller = make_controller(waiter, operation_timeout=10)
+    response = await graphql_post(
+        app,
+        '{ wait }',
+        headers=[(TIMEOUT_HEADER, b'0.05')]
+    )
+    assert response.status == 200
+    assert response.json()['errors'][0]['extensions'] == {
+        'code': 'DEADLINE_EXCEEDED',
+        'timeout': 0.05
+    }
+    assert waiter.cancelled.is_set()
+    assert controller.metrics.operations_timed_out.get(('http',)) == 1
+
+
+@pytest.mark.asyncio
+async def test_time_remaining() -> None:
+    """Test resolvers can find the time remaining"""
+    app, _ = make_controller(Waiter(), operation_timeout=10)
+    response = await graphql_post(app, '{ remaining }')
+    assert 9 < response.json()['data']['remaining'] <= 10
+
+
+@pytest.mark.asyncio
+async def test_websocket_deadline() -> None:
+    """Test the timeout header of a WebSocket connection applies to queries"""
+    waiter = Waiter()
+    app, controller = make_controller(waiter)
+    client = WebSocketClient(app, headers=[(TIMEOUT_HEADER, b'0.05')])
+    await client.connect()
+    await client.start(1, '{ wait }')
+    message = await client.receive()
+    assert message['type'] == 'data'
+    errors = message['payload']['errors']
+    assert errors[0]['extensions']['code'] == 'DEADLINE_EXCEEDED'
+    assert controller.metrics.operations_timed_out.get(('websocket',)) == 1
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_cancel_on_disconnect() -> None:
+    """Test an operation is cancelled when the HTTP client disconnects"""
+    waiter = Waiter()
+    app, controller = make_controller(waiter, cancel_on_disconnect=True)
+    stream = HttpStream(
+        app,
+        'POST',
+        '/graphql',
+        json.dumps({'query': '{ wait }'}).encode(),
+        [(b'content-type', b'application/json')]
+    )
+    stream.open()
+    await asyncio.wait_for(waiter.started.wait(), 1)
+    await stream.disconnect()
+    assert waiter.cancelled.is_set()
+    assert controller.metrics.operations_cancelled.get(('http',)) == 1
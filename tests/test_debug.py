@@ -0,0 +1,201 @@
+"""Tests for the debug routes and the subscription registry"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Tuple
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+import pytest
+
+from bareasgi_graphql_next import (
+    GraphQLController,
+    GraphQLOptions,
+    OperationStats
+)
+from bareasgi_graphql_next.metrics import Metrics
+from bareasgi_graphql_next.subscriptions import (
+    SubscriptionRegistry,
+    source_queue_size
+)
+
+from .asgi import (
+    HttpStream,
+    WebSocketClient,
+    graphql_post,
+    http_request,
+    subscription_query_string
+)
+
+
+async def listen(*_: Any) -> AsyncIterator[str]:
+    """A subscription which publishes one event"""
+    yield 'event'
+    await asyncio.sleep(60)
+
+
+SCHEMA = GraphQLSchema(
+    query=GraphQLObjectType(
+        'Query',
+        {
+            'hello': GraphQLField(GraphQLString, resolve=lambda *_: 'world'),
+            'name': GraphQLField(GraphQLString, resolve=lambda *_: 'Rob')
+        }
+    ),
+    subscription=GraphQLObjectType(
+        'Subscription',
+        {
+            'event': GraphQLField(
+                GraphQLString,
+                subscribe=listen,
+                resolve=lambda event, _info: event
+            )
+        }
+    )
+)
+
+
+class Source:
+    """A subscription source with a queue"""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+
+    def qsize(self) -> int:
+        """The number of buffered events"""
+        return self.size
+
+
+def test_registry() -> None:
+    """Test the registry tracks the subscriptions and publishes metrics"""
+    metrics = Metrics()
+    registry = SubscriptionRegistry(metrics)
+    first = registry.add('a', 'subscription a', 'A', 'sse', Source(3).qsize)
+    second = registry.add('b', 'subscription b', None, 'websocket')
+    assert len(registry) == 2
+    assert metrics.subscriptions_active.get(('sse',)) == 1
+    assert registry.oldest_age() >= 0
+
+    registry.received(first)
+    registry.received(first)
+    registry.sent(first, 10)
+    assert first.buffer_depth == 4
+    assert metrics.subscription_events_sent.get(('sse',)) == 1
+    assert metrics.subscription_bytes_sent.get(('sse',)) == 10
+
+    snapshot = registry.snapshot()
+    assert [info['signatureId'] for info in snapshot] == ['a', 'b']
+    assert snapshot[0]['operationName'] == 'A'
+    assert snapshot[0]['eventsSent'] == 1
+    assert snapshot[0]['bytesSent'] == 10
+    assert snapshot[0]['bufferDepth'] == 4
+
+    registry.remove(first)
+    registry.remove(first)
+    assert metrics.subscriptions_active.get(('sse',)) == 0
+    registry.remove(second)
+    assert len(registry) == 0
+    assert registry.oldest_age() == 0
+
+
+def test_source_queue_size() -> None:
+    """Test the queue size is found on the source or the iterator it maps"""
+    source = Source(2)
+    wrapper: Any = type('Wrapper', (), {'iterator': source})()
+    for candidate in (source, wrapper):
+        queue_size = source_queue_size(candidate)
+        assert queue_size is not None and queue_size() == 2
+    assert source_queue_size(object()) is None
+
+
+def make_controller() -> Tuple[Application, GraphQLController]:
+    """Make an application serving the debug routes"""
+    app = Application()
+    controller = GraphQLController(
+        SCHEMA,
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            debug_path='/debug',
+            operation_stats=OperationStats(slow_threshold=None)
+        )
+    )
+    controller.add_routes(app)
+    return app, controller
+
+
+async def get_json(app: Application, path: str, query_string: bytes = b'') -> Any:
+    """Get a debug route"""
+    response = await http_request(app, 'GET', path, query_string=query_string)
+    assert response.status == 200
+    assert response.headers[b'content-type'] == b'application/json'
+    assert int(response.headers[b'content-length']) == len(response.body)
+    return response.json()
+
+
+@pytest.mark.asyncio
+async def test_debug_operations() -> None:
+    """Test the operations with the greatest total time are listed"""
+    app, _ = make_controller()
+    for query in ('{ hello }', '{ hello }', '{ name }'):
+        await graphql_post(app, query)
+
+    body = await get_json(app, '/debug/operations')
+    counts: Dict[str, int] = {
+        operation['signature']: operation['count']
+        for operation in body['operations']
+    }
+    assert counts == {'query{hello}': 2, 'query{name}': 1}
+
+    body = await get_json(app, '/debug/operations', b'top=1')
+    assert len(body['operations']) == 1
+
+
+@pytest.mark.asyncio
+async def test_debug_subscriptions() -> None:
+    """Test the active subscriptions are listed"""
+    app, controller = make_controller()
+    stream = HttpStream(
+        app,
+        'GET',
+        '/subscriptions',
+        headers=[(b'accept', b'text/event-stream')],
+        query_string=subscription_query_string(
+            'subscription Sse { event }',
+            operation_name='Sse'
+        )
+    )
+    stream.open()
+    assert await stream.start() == 200
+    assert b'event: message' in await stream.read()
+
+    client = WebSocketClient(app)
+    await client.connect()
+    await client.start(1, 'subscription { event }')
+    assert (await client.receive())['type'] == 'data'
+
+    body = await get_json(app, '/debug/subscriptions')
+    subscriptions = {
+        info['transport']: info
+        for info in body['subscriptions']
+    }
+    assert set(subscriptions) == {'sse', 'websocket'}
+    assert subscriptions['sse']['operationName'] == 'Sse'
+    assert subscriptions['sse']['signature'] == 'subscription Sse{event}'
+    for info in subscriptions.values():
+        assert info['eventsSent'] == 1
+        assert info['bufferDepth'] == 0
+
+    await stream.disconnect()
+    await client.close()
+    assert (await get_json(app, '/debug/subscriptions')) == {'subscriptions': []}
+    active = controller.metrics.subscriptions_active
+    assert active.get(('sse',)) == active.get(('websocket',)) == 0
@@ -0,0 +1,211 @@
+"""Tests for cancelling WebSocket queries and draining on shutdown"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Tuple
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+import pytest
+
+from bareasgi_graphql_next import DrainReport, GraphQLController, GraphQLOptions
+from bareasgi_graphql_next.websocket_instance import (
+    GraphQLWebSocketHandlerInstanceBase
+)
+
+from .asgi import (
+    HttpStream,
+    WebSocketClient,
+    graphql_post,
+    subscription_query_string
+)
+
+DRAIN_TIMEOUT = 0.2
+
+
+class Resolvers:
+    """Resolvers which wait until they are cancelled"""
+
+    def __init__(self, release_time: float = 0) -> None:
+        self.release_time = release_time
+        self.started = asyncio.Event()
+        self.cancelled = asyncio.Event()
+
+    async def wait(self, *_: Any) -> str:
+        """A query which waits until it is cancelled"""
+        self.started.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+        return 'done'
+
+    async def listen(self, *_: Any) -> AsyncIterator[str]:
+        """A subscription which never publishes"""
+        self.started.set()
+        try:
+            await asyncio.sleep(60)
+            yield 'event'
+        finally:
+            # A source which is slow to release its resources.
+            await asyncio.sleep(self.release_time)
+
+
+def make_controller(
+        resolvers: Resolvers
+) -> Tuple[Application, GraphQLController]:
+    """Make an application with the resolvers"""
+    schema = GraphQLSchema(
+        query=GraphQLObjectType(
+            'Query',
+            {'wait': GraphQLField(GraphQLString, resolve=resolvers.wait)}
+        ),
+        subscription=GraphQLObjectType(
+            'Subscription',
+            {
+                'event': GraphQLField(
+                    GraphQLString,
+                    subscribe=resolvers.listen,
+                    resolve=lambda event, _info: event
+                )
+            }
+        )
+    )
+    app = Application()
+    controller = GraphQLController(
+        schema,
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            drain_timeout=DRAIN_TIMEOUT
+        )
+    )
+    controller.add_routes(app)
+    return app, controller
+
+
+def open_stream(app: Application) -> HttpStream:
+    """Start a streaming subscription"""
+    stream = HttpStream(
+        app,
+        'GET',
+        '/subscriptions',
+        headers=[(b'accept', b'text/event-stream')],
+        query_string=subscription_query_string('subscription { event }')
+    )
+    stream.open()
+    return stream
+
+
+@pytest.mark.asyncio
+async def test_stop_query() -> None:
+    """Test a WebSocket query is cancelled when the client stops it"""
+    resolvers = Resolvers()
+    app, controller = make_controller(resolvers)
+    client = WebSocketClient(app)
+    await client.connect()
+    await client.start(1, '{ wait }')
+    await asyncio.wait_for(resolvers.started.wait(), 1)
+
+    await client.stop(1)
+    await asyncio.wait_for(resolvers.cancelled.wait(), 1)
+    assert controller.metrics.operations_in_flight.get(('websocket',)) == 0
+
+    # Nothing is sent for the stopped query.
+    await client.start(2, '{ __typename }')
+    assert await client.receive() == {
+        'type': 'data',
+        'id': 2,
+        'payload': {'data': {'__typename': 'Query'}}
+    }
+    assert controller.metrics.operations_cancelled.get(('websocket',)) == 1
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_stop_query_before_it_starts() -> None:
+    """Test stopping an operation which has not started yet"""
+    resolvers = Resolvers()
+    task = asyncio.create_task(resolvers.wait())
+    # pylint: disable=protected-access
+    await GraphQLWebSocketHandlerInstanceBase._stop_subscription(task)
+    assert task.cancelled()
+    assert not resolvers.started.is_set()
+
+
+@pytest.mark.asyncio
+async def test_disconnect_query() -> None:
+    """Test a WebSocket query is cancelled when the client disconnects"""
+    resolvers = Resolvers()
+    app, _ = make_controller(resolvers)
+    client = WebSocketClient(app)
+    await client.connect()
+    await client.start(1, '{ wait }')
+    await asyncio.wait_for(resolvers.started.wait(), 1)
+
+    await client.close()
+    assert resolvers.cancelled.is_set()
+
+
+@pytest.mark.asyncio
+async def test_drain() -> None:
+    """Test the streams and connections are completed on shutdown"""
+    resolvers = Resolvers()
+    app, controller = make_controller(resolvers)
+    stream = open_stream(app)
+    assert await stream.start() == 200
+    resolvers.started.clear()
+    client = WebSocketClient(app)
+    await client.connect()
+    await client.start(1, 'subscription { event }')
+    await asyncio.wait_for(resolvers.started.wait(), 1)
+
+    report = await controller.shutdown()
+    assert report == DrainReport(drained=2, killed=0)
+
+    await asyncio.wait_for(stream.done.wait(), 1)
+    body = b''
+    while not stream._chunks.empty():  # pylint: disable=protected-access
+        body += await stream.read()
+    assert body.endswith(b'event: complete\ndata:\n\n')
+
+    assert await client.receive() == {'type': 'complete', 'id': 1}
+    assert await client.receive() == {'type': 'websocket.close', 'code': 1012}
+
+    # New subscriptions are sent elsewhere.
+    response = await graphql_post(
+        app,
+        'subscription { event }',
+        headers=[(b'accept', b'text/event-stream')],
+        path='/subscriptions'
+    )
+    assert response.status == 503
+    assert response.json()['errors'][0]['extensions']['code'] == (
+        'SERVER_DRAINING'
+    )
+    with pytest.raises(ConnectionError):
+        await WebSocketClient(app).connect()
+
+
+@pytest.mark.asyncio
+async def test_kill() -> None:
+    """Test streams which have not finished by the drain timeout are killed"""
+    resolvers = Resolvers(release_time=60)
+    app, controller = make_controller(resolvers)
+    stream = open_stream(app)
+    assert await stream.start() == 200
+
+    start = asyncio.get_running_loop().time()
+    report = await controller.shutdown()
+    elapsed = asyncio.get_running_loop().time() - start
+    assert report == DrainReport(drained=0, killed=1)
+    assert DRAIN_TIMEOUT <= elapsed < DRAIN_TIMEOUT + 0.5
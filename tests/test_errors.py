@@ -0,0 +1,107 @@
+"""Tests for the responses to operations which cannot be executed"""
+
+import json
+from typing import Awaitable, Callable
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+import pytest
+
+from bareasgi_graphql_next import GraphQLController
+
+from .asgi import (
+    Response,
+    graphql_post,
+    http_request,
+    subscription_query_string
+)
+
+SCHEMA = GraphQLSchema(
+    GraphQLObjectType(
+        'Query',
+        {'hello': GraphQLField(GraphQLString, resolve=lambda *_: 'world')}
+    )
+)
+
+SYNTAX_ERROR = {
+    'errors': [
+        {
+            'message': 'Syntax Error: Expected Name, found <EOF>.',
+            'locations': [{'line': 1, 'column': 9}],
+            'path': None
+        }
+    ]
+}
+
+
+def make_app() -> Application:
+    """Make an application with a GraphQL controller"""
+    app = Application()
+    GraphQLController(
+        SCHEMA,
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps
+    ).add_routes(app)
+    return app
+
+
+async def get_subscription(app: Application, query: str) -> Response:
+    """Start a streaming subscription with a GET request"""
+    return await http_request(
+        app,
+        'GET',
+        '/subscriptions',
+        headers=[(b'accept', b'text/event-stream')],
+        query_string=subscription_query_string(query)
+    )
+
+
+async def post_subscription(app: Application, query: str) -> Response:
+    """Start a streaming subscription with a POST request"""
+    return await graphql_post(
+        app,
+        query,
+        headers=[(b'accept', b'text/event-stream')],
+        path='/subscriptions'
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('send', [graphql_post, get_subscription, post_subscription])
+async def test_syntax_error(
+        send: Callable[[Application, str], Awaitable[Response]]
+) -> None:
+    """Test a query which cannot be parsed is a bad request"""
+    response = await send(make_app(), '{ hello ')
+    assert response.status == 400
+    assert response.headers[b'content-type'] == b'application/json'
+    assert int(response.headers[b'content-length']) == len(response.body)
+    assert response.json() == SYNTAX_ERROR
+
+
+@pytest.mark.asyncio
+async def test_non_ascii_error() -> None:
+    """Test the content length of an error counts the bytes of the body"""
+    app = Application()
+    GraphQLController(
+        SCHEMA,
+        '',
+        None,
+        10,
+        json.loads,
+        lambda value: json.dumps(value, ensure_ascii=False)
+    ).add_routes(app)
+    response = await graphql_post(app, '{ héllo }')
+    assert response.status == 400
+    assert int(response.headers[b'content-length']) == len(response.body)
+    assert response.json()['errors'][0]['message'] == (
+        "Syntax Error: Cannot parse the unexpected character 'é'."
+    )
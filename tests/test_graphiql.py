@@ -0,0 +1,134 @@
+"""Tests for serving the GraphiQL page and its assets"""
+
+import json
+import os
+from typing import Any, Optional, Sequence
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+import pytest
+
+from bareasgi_graphql_next import GraphQLController, GraphQLOptions
+from bareasgi_graphql_next.graphiql_assets import GraphiQLAssets
+from bareasgi_graphql_next.template import GRAPHIQL_ASSETS
+
+from .asgi import Header, Response, http_request
+
+def make_app(graphiql_assets_path: Optional[str] = None) -> Application:
+    """Make an application with a GraphQL controller"""
+    schema = GraphQLSchema(
+        GraphQLObjectType(
+            'Query',
+            {'ping': GraphQLField(GraphQLString, resolve=lambda *_: 'pong')}
+        )
+    )
+    app = Application()
+    GraphQLController(
+        schema,
+        '/api',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            graphiql_assets_path=graphiql_assets_path
+        )
+    ).add_routes(app, '/api')
+    return app
+
+
+async def get(
+        app: Application,
+        path: str,
+        headers: Sequence[Header] = ()
+) -> Response:
+    """Send a GET request to the application"""
+    path, _, query_string = path.partition('?')
+    return await http_request(
+        app,
+        'GET',
+        path,
+        headers=[(b'host', b'example.com'), *headers],
+        query_string=query_string.encode()
+    )
+
+
+def write_assets(directory: str) -> None:
+    """Write placeholder assets"""
+    for _, filename, _ in GRAPHIQL_ASSETS:
+        with open(os.path.join(directory, filename), 'w', encoding='utf-8') as file:
+            file.write(f'/* {filename} */')
+
+
+@pytest.mark.asyncio
+async def test_page_is_cached_and_revalidated() -> None:
+    """Test the page has an entity tag and is not sent if unchanged"""
+    app = make_app()
+
+    status, headers, body = await get(app, '/api/graphiql')
+    assert status == 200
+    assert headers[b'cache-control'] == b'no-cache'
+    assert headers[b'content-type'] == b'text/html; charset=utf-8'
+    assert b'http://example.com/api/graphql' in body
+    assert b'https://cdn.jsdelivr.net/npm/graphiql@' in body
+    etag = headers[b'etag']
+
+    status, headers, body = await get(
+        app,
+        '/api/graphiql',
+        [(b'if-none-match', b'W/"other", ' + etag)]
+    )
+    assert status == 304
+    assert headers[b'etag'] == etag
+    assert body == b''
+
+    status, _, _ = await get(
+        app,
+        '/api/graphiql',
+        [(b'if-none-match', b'"other"')]
+    )
+    assert status == 200
+
+
+@pytest.mark.asyncio
+async def test_local_assets(tmp_path: Any) -> None:
+    """Test the assets are served locally with immutable caching"""
+    write_assets(str(tmp_path))
+    app = make_app(str(tmp_path))
+
+    _, _, page = await get(app, '/api/graphiql')
+    assert b'cdn.jsdelivr.net' not in page
+    assets = GraphiQLAssets(str(tmp_path))
+    url = assets.urls('/api/graphiql/assets/')['react_js']
+    assert url.encode() in page
+
+    status, headers, body = await get(app, url)
+    assert status == 200
+    assert body == b'/* react.production.min.js */'
+    assert headers[b'content-type'].startswith(b'application/javascript')
+    assert headers[b'cache-control'] == (
+        b'public, max-age=31536000, immutable'
+    )
+
+    status, _, _ = await get(
+        app,
+        url,
+        [(b'if-none-match', headers[b'etag'])]
+    )
+    assert status == 304
+
+    status, _, _ = await get(app, '/api/graphiql/assets/missing.js')
+    assert status == 404
+
+
+def test_missing_assets(tmp_path: Any) -> None:
+    """Test missing assets are reported when the controller is created"""
+    write_assets(str(tmp_path))
+    os.remove(os.path.join(str(tmp_path), 'graphiql.css'))
+    with pytest.raises(FileNotFoundError, match='graphiql.css'):
+        GraphiQLAssets(str(tmp_path))
@@ -0,0 +1,146 @@
+"""Tests for the time taken to import the package
+
+Each import is run in a fresh interpreter with `-X importtime`, after the
+standard library modules every ASGI server has already loaded. The time of
+the package's own modules and the total time, including the dependencies,
+are checked against a budget. The best of several runs is used to reduce the
+noise.
+
+Set IMPORT_TIME_BUDGET_SCALE to scale the budgets on a slow machine.
+"""
+
+import os
+import subprocess
+import sys
+from typing import List, Tuple
+
+import pytest
+
+RUNS = 3
+BUDGET_SCALE = float(os.environ.get('IMPORT_TIME_BUDGET_SCALE', '1'))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PRELOADED = 'import asyncio, json, logging, typing, sys'
+MARK = '--- measured imports ---'
+PACKAGE = 'bareasgi_graphql_next'
+
+# The statement, the budget of the package modules and the total budget, in
+# milliseconds.
+BUDGETS: List[Tuple[str, float, float]] = [
+    ('import bareasgi_graphql_next', 5, 10),
+    ('from bareasgi_graphql_next import add_graphql_next', 50, 400),
+    ('from bareasgi_graphql_next.graphene import add_graphene', 50, 500),
+    ('from bareasgi_graphql_next.process_pool import _execute_in_worker', 25, 300)
+]
+
+
+def _run(statement: str) -> str:
+    return subprocess.run(
+        [
+            sys.executable,
+            '-X',
+            'importtime',
+            '-c',
+            f'{PRELOADED}; sys.stderr.write({MARK!r} + "\\n"); {statement}'
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+        cwd=ROOT
+    ).stderr
+
+
+def measure(statement: str) -> Tuple[float, float, List[Tuple[float, str]]]:
+    """Measure the time taken by an import statement.
+
+    Args:
+        statement (str): The import statement.
+
+    Returns:
+        Tuple[float, float, List[Tuple[float, str]]]: The best times of the
+            package modules and of all modules in milliseconds, and the
+            slowest modules of the last run.
+    """
+    package_times, total_times = [], []
+    modules: List[Tuple[float, str]] = []
+    for _ in range(RUNS):
+        output = _run(statement).split(MARK + '\n', 1)[1]
+        modules = []
+        for line in output.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.partition(':')[2].split('|')
+            if len(fields) != 3 or not fields[0].strip().isdigit():
+                continue
+            modules.append((int(fields[0]) / 1000, fields[2].strip()))
+        package_times.append(sum(
+            self_time
+            for self_time, name in modules
+            if name.startswith(PACKAGE)
+        ))
+        total_times.append(sum(self_time for self_time, _ in modules))
+    return min(package_times), min(total_times), sorted(modules)[-5:]
+
+
+def loaded_modules(statement: str) -> List[str]:
+    """Find the modules loaded by an import statement.
+
+    Args:
+        statement (str): The import statement.
+
+    Returns:
+        List[str]: The names of the loaded modules.
+    """
+    return subprocess.run(
+        [
+            sys.executable,
+            '-c',
+            f'import sys; {statement}; print("\\n".join(sys.modules))'
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+        cwd=ROOT
+    ).stdout.splitlines()
+
+
+@pytest.mark.parametrize('statement,package_budget,total_budget', BUDGETS)
+def test_import_time(
+        statement: str,
+        package_budget: float,
+        total_budget: float
+) -> None:
+    """Test an import is within its budget"""
+    package_time, total_time, slowest = measure(statement)
+    print(f'{statement}: {package_time:.1f}ms package, {total_time:.1f}ms total')
+    assert package_time <= package_budget * BUDGET_SCALE, slowest
+    assert total_time <= total_budget * BUDGET_SCALE, slowest
+
+
+def test_package_import_is_lazy() -> None:
+    """Test importing the package loads no dependencies"""
+    modules = loaded_modules('import bareasgi_graphql_next')
+    for name in ('graphql', 'bareasgi', 'bareutils', 'graphene'):
+        assert name not in modules
+
+
+def test_optional_code_is_not_loaded() -> None:
+    """Test the optional features are loaded when they are used"""
+    modules = loaded_modules(
+        'from bareasgi_graphql_next import add_graphql_next'
+    )
+    for name in (
+            'cgi',
+            'graphene',
+            'multiprocessing',
+            'cProfile',
+            'pstats',
+            'bareasgi_graphql_next.multipart',
+            'bareasgi_graphql_next.template'
+    ):
+        assert name not in modules
+
+    modules = loaded_modules(
+        'from bareasgi_graphql_next.process_pool import _execute_in_worker'
+    )
+    assert 'bareasgi' not in modules
@@ -0,0 +1,261 @@
+"""Tests for queries using the @defer and @stream directives"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from bareasgi import Application
+import graphql
+from graphql import (
+    DirectiveLocation,
+    GraphQLDirective,
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString,
+    specified_directives
+)
+import pytest
+
+from bareasgi_graphql_next import GraphQLController, GraphQLOptions
+from bareasgi_graphql_next.utils import is_incremental_delivery_supported
+
+from .asgi import graphql_post
+
+ACCEPT_MULTIPART = (b'accept', b'multipart/mixed; deferSpec=20220824')
+ACCEPT_SSE = (b'accept', b'text/event-stream')
+QUERY = '{ hello ... @defer { slow } }'
+
+
+async def resolve_slow(*_: Any) -> str:
+    """A resolver which takes a while"""
+    await asyncio.sleep(0.2)
+    return 'slow'
+
+
+def make_schema() -> GraphQLSchema:
+    """Make a schema with the defer directive"""
+    defer_directive = getattr(graphql, 'GraphQLDeferDirective', None)
+    if defer_directive is None:
+        # The directive is declared so the query validates, although it is
+        # ignored by the execution.
+        defer_directive = GraphQLDirective(
+            'defer',
+            [
+                DirectiveLocation.FRAGMENT_SPREAD,
+                DirectiveLocation.INLINE_FRAGMENT
+            ]
+        )
+    return GraphQLSchema(
+        GraphQLObjectType(
+            'Query',
+            {
+                'hello': GraphQLField(GraphQLString, resolve=lambda *_: 'world'),
+                'slow': GraphQLField(GraphQLString, resolve=resolve_slow)
+            }
+        ),
+        directives=[*specified_directives, defer_directive]
+    )
+
+
+def make_controller(**kwargs: Any) -> Tuple[Application, GraphQLController]:
+    """Make an application with a GraphQL controller"""
+    app = Application()
+    controller = GraphQLController(
+        make_schema(),
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(**kwargs)
+    )
+    controller.add_routes(app)
+    return app, controller
+
+
+def parse_multipart(body: bytes) -> List[Any]:
+    """Parse the payloads of a multipart/mixed response"""
+    return [
+        json.loads(part.split(b'\r\n\r\n', 1)[1])
+        for part in body.split(b'\r\n---')[1:]
+        if not part.startswith(b'--')
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(
+    is_incremental_delivery_supported(),
+    reason='graphql-core executes incrementally'
+)
+async def test_unsupported() -> None:
+    """Test the query is executed normally without incremental execution"""
+    app, controller = make_controller()
+    response = await graphql_post(app, QUERY, headers=[ACCEPT_MULTIPART])
+    assert response.status == 200
+    assert response.headers[b'content-type'] == b'application/json'
+    assert response.json() == {'data': {'hello': 'world', 'slow': 'slow'}}
+    histogram = controller.metrics.phase_seconds.values
+    assert histogram[('execute', '', 'http')].count == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(
+    not is_incremental_delivery_supported(),
+    reason='graphql-core does not execute incrementally'
+)
+async def test_multipart() -> None:
+    """Test the deferred fields are sent after the initial payload"""
+    app, controller = make_controller()
+    response = await graphql_post(app, QUERY, headers=[ACCEPT_MULTIPART])
+    assert response.status == 200
+    assert response.headers[b'content-type'].startswith(b'multipart/mixed')
+    payloads = parse_multipart(response.body)
+    assert payloads[0]['data'] == {'hello': 'world'}
+    assert payloads[0]['hasNext']
+    assert not payloads[-1]['hasNext']
+    histogram = controller.metrics.phase_seconds.values
+    assert histogram[('serialise', '', 'http')].count == len(payloads)
+
+
+@pytest.mark.asyncio
+async def test_deadline() -> None:
+    """Test the deferred fields are bounded by the operation timeout"""
+    app, controller = make_controller(operation_timeout=0.05)
+    response = await graphql_post(app, QUERY, headers=[ACCEPT_MULTIPART])
+    assert response.status == 200
+    if is_incremental_delivery_supported():
+        payloads = parse_multipart(response.body)
+        assert payloads[0]['data'] == {'hello': 'world'}
+        errors = payloads[-1]['errors']
+    else:
+        errors = response.json()['errors']
+    assert errors[0]['extensions']['code'] == 'DEADLINE_EXCEEDED'
+    assert controller.metrics.operations_timed_out.get(('http',)) == 1
+
+
+class IncrementalResults:
+    """Stubbed incremental results, as graphql-core would return them"""
+
+    def __init__(self, delay: float = 0, fail: bool = False) -> None:
+        self.initial_result = SimpleNamespace(
+            formatted={'data': {'hello': 'world'}, 'hasNext': True},
+            errors=None
+        )
+        self.delay = delay
+        self.fail = fail
+        self.closed = False
+
+    async def query(self, *_: Any) -> Any:
+        """Execute the query"""
+        return SimpleNamespace(
+            initial_result=self.initial_result,
+            subsequent_results=self.subsequent_results()
+        )
+
+    async def subsequent_results(self) -> AsyncIterator[Any]:
+        """The deferred fields"""
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise ValueError('failed')
+            yield SimpleNamespace(
+                formatted={
+                    'incremental': [{'data': {'slow': 'slow'}, 'path': []}],
+                    'hasNext': False
+                },
+                incremental=[SimpleNamespace(errors=None)]
+            )
+        finally:
+            self.closed = True
+
+
+def stub_incremental(
+        monkeypatch: pytest.MonkeyPatch,
+        results: IncrementalResults,
+        operation_timeout: Optional[float] = None
+) -> Tuple[Application, GraphQLController]:
+    """Make an application executing incrementally with the stubbed results"""
+    monkeypatch.setattr(
+        'bareasgi_graphql_next.controller.is_incremental_delivery_supported',
+        lambda: True
+    )
+    app, controller = make_controller(operation_timeout=operation_timeout)
+    monkeypatch.setattr(controller, 'query_incremental', results.query)
+    return app, controller
+
+
+def parse_sse(body: bytes) -> List[Tuple[str, str]]:
+    """Parse the events of a server sent event response"""
+    events = []
+    for event in body.decode().split('\n\n')[:-1]:
+        fields = {
+            name: value.strip()
+            for name, _, value in (line.partition(':') for line in event.split('\n'))
+        }
+        events.append((fields['event'], fields['data']))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_stubbed_multipart(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the incremental payloads are sent as multipart/mixed parts"""
+    results = IncrementalResults()
+    app, controller = stub_incremental(monkeypatch, results)
+    response = await graphql_post(app, QUERY, headers=[ACCEPT_MULTIPART])
+    assert response.status == 200
+    assert response.headers[b'content-type'] == (
+        b'multipart/mixed; boundary="-"; deferSpec=20220824'
+    )
+    assert response.body.endswith(b'\r\n-----\r\n')
+    assert parse_multipart(response.body) == [
+        {'data': {'hello': 'world'}, 'hasNext': True},
+        {'incremental': [{'data': {'slow': 'slow'}, 'path': []}], 'hasNext': False}
+    ]
+    assert results.closed
+    histogram = controller.metrics.phase_seconds.values
+    assert histogram[('serialise', '', 'http')].count == 2
+
+
+@pytest.mark.asyncio
+async def test_stubbed_sse(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the incremental payloads are sent as events, ending with complete"""
+    app, _controller = stub_incremental(monkeypatch, IncrementalResults())
+    response = await graphql_post(app, QUERY, headers=[ACCEPT_SSE])
+    assert response.status == 200
+    assert response.headers[b'content-type'] == b'text/event-stream'
+    events = parse_sse(response.body)
+    assert [name for name, _data in events] == ['message', 'message', 'complete']
+    assert json.loads(events[0][1]) == {'data': {'hello': 'world'}, 'hasNext': True}
+    assert not json.loads(events[1][1])['hasNext']
+    assert events[2][1] == ''
+
+
+@pytest.mark.asyncio
+async def test_stubbed_failure(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a failure after the initial payload is sent as the last payload"""
+    results = IncrementalResults(fail=True)
+    app, _controller = stub_incremental(monkeypatch, results)
+    response = await graphql_post(app, QUERY, headers=[ACCEPT_MULTIPART])
+    assert response.status == 200
+    payloads = parse_multipart(response.body)
+    assert payloads[0] == {'data': {'hello': 'world'}, 'hasNext': True}
+    assert payloads[-1]['errors'][0]['message'] == 'Execution error'
+    assert not payloads[-1]['hasNext']
+    assert results.closed
+
+
+@pytest.mark.asyncio
+async def test_stubbed_deadline(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the subsequent payloads share the deadline of the operation"""
+    results = IncrementalResults(delay=1)
+    app, controller = stub_incremental(monkeypatch, results, 0.05)
+    response = await graphql_post(app, QUERY, headers=[ACCEPT_SSE])
+    events = parse_sse(response.body)
+    assert [name for name, _data in events] == ['message', 'message', 'complete']
+    payload = json.loads(events[1][1])
+    assert payload['errors'][0]['extensions']['code'] == 'DEADLINE_EXCEEDED'
+    assert not payload['hasNext']
+    assert results.closed
+    assert controller.metrics.operations_timed_out.get(('http',)) == 1
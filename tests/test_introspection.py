@@ -0,0 +1,139 @@
+"""Tests for the cached introspection responses"""
+
+import json
+from typing import Optional, Tuple
+
+from bareasgi import Application
+import graphql
+from graphql import (
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString,
+    get_introspection_query,
+    parse,
+    print_schema
+)
+import pytest
+
+from bareasgi_graphql_next import GraphQLController, GraphQLOptions
+from bareasgi_graphql_next.introspection import is_introspection_operation
+
+from .asgi import graphql_post, http_request
+
+SCHEMA = GraphQLSchema(
+    GraphQLObjectType(
+        'Query',
+        {'ping': GraphQLField(GraphQLString, resolve=lambda *_: 'pong')}
+    )
+)
+
+
+def make_controller() -> Tuple[Application, GraphQLController]:
+    """Make an application with a GraphQL controller"""
+    app = Application()
+    controller = GraphQLController(
+        SCHEMA,
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            cache_introspection=True
+        )
+    )
+    controller.add_routes(app)
+    return app, controller
+
+
+@pytest.mark.asyncio
+async def test_introspection_is_cached() -> None:
+    """Test introspection responses are cached and revalidated"""
+    app, controller = make_controller()
+    query = get_introspection_query(descriptions=True)
+
+    status, headers, content = await graphql_post(
+        app,
+        query,
+        operation_name='IntrospectionQuery'
+    )
+    assert status == 200
+    assert headers[b'content-type'] == b'application/json'
+    assert json.loads(content) == {
+        'data': graphql.graphql_sync(SCHEMA, query).data
+    }
+    etag = headers[b'etag']
+
+    status, headers, repeated = await graphql_post(
+        app,
+        query,
+        operation_name='IntrospectionQuery'
+    )
+    assert status == 200
+    assert repeated == content
+    assert headers[b'etag'] == etag
+    assert controller.introspection_cache is not None
+    assert len(controller.introspection_cache) == 1
+
+    status, _, content = await graphql_post(
+        app,
+        query,
+        headers=[(b'if-none-match', etag)],
+        operation_name='IntrospectionQuery'
+    )
+    assert status == 304
+    assert content == b''
+
+
+@pytest.mark.asyncio
+async def test_other_operations_are_executed() -> None:
+    """Test operations selecting other fields are not cached"""
+    app, controller = make_controller()
+
+    status, headers, content = await graphql_post(app, '{ __typename ping }')
+    assert status == 200
+    assert b'etag' not in headers
+    assert json.loads(content) == {
+        'data': {'__typename': 'Query', 'ping': 'pong'}
+    }
+    assert controller.introspection_cache is not None
+    assert len(controller.introspection_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_schema_route() -> None:
+    """Test the schema is served in the schema definition language"""
+    app, _ = make_controller()
+
+    status, headers, content = await http_request(app, 'GET', '/schema.graphql')
+    assert status == 200
+    assert headers[b'content-type'] == b'text/plain; charset=utf-8'
+    assert content.decode() == print_schema(SCHEMA)
+
+    status, _, _ = await http_request(
+        app,
+        'GET',
+        '/schema.graphql',
+        headers=[(b'if-none-match', headers[b'etag'])]
+    )
+    assert status == 304
+
+
+@pytest.mark.parametrize('query,operation_name,expected', [
+    ('{ __schema { queryType { name } } }', None, True),
+    ('{ __type(name: "Query") { name } __typename }', None, True),
+    ('query A { __typename } query B { ping }', 'A', True),
+    ('query A { __typename } query B { ping }', 'B', False),
+    ('query A { __typename } query B { ping }', None, False),
+    ('query ($name: String!) { __type(name: $name) { name } }', None, False),
+    ('{ ... on Query { __typename } }', None, False),
+    ('subscription { __typename }', None, False)
+])
+def test_is_introspection_operation(
+        query: str,
+        operation_name: Optional[str],
+        expected: bool
+) -> None:
+    """Test introspection operations are recognised"""
+    assert is_introspection_operation(parse(query), operation_name) == expected
@@ -0,0 +1,176 @@
+"""Tests for the input limits"""
+
+import json
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString,
+    get_introspection_query
+)
+import pytest
+
+from bareasgi_graphql_next import (
+    GraphQLController,
+    GraphQLOptions,
+    InputLimitError,
+    InputLimits
+)
+
+from .asgi import http_request
+
+
+def make_schema() -> GraphQLSchema:
+    """Make a recursive schema"""
+    node: GraphQLObjectType = GraphQLObjectType(
+        'Node',
+        lambda: {
+            'name': GraphQLField(GraphQLString, resolve=lambda *_: 'node'),
+            'child': GraphQLField(node, resolve=lambda *_: {})
+        }
+    )
+    return GraphQLSchema(
+        GraphQLObjectType(
+            'Query',
+            {'node': GraphQLField(node, resolve=lambda *_: {})}
+        )
+    )
+
+
+def make_controller(limits: InputLimits) -> Tuple[Application, GraphQLController]:
+    """Make an application with a GraphQL controller"""
+    app = Application()
+    controller = GraphQLController(
+        make_schema(),
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            input_limits=limits
+        )
+    )
+    controller.add_routes(app)
+    return app, controller
+
+
+async def post(
+        app: Application,
+        chunks: List[bytes],
+        content_length: Optional[int] = None,
+        path: str = '/graphql'
+) -> Tuple[int, Any]:
+    """Post a JSON body in chunks"""
+    headers = [(b'content-type', b'application/json')]
+    if content_length is not None:
+        headers.append((b'content-length', str(content_length).encode()))
+    response = await http_request(app, 'POST', path, chunks, headers)
+    return response.status, response.json()
+
+
+@pytest.mark.parametrize('query,limit', [
+    ('{ node { name } }' + ' # comment' * 100, None),
+    ('{' + ' node { name }' * 3000 + ' }', 'tokens'),
+    ('{' + ' node { child {' * 200 + ' name' + ' } }' * 200 + ' }', 'nesting'),
+    ('{ node {' + ' child {' * 20 + ' name' + ' }' * 20 + ' } }', 'depth'),
+    (
+        '{ ...F ...F } fragment F on Query { '
+        + ' '.join(f'a{i}: node {{ name }}' for i in range(30))
+        + ' }',
+        'aliases'
+    ),
+    ('{ node { name' + ' @skip(if: false)' * 51 + ' } }', 'directives')
+])
+def test_parse(query: str, limit: Optional[str]) -> None:
+    """Test the limits are checked as the query is parsed"""
+    limits = InputLimits()
+    if limit is None:
+        limits.parse(query)
+        return
+    with pytest.raises(InputLimitError) as error:
+        limits.parse(query)
+    assert error.value.limit == limit
+    assert error.value.extensions is not None
+    assert error.value.extensions['code'] == 'INPUT_LIMIT_EXCEEDED'
+
+
+def test_introspection_is_within_the_defaults() -> None:
+    """Test the introspection query used by GraphiQL passes the defaults"""
+    InputLimits().parse(get_introspection_query(descriptions=True))
+
+
+@pytest.mark.asyncio
+async def test_body_size() -> None:
+    """Test large bodies are rejected without reading them"""
+    app, controller = make_controller(InputLimits(max_body_size=100))
+    body = json.dumps({'query': '{ node { name } }'}).encode()
+
+    status, result = await post(app, [body], len(body))
+    assert status == 200
+    assert result == {'data': {'node': {'name': 'node'}}}
+
+    chunks = [b' ' * 50] * 10
+    status, result = await post(app, chunks, 500)
+    assert status == 413
+    assert result['errors'][0]['extensions'] == {
+        'code': 'INPUT_LIMIT_EXCEEDED',
+        'limit': 'bodySize',
+        'maximum': 100
+    }
+
+    status, result = await post(app, chunks)
+    assert status == 413
+
+    assert controller.metrics.input_rejected.get(('bodySize', 'http')) == 2
+
+
+@pytest.mark.asyncio
+async def test_subscription_body_size() -> None:
+    """Test large streaming subscription bodies are rejected"""
+    app, controller = make_controller(InputLimits(max_body_size=100))
+    chunks = [b' ' * 50] * 10
+
+    status, result = await post(app, chunks, 500, '/subscriptions')
+    assert status == 413
+    assert result['errors'][0]['extensions']['limit'] == 'bodySize'
+
+    status, result = await post(app, chunks, None, '/subscriptions')
+    assert status == 413
+
+    assert controller.metrics.input_rejected.get(('bodySize', 'http')) == 2
+
+
+@pytest.mark.asyncio
+async def test_body_read_stops_at_the_limit() -> None:
+    """Test a body without a content length is read until it is too large"""
+    read = 0
+
+    async def body() -> AsyncIterator[bytes]:
+        nonlocal read
+        for _ in range(10):
+            read += 1
+            yield b' ' * 50
+
+    with pytest.raises(InputLimitError):
+        await InputLimits(max_body_size=100).read_body(body())
+    assert read == 3
+
+
+@pytest.mark.asyncio
+async def test_query_limits_are_counted() -> None:
+    """Test query rejections are reported and counted"""
+    app, controller = make_controller(InputLimits(max_depth=3))
+    query = '{ node { child { child { name } } } }'
+
+    status, result = await post(app, [json.dumps({'query': query}).encode()])
+    assert status == 400
+    assert result['errors'][0]['extensions']['limit'] == 'depth'
+    assert controller.metrics.input_rejected.get(('depth', 'http')) == 1
+    assert (
+        'graphql_input_rejected_total{limit="depth",transport="http"} 1'
+        in controller.metrics.render().splitlines()
+    )
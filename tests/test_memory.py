@@ -0,0 +1,335 @@
+"""Tests for the memory held by subscriptions and its release
+
+The memory per subscription is reported as a test property, so it appears in
+the junit report, and is printed when run with `pytest -s`.
+
+Set SUBSCRIPTION_SOAK_SECONDS to run the soak test, which repeatedly opens
+and closes subscriptions and checks the memory does not grow.
+"""
+
+import asyncio
+import gc
+import inspect
+import json
+import os
+import time
+import tracemalloc
+from typing import Any, AsyncIterator, Callable, List, Set
+import weakref
+
+from asgi_typing import ASGISendEvent
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+import pytest
+
+from bareasgi_graphql_next import GraphQLController
+
+from .asgi import HttpStream, WebSocketClient, subscription_query_string
+
+SUBSCRIPTIONS = 2000
+SUBSCRIPTIONS_PER_CONNECTION = 20
+
+# A generous limit, to catch a subscription holding on to something large.
+MAX_BYTES_PER_SUBSCRIPTION = 64 * 1024
+
+# The memory allowed to remain after the subscriptions are closed.
+MAX_RETAINED_BYTES_PER_SUBSCRIPTION = 256
+
+SOAK_SECONDS = float(os.environ.get('SUBSCRIPTION_SOAK_SECONDS', '0'))
+SOAK_SUBSCRIPTIONS = 200
+
+# The growth allowed per soak cycle once the memory has settled.
+MAX_SOAK_GROWTH_PER_CYCLE = 512
+
+
+class Source:
+    """An event source publishing to every listener"""
+
+    def __init__(self) -> None:
+        self.queues: 'weakref.WeakSet[asyncio.Queue]' = weakref.WeakSet()
+        self.listening = 0
+        self.changed = asyncio.Event()
+
+    async def listen(self, _root: Any, _info: Any) -> AsyncIterator[str]:
+        """Subscribe to the source"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self.queues.add(queue)
+        self._change(1)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._change(-1)
+
+    def publish(self, event: str) -> None:
+        """Publish an event to the listeners"""
+        for queue in list(self.queues):
+            queue.put_nowait(event)
+
+    async def wait_for(self, listening: int) -> None:
+        """Wait until the number of listeners is reached"""
+        while self.listening != listening:
+            self.changed.clear()
+            await asyncio.wait_for(self.changed.wait(), 10)
+
+    def _change(self, amount: int) -> None:
+        self.listening += amount
+        self.changed.set()
+
+
+def make_app(source: Source) -> Application:
+    """Make an application with a subscription to the source"""
+    schema = GraphQLSchema(
+        query=GraphQLObjectType(
+            'Query',
+            {'ping': GraphQLField(GraphQLString, resolve=lambda *_: 'pong')}
+        ),
+        subscription=GraphQLObjectType(
+            'Subscription',
+            {
+                'event': GraphQLField(
+                    GraphQLString,
+                    subscribe=source.listen,
+                    resolve=lambda event, _info: event
+                )
+            }
+        )
+    )
+    app = Application()
+    controller = GraphQLController(
+        schema,
+        '',
+        None,
+        60,
+        json.loads,
+        json.dumps
+    )
+    controller.add_routes(app)
+    app.info['controller'] = controller
+    return app
+
+
+class SseClient(HttpStream):
+    """A client of a streaming subscription which keeps no responses"""
+
+    def __init__(self, app: Application) -> None:
+        super().__init__(
+            app,
+            'GET',
+            '/subscriptions',
+            headers=[(b'accept', b'text/event-stream')],
+            query_string=subscription_query_string('subscription { event }')
+        )
+        self.events = 0
+
+    async def on_send(self, message: ASGISendEvent) -> None:
+        """Count the events"""
+        if message['type'] == 'http.response.body':
+            self.events += message.get('body', b'').count(b'event: message')
+
+    async def close(self) -> None:
+        """Disconnect"""
+        await self.disconnect()
+
+
+class CountingWebSocketClient(WebSocketClient):
+    """A graphql-ws client which keeps no responses"""
+
+    def __init__(self, app: Application) -> None:
+        super().__init__(app)
+        self.events = 0
+
+    async def open(self, subscriptions: int) -> None:
+        """Connect and start the subscriptions"""
+        await self.connect()
+        for id_ in range(subscriptions):
+            await self.start(id_, 'subscription { event }')
+
+    async def on_send(self, message: ASGISendEvent) -> None:
+        """Count the events, keeping only the messages opening the connection"""
+        if message['type'] == 'websocket.send':
+            text = message.get('text') or ''
+            if '"data"' in text:
+                self.events += 1
+                return
+            if '"connection_ack"' not in text:
+                return
+        await super().on_send(message)
+
+
+async def settle() -> None:
+    """Let the cancelled tasks finish and collect the garbage"""
+    for _ in range(10):
+        await asyncio.sleep(0)
+    gc.collect()
+
+
+def live_generators(func: Callable) -> int:
+    """Count the live async generators of a function"""
+    return sum(
+        1
+        for obj in gc.get_objects()
+        if inspect.isasyncgen(obj) and obj.ag_code is func.__code__
+    )
+
+
+def assert_released(app: Application, source: Source, tasks: Set) -> None:
+    """Assert everything held by the subscriptions has been released"""
+    controller: GraphQLController = app.info['controller']
+    assert source.listening == 0
+    assert not list(source.queues)
+    assert live_generators(Source.listen) == 0
+    assert asyncio.all_tasks() <= tasks
+    assert controller.subscription_count.count == 0
+    assert not controller.stream_tasks
+    assert not controller.websocket_instances
+    assert len(controller.subscriptions) == 0
+
+
+async def open_sse(app: Application, source: Source, count: int) -> List[SseClient]:
+    """Open the streaming subscriptions"""
+    listening = source.listening + count
+    clients = [SseClient(app) for _ in range(count)]
+    for client in clients:
+        client.open()
+    await source.wait_for(listening)
+    return clients
+
+
+async def open_websockets(
+        app: Application,
+        source: Source,
+        count: int
+) -> List[CountingWebSocketClient]:
+    """Open the WebSocket subscriptions"""
+    listening = source.listening + count
+    clients = [
+        CountingWebSocketClient(app)
+        for _ in range(count // SUBSCRIPTIONS_PER_CONNECTION)
+    ]
+    for client in clients:
+        await client.open(SUBSCRIPTIONS_PER_CONNECTION)
+    await source.wait_for(listening)
+    return clients
+
+
+async def deliver(source: Source, clients: List[Any], events: int) -> None:
+    """Publish an event and wait for the clients to receive it"""
+    source.publish('tick')
+    deadline = time.monotonic() + 10
+    while sum(client.events for client in clients) < events:
+        assert time.monotonic() < deadline, 'events were not delivered'
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+@pytest.mark.parametrize('transport', ['sse', 'websocket'])
+async def test_memory_per_subscription(
+        transport: str,
+        record_property: Callable[[str, Any], None]
+) -> None:
+    """Test the memory per subscription, and that it is released"""
+    source = Source()
+    app = make_app(source)
+    tasks = asyncio.all_tasks()
+
+    async def open_subscriptions() -> List[Any]:
+        if transport == 'sse':
+            return await open_sse(app, source, SUBSCRIPTIONS)
+        return await open_websockets(app, source, SUBSCRIPTIONS)
+
+    # Warm up with the same number of subscriptions, so the caches are
+    # filled and the sets and dictionaries holding the subscriptions have
+    # grown. They keep their size when emptied, which is not a leak. Tracing
+    # starts first, so a table resized later is not counted as new memory.
+    tracemalloc.start()
+    try:
+        clients = await open_subscriptions()
+        await deliver(source, clients, SUBSCRIPTIONS)
+        for client in clients:
+            await client.close()
+        await settle()
+
+        before = tracemalloc.get_traced_memory()[0]
+        clients = await open_subscriptions()
+        await deliver(source, clients, SUBSCRIPTIONS)
+        gc.collect()
+        opened = tracemalloc.get_traced_memory()[0]
+
+        if transport == 'websocket':
+            # Stop half the subscriptions, and close the connections with the
+            # rest running.
+            for client in clients:
+                for id_ in range(0, SUBSCRIPTIONS_PER_CONNECTION, 2):
+                    await client.stop(id_)
+            await source.wait_for(SUBSCRIPTIONS // 2)
+        for client in clients:
+            await client.close()
+        del clients
+        await settle()
+        closed = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    bytes_per_subscription = (opened - before) / SUBSCRIPTIONS
+    retained_per_subscription = (closed - before) / SUBSCRIPTIONS
+    record_property('bytes_per_subscription', bytes_per_subscription)
+    record_property('retained_per_subscription', retained_per_subscription)
+    print(
+        f'\n{transport}: {bytes_per_subscription:,.0f} bytes per subscription,'
+        f' {retained_per_subscription:,.0f} retained'
+    )
+
+    assert bytes_per_subscription < MAX_BYTES_PER_SUBSCRIPTION
+    assert retained_per_subscription < MAX_RETAINED_BYTES_PER_SUBSCRIPTION
+    assert_released(app, source, tasks)
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+@pytest.mark.skipif(
+    SOAK_SECONDS <= 0,
+    reason='set SUBSCRIPTION_SOAK_SECONDS to run the soak test'
+)
+async def test_soak(record_property: Callable[[str, Any], None]) -> None:
+    """Test repeatedly opening and closing subscriptions does not leak"""
+    source = Source()
+    app = make_app(source)
+    tasks = asyncio.all_tasks()
+
+    samples: List[int] = []
+    tracemalloc.start()
+    try:
+        deadline = time.monotonic() + SOAK_SECONDS
+        while time.monotonic() < deadline or len(samples) < 10:
+            clients: List[Any] = [
+                *await open_sse(app, source, SOAK_SUBSCRIPTIONS // 2),
+                *await open_websockets(app, source, SOAK_SUBSCRIPTIONS // 2)
+            ]
+            await deliver(source, clients, SOAK_SUBSCRIPTIONS)
+            for client in clients:
+                await client.close()
+            del clients
+            await settle()
+            samples.append(tracemalloc.get_traced_memory()[0])
+    finally:
+        tracemalloc.stop()
+
+    # Compare the last third with the middle third, after the first third
+    # has let the memory settle.
+    third = len(samples) // 3
+    middle = sum(samples[third:2 * third]) / third
+    last = sum(samples[-third:]) / third
+    growth_per_cycle = (last - middle) / third
+    record_property('soak_cycles', len(samples))
+    record_property('soak_growth_per_cycle', growth_per_cycle)
+    print(f'\nsoak: {len(samples)} cycles, {growth_per_cycle:,.0f} bytes per cycle')
+
+    assert growth_per_cycle < MAX_SOAK_GROWTH_PER_CYCLE
+    assert_released(app, source, tasks)
@@ -0,0 +1,93 @@
+"""Tests for the metrics route"""
+
+import json
+from typing import Any, List, Tuple
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+import pytest
+
+from bareasgi_graphql_next import (
+    GraphQLController,
+    GraphQLOptions,
+    OffloadMiddleware,
+    ResolverPool
+)
+
+from .asgi import graphql_post, http_request
+
+SCHEMA = GraphQLSchema(
+    GraphQLObjectType(
+        'Query',
+        {'hello': GraphQLField(GraphQLString, resolve=lambda *_: 'world')}
+    )
+)
+
+
+def make_controller(**kwargs: Any) -> Tuple[Application, GraphQLController]:
+    """Make an application serving the metrics"""
+    app = Application()
+    controller = GraphQLController(
+        SCHEMA,
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            metrics_path='/metrics',
+            **kwargs
+        )
+    )
+    controller.add_routes(app)
+    return app, controller
+
+
+async def scrape(app: Application) -> List[str]:
+    """Get the metrics"""
+    response = await http_request(app, 'GET', '/metrics')
+    assert response.status == 200
+    assert response.headers[b'content-type'] == (
+        b'text/plain; version=0.0.4; charset=utf-8'
+    )
+    assert int(response.headers[b'content-length']) == len(response.body)
+    return response.body.decode('utf-8').splitlines()
+
+
+@pytest.mark.asyncio
+async def test_phases() -> None:
+    """Test the phases of an operation are published"""
+    app, _ = make_controller()
+    response = await graphql_post(
+        app,
+        'query Hello { hello }',
+        operation_name='Hello'
+    )
+    assert response.status == 200
+
+    lines = await scrape(app)
+    assert '# TYPE graphql_operation_phase_seconds histogram' in lines
+    for phase in ('parse', 'validate', 'execute', 'serialise', 'send'):
+        assert (
+            'graphql_operation_phase_seconds_count'
+            f'{{phase="{phase}",operation="Hello",transport="http"}} 1'
+        ) in lines
+    assert '# TYPE graphql_operations_in_flight gauge' in lines
+    assert 'graphql_streams_active 0' in lines
+
+
+@pytest.mark.asyncio
+async def test_non_ascii_labels() -> None:
+    """Test the content length counts the bytes of non-ASCII labels"""
+    offload = OffloadMiddleware([ResolverPool('écriture')])
+    app, _ = make_controller(resolver_offload=offload)
+    try:
+        lines = await scrape(app)
+    finally:
+        offload.shutdown()
+    assert 'graphql_resolver_pool_queued{pool="écriture"} 0' in lines
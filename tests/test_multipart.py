@@ -0,0 +1,279 @@
+"""Tests for multipart requests and file uploads"""
+
+import json
+import tracemalloc
+from typing import Any, Dict, List, Tuple
+
+from bareasgi import Application
+from graphql import (
+    GraphQLArgument,
+    GraphQLField,
+    GraphQLList,
+    GraphQLNonNull,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+import pytest
+
+from bareasgi_graphql_next import GraphQLController, InputLimitError
+from bareasgi_graphql_next.multipart import (
+    MAX_PARTS,
+    GraphQLUpload,
+    MultipartError,
+    MultipartParser,
+    Upload
+)
+
+from .asgi import http_request
+
+BOUNDARY = b'----boundary'
+
+UPLOADS: List[Upload] = []
+
+
+async def resolve_upload(_root: Any, _info: Any, file: Upload) -> str:
+    """Read an upload"""
+    UPLOADS.append(file)
+    content = b''.join([chunk async for chunk in file.stream(4)])
+    return f'{file.filename}:{file.content_type}:{content.decode()}'
+
+
+def read_all(file: Upload) -> str:
+    """Read an upload from the start"""
+    file.seek(0)
+    return file.read().decode()
+
+
+def make_app() -> Application:
+    """Make an application with an upload mutation"""
+    schema = GraphQLSchema(
+        GraphQLObjectType(
+            'Query',
+            {'ping': GraphQLField(GraphQLString, resolve=lambda *_: 'pong')}
+        ),
+        GraphQLObjectType(
+            'Mutation',
+            {
+                'upload': GraphQLField(
+                    GraphQLString,
+                    args={'file': GraphQLArgument(GraphQLNonNull(GraphQLUpload))},
+                    resolve=resolve_upload
+                ),
+                'uploads': GraphQLField(
+                    GraphQLList(GraphQLString),
+                    args={
+                        'files': GraphQLArgument(
+                            GraphQLList(GraphQLNonNull(GraphQLUpload))
+                        )
+                    },
+                    resolve=lambda _root, _info, files: [
+                        read_all(file) for file in files
+                    ]
+                )
+            }
+        )
+    )
+    app = Application()
+    GraphQLController(
+        schema,
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps
+    ).add_routes(app)
+    return app
+
+
+def make_body(parts: List[Tuple[str, bytes, Dict[str, str]]]) -> bytes:
+    """Make a multipart/form-data body"""
+    body = b'preamble\r\n'
+    for name, content, parameters in parts:
+        disposition = f'form-data; name="{name}"' + ''.join(
+            f'; {key}="{value}"'
+            for key, value in parameters.items()
+            if key != 'content-type'
+        )
+        body += b'--' + BOUNDARY + b'\r\n'
+        body += f'Content-Disposition: {disposition}\r\n'.encode()
+        if 'content-type' in parameters:
+            body += f'Content-Type: {parameters["content-type"]}\r\n'.encode()
+        body += b'\r\n' + content + b'\r\n'
+    return body + b'--' + BOUNDARY + b'--\r\nepilogue'
+
+
+async def post(app: Application, body: bytes, chunk_size: int) -> Tuple[int, Any]:
+    """Post a multipart body to the application in chunks"""
+    chunks = [
+        body[start:start + chunk_size]
+        for start in range(0, len(body), chunk_size)
+    ]
+    response = await http_request(
+        app,
+        'POST',
+        '/graphql',
+        chunks,
+        [(b'content-type', b'multipart/form-data; boundary="' + BOUNDARY + b'"')]
+    )
+    return response.status, response.json()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('chunk_size', [1, 7, 65536])
+async def test_graphql_upload(chunk_size: int) -> None:
+    """Test files are put into the variables and closed after the response"""
+    UPLOADS.clear()
+    operations = {
+        'query': 'mutation ($file: Upload!) { upload(file: $file) }',
+        'variables': {'file': None}
+    }
+    body = make_body([
+        ('operations', json.dumps(operations).encode(), {}),
+        ('map', json.dumps({'0': ['variables.file']}).encode(), {}),
+        (
+            '0',
+            b'--boundary\r\n--' + BOUNDARY[:-1] + b' is not the end',
+            {'filename': 'a.txt', 'content-type': 'text/plain; charset=utf-8'}
+        )
+    ])
+
+    status, result = await post(make_app(), body, chunk_size)
+    assert status == 200
+    assert result == {
+        'data': {
+            'upload': (
+                'a.txt:text/plain:--boundary\r\n--'
+                + BOUNDARY[:-1].decode() + ' is not the end'
+            )
+        }
+    }
+    assert UPLOADS[0].closed
+
+
+@pytest.mark.asyncio
+async def test_graphql_upload_list() -> None:
+    """Test a file may be used in several places"""
+    operations = {
+        'query': 'mutation ($files: [Upload!]) { uploads(files: $files) }',
+        'variables': {'files': [None, None, None]}
+    }
+    file_map = {
+        'a': ['variables.files.0', 'variables.files.2'],
+        'b': ['variables.files.1']
+    }
+    body = make_body([
+        ('operations', json.dumps(operations).encode(), {}),
+        ('map', json.dumps(file_map).encode(), {}),
+        ('a', b'first', {'filename': 'a.txt'}),
+        ('b', b'second', {'filename': 'b.txt'})
+    ])
+
+    status, result = await post(make_app(), body, 1024)
+    assert status == 200
+    assert result == {'data': {'uploads': ['first', 'second', 'first']}}
+
+
+@pytest.mark.asyncio
+async def test_form_fields() -> None:
+    """Test a form without operations provides the operation fields"""
+    body = make_body([('query', b'{ ping }', {})])
+    status, result = await post(make_app(), body, 3)
+    assert status == 200
+    assert result == {'data': {'ping': 'pong'}}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('body,message', [
+    (
+        make_body([
+            ('operations', b'{"query": "{ ping }", "variables": {}}', {}),
+            ('map', b'{"0": ["variables.file"]}', {})
+        ]),
+        'The file "0" is missing'
+    ),
+    (
+        make_body([
+            ('operations', b'{"query": "{ ping }"}', {}),
+            ('map', b'{"0": ["query"]}', {}),
+            ('0', b'', {'filename': 'a.txt'})
+        ]),
+        'Invalid file path "query"'
+    ),
+    (
+        make_body([('operations', b'[]', {})]),
+        'Batched operations are not supported'
+    ),
+    (
+        make_body([('query', b'{ ping }', {})])[:-20],
+        'The multipart body is incomplete'
+    )
+])
+async def test_bad_request(body: bytes, message: str) -> None:
+    """Test malformed requests are rejected"""
+    status, result = await post(make_app(), body, 1024)
+    assert status == 400
+    assert result['errors'][0]['message'] == message
+    assert result['errors'][0]['extensions'] == {
+        'code': 'BAD_MULTIPART_REQUEST'
+    }
+
+
+def test_large_upload_memory_is_flat() -> None:
+    """Test a large upload is spooled to disk"""
+    chunk = b'x' * 65536
+    parser = MultipartParser(BOUNDARY, spool_size=1024 * 1024)
+    tracemalloc.start()
+    try:
+        parser.feed(
+            b'--' + BOUNDARY + b'\r\n'
+            b'Content-Disposition: form-data; name="0"; filename="big.bin"\r\n'
+            b'\r\n'
+        )
+        for _ in range(512):
+            parser.feed(chunk)
+        parser.feed(b'\r\n--' + BOUNDARY + b'--\r\n')
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert parser.is_complete
+    upload = parser.files['0']
+    assert upload.size == 512 * len(chunk)
+    assert peak < 4 * 1024 * 1024
+    parser.close()
+    assert upload.closed
+
+
+def test_malformed_part() -> None:
+    """Test a part without a name is rejected"""
+    parser = MultipartParser(BOUNDARY)
+    with pytest.raises(MultipartError):
+        parser.feed(b'--' + BOUNDARY + b'\r\nContent-Type: text/plain\r\n\r\n')
+
+
+def test_fields_are_limited_in_total() -> None:
+    """Test the size of the fields is limited together"""
+    parser = MultipartParser(BOUNDARY, max_field_size=100)
+    body = make_body([(str(index), b'x' * 60, {}) for index in range(2)])
+    with pytest.raises(InputLimitError) as error:
+        parser.feed(body)
+    assert error.value.limit == 'fieldSize'
+
+    parser = MultipartParser(BOUNDARY, max_field_size=100)
+    parser.feed(make_body([(str(index), b'x' * 40, {}) for index in range(2)]))
+    assert parser.is_complete
+    assert len(parser.fields) == 2
+
+
+@pytest.mark.asyncio
+async def test_too_many_parts() -> None:
+    """Test a body with too many parts is rejected"""
+    body = make_body([(str(index), b'', {}) for index in range(MAX_PARTS + 1)])
+    status, result = await post(make_app(), body, 64 * 1024)
+    assert status == 413
+    assert result['errors'][0]['extensions'] == {
+        'code': 'INPUT_LIMIT_EXCEEDED',
+        'limit': 'parts',
+        'maximum': MAX_PARTS
+    }
@@ -0,0 +1,209 @@
+"""Tests for running blocking resolvers on thread pools"""
+
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Dict
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString,
+    graphql
+)
+import pytest
+
+from bareasgi_graphql_next import (
+    GraphQLController,
+    GraphQLOptions,
+    OffloadMiddleware,
+    ResolverPool,
+    blocking_resolver
+)
+from bareasgi_graphql_next.deadline import _DEADLINE
+from bareasgi_graphql_next.metrics import Metrics
+
+from .asgi import WebSocketClient
+
+BLOCKING_SECONDS = 0.2
+
+
+@blocking_resolver()
+def resolve_slow(_root: Any, _info: Any) -> str:
+    """A resolver which blocks"""
+    time.sleep(BLOCKING_SECONDS)
+    return threading.current_thread().name
+
+
+def resolve_thread(_root: Any, _info: Any) -> str:
+    """A resolver returning the name of its thread"""
+    return threading.current_thread().name
+
+
+def resolve_deadline(_root: Any, _info: Any) -> str:
+    """A resolver returning the deadline"""
+    return str(_DEADLINE.get())
+
+
+def make_schema() -> GraphQLSchema:
+    """Make a schema with blocking and non-blocking resolvers"""
+    return GraphQLSchema(
+        GraphQLObjectType(
+            'Query',
+            {
+                'slow': GraphQLField(GraphQLString, resolve=resolve_slow),
+                'thread': GraphQLField(GraphQLString, resolve=resolve_thread),
+                'deadline': GraphQLField(
+                    GraphQLString,
+                    resolve=resolve_deadline
+                )
+            }
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_marked_resolver_does_not_block_the_loop() -> None:
+    """Test a marked resolver runs on a thread while the loop runs"""
+    offload = OffloadMiddleware()
+    ticks = 0
+
+    async def tick() -> None:
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    result = await graphql(
+        make_schema(),
+        '{ slow thread }',
+        middleware=[offload]
+    )
+    ticker.cancel()
+    offload.shutdown()
+
+    assert result.errors is None
+    assert result.data is not None
+    assert result.data['slow'].startswith('graphql-default')
+    assert result.data['thread'] == threading.current_thread().name
+    assert ticks >= 5
+
+
+@pytest.mark.asyncio
+async def test_fields_and_context() -> None:
+    """Test fields are named by coordinate and the context is propagated"""
+    offload = OffloadMiddleware(
+        [ResolverPool('io', max_workers=1)],
+        {'Query.deadline': 'io', 'Query.thread': 'io'}
+    )
+    token = _DEADLINE.set(123.0)
+    try:
+        result = await graphql(
+            make_schema(),
+            '{ thread deadline }',
+            middleware=[offload]
+        )
+    finally:
+        _DEADLINE.reset(token)
+        offload.shutdown()
+
+    assert result.errors is None
+    assert result.data == {'thread': 'graphql-io_0', 'deadline': '123.0'}
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected() -> None:
+    """Test a resolver is rejected when the queue is full"""
+    pool = ResolverPool('small', max_workers=1, max_queue_size=1)
+    metrics = Metrics()
+    offload = OffloadMiddleware([pool], {'Query': 'small'})
+    offload.bind(metrics)
+
+    results = await asyncio.gather(*[
+        graphql(make_schema(), '{ slow }', middleware=[offload])
+        for _ in range(3)
+    ])
+    await asyncio.sleep(0)
+    offload.shutdown()
+
+    codes = []
+    for result in results:
+        if result.errors:
+            assert result.errors[0].extensions is not None
+            codes.append(result.errors[0].extensions['code'])
+        else:
+            codes.append(None)
+    assert codes.count('RESOLVER_POOL_FULL') == 1
+    assert metrics.resolver_pool_rejected.get(('small',)) == 1
+    assert metrics.resolver_pool_run_seconds.values[('small',)].count == 2
+    assert 'graphql_resolver_pool_queued{pool="small"} 0' in metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_controller() -> None:
+    """Test the controller adds the middleware and records the metrics"""
+    offload = OffloadMiddleware()
+    controller = GraphQLController(
+        make_schema(),
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            resolver_offload=offload
+        )
+    )
+    request: Dict[str, Any] = {}
+    result = await controller.query(
+        request,  # type: ignore
+        '{ slow }',
+        None,
+        None
+    )
+    await asyncio.sleep(0)
+    await controller.shutdown()
+
+    assert result.errors is None
+    assert controller.metrics.resolver_pool_run_seconds.values[
+        ('default',)
+    ].count == 1
+
+
+@pytest.mark.asyncio
+async def test_websocket_query() -> None:
+    """Test the middleware applies to queries over a WebSocket"""
+    app = Application()
+    controller = GraphQLController(
+        make_schema(),
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            resolver_offload=OffloadMiddleware()
+        )
+    )
+    controller.add_routes(app)
+
+    client = WebSocketClient(app)
+    await client.connect()
+    try:
+        await client.start(1, '{ slow thread }')
+        message = await asyncio.wait_for(client.receive(), 5)
+    finally:
+        await client.close()
+        await controller.shutdown()
+
+    assert message['type'] == 'data'
+    data = message['payload']['data']
+    assert data['slow'].startswith('graphql-default')
+    assert data['thread'] == threading.current_thread().name
+    assert controller.metrics.resolver_pool_run_seconds.values[
+        ('default',)
+    ].count == 1
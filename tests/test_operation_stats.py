@@ -0,0 +1,163 @@
+"""Tests for operation signatures and the aggregated operation statistics"""
+
+import json
+import logging
+from typing import Any
+
+from bareasgi import Application
+from graphql import (
+    GraphQLArgument,
+    GraphQLField,
+    GraphQLInt,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString,
+    parse
+)
+import pytest
+
+from bareasgi_graphql_next import (
+    GraphQLController,
+    GraphQLOptions,
+    OperationStats
+)
+from bareasgi_graphql_next.operation_stats import REDACTED
+from bareasgi_graphql_next.signature import operation_signature, signature_hash
+
+from .asgi import graphql_post
+
+SCHEMA = GraphQLSchema(
+    GraphQLObjectType(
+        'Query',
+        {
+            'hello': GraphQLField(
+                GraphQLString,
+                args={'count': GraphQLArgument(GraphQLInt)},
+                resolve=lambda *_, **__: 'world'
+            ),
+            'name': GraphQLField(GraphQLString, resolve=lambda *_: 'Rob')
+        }
+    )
+)
+
+
+def signature(query: str, operation_name: Any = None) -> str:
+    """Make the signature of a query"""
+    return operation_signature(parse(query), operation_name)
+
+
+@pytest.mark.parametrize('first,second', [
+    ('{ hello(count: 1) }', '{ hello(count: 2) }'),
+    ('{ greeting: hello name }', '{ name hello }'),
+    ('{ hello(count: 1) name }', '{\n  name\n  hello(count: 5)\n}')
+])
+def test_same_signature(first: str, second: str) -> None:
+    """Test operations differing by literals, aliases and order are equal"""
+    assert signature(first) == signature(second)
+    assert signature_hash(signature(first)) == signature_hash(signature(second))
+
+
+def test_different_signature() -> None:
+    """Test operations selecting different fields are distinct"""
+    assert signature('{ hello }') != signature('{ name }')
+
+
+def test_operation_name() -> None:
+    """Test only the named operation and the fragments it uses are included"""
+    query = '''
+        query A { ...Name }
+        query B { hello }
+        fragment Name on Query { name }
+        fragment Unused on Query { hello }
+    '''
+    assert signature(query, 'A') == (
+        'query A{...Name} fragment Name on Query{name}'
+    )
+    assert signature(query, 'B') == 'query B{hello}'
+    assert signature(query, 'C') == ''
+
+
+def test_top() -> None:
+    """Test the signatures are ranked by their total time"""
+    stats = OperationStats(slow_threshold=None)
+    for duration in (0.1, 0.2, 0.3):
+        stats.record('a', 'query a', None, None, duration, False, 10)
+    stats.record('b', 'query b', None, None, 1.0, True, 5)
+
+    top = stats.top()
+    assert [row['id'] for row in top] == ['b', 'a']
+    assert top[0]['errorCount'] == 1
+    assert top[1] == {
+        'id': 'a',
+        'signature': 'query a',
+        'count': 3,
+        'errorCount': 0,
+        'totalTime': pytest.approx(0.6),
+        'p50': 0.2,
+        'p95': 0.3,
+        'p99': 0.3,
+        'responseBytes': 30
+    }
+    assert [row['id'] for row in stats.top(1)] == ['b']
+
+
+def test_max_signatures() -> None:
+    """Test the least recently seen signature is discarded"""
+    stats = OperationStats(slow_threshold=None, max_signatures=2)
+    stats.record('a', 'query a', None, None, 0.1, False, 0)
+    stats.record('b', 'query b', None, None, 0.1, False, 0)
+    stats.record('a', 'query a', None, None, 0.1, False, 0)
+    stats.record('c', 'query c', None, None, 0.1, False, 0)
+    assert len(stats) == 2
+    assert {row['id'] for row in stats.top()} == {'a', 'c'}
+
+
+def test_slow_operation(caplog: Any) -> None:
+    """Test slow operations are logged with their variables redacted"""
+    stats = OperationStats(slow_threshold=0.5)
+    with caplog.at_level(logging.WARNING, 'bareasgi_graphql_next.slow'):
+        stats.record('a', 'query a', 'A', {'password': 'secret'}, 0.1, False, 0)
+        assert not caplog.records
+        stats.record(
+            'a',
+            'query a',
+            'A',
+            {'password': 'secret', 'ids': [1, None]},
+            0.6,
+            False,
+            0
+        )
+    assert len(caplog.records) == 1
+    message = caplog.records[0].getMessage()
+    assert 'signature=a operationName=A' in message
+    assert 'secret' not in message
+    assert str({'password': REDACTED, 'ids': [REDACTED, None]}) in message
+
+
+@pytest.mark.asyncio
+async def test_controller() -> None:
+    """Test the controller records operations by their signature"""
+    stats = OperationStats(slow_threshold=None)
+    app = Application()
+    GraphQLController(
+        SCHEMA,
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            operation_stats=stats
+        )
+    ).add_routes(app)
+
+    for query in ('{ hello(count: 1) }', '{ hello(count: 2) }', '{ name }'):
+        response = await graphql_post(app, query)
+        assert response.status == 200
+
+    top = {row['signature']: row for row in stats.top()}
+    assert top['query{hello(count:0)}']['count'] == 2
+    assert top['query{name}']['count'] == 1
+    assert top['query{name}']['responseBytes'] == len(
+        json.dumps({'data': {'name': 'Rob'}})
+    )
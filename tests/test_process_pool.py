@@ -0,0 +1,237 @@
+"""Tests for running operations in worker processes"""
+
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator
+
+from graphql import (
+    GraphQLArgument,
+    GraphQLField,
+    GraphQLInt,
+    GraphQLNonNull,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+from bareasgi import Application
+import pytest
+
+from bareasgi_graphql_next import (
+    GraphQLController,
+    GraphQLOptions,
+    ProcessPoolExecution
+)
+from bareasgi_graphql_next.process_pool import EncodedExecutionResult
+
+from .asgi import WebSocketClient
+
+
+def resolve_fibonacci(_root: Any, _info: Any, n: int) -> int:
+    """A CPU bound resolver"""
+    previous, current = 0, 1
+    for _ in range(n):
+        previous, current = current, previous + current
+    return previous
+
+
+def resolve_fail(_root: Any, _info: Any) -> str:
+    """A resolver which fails"""
+    raise ValueError('failed')
+
+
+async def subscribe_ticks(_root: Any, _info: Any) -> AsyncIterator[str]:
+    """A subscription which is never run in a worker"""
+    yield 'tick'
+
+
+def make_schema() -> GraphQLSchema:
+    """Make the schema, which the workers load by its import path"""
+    return GraphQLSchema(
+        query=GraphQLObjectType(
+            'Query',
+            {
+                'pid': GraphQLField(
+                    GraphQLInt,
+                    resolve=lambda *_: os.getpid()
+                ),
+                'fibonacci': GraphQLField(
+                    GraphQLString,
+                    args={'n': GraphQLArgument(GraphQLNonNull(GraphQLInt))},
+                    resolve=lambda *args, **kwargs: str(
+                        resolve_fibonacci(*args, **kwargs)
+                    )
+                ),
+                'user': GraphQLField(
+                    GraphQLString,
+                    resolve=lambda _root, info: info.context.get('user')
+                ),
+                'fail': GraphQLField(GraphQLString, resolve=resolve_fail)
+            }
+        ),
+        subscription=GraphQLObjectType(
+            'Subscription',
+            {
+                'tick': GraphQLField(
+                    GraphQLString,
+                    subscribe=subscribe_ticks,
+                    resolve=lambda event, _info: event
+                )
+            }
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_selected_operations_run_in_workers() -> None:
+    """Test operations selected by name run in a worker with the context"""
+    process_pool = ProcessPoolExecution(
+        'tests.test_process_pool:make_schema',
+        operation_names=['Heavy', 'Failing'],
+        context=lambda request: {'user': request['user']},
+        max_workers=1
+    )
+    controller = GraphQLController(
+        make_schema(),
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            process_pool=process_pool
+        )
+    )
+    request = {'user': 'alice'}
+    try:
+        for _ in range(2):
+            result = await controller.query(
+                request,  # type: ignore
+                'query Heavy { pid user fibonacci(n: 90) }',
+                None,
+                None
+            )
+            assert isinstance(result, EncodedExecutionResult)
+            response = json.loads(result.encoded)
+            assert response['data']['pid'] != os.getpid()
+            assert response['data']['user'] == 'alice'
+            assert response['data']['fibonacci'] == '2880067194370816120'
+            assert not result.errors
+
+        result = await controller.query(
+            request,  # type: ignore
+            'query Failing { fail }',
+            None,
+            None
+        )
+        assert isinstance(result, EncodedExecutionResult)
+        assert result.errors and result.errors[0].message == 'failed'
+        assert json.loads(result.encoded)['errors'][0]['path'] == ['fail']
+
+        result = await controller.query(
+            request,  # type: ignore
+            'query Light { pid }',
+            None,
+            None
+        )
+        assert not isinstance(result, EncodedExecutionResult)
+        assert result.data == {'pid': os.getpid()}
+    finally:
+        await controller.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_websocket_query_runs_in_worker() -> None:
+    """Test a query over a WebSocket sends the encoded worker response"""
+    controller = GraphQLController(
+        make_schema(),
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            process_pool=ProcessPoolExecution(
+                'tests.test_process_pool:make_schema',
+                operation_names=['Heavy'],
+                max_workers=1
+            )
+        )
+    )
+    app = Application()
+    controller.add_routes(app)
+
+    client = WebSocketClient(app)
+    await client.connect()
+    try:
+        await client.start('1', 'query Heavy { pid }')
+        message = await asyncio.wait_for(client.receive(), 30)
+    finally:
+        await client.close()
+        await controller.shutdown()
+
+    assert message['type'] == 'data'
+    assert message['id'] == '1'
+    assert message['payload']['data']['pid'] != os.getpid()
+
+
+@pytest.mark.asyncio
+async def test_shutdown_cancels_pending_operations() -> None:
+    """Test operations waiting for a worker are cancelled on shutdown"""
+    process_pool = ProcessPoolExecution(
+        'tests.test_process_pool:make_schema',
+        max_workers=1
+    )
+    process_pool.start(json.dumps)
+    query = 'query Heavy { fibonacci(n: 200000) }'
+    await process_pool.execute(None, '{ pid }', None, None)
+
+    operations = [
+        asyncio.create_task(process_pool.execute(None, query, None, None))
+        for _ in range(5)
+    ]
+    await asyncio.sleep(0.1)
+    process_pool.shutdown()
+    results = await asyncio.gather(*operations, return_exceptions=True)
+
+    assert any(
+        isinstance(result, asyncio.CancelledError)
+        for result in results
+    )
+    assert all(
+        isinstance(result, (asyncio.CancelledError, EncodedExecutionResult))
+        for result in results
+    )
+
+
+def test_selects() -> None:
+    """Test operations are selected by name and by cost"""
+    process_pool = ProcessPoolExecution(
+        'tests.test_process_pool:make_schema',
+        operation_names=['Heavy'],
+        min_cost=100
+    )
+    controller = GraphQLController(
+        make_schema(),
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps
+    )
+    cache = controller.document_cache
+
+    assert process_pool.selects(cache.get('query Heavy { pid }'), None)
+    assert process_pool.selects(
+        cache.get('query Heavy { pid } query Light { pid }'),
+        'Heavy'
+    )
+    assert not process_pool.selects(
+        cache.get('query Heavy { pid } query Light { pid }'),
+        None
+    )
+    assert not process_pool.selects(cache.get('{ pid }'), None)
+    assert not process_pool.selects(
+        cache.get('subscription Heavy { tick }'),
+        None
+    )
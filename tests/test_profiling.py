@@ -0,0 +1,141 @@
+"""Tests for profiling operations on demand"""
+
+import asyncio
+import json
+import os
+from typing import Any, Tuple
+
+from bareasgi import Application
+from graphql import (
+    ExecutionResult,
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+import pytest
+
+from bareasgi_graphql_next import (
+    GraphQLController,
+    GraphQLOptions,
+    OperationProfiler
+)
+
+from .asgi import WebSocketClient, graphql_post
+
+PROFILE_HEADER = (b'x-graphql-profile', b'1')
+API_KEY = (b'x-api-key', b'admin')
+
+SCHEMA = GraphQLSchema(
+    GraphQLObjectType(
+        'Query',
+        {'hello': GraphQLField(GraphQLString, resolve=lambda *_: 'world')}
+    )
+)
+
+
+def is_admin(request: Any) -> bool:
+    """Only the administrator may profile operations"""
+    return dict(request.scope['headers']).get(b'x-api-key') == b'admin'
+
+
+def make_controller(
+        **kwargs: Any
+) -> Tuple[Application, GraphQLController]:
+    """Make an application with a profiler"""
+    app = Application()
+    controller = GraphQLController(
+        SCHEMA,
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            profiler=OperationProfiler(is_admin, top=5, **kwargs)
+        )
+    )
+    controller.add_routes(app)
+    return app, controller
+
+
+@pytest.mark.asyncio
+async def test_profile() -> None:
+    """Test the profile is returned in the extensions"""
+    app, _ = make_controller()
+    response = await graphql_post(
+        app,
+        '{ hello }',
+        headers=[PROFILE_HEADER, API_KEY]
+    )
+    assert response.status == 200
+    body = response.json()
+    assert body['data'] == {'hello': 'world'}
+    functions = body['extensions']['profile']['functions']
+    assert 0 < len(functions) <= 5
+    cumulative_times = [function['cumulativeTime'] for function in functions]
+    assert cumulative_times == sorted(cumulative_times, reverse=True)
+    assert 'file' not in body['extensions']['profile']
+
+
+@pytest.mark.asyncio
+async def test_not_requested() -> None:
+    """Test operations are only profiled when the client asks"""
+    app, _ = make_controller()
+    response = await graphql_post(app, '{ hello }', headers=[API_KEY])
+    assert response.json() == {'data': {'hello': 'world'}}
+
+
+@pytest.mark.asyncio
+async def test_unauthorised() -> None:
+    """Test a client which may not profile gets a normal response"""
+    app, _ = make_controller()
+    response = await graphql_post(
+        app,
+        '{ hello }',
+        headers=[PROFILE_HEADER, (b'x-api-key', b'guest')]
+    )
+    assert response.status == 200
+    assert response.json() == {'data': {'hello': 'world'}}
+
+
+@pytest.mark.asyncio
+async def test_output_dir(tmp_path: Any) -> None:
+    """Test the profile is written to the output directory"""
+    app, _ = make_controller(output_dir=str(tmp_path))
+    response = await graphql_post(
+        app,
+        'query Greeting { hello }',
+        headers=[PROFILE_HEADER, API_KEY],
+        operation_name='Greeting'
+    )
+    filename = response.json()['extensions']['profile']['file']
+    assert filename.endswith('-Greeting.prof')
+    assert os.listdir(tmp_path) == [filename]
+
+
+@pytest.mark.asyncio
+async def test_websocket() -> None:
+    """Test the profile header of a WebSocket connection applies to queries"""
+    app, _ = make_controller()
+    client = WebSocketClient(app, headers=[PROFILE_HEADER, API_KEY])
+    await client.connect()
+    await client.start(1, '{ hello }')
+    message = await client.receive()
+    assert message['type'] == 'data'
+    assert message['payload']['data'] == {'hello': 'world'}
+    assert message['payload']['extensions']['profile']['functions']
+    await client.close()
+
+
+def test_profiler_outlives_event_loops() -> None:
+    """Test a profiler made outside an event loop can be used in several"""
+    profiler = OperationProfiler(is_admin)
+
+    async def operation() -> ExecutionResult:
+        return ExecutionResult(data={'hello': 'world'})
+
+    for _ in range(2):
+        result = asyncio.run(profiler.profile(operation(), None))
+        assert result.extensions is not None
+        assert 'profile' in result.extensions
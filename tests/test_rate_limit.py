@@ -0,0 +1,230 @@
+"""Tests for the cost based rate limiting"""
+
+import json
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, List
+from urllib.parse import urlsplit
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+import pytest
+
+from bareasgi_graphql_next import (
+    CostRateLimiter,
+    GraphQLController,
+    GraphQLOptions,
+    RateLimitError,
+    header_identity
+)
+
+from .asgi import WebSocketClient, graphql_post, http_request, http_scope
+
+
+async def subscribe_hello(*_: Any) -> AsyncIterator[str]:
+    """Send a single greeting"""
+    yield 'world'
+
+
+SCHEMA = GraphQLSchema(
+    GraphQLObjectType(
+        'Query',
+        {'hello': GraphQLField(GraphQLString, resolve=lambda *_: 'world')}
+    ),
+    subscription=GraphQLObjectType(
+        'Subscription',
+        {
+            'hello': GraphQLField(
+                GraphQLString,
+                resolve=lambda value, *_: value,
+                subscribe=subscribe_hello
+            )
+        }
+    )
+)
+
+
+class Clock:
+    """A clock moved by the test"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_request(api_key: str) -> Any:
+    """Make a request with the API key header"""
+    return SimpleNamespace(
+        scope=http_scope('POST', '/graphql', [(b'x-api-key', api_key.encode())])
+    )
+
+
+def make_limiter(clock: Clock) -> CostRateLimiter:
+    """Make a limiter adding a token a second, with a capacity of 2"""
+    return CostRateLimiter(
+        1,
+        2,
+        identify=header_identity(b'x-api-key'),
+        clock=clock
+    )
+
+
+def test_token_bucket() -> None:
+    """Test a client's bucket is charged and refilled"""
+    clock = Clock()
+    limiter = make_limiter(clock)
+    alice = make_request('alice')
+
+    limiter.charge(alice, 1)
+    limiter.charge(alice, 1)
+    with pytest.raises(RateLimitError) as error:
+        limiter.charge(alice, 1.5)
+    assert error.value.retry_after == 1.5
+
+    clock.now = 1.5
+    limiter.charge(alice, 1.5)
+    assert len(limiter) == 1
+
+    # Other clients have their own bucket.
+    limiter.charge(make_request('bob'), 2)
+    assert len(limiter) == 2
+
+
+def test_expensive_operations() -> None:
+    """Test an operation costing more than the capacity needs a full bucket"""
+    clock = Clock()
+    limiter = make_limiter(clock)
+    alice = make_request('alice')
+
+    limiter.charge(alice, 5)
+    with pytest.raises(RateLimitError) as error:
+        limiter.charge(alice, 5)
+    assert error.value.retry_after == 5
+
+    clock.now = 5
+    limiter.charge(alice, 5)
+
+
+def test_buckets_expire() -> None:
+    """Test a bucket which has had time to refill is discarded"""
+    clock = Clock()
+    limiter = make_limiter(clock)
+    limiter.charge(make_request('alice'), 2)
+    clock.now = 1
+    limiter.charge(make_request('bob'), 1)
+    assert len(limiter) == 2
+
+    clock.now = 1.5
+    limiter.charge(make_request('carol'), 1)
+    assert len(limiter) == 3
+
+    clock.now = 2
+    limiter.charge(make_request('dave'), 1)
+    assert len(limiter) == 2
+
+    # Requests without an identity are not limited.
+    limiter.charge(make_request(''), 100)
+    assert len(limiter) == 2
+
+
+def make_app(clock: Clock) -> Application:
+    """Make an application limited by the API key"""
+    app = Application()
+    GraphQLController(
+        SCHEMA,
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(
+            rate_limiter=make_limiter(clock)
+        )
+    ).add_routes(app)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_too_many_requests() -> None:
+    """Test a limited client is told when to retry"""
+    clock = Clock()
+    app = make_app(clock)
+    headers = [(b'x-api-key', b'alice')]
+
+    statuses: List[int] = []
+    for _ in range(3):
+        response = await graphql_post(app, '{ hello }', headers=headers)
+        statuses.append(response.status)
+    assert statuses == [200, 200, 429]
+    assert response.headers[b'retry-after'] == b'1'
+    assert response.json() == {
+        'data': None,
+        'errors': [
+            {
+                'message': 'Rate limit exceeded.',
+                'locations': None,
+                'path': None,
+                'extensions': {
+                    'code': 'RATE_LIMITED',
+                    'cost': 1,
+                    'retryAfter': 1
+                }
+            }
+        ]
+    }
+
+    clock.now = 1
+    response = await graphql_post(app, '{ hello }', headers=headers)
+    assert response.status == 200
+
+
+@pytest.mark.asyncio
+async def test_redirected_subscription() -> None:
+    """Test a subscription redirected to GET is charged once"""
+    app = make_app(Clock())
+    headers = [(b'x-api-key', b'alice')]
+
+    response = await graphql_post(app, 'subscription { hello }', headers=headers)
+    assert response.status == 201
+    location = urlsplit(response.headers[b'location'].decode())
+
+    response = await http_request(
+        app,
+        'GET',
+        location.path,
+        headers=headers + [(b'accept', b'text/event-stream')],
+        query_string=location.query.encode()
+    )
+    assert response.status == 200
+
+    response = await graphql_post(app, '{ hello }', headers=headers)
+    assert response.status == 200
+    response = await graphql_post(app, '{ hello }', headers=headers)
+    assert response.status == 429
+
+
+@pytest.mark.asyncio
+async def test_websocket() -> None:
+    """Test a limited WebSocket operation is answered with an error"""
+    app = make_app(Clock())
+    client = WebSocketClient(app, headers=[(b'x-api-key', b'alice')])
+    await client.connect()
+
+    for id_ in range(2):
+        await client.start(id_, '{ hello }')
+        message = await client.receive()
+        assert message['type'] == 'data'
+
+    await client.start(2, '{ hello }')
+    message = await client.receive()
+    assert message['type'] == 'error'
+    assert message['id'] == 2
+    assert message['payload']['extensions']['code'] == 'RATE_LIMITED'
+
+    await client.close()
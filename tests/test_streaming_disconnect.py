@@ -0,0 +1,107 @@
+"""Tests for releasing streaming subscriptions when the client disconnects"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, List
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+import pytest
+
+from bareasgi_graphql_next import GraphQLController
+
+from .asgi import HttpStream, subscription_query_string
+
+# The longest acceptable time between the disconnect and the release of the
+# source. This is far shorter than the ping interval.
+MAX_CLEANUP_LATENCY = 0.1
+
+# The time the source takes to release its resources.
+RELEASE_TIME = 0.01
+
+
+class SparseSource:
+    """An event source which never publishes, and releases its resources
+    asynchronously"""
+
+    def __init__(self) -> None:
+        self.listeners: List[asyncio.Queue] = []
+        self.listening = asyncio.Event()
+        self.released = asyncio.Event()
+
+    async def listen(self, _root: Any, _info: Any) -> AsyncIterator[str]:
+        """Subscribe to the source"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self.listeners.append(queue)
+        self.listening.set()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            await asyncio.sleep(RELEASE_TIME)
+            self.listeners.remove(queue)
+            self.released.set()
+
+
+def make_schema(source: SparseSource) -> GraphQLSchema:
+    """Make a schema with a subscription to the source"""
+    return GraphQLSchema(
+        query=GraphQLObjectType(
+            'Query',
+            {'ping': GraphQLField(GraphQLString, resolve=lambda *_: 'pong')}
+        ),
+        subscription=GraphQLObjectType(
+            'Subscription',
+            {
+                'event': GraphQLField(
+                    GraphQLString,
+                    subscribe=source.listen,
+                    resolve=lambda event, _info: event
+                )
+            }
+        )
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'accept',
+    [b'text/event-stream', b'application/json']
+)
+async def test_cleanup_latency(accept: bytes) -> None:
+    """Test the source is released promptly when the client disconnects"""
+    source = SparseSource()
+    app = Application()
+    controller = GraphQLController(
+        make_schema(source),
+        '',
+        None,
+        60,
+        json.loads,
+        json.dumps
+    )
+    controller.add_routes(app)
+
+    stream = HttpStream(
+        app,
+        'GET',
+        '/subscriptions',
+        headers=[(b'accept', accept)],
+        query_string=subscription_query_string('subscription { event }')
+    )
+    stream.open()
+    await asyncio.wait_for(source.listening.wait(), 1)
+    assert await stream.start() == 200
+
+    # The response is complete when the application returns, by which time
+    # the source must have been released and no tasks left behind.
+    await asyncio.wait_for(stream.disconnect(), MAX_CLEANUP_LATENCY)
+    assert source.released.is_set()
+    assert not source.listeners
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+    assert controller.subscription_count.count == 0
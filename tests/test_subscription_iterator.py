@@ -0,0 +1,66 @@
+"""Tests for SubscriptionIterator"""
+
+from types import AsyncGeneratorType
+from typing import AsyncIterator
+
+from graphql import MapAsyncIterator
+import pytest
+
+from bareasgi_graphql_next.utils import (
+    SubscriptionIterator,
+    compact_subscription
+)
+
+
+async def count_to(limit: int) -> AsyncIterator[int]:
+    """A finite source"""
+    for value in range(limit):
+        yield value
+
+
+@pytest.mark.asyncio
+async def test_maps_values() -> None:
+    """Test the values are mapped by the callback"""
+    result = compact_subscription(
+        MapAsyncIterator(count_to(3), lambda value: value * 10)
+    )
+    assert isinstance(result, SubscriptionIterator)
+    assert [value async for value in result] == [0, 10, 20]
+
+
+@pytest.mark.asyncio
+async def test_async_callback() -> None:
+    """Test an awaitable result of the callback is awaited"""
+    async def callback(value: int) -> int:
+        return value + 1
+
+    iterator = SubscriptionIterator(count_to(2), callback)
+    assert [value async for value in iterator] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_reject_callback() -> None:
+    """Test an error from the source is mapped by the reject callback"""
+    async def failing() -> AsyncIterator[int]:
+        yield 1
+        raise ValueError('failed')
+
+    iterator = SubscriptionIterator(
+        failing(),
+        lambda value: value,
+        lambda error: str(error)
+    )
+    assert [value async for value in iterator] == [1, 'failed']
+
+
+@pytest.mark.asyncio
+async def test_aclose() -> None:
+    """Test closing the iterator closes the source"""
+    source = count_to(10)
+    assert isinstance(source, AsyncGeneratorType)
+    iterator = SubscriptionIterator(source, lambda value: value)
+    assert await iterator.__anext__() == 0
+    await iterator.aclose()
+    with pytest.raises(StopAsyncIteration):
+        await iterator.__anext__()
+    assert source.ag_frame is None
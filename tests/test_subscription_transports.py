@@ -0,0 +1,194 @@
+"""Tests for the transports of streaming subscriptions over HTTP"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, List, Tuple
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLInt,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+import pytest
+
+from bareasgi_graphql_next import GraphQLController
+
+from .asgi import Response, graphql_post, http_request, subscription_query_string
+
+# The time between subscription events, when the test wants heartbeats.
+SLOW_EVENT_SECONDS = 0.15
+
+
+async def count(_root: Any, _info: Any, delay: float = 0) -> AsyncIterator[int]:
+    """Count to two"""
+    for value in range(2):
+        await asyncio.sleep(delay)
+        yield value
+
+
+SCHEMA = GraphQLSchema(
+    query=GraphQLObjectType(
+        'Query',
+        {'hello': GraphQLField(GraphQLString, resolve=lambda *_: 'world')}
+    ),
+    subscription=GraphQLObjectType(
+        'Subscription',
+        {
+            'count': GraphQLField(
+                GraphQLInt,
+                subscribe=count,
+                resolve=lambda value, _info: value
+            ),
+            'slowCount': GraphQLField(
+                GraphQLInt,
+                subscribe=lambda root, info: count(
+                    root,
+                    info,
+                    SLOW_EVENT_SECONDS
+                ),
+                resolve=lambda value, _info: value
+            )
+        }
+    )
+)
+
+
+async def subscribe(
+        query: str,
+        accept: bytes,
+        ping_interval: float = 10
+) -> Response:
+    """Run a subscription to completion with a GET request"""
+    app = Application()
+    GraphQLController(
+        SCHEMA,
+        '',
+        None,
+        ping_interval,
+        json.loads,
+        json.dumps
+    ).add_routes(app)
+    return await http_request(
+        app,
+        'GET',
+        '/subscriptions',
+        headers=[(b'accept', accept)],
+        query_string=subscription_query_string(query)
+    )
+
+
+def multipart_parts(body: bytes) -> List[Any]:
+    """Parse the parts of a multipart/mixed subscription"""
+    assert body.endswith(b'\r\n--graphql--\r\n')
+    return [
+        json.loads(part.split(b'\r\n\r\n', 1)[1])
+        for part in body.split(b'\r\n--graphql')[1:-1]
+    ]
+
+
+@pytest.mark.asyncio
+async def test_multipart() -> None:
+    """Test events are sent as parts of a multipart/mixed response"""
+    response = await subscribe(
+        'subscription { count }',
+        b'multipart/mixed; subscriptionSpec="1.0", application/json'
+    )
+    assert response.status == 200
+    assert response.headers[b'content-type'] == (
+        b'multipart/mixed; boundary="graphql"; subscriptionSpec="1.0"'
+    )
+    assert multipart_parts(response.body) == [
+        {'payload': {'data': {'count': 0}}},
+        {'payload': {'data': {'count': 1}}}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_multipart_heartbeat() -> None:
+    """Test an empty part is sent as a heartbeat while there are no events"""
+    response = await subscribe(
+        'subscription { slowCount }',
+        b'multipart/mixed',
+        ping_interval=SLOW_EVENT_SECONDS / 3
+    )
+    parts = multipart_parts(response.body)
+    assert parts[0] == {}
+    assert [part for part in parts if part] == [
+        {'payload': {'data': {'slowCount': 0}}},
+        {'payload': {'data': {'slowCount': 1}}}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_server_sent_events() -> None:
+    """Test events are sent as server sent events"""
+    response = await subscribe('subscription { count }', b'text/event-stream')
+    assert response.headers[b'content-type'] == b'text/event-stream'
+    events = [
+        event for event in response.body.decode().split('\n\n')
+        if event.startswith('event:')
+    ]
+    assert events == [
+        'event: message\ndata: {"data": {"count": 0}, "errors": null}',
+        'event: message\ndata: {"data": {"count": 1}, "errors": null}',
+        'event: complete\ndata:'
+    ]
+
+
+@pytest.mark.asyncio
+async def test_ndjson() -> None:
+    """Test events are sent as newline delimited JSON"""
+    response = await subscribe('subscription { count }', b'application/json')
+    assert response.headers[b'content-type'] == b'application/stream+json'
+    assert [
+        json.loads(line)
+        for line in response.body.decode().splitlines()
+        if line
+    ] == [
+        {'data': {'count': 0}, 'errors': None},
+        {'data': {'count': 1}, 'errors': None}
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('headers,location', [
+    ([(b'host', b'internal')], 'http://internal/subscriptions'),
+    (
+        [
+            (b'host', b'internal'),
+            (b'x-forwarded-proto', b'https'),
+            (b'x-forwarded-host', b'proxy.example.com')
+        ],
+        'https://proxy.example.com/subscriptions'
+    ),
+    (
+        [
+            (b'host', b'internal'),
+            (b'x-forwarded-proto', b'http'),
+            (
+                b'forwarded',
+                b'for=192.0.2.60;Proto=https;host="www.example.com", '
+                b'for=198.51.100.17;proto=http;host=proxy'
+            )
+        ],
+        'https://www.example.com/subscriptions'
+    )
+])
+async def test_redirect(headers: List[Tuple[bytes, bytes]], location: str) -> None:
+    """Test a posted subscription is redirected to the location seen by the
+    client"""
+    app = Application()
+    GraphQLController(
+        SCHEMA,
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps
+    ).add_routes(app)
+    response = await graphql_post(app, 'subscription { count }', headers=headers)
+    assert response.status == 201
+    assert response.headers[b'location'].decode().startswith(location + '?')
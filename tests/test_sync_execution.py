@@ -0,0 +1,196 @@
+"""Tests for the synchronous execution of operations"""
+
+import asyncio
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLFloat,
+    GraphQLInterfaceType,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString,
+    parse
+)
+import pytest
+
+from bareasgi_graphql_next import GraphQLController, GraphQLOptions, get_deadline
+from bareasgi_graphql_next.document_cache import CachedDocument
+from bareasgi_graphql_next.sync_execution import SyncAnalyser
+
+from .asgi import graphql_post, http_request
+
+
+async def resolve_async(*_: Any) -> str:
+    """An asynchronous resolver"""
+    await asyncio.sleep(0)
+    return 'async'
+
+
+def resolve_awaitable(*_: Any) -> Any:
+    """A synchronous resolver returning an awaitable"""
+    return resolve_async()
+
+
+NAMED = GraphQLInterfaceType(
+    'Named',
+    {'name': GraphQLField(GraphQLString)},
+    resolve_type=lambda value, *_: value['type']
+)
+
+PERSON = GraphQLObjectType(
+    'Person',
+    {'name': GraphQLField(GraphQLString, resolve=lambda value, _: value['name'])},
+    interfaces=[NAMED]
+)
+
+ROBOT = GraphQLObjectType(
+    'Robot',
+    {'name': GraphQLField(GraphQLString, resolve=resolve_async)},
+    interfaces=[NAMED]
+)
+
+SCHEMA = GraphQLSchema(
+    GraphQLObjectType(
+        'Query',
+        {
+            'sync': GraphQLField(GraphQLString, resolve=lambda *_: 'sync'),
+            'async': GraphQLField(GraphQLString, resolve=resolve_async),
+            'awaitable': GraphQLField(GraphQLString, resolve=resolve_awaitable),
+            'person': GraphQLField(
+                PERSON,
+                resolve=lambda *_: {'type': 'Person', 'name': 'Luke'}
+            ),
+            'named': GraphQLField(
+                NAMED,
+                resolve=lambda *_: {'type': 'Person', 'name': 'Luke'}
+            ),
+            'deadline': GraphQLField(
+                GraphQLFloat,
+                resolve=lambda *_: get_deadline()
+            )
+        }
+    ),
+    types=[PERSON, ROBOT]
+)
+
+
+@pytest.mark.parametrize('query,expected', [
+    ('{ sync person { name } __typename }', True),
+    ('{ sync async }', False),
+    ('{ ...F } fragment F on Query { async }', False),
+    ('{ named { name } }', False),
+    ('{ named { ... on Person { name } } }', True),
+    ('query A { sync } query B { async }', None),
+    ('subscription { sync }', False)
+])
+def test_analyse(query: str, expected: Optional[bool]) -> None:
+    """Test the operations with asynchronous resolvers are found"""
+    analyser = SyncAnalyser(None)
+    cached_document = CachedDocument(parse(query))
+    if expected is None:
+        assert analyser.is_sync(SCHEMA, cached_document, 'A')
+        assert not analyser.is_sync(SCHEMA, cached_document, 'B')
+        assert cached_document.sync_operations == {'A': True, 'B': False}
+    else:
+        assert analyser.is_sync(SCHEMA, cached_document, None) == expected
+
+
+def test_async_middleware() -> None:
+    """Test asynchronous middleware prevents synchronous execution"""
+    async def middleware(next_: Any, root: Any, info: Any, **args: Any) -> Any:
+        return await next_(root, info, **args)
+
+    def sync_middleware(next_: Any, root: Any, info: Any, **args: Any) -> Any:
+        return next_(root, info, **args)
+
+    cached_document = CachedDocument(parse('{ sync }'))
+    assert SyncAnalyser([sync_middleware]).is_sync(
+        SCHEMA,
+        cached_document,
+        None
+    )
+    assert not SyncAnalyser([middleware]).is_sync(
+        SCHEMA,
+        CachedDocument(cached_document.document),
+        None
+    )
+
+
+def make_controller(**kwargs: Any) -> Tuple[Application, GraphQLController]:
+    """Make an application with a GraphQL controller"""
+    app = Application()
+    controller = GraphQLController(
+        SCHEMA,
+        '',
+        None,
+        10,
+        json.loads,
+        json.dumps,
+        GraphQLOptions(**kwargs)
+    )
+    controller.add_routes(app)
+    return app, controller
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('query,data,outcome', [
+    (
+        '{ sync person { name } }',
+        {'sync': 'sync', 'person': {'name': 'Luke'}},
+        'completed'
+    ),
+    ('{ sync awaitable }', {'sync': 'sync', 'awaitable': 'async'}, 'fallback'),
+    ('{ sync async }', {'sync': 'sync', 'async': 'async'}, None)
+])
+async def test_execution(
+        query: str,
+        data: Dict[str, Any],
+        outcome: Optional[str]
+) -> None:
+    """Test synchronous operations are completed, falling back to awaiting"""
+    app, controller = make_controller()
+    response = await graphql_post(app, query)
+    assert response.status == 200
+    assert response.json() == {'data': data}
+    sync_executions = controller.metrics.sync_executions
+    assert sync_executions.get(('completed',)) == (outcome == 'completed')
+    assert sync_executions.get(('fallback',)) == (outcome == 'fallback')
+
+
+@pytest.mark.asyncio
+async def test_disabled() -> None:
+    """Test synchronous execution can be disabled"""
+    app, controller = make_controller(sync_execution=False)
+    response = await graphql_post(app, '{ sync }')
+    assert response.status == 200
+    assert response.json() == {'data': {'sync': 'sync'}}
+    assert controller.sync_analyser is None
+    assert controller.metrics.sync_executions.get(('completed',)) == 0
+
+
+@pytest.mark.asyncio
+async def test_deadline() -> None:
+    """Test the deadline is set for synchronous resolvers"""
+    app, controller = make_controller(operation_timeout=10)
+    start = asyncio.get_running_loop().time()
+    response = await graphql_post(app, '{ deadline }')
+    assert response.status == 200
+    assert start + 10 <= response.json()['data']['deadline'] <= start + 11
+    assert controller.metrics.sync_executions.get(('completed',)) == 1
+
+
+@pytest.mark.asyncio
+async def test_metrics() -> None:
+    """Test the synchronous executions are published as metrics"""
+    app, _ = make_controller(metrics_path='/metrics')
+    response = await graphql_post(app, '{ sync }')
+    assert response.status == 200
+
+    response = await http_request(app, 'GET', '/metrics')
+    assert response.status == 200
+    lines = response.body.decode().splitlines()
+    assert '# TYPE graphql_sync_executions_total counter' in lines
+    assert 'graphql_sync_executions_total{outcome="completed"} 1' in lines
@@ -0,0 +1,97 @@
+"""Tests for the resolver tracing"""
+
+import json
+from typing import Any, Dict
+
+from bareasgi import Application
+from graphql import (
+    GraphQLField,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+import pytest
+
+from bareasgi_graphql_next import GraphQLController, TracingMiddleware
+
+from .asgi import WebSocketClient, graphql_post
+
+TRACING_HEADER = (b'x-graphql-tracing', b'1')
+
+SCHEMA = GraphQLSchema(
+    GraphQLObjectType(
+        'Query',
+        {'hello': GraphQLField(GraphQLString, resolve=lambda *_: 'world')}
+    )
+)
+
+
+def make_app(tracing: TracingMiddleware) -> Application:
+    """Make an application with tracing middleware"""
+    app = Application()
+    GraphQLController(
+        SCHEMA,
+        '',
+        [tracing],
+        10,
+        json.loads,
+        json.dumps
+    ).add_routes(app)
+    return app
+
+
+def assert_traced(result: Dict[str, Any]) -> None:
+    """Assert a result has a trace of the operation"""
+    assert result['data'] == {'hello': 'world'}
+    trace = result['extensions']['tracing']
+    assert trace['version'] == 1
+    assert set(trace['parsing']) == {'startOffset', 'duration'}
+    assert set(trace['validation']) == {'startOffset', 'duration'}
+    assert trace['parsing']['startOffset'] <= trace['validation']['startOffset']
+    resolvers = trace['execution']['resolvers']
+    assert [resolver['path'] for resolver in resolvers] == [['hello']]
+    assert resolvers[0]['startOffset'] >= trace['validation']['startOffset']
+
+
+@pytest.mark.asyncio
+async def test_http() -> None:
+    """Test an operation is traced when the request has the header"""
+    app = make_app(TracingMiddleware())
+
+    response = await graphql_post(app, '{ hello }')
+    assert response.json() == {'data': {'hello': 'world'}}
+
+    response = await graphql_post(app, '{ hello }', headers=[TRACING_HEADER])
+    assert_traced(response.json())
+
+
+@pytest.mark.asyncio
+async def test_websocket() -> None:
+    """Test queries over a WebSocket connection are traced"""
+    app = make_app(TracingMiddleware())
+    client = WebSocketClient(app, headers=[TRACING_HEADER])
+    await client.connect()
+    await client.start(1, '{ hello }')
+    message = await client.receive()
+    assert message['type'] == 'data' and message['id'] == 1
+    assert_traced(message['payload'])
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_websocket_sampling() -> None:
+    """Test each operation over a WebSocket connection is sampled on its own"""
+    samples = iter([0.0, 0.9])
+    app = make_app(TracingMiddleware(0.5, None, lambda: next(samples)))
+    client = WebSocketClient(app)
+    await client.connect()
+
+    await client.start(1, '{ hello }')
+    message = await client.receive()
+    assert_traced(message['payload'])
+
+    await client.start(2, '{ hello }')
+    message = await client.receive()
+    assert message['payload'] == {'data': {'hello': 'world'}}
+
+    await client.close()
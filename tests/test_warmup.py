@@ -0,0 +1,124 @@
+"""Tests for warming up before the first request"""
+
+import gc
+import logging
+from typing import Any, Dict
+
+from bareasgi import Application, LifespanRequest
+from graphql import (
+    GraphQLArgument,
+    GraphQLField,
+    GraphQLInt,
+    GraphQLList,
+    GraphQLObjectType,
+    GraphQLSchema,
+    GraphQLString
+)
+import pytest
+
+from bareasgi_graphql_next import (
+    GraphQLOptions,
+    QueryCostAnalyser,
+    WarmUp,
+    add_graphql_next
+)
+from bareasgi_graphql_next.graphql.helpers import GRAPHQL_INFO_KEY
+from bareasgi_graphql_next.introspection import STANDARD_INTROSPECTION_QUERY
+from bareasgi_graphql_next.template import make_graphiql_page
+
+from .asgi import graphql_post
+
+
+def make_schema() -> GraphQLSchema:
+    """Make a schema with a list field"""
+    return GraphQLSchema(
+        GraphQLObjectType(
+            'Query',
+            {
+                'hello': GraphQLField(GraphQLString),
+                'items': GraphQLField(
+                    GraphQLList(GraphQLString),
+                    args={'first': GraphQLArgument(GraphQLInt)}
+                )
+            }
+        )
+    )
+
+
+def test_prepare(caplog: pytest.LogCaptureFixture) -> None:
+    """Test operations are parsed, validated and costed"""
+    make_graphiql_page.cache_clear()
+    warm_up = WarmUp(
+        [
+            'query Hello { hello }',
+            'query Items { items(first: 10) }',
+            '{ missing }',
+            '{ hello'
+        ],
+        graphiql_hosts=['example.com']
+    )
+    schema = make_schema()
+    with caplog.at_level(logging.WARNING):
+        warm_up.prepare(schema, QueryCostAnalyser(), '/api')
+
+    assert warm_up.document_cache is not None
+    hello = warm_up.document_cache.get('query Hello { hello }')
+    assert hello.validation_errors == []
+    assert set(hello.costs) == {None, 'Hello'}
+    items = warm_up.document_cache.get('query Items { items(first: 10) }')
+    assert 'Items' in items.costs
+    assert len(caplog.records) == 2
+
+    assert warm_up.introspection_result is not None
+    assert warm_up.introspection_result['__schema']['queryType'] == {
+        'name': 'Query'
+    }
+    assert make_graphiql_page.cache_info().currsize == 2
+    assert b'https://example.com/api/graphql' in make_graphiql_page(
+        'https',
+        'example.com',
+        '/api'
+    ).body
+
+
+@pytest.mark.asyncio
+async def test_prefork() -> None:
+    """Test a prefork warm up happens when the helper is called"""
+    warm_up = WarmUp(['{ hello }'], prefork=True)
+    app = Application()
+    frozen = gc.get_freeze_count()
+    try:
+        add_graphql_next(
+            app,
+            make_schema(),
+            options=GraphQLOptions(cache_introspection=True),
+            warm_up=warm_up
+        )
+        assert warm_up.is_prepared
+        assert gc.get_freeze_count() > frozen
+    finally:
+        gc.unfreeze()
+
+    info: Dict[str, Any] = {}
+    await app.startup_handlers[-1](
+        LifespanRequest({'type': 'lifespan'}, info)  # type: ignore
+    )
+    controller = info[GRAPHQL_INFO_KEY]
+    try:
+        assert warm_up.document_cache is not None
+        assert controller.document_cache is warm_up.document_cache
+        assert len(controller.document_cache) == 1
+        assert controller.introspection_cache is not None
+        assert len(controller.introspection_cache) == 2
+
+        response = await graphql_post(
+            app,
+            STANDARD_INTROSPECTION_QUERY,
+            operation_name='IntrospectionQuery'
+        )
+        assert response.status == 200
+        assert b'etag' in response.headers
+        assert response.json() == {'data': warm_up.introspection_result}
+        assert len(controller.introspection_cache) == 2
+    finally:
+        await controller.shutdown()